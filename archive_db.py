@@ -0,0 +1,120 @@
+"""
+Script that queries the archive catalog of the exported netCDFs (see modules/archive.py), ie. the full netCDFs of
+a sensor in a month, and adds netCDFs to the catalog, ie. the files exported before the catalog existed.
+
+Run: python archive_db.py -c configs_netcdf/config_PAR_008_GV.yml --start 2024-01-01 --end 2024-02-01 --version full
+     python archive_db.py -c configs_netcdf/config_PAR_008_GV.yml --scan
+
+Functions:
+- format_record: Formats the record of one netCDF as a report line.
+- main: Adds netCDFs to the catalog, or reports the netCDFs of a time range.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+
+from pydantic.v1.utils import deep_update
+
+from modules.archive import archive_db_path, create_archive_db, index_files, query_archive, prune_archive
+from modules.sqldb import connect_db
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger
+
+
+def format_record(record: Dict) -> str:
+    """
+    Formats the record of one netCDF as a report line.
+    :param record: the record of the netCDF, as returned by query_archive
+    :return: the report line
+    """
+    start = datetime.fromtimestamp(record['start_time'], tz=timezone.utc)
+    end = datetime.fromtimestamp(record['end_time'], tz=timezone.utc)
+    line = (f"{record['path']} {record['sensor_name']} {record['version']} {record['interval']}s"
+            f" {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M} {record['n_rows']} rows {record['size']} bytes")
+    if record['rain_amount'] is not None:
+        line += f", {record['rain_amount']:.2f} mm"
+    if record['qc_flagged'] is not None:
+        line += f", {record['qc_flagged']} flagged"
+    return line
+
+
+def main(args):
+    """
+    Adds netCDFs to the archive catalog, or reports the netCDFs of a time range.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    archive_db = archive_db_path(config_dict_site)
+    create_archive_db(dbpath=archive_db)
+    con, cur = connect_db(dbpath=str(archive_db))
+    sensor_name = config_dict_site['global_attrs']['sensor_name']
+
+    if args.input or args.scan:
+        logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                               script_name='archive_db',
+                               sensor_name=sensor_name)
+        config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+        if config_dict_general is None:
+            sys.exit(1)
+        config_dict = deep_update(config_dict_general, config_dict_site)
+        if args.scan:
+            # the monthly directories of the export, ie. 202401/20240101_Green_Village-GV_PAR008.nc
+            paths = sorted(Path(config_dict['data_dir']).glob(f'[0-9]*/*_{sensor_name}*.nc'))
+        else:
+            paths = [Path(path) for path in args.input]
+        records = index_files(con, paths=paths, station=config_dict['station_code'], config_dict=config_dict)
+        print(f'Added {len(records)} netCDF to {archive_db}')
+    elif args.prune:
+        for path in prune_archive(con):
+            print(f'Removed {path}')
+    else:
+        start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc) if args.start else None
+        end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end else None
+        for record in query_archive(con, start=start, end=end, station=args.station,
+                                    sensor_name=None if args.all_sensors else sensor_name,
+                                    version=args.version, interval=args.interval):
+            print(record['path'] if args.paths else format_record(record))
+    cur.close()
+    con.close()
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: query the archive catalog of the exported netCDFs, or add netCDFs to it."
+                    " Run: python archive_db.py -c configs_netcdf/config_PAR_008_GV.yml --start 2024-01-01"
+                    " --end 2024-02-01 --version full")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor, for the catalog (archive_db) and the sensor name.'
+                             ' ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('-i', '--input', nargs='+', default=None,
+                        help='NetCDFs of the sensor to add to the catalog, instead of a query')
+    parser.add_argument('--scan', action='store_true',
+                        help='Add all netCDFs of the sensor in the monthly directories of data_dir to the catalog')
+    parser.add_argument('--prune', action='store_true',
+                        help='Remove the records of the netCDFs that no longer exist')
+    parser.add_argument('--start', default=None,
+                        help='Start of the time range (YYYY-MM-DD or YYYY-MM-DDTHH:MM, UTC)')
+    parser.add_argument('--end', default=None,
+                        help='End of the time range, exclusive (YYYY-MM-DD or YYYY-MM-DDTHH:MM, UTC)')
+    parser.add_argument('--station', default=None,
+                        help='Only the netCDFs of this station code')
+    parser.add_argument('--all_sensors', action='store_true',
+                        help='The netCDFs of all sensors in the catalog, not only the sensor of the config')
+    parser.add_argument('--version', default=None, choices=['full', 'light'],
+                        help='Only the full or light netCDFs')
+    parser.add_argument('--interval', type=int, default=None,
+                        help='Only the netCDFs of this time interval in seconds, ie. 60, or 3600 for hourly products')
+    parser.add_argument('--paths', action='store_true',
+                        help='Only print the paths, ie. as input of resample_nc.py')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
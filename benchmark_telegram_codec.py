@@ -0,0 +1,119 @@
+"""
+Script that compares the codecs of the telegram column (see modules/telegram_codec.py): the stored bytes per
+telegram, and the time to encode, decode, insert and query a day of telegrams, for a dry and a rainy day.
+
+Run: python benchmark_telegram_codec.py --telegrams 1440
+
+Functions:
+- db_telegram: Returns a Parsivel telegram string as it is stored in the database.
+- benchmark_codec: Measures one codec on a list of telegrams.
+- main: Prints the comparison of the available codecs.
+- get_args: Gets the arguments from the command line.
+"""
+import random
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from logging import getLogger
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict, List
+
+from modules.simulators import default_parsivel_telegram
+from modules.sqldb import create_db, connect_db, insert_rows, query_db_rows_gen
+from modules.telegram_codec import TELEGRAM_CODECS, codec_available, encode_telegram, decode_telegram
+
+DAY = datetime(2024, 1, 1, tzinfo=timezone.utc)
+logger = getLogger('benchmark_telegram_codec')
+
+
+def db_telegram(rain: bool, rng: random.Random) -> str:
+    """
+    Returns a Parsivel telegram string as it is stored in the database, ie. 01:0000.000; 02:0000.00; ...
+    :param rain: whether the spectrum (field 93) and the drop fields (90, 91) have counts
+    :param rng: the random generator
+    :return: the telegram string
+    """
+    fields = default_parsivel_telegram()
+    if rain:
+        fields['90'] = ';'.join(f'{rng.uniform(-1, 3):.3f}' for _ in range(32)) + ';'
+        fields['91'] = ';'.join(f'{rng.uniform(0, 10):06.3f}' for _ in range(32)) + ';'
+        fields['93'] = ';'.join(f'{rng.choice([0] * 6 + list(range(1, 40))):03d}' for _ in range(1024)) + ';'
+    return '; '.join(f"{field}:{value.rstrip(';').replace(';', ',')}" for field, value in fields.items())
+
+
+def benchmark_codec(codec: str, telegrams: List[str], db_path: Path) -> Dict[str, float]:
+    """
+    Measures one codec on a list of telegrams of one day.
+    :param codec: one of TELEGRAM_CODECS
+    :param telegrams: the telegram strings
+    :param db_path: path of the database to create
+    :return: bytes per telegram, and telegrams per second of encode, decode, insert and query
+    """
+    start = perf_counter()
+    encoded = [encode_telegram(telegram, codec) for telegram in telegrams]
+    encode_time = perf_counter() - start
+    start = perf_counter()
+    decoded = [decode_telegram(value) for value in encoded]
+    decode_time = perf_counter() - start
+    assert decoded == telegrams
+
+    create_db(dbpath=str(db_path))
+    con, cur = connect_db(dbpath=str(db_path))
+    start = perf_counter()
+    # the telegrams are spread over one day
+    step = 86340 / len(telegrams)
+    rows = [(DAY.timestamp() + i * step, str(i), 'PAR008', telegram) for i, telegram in enumerate(telegrams)]
+    insert_rows(cur, rows, codec=codec)
+    con.commit()
+    insert_time = perf_counter() - start
+    stored = cur.execute('SELECT SUM(length(CAST(telegram AS BLOB))) FROM disdrodl').fetchone()[0]
+    start = perf_counter()
+    n_rows = sum(1 for _ in query_db_rows_gen(con, DAY, logger))
+    query_time = perf_counter() - start
+    cur.close()
+    con.close()
+    assert n_rows == len(telegrams)
+
+    return {'bytes': stored / len(telegrams), 'encode': len(telegrams) / encode_time,
+            'decode': len(telegrams) / decode_time, 'insert': len(telegrams) / insert_time,
+            'query': len(telegrams) / query_time}
+
+
+def main(args):
+    """
+    Prints the comparison of the available codecs for a dry and a rainy day.
+    :param args: the command line arguments
+    """
+    rng = random.Random(args.seed)
+    with TemporaryDirectory() as tmp_dir:
+        for rain in (False, True):
+            telegrams = [db_telegram(rain, rng) for _ in range(args.telegrams)]
+            print(f"{'rain' if rain else 'dry'}: {args.telegrams} telegrams")
+            print(f"{'codec':>6} {'bytes':>8} {'encode/s':>10} {'decode/s':>10} {'insert/s':>10} {'query/s':>10}")
+            for codec in TELEGRAM_CODECS:
+                if not codec_available(codec):
+                    print(f'{codec:>6} not available, run: pip install zstandard')
+                    continue
+                result = benchmark_codec(codec, telegrams, Path(tmp_dir) / f'{codec}_{rain}.db')
+                print(f"{codec:>6} {result['bytes']:8.0f} {result['encode']:10.0f} {result['decode']:10.0f}"
+                      f" {result['insert']:10.0f} {result['query']:10.0f}")
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: compare the codecs of the telegram column."
+                    " Run: python benchmark_telegram_codec.py --telegrams 1440")
+    parser.add_argument('--telegrams', type=int, default=1440,
+                        help='Number of telegrams per day, default one day of 1 minute telegrams')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random spectra of the rainy day')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
@@ -0,0 +1,115 @@
+"""
+Script that compares two co-located sensors over a period from their exported netCDFs (see modules/compare.py),
+ie. the Parsivel and the Thies at Cabauw or the Green Village.
+
+Run: python compare_sensors.py -a configs_netcdf/config_PAR_007_CABAUW.yml -b configs_netcdf/config_THIES_005_CABAUW.yml
+     --start 2024-01-01 --end 2025-01-01
+     python compare_sensors.py -a configs_netcdf/config_PAR_008_GV.yml -b configs_netcdf/config_THIES_006_GV.yml
+     --start 2024-07-01 --end 2024-08-01 -o comparison_GV_202407.json
+
+Functions:
+- combined_config: Returns the combined site specific and general config of a sensor.
+- format_stats: Formats the statistics of one quantity as report lines.
+- main: Compares the sensors and reports the statistics.
+- get_args: Gets the arguments from the command line.
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import numpy
+from pydantic.v1.utils import deep_update
+
+from modules.compare import compare_sensors
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger
+
+
+def combined_config(wd: Path, config: str) -> Dict:
+    """
+    Returns the combined site specific and general config of a sensor.
+    :param wd: the directory of the script
+    :param config: the path of the site config file
+    :return: the combined config
+    """
+    config_dict_site = yaml2dict(path=wd / config)
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name='compare_sensors',
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        sys.exit(1)
+    return deep_update(config_dict_general, config_dict_site)
+
+
+def format_stats(quantity: str, stats: Dict) -> List[str]:
+    """
+    Formats the statistics of one quantity as report lines.
+    :param quantity: the name of the quantity
+    :param stats: the statistics, as returned by PairStats.result
+    :return: the report lines
+    """
+    return [f"{quantity}: {stats['n']} pairs, mean a {stats['mean_a']:.3f}, mean b {stats['mean_b']:.3f},"
+            f" bias {stats['bias']:.3f} ({stats['relative_bias']:.1%}), MAE {stats['mae']:.3f},"
+            f" RMSE {stats['rmse']:.3f}, r {stats['correlation']:.3f}",
+            f"  detection: {stats['hits']} hits, {stats['misses']} misses, {stats['false_alarms']} false alarms,"
+            f" POD {stats['pod']:.2f}, FAR {stats['far']:.2f}, CSI {stats['csi']:.2f}"]
+
+
+def main(args):
+    """
+    Compares the sensors over the period and reports the statistics, optionally to a JSON file.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_a, config_b = combined_config(wd, args.config_a), combined_config(wd, args.config_b)
+    start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc)
+    end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc)
+    result = compare_sensors(config_a, config_b, start, end, chunk=timedelta(days=args.chunk_days),
+                             spectra=not args.no_spectra, version=args.version)
+
+    print(f"{result['sensor_a']} (a) - {result['sensor_b']} (b), {start:%Y-%m-%d} - {end:%Y-%m-%d}:"
+          f" {result['minutes']} shared minutes")
+    for quantity, stats in result['stats'].items():
+        print('\n'.join(format_stats(quantity, stats)))
+    if 'spectrum_a' in result:
+        total_a, total_b = result['spectrum_a'].sum(), result['spectrum_b'].sum()
+        print(f'spectra: {total_a:.0f} particles per m2 (a), {total_b:.0f} particles per m2 (b) on the classes of a')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({key: value.tolist() if isinstance(value, numpy.ndarray) else value
+                       for key, value in result.items()}, file, indent=2)
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: compare two co-located sensors over a period from their netCDFs."
+                    " Run: python compare_sensors.py -a configs_netcdf/config_PAR_007_CABAUW.yml"
+                    " -b configs_netcdf/config_THIES_005_CABAUW.yml --start 2024-01-01 --end 2025-01-01")
+    parser.add_argument('-a', '--config_a', required=True,
+                        help='Site config file of the reference sensor, ie. the Parsivel')
+    parser.add_argument('-b', '--config_b', required=True,
+                        help='Site config file of the compared sensor, ie. the Thies, rebinned onto the classes of a')
+    parser.add_argument('--start', required=True,
+                        help='Start of the period (YYYY-MM-DD or YYYY-MM-DDTHH:MM, UTC)')
+    parser.add_argument('--end', required=True,
+                        help='End of the period, exclusive (YYYY-MM-DD or YYYY-MM-DDTHH:MM, UTC)')
+    parser.add_argument('--chunk_days', type=int, default=1,
+                        help='Number of days read at once, default 1')
+    parser.add_argument('--no_spectra', action='store_true',
+                        help='Do not compare the spectra, ie. for the light netCDFs')
+    parser.add_argument('--version', default='full', choices=['full', 'light'],
+                        help='Compare the full or light netCDFs, default full')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Path of a JSON file for the statistics and the summed spectra')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
@@ -17,13 +17,21 @@ Functions:
 - db_insert_24h_empty_parsivel: Inserts 24 hours worth of empty Telegram telegrams into the test database.
 - db_insert_24h_empty_thies: Inserts 24 hours worth of empty Thies telegrams into the test database.
 - db_insert_24h_empty: Inserts 24 hours worth of empty lines into a test database.
+- write_parsivel_netcdf: Returns write_parsivel_netcdf_.
+- write_parsivel_netcdf_: Writes a Parsivel netCDF of telegrams with changed fields at the given minutes.
+- db_telegram_string: Returns a Parsivel telegram string as stored in the database.
+- sample_nc_days: Returns a function that copies the sample netCDF as the netCDFs of days into tmp_path.
+- copy_sample_nc: Copies the sample netCDF as the netCDF of a day into the monthly directory of a data directory.
 """
 
 import os
 import logging
+import shutil
 from pathlib import Path
 from logging import StreamHandler
 from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
 from pydantic.v1.utils import deep_update
 import pytest
 
@@ -31,6 +39,9 @@ from modules.sqldb import create_db, connect_db
 from modules.util_functions import yaml2dict
 from modules.now_time import NowTime
 from modules.telegram import create_telegram
+from modules.netCDF import NetCDF
+from modules.reader import netCDF_name
+from modules.simulators import default_parsivel_telegram
 
 # General variables
 
@@ -53,6 +64,8 @@ db_path_parsivel = data_dir / db_file
 config_dict_general = yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml')
 config_dict_site = yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml')
 config_dict_parsivel = deep_update(config_dict_general, config_dict_site)
+# an exported netCDF of 2024-07-22 of PAR008
+sample_nc = data_dir / '20240722_Green_Village-GV_PAR008.nc'
 
 parsivel_lines = [b'TYP OP4A\r\n', b'01:0000.000\r\n', b'02:0000.00\r\n', b'03:00\r\n', b'04:00\r\n', b'05:   NP\r\n', b'06:   C\r\n', b'07:-9.999\r\n', b'08:20000\r\n', b'09:00043\r\n', b'10:13894\r\n', b'11:00000\r\n', b'12:021\r\n', b'13:450994\r\n', b'14:2.11.6\r\n', b'15:2.11.1\r\n', b'16:0.50\r\n', b'17:24.3\r\n', b'18:0\r\n', b'19: \r\n', b'20:10:13:21\r\n', b'21:25.05.2023\r\n', b'22:\r\n', b'23:\r\n', b'24:0000.00\r\n', b'25:000\r\n', b'26:032\r\n', b'27:022\r\n', b'28:022\r\n', b'29:000.041\r\n', b'30:00.000\r\n', b'31:0000.0\r\n', b'32:0000.00\r\n', b'34:0000.00\r\n', b'35:0000.00\r\n', b'40:20000\r\n', b'41:20000\r\n', b'50:00000000\r\n', b'51:000140\r\n', b'90:-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;-9.999;\r\n', b'91:00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;00.000;\r\n', b'93:000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;000;\r\n', b'94:0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;0000;\r\n', b'95:0.00;0.00;0.00;0.00;0.00;0.00;0.00;\r\n', b'96:0000000;0000000;0000000;0000000;0000000;0000000;0000000;\r\n', b'97:;\r\n', b'98:;\r\n', b'99:;\r\n', b'\x03'] # pylint: disable=line-too-long
 
@@ -248,4 +261,75 @@ def db_insert_two_telegrams_parsivel(create_db_parsivel): # pylint: disable=unus
     This function inserts two Parsivel telegrams into the test database.
     :param create_db_parsivel: the function to create the test database
     """
-    db_insert_two_telegrams(db_path_parsivel, config_dict_parsivel, parsivel_lines)
\ No newline at end of file
+    db_insert_two_telegrams(db_path_parsivel, config_dict_parsivel, parsivel_lines)
+
+@pytest.fixture()
+def write_parsivel_netcdf():
+    """
+    This function returns write_parsivel_netcdf_, to write netCDFs of telegrams in a test.
+    :return: the function write_parsivel_netcdf_
+    """
+    return write_parsivel_netcdf_
+
+def write_parsivel_netcdf_(path, date, minutes, changed_fields, config_dict, full_version=True):  # pylint: disable=too-many-positional-arguments
+    """
+    This function writes a Parsivel netCDF of telegrams with changed fields at the given minutes of a day.
+    :param path: the directory of the netCDF
+    :param date: the day of the netCDF
+    :param minutes: the minutes of the day with a telegram
+    :param changed_fields: per minute the dictionary of the changed telegram fields to their value
+    :param config_dict: the combined site specific and general config, ie. with export_qc set
+    :param full_version: write the full or the light version
+    :return: the path of the netCDF
+    """
+    telegram_objs = []
+    for minute, fields in zip(minutes, changed_fields):
+        telegram = create_telegram(config_dict=config_dict, telegram_lines=db_telegram_string(fields),
+                                   timestamp=date + timedelta(minutes=minute), db_cursor=None, db_row_id=None,
+                                   telegram_data={}, logger=Mock())
+        telegram.parse_telegram_row()
+        telegram_objs.append(telegram)
+    fn_start = date.strftime('%Y%m%d')
+    nc = NetCDF(logger=Mock(), config_dict=config_dict, data_dir=path, fn_start=fn_start, full_version=full_version,
+                telegram_objs=telegram_objs, date=date)
+    nc.create_netCDF()
+    nc.write_data_to_netCDF()
+    return path / f'{fn_start}.nc'
+
+def db_telegram_string(changed_fields=None):
+    """
+    This function returns a Parsivel telegram string as stored in the database, ie. 01:0000.000; 02:0000.00; ...,
+    with the values of a list field separated by commas.
+    :param changed_fields: dictionary of field number to the value that replaces the default value
+    :return: the telegram string
+    """
+    fields = default_parsivel_telegram()
+    fields.update(changed_fields or {})
+    return '; '.join(f"{field}:{value.rstrip(';').replace(';', ',')}" for field, value in fields.items())
+
+@pytest.fixture()
+def sample_nc_days(tmp_path):
+    """
+    This function returns a function that copies the sample netCDF as the netCDFs of days into the monthly
+    directories of a data directory in tmp_path, as written by the export.
+    :param tmp_path: pytest temporary directory
+    :return: the function, that takes the days and returns the Parsivel config with the data directory
+             and the paths of the netCDFs
+    """
+    config = deep_update(config_dict_parsivel, {'data_dir': str(tmp_path)})
+    return lambda days: (config, [copy_sample_nc(config, day) for day in days])
+
+def copy_sample_nc(config_dict, day):
+    """
+    This function copies the sample netCDF as the netCDF of a day into the monthly directory of the data directory
+    of a config, with the time relative to the day.
+    :param config_dict: the combined site specific and general config with the data directory
+    :param day: the day of the netCDF
+    :return: the path of the netCDF
+    """
+    path = Path(config_dict['data_dir']) / f'{day:%Y%m}' / netCDF_name(config_dict, day.date())
+    path.parent.mkdir(exist_ok=True)
+    shutil.copy(sample_nc, path)
+    with Dataset(path, 'a') as nc_file:
+        nc_file.variables['time'].units = f'hours since {day:%Y-%m-%d} 00:00:00 +00:00'
+    return path
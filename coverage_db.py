@@ -0,0 +1,96 @@
+"""
+Script that reports the minute coverage of a sensor per day from the coverage index of the database
+(see modules/coverage.py), ie. to find the days a backfill or re-export should target.
+
+Run: python coverage_db.py -c configs_netcdf/config_PAR_008_GV.yml --start 2024-01-01 --end 2024-12-31 --incomplete
+
+Functions:
+- format_day: Formats the coverage of one day as a report line.
+- main: Reports the coverage of a sensor, optionally after rebuilding the index.
+- get_args: Gets the arguments from the command line.
+"""
+from argparse import ArgumentParser
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict
+
+from modules.coverage import MINUTES_PER_DAY, query_coverage, rebuild_coverage, missing_minutes, empty_coverage
+from modules.sqldb import connect_db, create_db, DBRouter
+from modules.util_functions import yaml2dict
+
+
+def format_day(day: Dict) -> str:
+    """
+    Formats the coverage of one day as a report line, with the first missing minute of an incomplete day.
+    :param day: the coverage of the day, as returned by query_coverage
+    :return: the report line
+    """
+    line = (f"{day['date']} {day['n_minutes']:4d}/{MINUTES_PER_DAY} minutes, {day['n_telegrams']} telegrams,"
+            f" {day['n_empty']} empty, {day['n_short']} short")
+    missing = missing_minutes(day['minutes'])
+    if 0 < len(missing) < MINUTES_PER_DAY:
+        line += f", first missing {missing[0] // 60:02d}:{missing[0] % 60:02d}"
+    return line
+
+
+def main(args):
+    """
+    Reports the coverage of a sensor for a range of days.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    db_router = DBRouter(db_path=Path(config_dict_site['data_dir']) / config_dict_site['db_filename'],
+                         partitioned=config_dict_site.get('partition_db', False))
+    sensor_name = config_dict_site['global_attrs']['sensor_name']
+
+    for db_path in db_router.paths():
+        # adds the coverage table to a database of a previous version
+        create_db(dbpath=str(db_path))
+        if args.rebuild:
+            con, cur = connect_db(dbpath=str(db_path))
+            n_days = rebuild_coverage(con)
+            cur.close()
+            con.close()
+            print(f'Rebuilt the coverage index of {db_path}: {n_days} sensor days')
+
+    end = date.fromisoformat(args.end) if args.end else datetime.now(timezone.utc).date()
+    start = date.fromisoformat(args.start) if args.start else end - timedelta(days=30)
+    coverage = {}
+    for db_path, partition_start, partition_end in db_router.date_ranges(start, end):
+        con, cur = connect_db(dbpath=str(db_path))
+        coverage.update((day['date'], day) for day in query_coverage(con, sensor_name, partition_start, partition_end))
+        cur.close()
+        con.close()
+
+    for day_number in range((end - start).days + 1):
+        day_iso = (start + timedelta(days=day_number)).isoformat()
+        day = coverage.get(day_iso, empty_coverage(day_iso))
+        if not args.incomplete or day['n_minutes'] < MINUTES_PER_DAY:
+            print(format_day(day))
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: report the minute coverage per day of a sensor."
+                    " Run: python coverage_db.py -c configs_netcdf/config_PAR_008_GV.yml --incomplete")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('--start', default=None,
+                        help='First day of the report (YYYY-MM-DD), defaults to 30 days before the last day')
+    parser.add_argument('--end', default=None,
+                        help='Last day of the report (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--incomplete', action='store_true',
+                        help='Only report the days that are not complete')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Rebuild the coverage index from the telegrams first, ie. for a database of a previous'
+                             ' version')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
@@ -0,0 +1,202 @@
+"""
+Script that removes duplicate telegrams from an existing disdrodl.db, so the unique index on the sensor and the
+interval-aligned timestamp (see create_unique_index in modules/sqldb.py) can be created.
+The duplicates are removed online, in small batches with a short transaction each, so the acquisition loop
+writing to the same database is never delayed by a long write lock. For the same reason only the coverage of the
+days of the removed telegrams is recounted afterwards, one day per transaction.
+
+Run: python dedup_db.py -c configs_netcdf/config_PAR_008_GV.yml
+
+Functions:
+- find_duplicates: Finds the ids of the duplicate telegrams, reading the table in batches.
+- remove_duplicates: Removes the duplicate telegrams in batches.
+- recount_days: Recounts the coverage of the sensor days of the removed telegrams, a day per transaction.
+- main: Removes the duplicate telegrams of every database partition.
+- dedup_partition: Removes the duplicate telegrams of one database and creates the unique index.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import sleep
+from typing import List, Set, Tuple, Union
+
+from pydantic.v1.utils import deep_update
+
+from modules.coverage import coverage_slot, recount_coverage
+from modules.sqldb import connect_db, create_db, create_unique_index, DBRouter, INSERT_DUPLICATE_QUERY, \
+    DUPLICATE_POLICIES
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger, set_interval, \
+    get_duplicates_policy
+
+# new duplicates can be inserted by the acquisition loop while removing, the removal is then repeated
+MAX_PASSES = 3
+
+
+def find_duplicates(cur, interval: int, duplicates: str, batch_size: int) -> List[int]:
+    """
+    Finds the ids of the duplicate telegrams, reading the table in batches of ids.
+    :param cur: the database cursor object
+    :param interval: the acquisition interval in seconds
+    :param duplicates: the duplicate policy, keep_last keeps the last telegram of an interval, the others the first
+    :param batch_size: the number of rows read per query
+    :return: the ids of the telegrams to remove
+    """
+    kept = {}
+    duplicate_ids = []
+    last_id = 0
+    while True:
+        rows = cur.execute('SELECT id, sensor_id, timestamp FROM disdrodl WHERE id > ? ORDER BY id LIMIT ?',
+                           (last_id, batch_size)).fetchall()
+        if len(rows) == 0:
+            break
+        for row_id, sensor_id, timestamp in rows:
+            slot = (sensor_id, int(timestamp // interval))
+            if slot not in kept:
+                kept[slot] = row_id
+            elif duplicates == 'keep_last':
+                duplicate_ids.append(kept[slot])
+                kept[slot] = row_id
+            else:
+                duplicate_ids.append(row_id)
+        last_id = rows[-1][0]
+    return sorted(duplicate_ids)
+
+
+def remove_duplicates(con, cur, duplicate_ids: List[int], duplicates: str, batch_size: int,  # pylint: disable=too-many-positional-arguments
+                      pause: float) -> Tuple[int, Set[Tuple[str, str]]]:
+    """
+    Removes the duplicate telegrams in batches, committing and pausing after every batch.
+    With the keep_both policy the telegrams are first copied to the disdrodl_duplicates table.
+    :param con: the database connection object
+    :param cur: the database cursor object
+    :param duplicate_ids: the ids of the telegrams to remove
+    :param duplicates: the duplicate policy
+    :param batch_size: the number of rows removed per transaction
+    :param pause: time in seconds between the transactions, so the acquisition loop can write
+    :return: the number of removed telegrams, and the (sensor_id, date) of the removed telegrams
+    """
+    n_removed = 0
+    days = set()
+    for start in range(0, len(duplicate_ids), batch_size):
+        batch = duplicate_ids[start:start + batch_size]
+        placeholders = ', '.join('?' * len(batch))
+        days.update((sensor_id, coverage_slot(timestamp)[0]) for sensor_id, timestamp in cur.execute(
+            f'SELECT sensor_id, timestamp FROM disdrodl WHERE id IN ({placeholders})', batch))
+        if duplicates == 'keep_both':
+            rows = cur.execute('SELECT timestamp, datetime, sensor_id, telegram FROM disdrodl'
+                               f' WHERE id IN ({placeholders})', batch).fetchall()
+            cur.executemany(INSERT_DUPLICATE_QUERY, rows)
+        cur.execute(f'DELETE FROM disdrodl WHERE id IN ({placeholders})', batch)
+        con.commit()
+        n_removed += cur.rowcount
+        sleep(pause)
+    return n_removed, days
+
+
+def recount_days(db_path: Path, days: Set[Tuple[str, str]], interval: int, pause: float):
+    """
+    Recounts the coverage of the sensor days of the removed telegrams, one short transaction per sensor day with
+    a pause in between, so the acquisition loop is not delayed. The telegrams of a day are read through the
+    unique index, so it must exist.
+    :param db_path: the path of the database (partition)
+    :param days: the (sensor_id, date) of the removed telegrams
+    :param interval: the acquisition interval in seconds, of the unique index
+    :param pause: time in seconds between the transactions, so the acquisition loop can write
+    """
+    con, cur = connect_db(dbpath=str(db_path))
+    try:
+        for day in sorted(days):
+            cur.execute('BEGIN IMMEDIATE')
+            recount_coverage(cur, [day], interval)
+            con.commit()
+            sleep(pause)
+    finally:
+        cur.close()
+        con.close()
+
+
+def main(args):
+    """
+    Removes the duplicate telegrams of the database (partitions) of a site config and creates the unique indexes.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name='dedup_db',
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        sys.exit(1)
+    config_dict = deep_update(config_dict_general, config_dict_site)
+    if args.duplicates is not None:
+        config_dict['duplicates'] = args.duplicates
+    interval = set_interval(config_dict, logger)
+    duplicates = get_duplicates_policy(config_dict, logger)
+    if interval is None or duplicates is None:
+        sys.exit(1)
+
+    db_router = DBRouter(db_path=Path(config_dict['data_dir']) / config_dict['db_filename'],
+                         partitioned=config_dict.get('partition_db', False))
+    for db_path in db_router.paths():
+        if dedup_partition(db_path, interval, duplicates, args, logger) is None:
+            sys.exit(1)
+
+
+def dedup_partition(db_path: Path, interval: int, duplicates: str, args, logger) -> Union[int, None]:
+    """
+    Removes the duplicate telegrams of one database (partition) and creates its unique index.
+    :param db_path: the path of the database (partition)
+    :param interval: the acquisition interval in seconds
+    :param duplicates: the duplicate policy
+    :param args: the command line arguments
+    :param logger: the logger object
+    :return: the number of removed telegrams, None if duplicates are still inserted after MAX_PASSES passes
+    """
+    # adds the disdrodl_duplicates table to an existing database
+    create_db(dbpath=str(db_path))
+
+    n_removed = 0
+    days: Set[Tuple[str, str]] = set()
+    for _ in range(MAX_PASSES):
+        con, cur = connect_db(dbpath=str(db_path))
+        duplicate_ids = find_duplicates(cur, interval, duplicates, args.batch_size)
+        n_pass, days_pass = remove_duplicates(con, cur, duplicate_ids, duplicates, args.batch_size, args.pause)
+        n_removed += n_pass
+        days |= days_pass
+        cur.close()
+        con.close()
+        if create_unique_index(dbpath=str(db_path), interval=interval, logger=logger):
+            # the coverage index still counts the removed telegrams, only their days are recounted
+            recount_days(db_path, days, interval, args.pause)
+            msg = f'Removed {n_removed} duplicate telegrams ({duplicates}) from {db_path}, the unique index is created'
+            logger.info(msg=msg)
+            print(msg)
+            return n_removed
+    logger.error(msg=f'Duplicate telegrams are still inserted in {db_path} after {MAX_PASSES} passes')
+    return None
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: remove duplicate telegrams from the database and create the unique index."
+                    " Run: python dedup_db.py -c configs_netcdf/config_PAR_008_GV.yml")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('--duplicates', choices=DUPLICATE_POLICIES, default=None,
+                        help='Duplicate policy, defaults to the duplicates entry of the config file or keep_first')
+    parser.add_argument('--batch_size', type=int, default=500,
+                        help='Number of rows read or removed per transaction')
+    parser.add_argument('--pause', type=float, default=0.1,
+                        help='Time in seconds between the transactions, so the acquisition loop can write')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
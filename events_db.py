@@ -0,0 +1,107 @@
+"""
+Script that queries the rain-event catalog (see modules/events.py), ie. all events over 10 mm/h at a station in
+a year, and fills the catalog with the events of exported netCDFs of earlier days.
+
+Run: python events_db.py -c configs_netcdf/config_PAR_001_CABAUW.yml --start 2024-01-01 --end 2024-12-31
+     --min_peak 10
+     python events_db.py -c configs_netcdf/config_PAR_001_CABAUW.yml -i /data/disdroDL/2024*/*_PAR001.nc
+
+Functions:
+- format_event: Formats one event as a report line.
+- main: Fills the catalog from netCDFs, or reports the events of a range of days.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict
+
+from pydantic.v1.utils import deep_update
+
+from modules.events import events_db_path, create_events_db, update_events, query_events, events_from_netCDF
+from modules.sqldb import connect_db
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger
+
+
+def format_event(event: Dict) -> str:
+    """
+    Formats one event as a report line.
+    :param event: the event, as returned by query_events
+    :return: the report line
+    """
+    start = datetime.fromtimestamp(event['start_time'], tz=timezone.utc)
+    end = datetime.fromtimestamp(event['end_time'], tz=timezone.utc)
+    return (f"{event['station']} {event['sensor_name']} {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}"
+            f" peak {event['peak_intensity']:.2f} mm/h, total {event['total_amount']:.2f} mm,"
+            f" {event['n_minutes']} wet minutes")
+
+
+def main(args):
+    """
+    Fills the event catalog with the events of netCDFs, or reports the events of a range of days.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    events_db = events_db_path(config_dict_site)
+    create_events_db(dbpath=events_db)
+    con, cur = connect_db(dbpath=str(events_db))
+
+    if args.input:
+        logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                               script_name='events_db',
+                               sensor_name=config_dict_site['global_attrs']['sensor_name'])
+        config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+        if config_dict_general is None:
+            sys.exit(1)
+        config_dict = deep_update(config_dict_general, config_dict_site)
+        # the file names start with the date, so sorting them puts them in time order
+        for path in sorted(Path(path) for path in args.input):
+            day, events = events_from_netCDF(path, config_dict)
+            update_events(con, station=config_dict['station_code'],
+                          sensor_name=config_dict['global_attrs']['sensor_name'], day=day, events=events,
+                          max_gap=config_dict['events']['max_gap'])
+            print(f'{day}: {len(events)} rain events from {path}')
+    else:
+        end = date.fromisoformat(args.end) if args.end else datetime.now(timezone.utc).date()
+        start = date.fromisoformat(args.start) if args.start else end - timedelta(days=30)
+        sensor_name = None if args.all_sensors else config_dict_site['global_attrs']['sensor_name']
+        for event in query_events(con, start, end, station=args.station, sensor_name=sensor_name,
+                                  min_peak=args.min_peak, min_total=args.min_total):
+            print(format_event(event))
+    cur.close()
+    con.close()
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: query the rain-event catalog, or fill it from exported netCDFs."
+                    " Run: python events_db.py -c configs_netcdf/config_PAR_001_CABAUW.yml --start 2024-01-01"
+                    " --end 2024-12-31 --min_peak 10")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor, for the catalog (events_db) and the sensor name.'
+                             ' ie. -c configs_netcdf/config_PAR_001_CABAUW.yml')
+    parser.add_argument('-i', '--input', nargs='+', default=None,
+                        help='Exported netCDFs of the sensor to add to the catalog, instead of a query')
+    parser.add_argument('--start', default=None,
+                        help='First day of the query (YYYY-MM-DD), defaults to 30 days before the last day')
+    parser.add_argument('--end', default=None,
+                        help='Last day of the query (YYYY-MM-DD), defaults to today')
+    parser.add_argument('--station', default=None,
+                        help='Only the events of this station code')
+    parser.add_argument('--all_sensors', action='store_true',
+                        help='The events of all sensors in the catalog, not only the sensor of the config')
+    parser.add_argument('--min_peak', type=float, default=None,
+                        help='Only the events with at least this peak intensity [mm/h]')
+    parser.add_argument('--min_total', type=float, default=None,
+                        help='Only the events with at least this total amount [mm]')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
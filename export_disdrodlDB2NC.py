@@ -12,10 +12,17 @@ from argparse import ArgumentParser
 from datetime import datetime, date, timedelta, timezone
 from pathlib import Path
 from pydantic.v1.utils import deep_update
-from modules.util_functions import yaml2dict, get_general_config_dict, create_dir, create_logger
+from modules.util_functions import yaml2dict, get_general_config_dict, create_dir, create_logger, get_option, \
+    set_interval
 from modules.telegram import create_telegram
 from modules.netCDF import NetCDF
-from modules.sqldb import query_db_rows_gen, connect_db
+from modules.sqldb import query_db_rows_gen, connect_db, query_particles, DBRouter, DEFAULT_ARRAYSIZE
+from modules.particles import blob_to_particles
+from modules.coverage import MIN_TELEGRAM_LENGTH
+from modules.profiler import StageProfiler
+from modules.resample import resample_netCDF
+from modules.events import events_db_path, create_events_db, events_from_telegrams, update_events
+from modules.archive import archive_db_path, create_archive_db, index_files
 
 
 date_today = date.today()
@@ -46,18 +53,37 @@ def get_arguments():
         '--version',
         default='full',
         help="Bool for what version netCDF to export, a full or light version. Format: 'full' or 'light'")
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report wall time and memory of each export stage to the log and stdout')
+    parser.add_argument(
+        '--profile_output',
+        default=None,
+        help='Path to write cProfile statistics to (pstats format), implies --profile')
+    parser.add_argument(
+        '--resample',
+        nargs='+',
+        type=int,
+        default=None,
+        help='Also write the day resampled to these intervals in seconds, ie. --resample 300 3600 86400')
 
     return parser.parse_args()
 
-def main(args):
+def main(args):  # pylint: disable=too-many-locals,too-many-branches
     """
     The main function for exporting a netCDF file.
     :param args: a tuple with a path to a config file, a date, and a version
     """
+    profile_output = get_option(args, 'profile_output')
+    profiler = StageProfiler(enabled=get_option(args, 'profile', False) or profile_output is not None)
+    profiler.start(use_cprofile=profile_output is not None)
+
     date_dt = datetime.strptime(args.date, '%Y-%m-%d')
     wd = Path(__file__).parent
 
-    config_dict_site = yaml2dict(path=wd / args.config)
+    with profiler.stage('config_load'):
+        config_dict_site = yaml2dict(path=wd / args.config)
 
     # Get the sensor type from the site specific config file
     sensor_type = config_dict_site['global_attrs']['sensor_type']
@@ -65,10 +91,13 @@ def main(args):
     # Create the logger object
     logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
                            script_name='disdro_db2nc',
-                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'],
+                           queued=True,
+                           sample_rates=config_dict_site.get('log_sampling'))
 
     # Use the general config file which corresponds to the sensor type
-    config_dict_general = get_general_config_dict(wd, sensor_type, logger)
+    with profiler.stage('config_load'):
+        config_dict_general = get_general_config_dict(wd, sensor_type, logger)
 
     if config_dict_general is None:
         sys.exit(1)
@@ -76,6 +105,10 @@ def main(args):
     # Combine the site specific config file and the sensor type specific config file into one
     config_dict = deep_update(config_dict_general, config_dict_site)
 
+    # The interval variable follows the acquisition interval, the time variable follows the DB timestamps
+    if set_interval(config_dict, logger) is None:
+        sys.exit(1)
+
     # Create a boolean from the version name to indicate a full or light version
     if args.version == 'full':
         full_version = True
@@ -95,8 +128,10 @@ def main(args):
     if full_version is False:
         fn_start = f"{fn_start}_light"
 
-    # Path to the database
-    db_path = Path(config_dict['data_dir']) / config_dict['db_filename']
+    # Path to the database, a day is always in one monthly partition
+    db_router = DBRouter(db_path=Path(config_dict['data_dir']) / config_dict['db_filename'],
+                         partitioned=config_dict.get('partition_db', False))
+    db_path = db_router.path_for(date_dt.replace(tzinfo=timezone.utc).timestamp())
 
     # Log the starting messages to the logger
     msg_conf = f"Starting {__file__} for {config_dict['global_attrs']['sensor_name']}"
@@ -106,29 +141,39 @@ def main(args):
 
     # Query the relevant data rows and create Telegram instances out of those
     telegram_objs = []
-    cur, con = connect_db(dbpath=str(db_path.absolute()))
-    for row in query_db_rows_gen(con, date_dt=date_dt, logger=logger):
-
-        if len(row['telegram']) > 1000:
-            ts_dt = datetime.fromtimestamp(row.get('timestamp'), tz=timezone.utc)
-
-            telegram_instance = create_telegram(
-                    config_dict=config_dict,
-                    telegram_lines=row.get('telegram'),
-                    db_row_id=row.get('id'),
-                    timestamp=ts_dt,
-                    db_cursor=None,
-                    telegram_data={},
-                    logger=logger)
-            telegram_instance.parse_telegram_row()
+    con, cur = connect_db(dbpath=str(db_path.absolute()))
+    rows = query_db_rows_gen(con, date_dt=date_dt, logger=logger,
+                             arraysize=config_dict.get('db_arraysize', DEFAULT_ARRAYSIZE))
+    for row in profiler.iterate('db_query', rows):
+
+        if len(row.get('telegram') or '') > MIN_TELEGRAM_LENGTH:
+            with profiler.stage('telegram_parse'):
+                ts_dt = datetime.fromtimestamp(row.get('timestamp'), tz=timezone.utc)
+
+                telegram_instance = create_telegram(
+                        config_dict=config_dict,
+                        telegram_lines=row.get('telegram'),
+                        db_row_id=row.get('id'),
+                        timestamp=ts_dt,
+                        db_cursor=None,
+                        telegram_data={},
+                        logger=logger)
+                telegram_instance.parse_telegram_row()
 
             # Append telegram_instance if it has data organized by keys(fields)
             if (("11" in telegram_instance.telegram_data.keys() and sensor_type == 'Thies Clima') or
                 ("90" in telegram_instance.telegram_data.keys() and sensor_type == 'OTT Hydromet Parsivel2')):
                 telegram_objs.append(telegram_instance)
 
-    con.close()
+    # Attach the particle lists of field 61, stored next to the telegrams
+    if config_dict.get('capture_particles', False):
+        with profiler.stage('db_query'):
+            particles = query_particles(con, date_dt=date_dt, logger=logger)
+        for telegram_instance in telegram_objs:
+            telegram_instance.particles = blob_to_particles(particles.get(telegram_instance.timestamp.timestamp()))
+
     cur.close()
+    con.close()
 
     # Exit the process if there are no Telegram objects
     if len(telegram_objs) == 0:
@@ -150,16 +195,59 @@ def main(args):
                 fn_start=fn_start,
                 full_version=full_version,
                 telegram_objs=telegram_objs,
-                date=date_dt)
+                date=date_dt,
+                profiler=profiler)
 
     msg_date = f'data_dir is: {nc.data_dir}'
     logger.info(msg=msg_date)
 
-    nc.create_netCDF()
-
-    nc.write_data_to_netCDF()
-
-    nc.compress()
+    with profiler.stage('netcdf_create'):
+        nc.create_netCDF()
+
+    with profiler.stage('netcdf_write'):
+        nc.write_data_to_netCDF()
+
+    with profiler.stage('compression'):
+        nc.compress()
+
+    # Smaller products of the same day at longer intervals, ie. <fn_start>_3600s.nc
+    exported_paths = [nc.path_netCDF]
+    for interval in get_option(args, 'resample') or []:
+        with profiler.stage('resample'):
+            resample_netCDF(paths=[nc.path_netCDF], path_out=data_dir / f'{fn_start}_{interval}s.nc',
+                            interval=interval, config_dict=config_dict, logger=logger)
+        exported_paths.append(data_dir / f'{fn_start}_{interval}s.nc')
+
+    # Replace the rain events of the day in the event catalog
+    if config_dict.get('index_events', False):
+        with profiler.stage('events'):
+            events = events_from_telegrams(telegram_objs, config_dict)
+            events_db = events_db_path(config_dict)
+            create_events_db(dbpath=events_db)
+            con, cur = connect_db(dbpath=str(events_db))
+            update_events(con, station=st_code, sensor_name=sensor_name, day=date_dt.date(), events=events,
+                          max_gap=config_dict['events']['max_gap'])
+            cur.close()
+            con.close()
+        logger.info(msg=f'{len(events)} rain events of {args.date} stored in {events_db}')
+
+    # Add the written netCDFs to the archive catalog
+    if config_dict.get('index_archive', False):
+        with profiler.stage('archive'):
+            archive_db = archive_db_path(config_dict)
+            create_archive_db(dbpath=archive_db)
+            con, cur = connect_db(dbpath=str(archive_db))
+            index_files(con, paths=exported_paths, station=st_code, config_dict=config_dict)
+            cur.close()
+            con.close()
+        logger.info(msg=f'{len(exported_paths)} netCDF of {args.date} added to {archive_db}')
+
+    profiler.stop()
+    profiler.log_report(logger)
+    profiler.print_report()
+    if profile_output is not None:
+        profiler.dump_stats(profile_output)
+        logger.info(msg=f'cProfile statistics written to {profile_output}')
 
 if __name__ == '__main__':
     main(get_arguments())
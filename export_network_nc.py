@@ -0,0 +1,90 @@
+"""
+Script that exports a day of several sensors of the same type, ie. the Parsivels of all Ruisdael stations,
+from their databases to one netCDF with a station dimension (see modules/network.py).
+
+Run: python export_network_nc.py -c configs_netcdf/config_PAR_007_CABAUW.yml configs_netcdf/config_PAR_008_GV.yml
+     -d 2024-01-01
+     python export_network_nc.py -c configs_netcdf/config_PAR_00*.yml -d 2024-01-01 -v light -o network.nc
+
+Functions:
+- main: Exports the day of the sensors to one netCDF.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, date, timedelta
+from pathlib import Path
+
+from pydantic.v1.utils import deep_update
+
+from modules.network import export_network, network_name
+from modules.util_functions import yaml2dict, get_general_config_dict, create_dir, create_logger, set_interval
+
+
+def main(args):
+    """
+    Exports the day of the sensors of the site configs to one netCDF with a station dimension.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    date_dt = datetime.strptime(args.date, '%Y-%m-%d')
+    config_dicts_site = [yaml2dict(path=wd / config) for config in args.config]
+    logger = create_logger(log_dir=Path(config_dicts_site[0]['log_dir']),
+                           script_name='network_db2nc',
+                           sensor_name='network')
+
+    config_dicts = []
+    for config_dict_site in config_dicts_site:
+        config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+        if config_dict_general is None:
+            sys.exit(1)
+        config_dict = deep_update(config_dict_general, config_dict_site)
+        if set_interval(config_dict, logger) is None:
+            sys.exit(1)
+        config_dicts.append(config_dict)
+
+    full_version = args.version == 'full'
+    if args.output:
+        path_out = Path(args.output)
+    else:
+        # the network netCDF is stored next to the netCDFs of the first sensor
+        data_dir = Path(config_dicts[0]['data_dir']) / date_dt.strftime('%Y%m')
+        if create_dir(path=data_dir):
+            logger.info(msg=f'Created data directory: {data_dir}')
+        path_out = data_dir / network_name(config_dicts, date_dt, full_version=full_version)
+
+    try:
+        n_steps = export_network(config_dicts, date_dt, path_out, full_version=full_version, logger=logger,
+                                 workers=args.workers)
+    except ValueError as error:
+        logger.error(msg=f'Network netCDF not created: {error}')
+        sys.exit(1)
+    print(f'Exported {n_steps} time steps of {len(config_dicts)} sensors: {path_out}')
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: export a day of several sensors of the same type to one netCDF with a station"
+                    " dimension. Run: python export_network_nc.py -c configs_netcdf/config_PAR_007_CABAUW.yml"
+                    " configs_netcdf/config_PAR_008_GV.yml -d 2024-01-01")
+    parser.add_argument('-c', '--config', nargs='+', required=True,
+                        help='Site config files of the sensors, of the same sensor type and interval')
+    parser.add_argument('-d', '--date', default=(date.today() - timedelta(days=1)).strftime('%Y-%m-%d'),
+                        help='Date of the day to export, default yesterday. Format: YYYY-mm-dd')
+    parser.add_argument('-v', '--version', default='full', choices=['full', 'light'],
+                        help='Export the full or light version, default full')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Path of the netCDF, by default <YYYYMMDD>_network_<sensor type>.nc'
+                             ' in the data_dir of the first sensor')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of sensors exported at once in worker processes, default one per sensor up to the'
+                             ' number of CPUs')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
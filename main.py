@@ -1,27 +1,32 @@
 """
-This module contains the main loop to log data once every minute.
+This module contains the main loop to log data once every interval (default: once every minute).
 
 After setting up the logger and the connection with the database,
-the code enters a permanent while loop where each time the seconds are 0,
+the code enters a permanent while loop where each time the seconds are a multiple of the interval,
 data gets logged to the database.
 """
+import sqlite3
 import sys
 from pathlib import Path
-from time import sleep
+from time import sleep, time
 from argparse import ArgumentParser
 from pydantic.v1.utils import deep_update
 
 from modules.sensors import Parsivel, Thies
-from modules.util_functions import yaml2dict, get_general_config_dict, create_logger, create_sensor
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger, create_sensor, set_interval, \
+    get_duplicates_policy, get_telegram_codec
 from modules.telegram import ParsivelTelegram, ThiesTelegram, create_telegram
 from modules.now_time import NowTime
-from modules.sqldb import create_db, connect_db
+from modules.sqldb import create_db, connect_db, create_unique_index, DBRouter
+from modules.metrics import CycleMetrics
+from modules.spool import Spool, SpoolDrainer
+from modules.raw_log import RawLog
 
 
 ######################## BOILER PLATE ##################
-def main(config_site):
+def main(config_site):  # pylint: disable=too-many-locals,too-many-branches,too-many-statements
     """
-    Main function to log data once every minute
+    Main function to log data once every interval
     :param config_site: the config file for the site
     """
     ### Config files ###
@@ -32,7 +37,9 @@ def main(config_site):
     ### Log ###
     logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
                            script_name=config_dict_site['script_name'],
-                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'],
+                           queued=True,
+                           sample_rates=config_dict_site.get('log_sampling'))
     logger.info(msg=f"Starting {__file__} for {config_dict_site['global_attrs']['sensor_name']}")
     print(f"{__file__} running\nLogs written to {config_dict_site['log_dir']}")
 
@@ -45,6 +52,19 @@ def main(config_site):
 
     config_dict = deep_update(config_dict_general, config_dict_site)
 
+    interval = set_interval(config_dict, logger)
+    if interval is None:
+        sys.exit(1)
+    if interval < 60:
+        # the start sequence takes longer than a sub-minute interval, so it only runs at startup
+        logger.info(msg=f"Logging every {interval} seconds, the start sequence only runs at startup"
+                        f" and the rain amount is reset every minute")
+
+    duplicates = get_duplicates_policy(config_dict, logger)
+    codec = get_telegram_codec(config_dict, logger)
+    if duplicates is None or codec is None:
+        sys.exit(1)
+
     ### Serial connection ###
 
     sensor_id = config_dict['global_attrs']['sensor_name'][-2:]
@@ -55,25 +75,65 @@ def main(config_site):
     sleep(2)
 
     ### DB ###
-    db_path = Path(config_dict['data_dir']) / config_dict['db_filename']
-    create_db(dbpath=str(db_path))
+    # with partition_db the telegrams are written to a database file per month, see DBRouter
+    db_router = DBRouter(db_path=Path(config_dict['data_dir']) / config_dict['db_filename'],
+                         partitioned=config_dict.get('partition_db', False), interval=interval, logger=logger)
+    db_path = db_router.path_for(time())
+    # while the database can not be created the telegrams are spooled, and its creation is retried every cycle
+    db_ready = prepare_db(db_path=db_path, interval=interval, logger=logger)
+
+    # telegrams that can not be written to the DB are spooled, and drained into the DB once it is writable again
+    spool = Spool(path=Path(config_dict.get('spool_file', f'{db_router.db_path}.spool')), logger=logger,
+                  fsync_batch=config_dict.get('spool_fsync_batch', 0), duplicates=duplicates, codec=codec)
+    spool_drainer = SpoolDrainer(spool=spool, db_path=db_router, logger=logger)
+    spool_drainer.start()
+
+    # the telegrams as received, to parse them again when the parsing logic changes
+    raw_log = None
+    if config_dict.get('raw_log_dir') is not None:
+        raw_log = RawLog(log_dir=Path(config_dict['raw_log_dir']),
+                         sensor_name=config_dict['global_attrs']['sensor_name'], logger=logger)
+
+    ### Metrics ###
+    metrics = CycleMetrics(sensor_name=config_dict['global_attrs']['sensor_name'])
+    metrics_file = config_dict.get('metrics_file')
 
     #########################################################
 
     while True:
         now_utc = NowTime()
 
-        # if the seconds are not 0, sleep for 1 second and then continue
-        if int(now_utc.time_list[2]) != 0:
+        # if the seconds are not a multiple of the interval, sleep for 1 second and then continue
+        if int(now_utc.time_list[2]) % interval != 0:
             sleep(1)
             continue
 
-        # only log data if the seconds are 0, resulting in data getting logged once a minute
-        con, cur = connect_db(dbpath=str(db_path))
+        # only log data if the seconds are a multiple of the interval, logging data once every interval
+        # wake-up lateness: how long after the interval boundary the cycle started
+        metrics.observe('wakeup_lateness', time() % interval)
+
+        # the first telegram of a month creates its partition, the old db_path is kept until that succeeds
+        if not db_ready or (db_router.partitioned and db_router.path_for(now_utc.utc.timestamp()) != db_path):
+            path_now = db_router.path_for(now_utc.utc.timestamp())
+            db_ready = prepare_db(db_path=path_now, interval=interval, logger=logger)
+            if db_ready:
+                db_path = path_now
+
+        con, cur = None, None
+        if db_ready:
+            with metrics.stage('db_connect'):
+                try:
+                    con, cur = connect_db(dbpath=str(db_path))
+                except sqlite3.Error as e:
+                    logger.error(msg=f'Failed to connect to {db_path}: {e}')
         logger.debug(msg=f'writing Telegram to DB on: {now_utc.time_list}, {now_utc.utc}')
 
         # Read telegram from the sensor
-        telegram_lines = sensor.read(logger=logger)
+        with metrics.stage('read'):
+            telegram_lines = sensor.read(logger=logger)
+
+        if raw_log is not None:
+            raw_log.append(now_utc.utc, telegram_lines)
 
         # throw error if telegram_lines is empty
         try:
@@ -81,32 +141,84 @@ def main(config_site):
         except IndexError:
             logger.error(msg="sensor_lines is EMPTY")
 
-        telegram = create_telegram(config_dict=config_dict,
-                                   telegram_lines=telegram_lines,
-                                   db_row_id=None,
-                                   timestamp=now_utc.utc,
-                                   db_cursor=cur,
-                                   telegram_data={},
-                                   logger=logger)
+        with metrics.stage('parse'):
+            telegram = create_telegram(config_dict=config_dict,
+                                       telegram_lines=telegram_lines,
+                                       db_row_id=None,
+                                       timestamp=now_utc.utc,
+                                       db_cursor=cur,
+                                       telegram_data={},
+                                       logger=logger)
+            if telegram is not None:
+                telegram.capture_prefixes_and_data()
+                telegram.prep_telegram_data4db()
 
         if telegram is None:
             logger.error(msg=f"telegram is None on: {now_utc.time_list}, {now_utc.utc}")
         else:
-            telegram.capture_prefixes_and_data()
-            telegram.prep_telegram_data4db()
-            telegram.insert2db()
-            con.commit()
-
-        cur.close()
-        con.close()
-
-        sensor.sensor_start_sequence(config_dict=config_dict, logger=logger, include_in_log=False)
+            stored = False
+            if cur is not None:
+                try:
+                    with metrics.stage('insert'):
+                        telegram.insert2db()
+                    with metrics.stage('commit'):
+                        con.commit()
+                    stored = True
+                except (sqlite3.Error, OSError) as e:
+                    logger.error(msg=f'Failed to write to {db_path}, spooling the telegram: {e}')
+            if not stored:
+                with metrics.stage('spool'):
+                    try:
+                        spool.append(telegram.db_row(), telegram.particles_row())
+                    except OSError as e:
+                        # a full disk or read-only volume loses this telegram, but must not end the loop
+                        logger.error(msg=f'Failed to spool the telegram of {now_utc.utc} to {spool.path}: {e}')
+
+        if cur is not None:
+            cur.close()
+            con.close()
+
+        # the start sequence commands and their sleeps
+        if interval == 60:
+            with metrics.stage('write'):
+                sensor.sensor_start_sequence(config_dict=config_dict, logger=logger, include_in_log=False)
+        elif now_utc.utc.second == 0:
+            # only the rain amount reset of the start sequence, so the rain amount is accumulated over a minute
+            with metrics.stage('write'):
+                sensor.reset_rain_amount(logger=logger)
+
+        cycle_timings = metrics.end_cycle()
+        logger.debug(msg=f'cycle stage timings [s]: {cycle_timings}')
+        if metrics_file is not None:
+            metrics.write(metrics_file)
 
         # sleep for 2 seconds to guarantee you don't log the same data twice
-        # this causes issues with a computation time of 58 seconds
+        # this causes issues with a computation time of interval - 2 seconds
         sleep(2)
 
 
+def prepare_db(db_path: Path, interval: int, logger) -> bool:
+    """
+    Creates the database (partition) with its tables and unique index, logging a failure instead of raising it.
+    A database without the unique index, ie. as it contains duplicates, can be written, but the duplicates policy
+    does not apply to it, which is logged as an error.
+    :param db_path: the path of the database
+    :param interval: the interval of the sensor in seconds
+    :param logger: logger for errors
+    :return: True if the database is ready to be written, False if the telegrams must be spooled
+    """
+    try:
+        create_db(dbpath=str(db_path))
+        # at most one telegram per sensor and interval, a second one is handled by the duplicates policy
+        if not create_unique_index(dbpath=str(db_path), interval=interval, logger=logger):
+            logger.error(msg=f'{db_path} has no unique index, so the duplicates policy does not apply to it.'
+                             f' Remove the duplicates with dedup_db.py to create it')
+    except (sqlite3.Error, OSError) as e:
+        logger.error(msg=f'Failed to create {db_path}, spooling the telegrams until it succeeds: {e}')
+        return False
+    return True
+
+
 def get_config_file():
     """
     Function that gets th config file from the command line
@@ -0,0 +1,341 @@
+"""
+This module contains a daemon that logs data of several sensors in one process.
+
+Every sensor is polled once every interval by its own thread, so a slow or failing sensor
+does not delay the others. A sensor thread that fails logs the error, closes its serial
+connection and reconnects after a delay, without affecting the other sensors.
+The telegrams of all sensors are written in batches by one shared DBWriter thread. Telegrams that can
+not be written are spooled per sensor, and drained into the database once it is writable again.
+
+Classes:
+- SensorWorker: thread that polls one sensor once every interval
+
+Functions:
+- load_config: Loads and combines the site specific and general config files of a sensor.
+- main: Starts one SensorWorker per site config file and the shared DBWriter.
+- get_config_files: Gets the config files from the command line.
+"""
+import signal
+import sqlite3
+import threading
+from argparse import ArgumentParser
+from logging import Logger
+from pathlib import Path
+from time import time
+from typing import Dict, List, Tuple, Union
+from pydantic.v1.utils import deep_update
+
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger, create_sensor, set_interval, \
+    get_duplicates_policy, get_telegram_codec
+from modules.telegram import create_telegram
+from modules.now_time import NowTime
+from modules.sqldb import DBRouter
+from modules.metrics import CycleMetrics
+from modules.db_writer import DBWriter
+from modules.raw_log import RawLog
+from modules.spool import Spool, SpoolDrainer
+
+
+class SensorWorker(threading.Thread):  # pylint: disable=too-many-instance-attributes
+    """
+    Thread that polls one sensor once every interval and passes the telegrams to the DBWriter.
+
+    Attributes:
+    - config_dict: the combined site specific and general config of the sensor
+    - logger: logger of the sensor
+    - db_writer: the shared DBWriter
+    - db_router: the DBRouter of the database partitions of the sensor
+    - db_path: path of the database (partition) the telegrams are written to
+    - db_ready: whether the database (partition) could be created, the telegrams are spooled while it is not
+    - stop_event: event that stops the thread when set
+    - retry_delay: seconds to wait before reconnecting after a failure
+    - interval: seconds between cycles, a divisor of 60
+    - sensor: the Sensor object, None while not connected
+    - metrics: the CycleMetrics of the sensor
+    - failures: number of failures so far
+    - raw_log: the RawLog of the sensor, None if raw_log_dir is not set in the config
+    - spool: the Spool of the telegrams the DBWriter could not write
+
+    Functions:
+    - connect: sets up the serial connection and runs the start sequence
+    - prepare_db: creates the database (partition) of a timestamp, logging a failure instead of raising it
+    - disconnect: closes the serial connection
+    - wait_for_interval: waits until the start of the next interval
+    - run: the thread loop
+    - cycle: requests, parses and queues one telegram
+    """
+
+    def __init__(self, config_dict: Dict, logger: Logger, db_writer: DBWriter,  # pylint: disable=too-many-positional-arguments
+                 stop_event: threading.Event, retry_delay: float = 30, interval: int = 60):
+        """
+        Constructor for SensorWorker.
+        :param config_dict: the combined site specific and general config of the sensor
+        :param logger: logger of the sensor
+        :param db_writer: the shared DBWriter
+        :param stop_event: event that stops the thread when set
+        :param retry_delay: seconds to wait before reconnecting after a failure
+        :param interval: seconds between cycles, a divisor of 60
+        """
+        super().__init__(name=config_dict['global_attrs']['sensor_name'], daemon=True)
+        self.config_dict = config_dict
+        self.logger = logger
+        self.db_writer = db_writer
+        self.db_router = DBRouter(db_path=Path(config_dict['data_dir']) / config_dict['db_filename'],
+                                  partitioned=config_dict.get('partition_db', False), interval=interval,
+                                  logger=logger)
+        self.db_path = self.db_router.path_for(time())
+        self.db_ready = False
+        self.stop_event = stop_event
+        self.retry_delay = retry_delay
+        self.interval = interval
+        self.sensor = None
+        self.metrics = CycleMetrics(sensor_name=config_dict['global_attrs']['sensor_name'])
+        self.failures = 0
+        self.raw_log = None
+        if config_dict.get('raw_log_dir') is not None:
+            self.raw_log = RawLog(log_dir=Path(config_dict['raw_log_dir']),
+                                  sensor_name=config_dict['global_attrs']['sensor_name'], logger=logger)
+        self.spool = Spool(path=Path(config_dict.get('spool_file', f'{self.db_router.db_path}.spool')),
+                           logger=logger, fsync_batch=config_dict.get('spool_fsync_batch', 0),
+                           duplicates=config_dict.get('duplicates', 'keep_first'),
+                           codec=config_dict.get('telegram_codec', 'plain'))
+
+    def connect(self):
+        """
+        Sets up the serial connection with the sensor and runs the start sequence.
+        """
+        sensor_type = self.config_dict['global_attrs']['sensor_type']
+        sensor_id = self.config_dict['global_attrs']['sensor_name'][-2:]
+        sensor = create_sensor(sensor_type=sensor_type, logger=self.logger, sensor_id=sensor_id)
+        sensor.init_serial_connection(port=self.config_dict['port'], baud=self.config_dict['baud'],
+                                      logger=self.logger)
+        self.sensor = sensor
+        self.sensor.sensor_start_sequence(config_dict=self.config_dict, logger=self.logger, include_in_log=True)
+
+    def prepare_db(self, timestamp: float) -> bool:
+        """
+        Creates the database (partition) of a timestamp and routes the telegrams to it. A failure is logged instead
+        of raised, so it does not count as a failure of the sensor, and the old db_path is kept.
+        :param timestamp: the timestamp in seconds since the epoch
+        :return: True if the database is ready to be written, False if the telegrams must be spooled
+        """
+        try:
+            self.db_path = self.db_router.prepare(timestamp)
+        except (sqlite3.Error, OSError) as e:
+            self.logger.error(msg=f'Failed to create {self.db_router.path_for(timestamp)},'
+                                  f' spooling the telegrams until it succeeds: {e}')
+            return False
+        return True
+
+    def disconnect(self):
+        """
+        Closes the serial connection with the sensor, if any.
+        """
+        if self.sensor is not None:
+            try:
+                self.sensor.close_serial_connection()
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error(msg=f'Failed to close serial connection: {e}')
+            self.sensor = None
+
+    def wait_for_interval(self) -> bool:
+        """
+        Waits until the start of the next interval. A wait that ends early, ie. on a clock adjustment,
+        is repeated, so the telegram is never stamped in the previous interval.
+        :return: True at the start of the interval, False if the thread is stopped
+        """
+        boundary = (time() // self.interval + 1) * self.interval
+        while time() < boundary:
+            if self.stop_event.wait(boundary - time()):
+                return False
+        return True
+
+    def run(self):
+        """
+        The thread loop: waits for the start of every interval and runs a cycle,
+        reconnecting after a delay when anything fails.
+        """
+        while not self.stop_event.is_set():
+            try:
+                if self.sensor is None:
+                    self.connect()
+                if not self.wait_for_interval():
+                    break
+                self.cycle(NowTime())
+            except (Exception, SystemExit) as e:  # pylint: disable=broad-except
+                # init_serial_connection exits on failure, which must only stop this sensor
+                self.failures += 1
+                self.logger.error(msg=f'Sensor cycle failed ({self.failures} failures so far),'
+                                      f' reconnecting in {self.retry_delay} s: {e!r}')
+                self.disconnect()
+                self.stop_event.wait(self.retry_delay)
+        self.disconnect()
+
+    def cycle(self, now_utc: NowTime):
+        """
+        Requests, parses and queues one telegram, then runs the start sequence for the next one.
+        The start sequence takes longer than a sub-minute interval, so it only runs at startup for those,
+        and only the rain amount is reset after the telegram of each minute.
+        :param now_utc: the time of the cycle
+        """
+        self.metrics.observe('wakeup_lateness', time() % self.interval)
+
+        with self.metrics.stage('read'):
+            telegram_lines = self.sensor.read(logger=self.logger)
+
+        if self.raw_log is not None:
+            self.raw_log.append(now_utc.utc, telegram_lines)
+
+        if not telegram_lines:
+            self.logger.error(msg="sensor_lines is EMPTY")
+
+        with self.metrics.stage('parse'):
+            telegram = create_telegram(config_dict=self.config_dict,
+                                       telegram_lines=telegram_lines,
+                                       db_row_id=None,
+                                       timestamp=now_utc.utc,
+                                       db_cursor=None,
+                                       telegram_data={},
+                                       logger=self.logger)
+            if telegram is not None:
+                telegram.capture_prefixes_and_data()
+                telegram.prep_telegram_data4db()
+
+        if telegram is None:
+            self.logger.error(msg=f"telegram is None on: {now_utc.time_list}, {now_utc.utc}")
+        else:
+            # the first telegram of a month creates its partition, the creation is retried every cycle until then
+            timestamp = now_utc.utc.timestamp()
+            if not self.db_ready or (self.db_router.partitioned and self.db_router.path_for(timestamp) != self.db_path):
+                self.db_ready = self.prepare_db(timestamp)
+            if self.db_ready:
+                with self.metrics.stage('insert'):
+                    self.db_writer.put(self.db_path, telegram.db_row(),
+                                       particles_row=telegram.particles_row(),
+                                       duplicates=self.config_dict.get('duplicates', 'keep_first'),
+                                       codec=self.config_dict.get('telegram_codec', 'plain'),
+                                       spool=self.spool)
+            else:
+                with self.metrics.stage('spool'):
+                    try:
+                        self.spool.append(telegram.db_row(), telegram.particles_row())
+                    except OSError as e:
+                        # the telegram is lost, but the sensor itself did not fail
+                        self.logger.error(msg=f'Failed to spool the telegram of {now_utc.utc} to'
+                                              f' {self.spool.path}: {e}')
+
+        if self.interval == 60:
+            with self.metrics.stage('write'):
+                self.sensor.sensor_start_sequence(config_dict=self.config_dict, logger=self.logger,
+                                                  include_in_log=False)
+        elif now_utc.utc.second == 0:
+            with self.metrics.stage('write'):
+                self.sensor.reset_rain_amount(logger=self.logger)
+
+        cycle_timings = self.metrics.end_cycle()
+        self.logger.debug(msg=f'cycle stage timings [s]: {cycle_timings}')
+        if self.config_dict.get('metrics_file') is not None:
+            self.metrics.write(self.config_dict['metrics_file'])
+
+
+def load_config(wd: Path, config_site: str) -> Tuple[Union[Dict, None], Logger]:
+    """
+    Loads and combines the site specific and general config files of a sensor.
+    :param wd: the directory containing configs_netcdf
+    :param config_site: path to the site specific config file
+    :return: the combined config (None if the sensor type is not recognized) and the logger of the sensor
+    """
+    config_dict_site = yaml2dict(path=wd / config_site)
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name=config_dict_site['script_name'],
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'],
+                           queued=True,
+                           sample_rates=config_dict_site.get('log_sampling'))
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        return None, logger
+    return deep_update(config_dict_general, config_dict_site), logger
+
+
+def main(config_sites: List[str]):
+    """
+    Starts one SensorWorker per site config file and the shared DBWriter,
+    and runs until SIGTERM or SIGINT is received.
+    :param config_sites: the site config files
+    """
+    wd = Path(__file__).parent
+    stop_event = threading.Event()
+
+    workers_config = []
+    for config_site in config_sites:
+        config_dict, logger = load_config(wd, config_site)
+        interval = set_interval(config_dict, logger) if config_dict is not None else None
+        if (interval is None or get_duplicates_policy(config_dict, logger) is None
+                or get_telegram_codec(config_dict, logger) is None):
+            # the other sensors are still started
+            continue
+        workers_config.append((config_dict, logger, interval))
+
+    if len(workers_config) == 0:
+        raise SystemExit(1)
+
+    writer_logger = create_logger(log_dir=Path(workers_config[0][0]['log_dir']),
+                                  script_name='main_multi',
+                                  sensor_name='db_writer',
+                                  queued=True)
+    db_writer = DBWriter(logger=writer_logger)
+
+    workers = []
+    spool_drainers = []
+    for config_dict, logger, interval in workers_config:
+        worker = SensorWorker(config_dict=config_dict, logger=logger,
+                              db_writer=db_writer, stop_event=stop_event, interval=interval)
+        # a sensor whose database can not be created spools its telegrams, the other sensors are not affected
+        worker.db_ready = worker.prepare_db(time())
+        workers.append(worker)
+        spool_drainers.append(SpoolDrainer(spool=worker.spool, db_path=worker.db_router, logger=logger))
+
+    def handle_signal(signum, frame):  # pylint: disable=unused-argument
+        writer_logger.info(msg=f'Received signal {signum}, stopping')
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    db_writer.start()
+    for spool_drainer in spool_drainers:
+        spool_drainer.start()
+    for worker in workers:
+        worker.start()
+    writer_logger.info(msg=f'Started {len(workers)} sensors: {[worker.name for worker in workers]}')
+    print(f"{__file__} running {len(workers)} sensors")
+
+    stop_event.wait()
+    for worker in workers:
+        worker.join(timeout=60)
+    db_writer.stop(timeout=60)
+    for spool_drainer in spool_drainers:
+        spool_drainer.stop(timeout=60)
+
+
+def get_config_files():
+    """
+    Function that gets the config files from the command line
+    :return: list of config file names
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: disdrometer data logger for several sensors in one process."
+                    " Run: python main_multi.py -c config_1.yml config_2.yml")
+    parser.add_argument(
+        '-c',
+        '--config',
+        required=True,
+        nargs='+',
+        help='Paths to site config files. ie. -c configs_netcdf/config_PAR_007_CABAUW.yml'
+             ' configs_netcdf/config_THIES_005_CABAUW.yml')
+    args = parser.parse_args()
+    return args.config
+
+
+if __name__ == '__main__':
+    main(get_config_files())
@@ -0,0 +1,105 @@
+"""
+Script that merges the daily netCDFs of a month or a year into one netCDF (see modules/merge.py), ie. for
+long-term analysis and data publication, with the memory of one day.
+
+Run: python merge_nc.py -c configs_netcdf/config_PAR_008_GV.yml --period 2024-01
+     python merge_nc.py -c configs_netcdf/config_PAR_008_GV.yml --period 2024 --version light
+     python merge_nc.py -c configs_netcdf/config_PAR_008_GV.yml -i /data/disdroDL/202401/*_PAR008.nc -o jan.nc
+
+Functions:
+- period_range: Returns the time range of a month or a year.
+- main: Merges the netCDFs to one netCDF.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Tuple
+
+from pydantic.v1.utils import deep_update
+
+from modules.merge import merge_netCDF
+from modules.reader import locate_files, netCDF_name
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger
+
+
+def period_range(period: str) -> Tuple[datetime, datetime, str]:
+    """
+    Returns the time range of a month or a year.
+    :param period: the month (YYYY-MM) or the year (YYYY)
+    :return: the start and end (exclusive) of the range, and the date format of the merged file name
+    """
+    if len(period) == 4:
+        start = datetime(int(period), 1, 1, tzinfo=timezone.utc)
+        return start, start.replace(year=start.year + 1), '%Y'
+    start = datetime.strptime(period, '%Y-%m').replace(tzinfo=timezone.utc)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1), '%Y%m'
+    return start, start.replace(month=start.month + 1), '%Y%m'
+
+
+def main(args):
+    """
+    Merges the netCDFs of a sensor, in time order, to one netCDF.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name='merge_nc',
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        sys.exit(1)
+    config_dict = deep_update(config_dict_general, config_dict_site)
+
+    if args.input:
+        if not args.output:
+            logger.error(msg='An output path (-o) is needed to merge input netCDFs')
+            sys.exit(1)
+        # the file names start with the date, so sorting them puts them in time order
+        paths = sorted(Path(path) for path in args.input)
+        path_out = Path(args.output)
+    elif args.period:
+        start, end, date_format = period_range(args.period)
+        paths = locate_files(config_dict, start, end, version=args.version, interval=args.interval)
+        path_out = Path(args.output) if args.output else Path(config_dict['data_dir']) / netCDF_name(
+            config_dict, start.date(), version=args.version, interval=args.interval, date_format=date_format)
+    else:
+        logger.error(msg='Either input netCDFs (-i) or a period (--period) is needed')
+        sys.exit(1)
+    if not paths:
+        logger.error(msg='No netCDFs to merge')
+        sys.exit(1)
+
+    n_steps = merge_netCDF(paths=paths, path_out=path_out, config_dict=config_dict, logger=logger)
+    print(f'Merged {len(paths)} netCDF to {n_steps} time steps: {path_out}')
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: merge the daily netCDFs of a month or a year into one netCDF."
+                    " Run: python merge_nc.py -c configs_netcdf/config_PAR_008_GV.yml --period 2024-01")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('-i', '--input', nargs='+', default=None,
+                        help='The netCDFs to merge, of the same sensor, version and interval, instead of a period')
+    parser.add_argument('--period', default=None,
+                        help='The month (YYYY-MM) or year (YYYY) of the daily netCDFs in data_dir to merge')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Path of the merged netCDF, by default <YYYYMM or YYYY>_<site>-<station>_<sensor>.nc'
+                             ' in data_dir for a period')
+    parser.add_argument('--version', default='full', choices=['full', 'light'],
+                        help='Merge the full or light netCDFs of the period, default full')
+    parser.add_argument('--interval', type=int, default=None,
+                        help='Merge the resampled netCDFs of this interval in seconds of the period, ie. 3600')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
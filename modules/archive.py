@@ -0,0 +1,202 @@
+"""
+This module contains the archive catalog: a small SQLite index of the exported netCDFs of all sensors, so tooling
+can find the files of a time range, version and interval, with their row counts, checksums and QC state, without
+listing the data directories and opening the files.
+
+Every netCDF written by the export (and the resampled products) is added to the catalog with its path, sensor,
+time range (the first and last time step), version (full or light), time interval, number of time steps, size,
+sha256 checksum and a summary: the rain amount and peak intensity, and the number of time steps flagged by the QC
+(see modules/qc.py). Indexing a file again replaces its record.
+
+Functions:
+- archive_db_path: Returns the path of the archive catalog of a sensor.
+- create_archive_db: Creates the archive catalog if it does not exist yet.
+- file_checksum: Returns the sha256 checksum of a file.
+- file_record: Returns the catalog record of a netCDF.
+- index_files: Adds netCDFs to the catalog, or replaces their records.
+- query_archive: Queries the records of the netCDFs that overlap a time range.
+- prune_archive: Removes the records of the netCDFs that no longer exist.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Union
+import numpy
+from cftime import num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+from modules.sqldb import connect_db
+
+ARCHIVE_KEYS = ('path', 'station', 'sensor_name', 'site_name', 'version', 'interval', 'start_time', 'end_time',
+                'n_rows', 'size', 'checksum', 'rain_amount', 'peak_intensity', 'qc_flagged', 'qc_summary',
+                'indexed_at')
+UPSERT_FILE_QUERY = (f"INSERT OR REPLACE INTO files({', '.join(ARCHIVE_KEYS)})"
+                     f" VALUES ({', '.join('?' * len(ARCHIVE_KEYS))})")
+# files are read in blocks of this size for the checksum
+CHECKSUM_BLOCK_SIZE = 1 << 20
+
+
+def archive_db_path(config_dict: Dict) -> Path:
+    """
+    This function returns the path of the archive catalog of a sensor, archive_db in the site config, by default
+    archive.db in the data directory. Several sensors can share a catalog.
+    :param config_dict: the (combined) site specific config
+    :return: the path of the archive catalog
+    """
+    return Path(config_dict.get('archive_db', Path(config_dict['data_dir']) / 'archive.db'))
+
+
+def create_archive_db(dbpath: Union[str, Path]):
+    """
+    This function creates the archive catalog at the specified path.
+    with Table: files, one record per netCDF
+    with the columns of ARCHIVE_KEYS
+    :param dbpath: the path of the archive catalog
+    """
+    con, cur = connect_db(dbpath=str(dbpath))
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS files
+                (
+                    path TEXT PRIMARY KEY,
+                    station TEXT,
+                    sensor_name TEXT,
+                    site_name TEXT,
+                    version TEXT,
+                    interval INTEGER,
+                    start_time REAL,
+                    end_time REAL,
+                    n_rows INTEGER,
+                    size INTEGER,
+                    checksum TEXT,
+                    rain_amount REAL,
+                    peak_intensity REAL,
+                    qc_flagged INTEGER,
+                    qc_summary TEXT,
+                    indexed_at REAL
+                )
+                """)
+    cur.execute('CREATE INDEX IF NOT EXISTS files_sensor_time ON files(sensor_name, start_time)')
+    con.commit()
+    cur.close()
+    con.close()
+
+
+def file_checksum(path: Path) -> str:
+    """
+    This function returns the sha256 checksum of a file, read in blocks.
+    :param path: the path of the file
+    :return: the hexadecimal checksum
+    """
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(CHECKSUM_BLOCK_SIZE), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def file_record(path: Path, station: str, config_dict: Dict) -> Dict:
+    """
+    This function returns the catalog record of a netCDF. The rain intensity is the intensity field of the events
+    section of the config, and the QC flags are the flags variable of its qc_variables section.
+    :param path: the path of the netCDF
+    :param station: the station code of the sensor
+    :param config_dict: the combined site specific and general config
+    :return: dictionary with the keys of ARCHIVE_KEYS
+    """
+    path = Path(path).resolve()
+    intensity_name = config_dict['telegram_fields'][config_dict['events']['intensity_field']]['var_attrs'][
+        'standard_name']
+    flags_name = config_dict['qc_variables']['flags']['var_attrs']['standard_name']
+    with Dataset(path, 'r') as nc_file:
+        time_var = nc_file.variables['time']
+        n_rows = len(time_var)
+        start_time, end_time = None, None
+        if n_rows > 0:
+            start_time, end_time = [
+                time.replace(tzinfo=timezone.utc).timestamp()
+                for time in num2date([time_var[0], time_var[n_rows - 1]], units=time_var.units,
+                                     calendar=time_var.calendar, only_use_cftime_datetimes=False,
+                                     only_use_python_datetimes=True)]
+        interval = int(nc_file.variables['time_interval'][:])
+        attrs = {key: nc_file.getncattr(key) for key in nc_file.ncattrs()}
+        rain_amount, peak_intensity = None, None
+        if intensity_name in nc_file.variables and n_rows > 0:
+            intensity = numpy.ma.filled(nc_file.variables[intensity_name][:].astype(float), numpy.nan)
+            if not numpy.isnan(intensity).all():
+                rain_amount = float(numpy.nansum(intensity) * interval / 3600)
+                peak_intensity = float(numpy.nanmax(intensity))
+        qc_flagged = None
+        if flags_name in nc_file.variables:
+            qc_flagged = int(numpy.count_nonzero(numpy.ma.filled(nc_file.variables[flags_name][:], 0)))
+    return {'path': str(path), 'station': station, 'sensor_name': attrs.get('sensor_name'),
+            'site_name': attrs.get('site_name'), 'version': 'light' if '_light' in path.stem else 'full',
+            'interval': interval, 'start_time': start_time, 'end_time': end_time, 'n_rows': n_rows,
+            'size': path.stat().st_size, 'checksum': file_checksum(path), 'rain_amount': rain_amount,
+            'peak_intensity': peak_intensity, 'qc_flagged': qc_flagged, 'qc_summary': attrs.get('qc_summary'),
+            'indexed_at': datetime.now(timezone.utc).timestamp()}
+
+
+def index_files(con, paths: List[Path], station: str, config_dict: Dict) -> List[Dict]:
+    """
+    This function adds netCDFs to the catalog, or replaces their records, in one transaction.
+    :param con: the connection to the archive catalog
+    :param paths: the paths of the netCDFs
+    :param station: the station code of the sensor
+    :param config_dict: the combined site specific and general config
+    :return: the records of the netCDFs
+    """
+    records = [file_record(path, station, config_dict) for path in paths]
+    cur = con.cursor()
+    try:
+        cur.executemany(UPSERT_FILE_QUERY, [tuple(record[key] for key in ARCHIVE_KEYS) for record in records])
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        cur.close()
+    return records
+
+
+def query_archive(con, start: Union[datetime, None] = None, end: Union[datetime, None] = None,  # pylint: disable=too-many-positional-arguments
+                  station: Union[str, None] = None, sensor_name: Union[str, None] = None,
+                  version: Union[str, None] = None, interval: Union[int, None] = None) -> List[Dict]:
+    """
+    This function queries the records of the netCDFs that overlap a time range.
+    :param con: the connection to the archive catalog
+    :param start: the start of the time range, None for no start
+    :param end: the end of the time range (exclusive), None for no end
+    :param station: only the netCDFs of this station, None for all stations
+    :param sensor_name: only the netCDFs of this sensor, None for all sensors
+    :param version: only the 'full' or 'light' netCDFs, None for both
+    :param interval: only the netCDFs of this time interval in seconds, ie. 60 or 3600, None for all intervals
+    :return: a dictionary per netCDF with the keys of ARCHIVE_KEYS, ordered by sensor and start time
+    """
+    conditions, params = [], []
+    for condition, value in (('end_time >= ?', None if start is None else start.timestamp()),
+                             ('start_time < ?', None if end is None else end.timestamp()),
+                             ('station = ?', station), ('sensor_name = ?', sensor_name),
+                             ('version = ?', version), ('interval = ?', interval)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    cur = con.cursor()
+    cur.row_factory = None
+    rows = cur.execute(f"SELECT {', '.join(ARCHIVE_KEYS)} FROM files{where} ORDER BY sensor_name, start_time",
+                       params).fetchall()
+    cur.close()
+    return [dict(zip(ARCHIVE_KEYS, row)) for row in rows]
+
+
+def prune_archive(con) -> List[str]:
+    """
+    This function removes the records of the netCDFs that no longer exist, ie. after files were moved or deleted.
+    :param con: the connection to the archive catalog
+    :return: the paths of the removed records
+    """
+    paths = [row[0] for row in con.execute('SELECT path FROM files') if not Path(row[0]).exists()]
+    con.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in paths])
+    con.commit()
+    return paths
@@ -0,0 +1,459 @@
+"""
+This module contains the asyncio variant of the sensor classes in modules/sensors.py.
+
+The serial port is opened as a non-blocking file descriptor and read through the event loop,
+so many sensors (and other tasks) can share one event loop, without the timeouts and sleeps
+of one sensor delaying another sensor's telegram.
+
+Classes:
+- AsyncSerialPort: non-blocking serial port driven by the asyncio event loop
+- AsyncSensor: abstract class for the asyncio sensors
+- AsyncParsivel: asyncio implementation of the Parsivel sensor
+- AsyncThies: asyncio implementation of the Thies sensor
+"""
+
+import asyncio
+import os
+import termios
+import tty
+from abc import abstractmethod, ABC
+from asyncio import sleep
+from typing import List, Union
+
+from modules.now_time import NowTime
+from modules.sensors import SensorType
+
+
+class AsyncSerialPort:
+    """
+    Serial port opened as a non-blocking file descriptor and driven by the asyncio event loop.
+
+    Attributes:
+    - port: path of the serial device, ie. /dev/ttyUSB0 or a pty
+    - baud: the baudrate
+    - fd: the file descriptor, None when closed
+
+    Functions:
+    - open: opens the port in raw mode with the baudrate
+    - close: closes the port
+    - write: writes all bytes, waiting for the port to become writable when necessary
+    - readlines: reads lines until no data arrived for a timeout
+    - readline: reads one line or until a timeout
+    - drain: waits until the written bytes are transmitted
+    - reset_input_buffer: discards received bytes that were not read yet
+    - reset_output_buffer: discards bytes that were not transmitted yet
+    """
+
+    def __init__(self, port: str, baud: int):
+        """
+        Constructor for AsyncSerialPort.
+        :param port: path of the serial device
+        :param baud: the baudrate
+        """
+        self.port = port
+        self.baud = baud
+        self.fd = None
+        self._buffer = b''
+
+    def open(self):
+        """
+        Opens the port as a non-blocking file descriptor in raw mode with the baudrate.
+        """
+        self.fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self.fd)
+        attrs = termios.tcgetattr(self.fd)
+        speed = getattr(termios, f'B{self.baud}')
+        attrs[4] = speed  # ispeed
+        attrs[5] = speed  # ospeed
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+
+    def close(self):
+        """
+        Closes the port.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    async def write(self, data: bytes):
+        """
+        Writes all bytes, waiting for the port to become writable when its buffer is full.
+        :param data: the bytes to write
+        """
+        view = memoryview(data)
+        while len(view) > 0:
+            try:
+                written = os.write(self.fd, view)
+                view = view[written:]
+            except BlockingIOError:
+                await self.__wait(writable=True, timeout=None)
+
+    async def readlines(self, timeout: float) -> List[bytes]:
+        """
+        Reads lines until no data arrived for timeout seconds,
+        like pyserial readlines() on a port with a timeout.
+        :param timeout: seconds without data after which reading stops
+        :return: list of lines, including their line endings
+        """
+        while await self.__wait(writable=False, timeout=timeout):
+            if not self.__read_available():
+                break
+        data, self._buffer = self._buffer, b''
+        return data.splitlines(keepends=True)
+
+    async def readline(self, timeout: float) -> bytes:
+        """
+        Reads one line, or what was received until the timeout, like pyserial readline().
+        :param timeout: seconds after which reading stops
+        :return: the line, including its line ending
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while b'\n' not in self._buffer:
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await self.__wait(writable=False, timeout=remaining):
+                break
+            if not self.__read_available():
+                break
+        if b'\n' in self._buffer:
+            line, self._buffer = self._buffer.split(b'\n', 1)
+            return line + b'\n'
+        line, self._buffer = self._buffer, b''
+        return line
+
+    async def drain(self):
+        """
+        Waits until the written bytes are transmitted. tcdrain blocks, so it runs in the default executor.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, termios.tcdrain, self.fd)
+
+    def reset_input_buffer(self):
+        """
+        Discards received bytes that were not read yet.
+        """
+        self._buffer = b''
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+
+    def reset_output_buffer(self):
+        """
+        Discards bytes that were not transmitted yet.
+        """
+        termios.tcflush(self.fd, termios.TCOFLUSH)
+
+    def __read_available(self) -> bool:
+        """
+        Appends all bytes that can be read without blocking to the buffer.
+        :return: False if the other side closed the port
+        """
+        while True:
+            try:
+                chunk = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return True
+            except OSError:
+                # EIO: the other side of a pty was closed
+                return False
+            if len(chunk) == 0:
+                return False
+            self._buffer += chunk
+
+    async def __wait(self, writable: bool, timeout: Union[float, None]) -> bool:
+        """
+        Waits until the port is readable or writable.
+        :param writable: wait for writable instead of readable
+        :param timeout: seconds to wait at most, None to wait forever
+        :return: True if the port became ready, False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def on_ready():
+            if not ready.done():
+                ready.set_result(True)
+
+        add, remove = (loop.add_writer, loop.remove_writer) if writable else (loop.add_reader, loop.remove_reader)
+        add(self.fd, on_ready)
+        try:
+            await asyncio.wait_for(ready, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            remove(self.fd)
+
+
+class AsyncSensor(ABC):
+    """
+    Abstract class outlining the asyncio variant of the Sensor interface in modules/sensors.py.
+
+    Attributes:
+    - sensor_type: type of the sensor
+    - serial_connection: the AsyncSerialPort, None when not connected
+
+    Functions:
+    - init_serial_connection: initializes the serial connection with the sensor
+    - sensor_start_sequence: executes the startup sequence for a sensor
+    - reset_sensor: resets a sensor
+    - close_serial_connection: closes the serial connection
+    - write: sends a message to the sensor
+    - read: reads lines from the sensor
+    - get_type: returns the type of the sensor as a string
+    """
+
+    # pyserial timeout of the sensor's serial port, in seconds
+    timeout = 1
+
+    def __init__(self, sensor_type: SensorType):
+        """
+        Constructor for asyncio sensors.
+        :param sensor_type: type of the sensor (enum)
+        """
+        self.sensor_type = sensor_type
+        self.serial_connection: Union[AsyncSerialPort, None] = None
+
+    def init_serial_connection(self, port: str, baud: int, logger) -> bool:
+        """
+        Initializes the non-blocking serial connection with the sensor.
+        Unlike the synchronous sensors this does not exit on failure, so other sensors sharing the loop keep running.
+        :param port: the port where the sensor is connected to
+        :param baud: the baudrate of the sensor
+        :param logger: Logger for logging information and errors
+        :return: True if the connection was opened
+        """
+        serial_connection = AsyncSerialPort(port, baud)
+        try:
+            serial_connection.open()
+        except (OSError, AttributeError, termios.error) as e:
+            logger.error(msg=f'Failed to connect to {self.get_type()} via {port}: {e}')
+            return False
+        logger.info(msg=f'Connected to {self.get_type()}, via: {port}')
+        self.serial_connection = serial_connection
+        return True
+
+    def close_serial_connection(self):
+        """
+        Closes the serial connection.
+        """
+        if self.serial_connection is not None:
+            self.serial_connection.close()
+            self.serial_connection = None
+
+    async def write(self, msg: bytes, logger):
+        """
+        Sends a message to the sensor if the serial connection is initialized,
+        else sends an error through the logger.
+        :param msg: Message for the sensor
+        :param logger: Logger for errors
+        """
+        if self.serial_connection is None:
+            logger.error(msg="serial_connection not initialized")
+            return
+        await self.serial_connection.write(msg)
+
+    @abstractmethod
+    async def sensor_start_sequence(self, config_dict, logger, include_in_log: bool):
+        """
+        Abstract coroutine for executing the startup sequence for a sensor.
+        :param config_dict: Dictionary containing configuration parameters for the sensor
+        :param logger: Logger for logging information and errors
+        :param include_in_log: Whether the start sequence should be included in the log
+        """
+
+    @abstractmethod
+    async def reset_sensor(self, logger, factory_reset: bool):
+        """
+        Abstract coroutine for resetting a sensor.
+        :param logger: Logger for logging information
+        :param factory_reset: Whether the factory reset should be performed
+        """
+
+    @abstractmethod
+    async def read(self, logger):
+        """
+        Abstract coroutine for reading a telegram from the sensor.
+        :param logger: Logger for errors
+        """
+
+    def get_type(self) -> str:
+        """
+        Returns the type of the sensor as a string.
+        :return: Type of the sensor as a string
+        """
+        return self.sensor_type.value
+
+
+class AsyncParsivel(AsyncSensor):
+    """
+    Class inheriting AsyncSensor and representing the Parsivel type sensor.
+    The commands are the same as in modules.sensors.Parsivel.
+    """
+
+    timeout = 1
+
+    def __init__(self, sensor_type=SensorType.PARSIVEL):
+        """
+        Constructor for the asyncio parsivel type sensor
+        :param sensor_type: type of the sensor (enum)
+        """
+        super().__init__(sensor_type)
+
+    async def sensor_start_sequence(self, config_dict, logger, include_in_log: bool):
+        """
+        Executes the startup sequence for the Parsivel sensor.
+        :param config_dict: Dictionary containing configuration parameters for the sensor
+        :param logger: Logger for logging information and errors
+        :param include_in_log: Whether the start sequence should be included in the log
+        """
+        if include_in_log:
+            logger.info(msg="Starting parsivel start sequence commands")
+        self.serial_connection.reset_input_buffer()
+
+        # Sets the name of the Parsivel, maximum 10 characters
+        await self.write(('CS/K/' + config_dict['station_code'] + '\r').encode('utf-8'), logger)
+        await sleep(1)
+
+        # Sets the ID of the Parsivel, maximum 4 numerical characters
+        await self.write(('CS/J/' + config_dict['global_attrs']['sensor_name'] + '\r').encode('utf-8'), logger)
+        await sleep(2)
+
+        # Sets the measuring interval of the Parsivel in seconds, when configured
+        if 'interval' in config_dict:
+            await self.write(f"CS/I/{config_dict['interval']}\r".encode('utf-8'), logger)
+            await sleep(1)
+
+        await self.write('CS/Z/1\r'.encode('utf-8'), logger)  # resets rain amount
+        await sleep(10)
+
+        # The Parsivel broadcasts the user defined telegram.
+        await self.write('CS/M/M/1\r'.encode('utf-8'), logger)
+
+        # the last command must be transmitted before the output buffer is flushed
+        await self.serial_connection.drain()
+        self.serial_connection.reset_input_buffer()
+        self.serial_connection.reset_output_buffer()
+
+    async def reset_sensor(self, logger, factory_reset: bool):
+        """
+        Resets the Parsivel sensor.
+        :param logger: Logger for logging information
+        :param factory_reset: Whether the factory reset should be performed
+        """
+        logger.info(msg="Resetting Parsivel")
+        if factory_reset:
+            await self.write('CS/F/1\r'.encode('utf-8'), logger)
+        else:
+            await self.write('CS/Z/1\r'.encode('utf-8'), logger)  # restart
+        await sleep(5)
+
+    async def read(self, logger):
+        """
+        Requests a telegram and reads its lines until the sensor is silent for the timeout.
+        :param logger: logger for errors
+        :return: List of lines or None
+        """
+        if self.serial_connection is None:
+            logger.error(msg="serial_connection not initialized")
+            return None
+        await self.write('CS/PA\r\n'.encode('ascii'), logger)
+        return await self.serial_connection.readlines(timeout=self.timeout)
+
+
+class AsyncThies(AsyncSensor):
+    """
+    Class inheriting AsyncSensor and representing the Thies type sensor.
+    The commands are the same as in modules.sensors.Thies.
+
+    Attributes:
+    - thies_id : id for the specific Thies sensor
+    """
+
+    timeout = 5
+
+    def __init__(self, sensor_type=SensorType.THIES, thies_id='00'):
+        """
+        Constructor for the asyncio thies type sensor.
+        :param sensor_type: type of the sensor (enum)
+        :param thies_id: id for the specific Thies sensor
+        """
+        super().__init__(sensor_type)
+        self.thies_id = thies_id
+
+    async def sensor_start_sequence(self, config_dict, logger, include_in_log: bool):
+        """
+        Sends the serial commands to the thies that change the necessary parameters.
+        :param config_dict: the configuration dictionary
+        :param logger: the logger object
+        :param include_in_log: whether the start sequence should be included in the log
+        """
+        self.serial_connection.reset_input_buffer()
+        self.serial_connection.reset_output_buffer()
+
+        if include_in_log:
+            logger.info(msg="Starting thies start sequence commands")
+
+        commands = ['KY00001',  # place in config mode
+                    'TM00000',  # turn of automatic mode
+                    'ZH000' + NowTime().time_list[0],  # set hour
+                    'ZM000' + NowTime().time_list[1],  # set minutes
+                    'ZS000' + NowTime().time_list[2],  # set seconds
+                    'KY00000']  # place out of config mode
+        for command in commands:
+            await self.write(('\r' + self.thies_id + command + '\r').encode('utf-8'), logger)
+            await sleep(1)
+
+        await self.serial_connection.drain()
+        self.serial_connection.reset_input_buffer()
+        self.serial_connection.reset_output_buffer()
+
+    async def reset_sensor(self, logger, factory_reset: bool):
+        """
+        Resets the thies sensor.
+        :param logger: the logger object
+        :param factory_reset: whether the factory reset should be performed
+        """
+        logger.info(msg="Resetting Thies")
+        await self.write(f'\r{self.thies_id}KY00001\r'.encode('utf-8'), logger)  # place in config mode
+        await sleep(1)
+        await self.write(f'\r{self.thies_id}RS00001\r'.encode('utf-8'), logger)  # restart the sensor
+        await sleep(60)
+        await self.write(f'\r{self.thies_id}RF00001\r'.encode('utf-8'), logger)  # reset error counters
+        await sleep(1)
+        # reset precipitation quantity and duration of quantity measurement
+        await self.write(f'\r{self.thies_id}RA00001\r'.encode('utf-8'), logger)
+        await sleep(1)
+        await self.write(f'\r{self.thies_id}KY00000\r'.encode('utf-8'), logger)  # place out of config mode
+        await sleep(1)
+        logger.info(msg="Thies reset complete")
+
+    async def read(self, logger):
+        """
+        Requests telegram 5 and reads it.
+        :param logger: the logger object
+        :return: the telegram line, without line ending
+        """
+        if self.serial_connection is None:
+            logger.error(msg="serial_connection not initialized")
+            return None
+
+        await sleep(2)  # Give sensor some time to create the telegram
+        await self.write(f'\r{self.thies_id}TR00005\r'.encode('utf-8'), logger)
+        output = await self.serial_connection.readline(timeout=self.timeout)
+        return str(output[0:len(output) - 2].decode("utf-8"))
+
+
+def create_async_sensor(sensor_type: str, logger, sensor_id: str = '00') -> Union[AsyncSensor, None]:
+    """
+    This function creates an asyncio sensor object based on the provided sensor type.
+    :param sensor_type: a string indicating the sensor type
+    :param logger: logger for logging an unrecognized sensor type
+    :param sensor_id: a string indicating the sensor id
+    :return: asyncio sensor object, or None if the sensor type is not recognized
+    """
+    sensors = {
+        'OTT Hydromet Parsivel2': AsyncParsivel,
+        'Thies Clima': lambda: AsyncThies(thies_id=sensor_id)
+    }
+    if sensor_type not in sensors:
+        logger.error(msg=f"Sensor type {sensor_type} not recognized")
+        return None
+    return sensors[sensor_type]()
@@ -0,0 +1,266 @@
+"""
+This module contains the comparison of two co-located sensors, ie. the Parsivel and the Thies at Cabauw or the Green
+Village, from their exported netCDFs.
+
+The records of both sensors are reduced to minutes (sub-minute intervals by the reduction rules of the config, see
+modules/resample.py) and joined on their shared minutes with one sorted intersection. The spectra of the second
+sensor are rebinned onto the diameter and velocity classes of the first, ie. the 22 x 20 Thies classes onto the
+32 x 32 Parsivel classes, by a precomputed matrix of the overlap of the classes per axis, assuming the particles are
+spread evenly over the width of a class. The statistics of a long period are computed in a single pass over chunks
+of days, of which only one is in memory: the sums, means and co-moments of every chunk are merged into the totals.
+
+Functions:
+- class_bounds: Returns the lower and upper bounds of the diameter or velocity classes of a sensor.
+- overlap_matrix: Returns the fraction of each source class that falls in each destination class.
+- rebin_spectra: Rebins spectra onto other diameter and velocity classes.
+- minute_values: Reduces the values of the time steps to one value per minute.
+- join_minutes: Returns the indices of the minutes that both sensors have.
+- compare_sensors: Compares two sensors over a time range.
+
+Classes:
+- PairStats: single-pass comparison statistics of the paired values of two sensors
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+import numpy
+
+from modules.reader import NetCDFReader
+from modules.resample import interval_starts, reduce_intervals, reduction_rules
+
+# the names of the compared quantities, and the field of each in the events section of the config
+COMPARED_FIELDS = {'intensity': 'intensity_field', 'particles': 'particles_field'}
+
+
+def class_bounds(config_dict: Dict, axis: str) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    This function returns the lower and upper bounds of the diameter or velocity classes of a sensor, from the
+    <axis>_lower_bounds and <axis>_upper_bounds variables of the config. An open class (an infinite bound) is taken
+    as wide as its neighbour.
+    :param config_dict: the combined site specific and general config
+    :param axis: 'diameter' or 'velocity'
+    :return: the lower and upper bounds
+    """
+    values = {var_dict['var_attrs']['standard_name']: var_dict.get('value')
+              for var_dict in config_dict['variables'].values()}
+    lower = numpy.array(values[f'{axis}_lower_bounds'], dtype=float)
+    upper = numpy.array(values[f'{axis}_upper_bounds'], dtype=float)
+    if not numpy.isfinite(upper[-1]):
+        upper[-1] = lower[-1] + (upper[-2] - lower[-2])
+    return lower, upper
+
+
+def overlap_matrix(lower_src: numpy.ndarray, upper_src: numpy.ndarray, lower_dst: numpy.ndarray,
+                   upper_dst: numpy.ndarray) -> numpy.ndarray:
+    """
+    This function returns the fraction of each source class that falls in each destination class, for particles
+    spread evenly over the width of a class. The part of a source class outside all destination classes is lost.
+    :param lower_src: the lower bounds of the source classes
+    :param upper_src: the upper bounds of the source classes
+    :param lower_dst: the lower bounds of the destination classes
+    :param upper_dst: the upper bounds of the destination classes
+    :return: array (source classes, destination classes)
+    """
+    overlap = (numpy.minimum(upper_src[:, None], upper_dst[None, :])
+               - numpy.maximum(lower_src[:, None], lower_dst[None, :]))
+    return numpy.clip(overlap, 0, None) / (upper_src - lower_src)[:, None]
+
+
+def rebin_spectra(cube: numpy.ndarray, diameter_matrix: numpy.ndarray, velocity_matrix: numpy.ndarray) -> numpy.ndarray:
+    """
+    This function rebins spectra onto other diameter and velocity classes, one axis at a time, ie. the
+    (time, 22, 20) Thies spectra onto (time, 32, 32) Parsivel spectra.
+    :param cube: the counts, (time, diameter, velocity)
+    :param diameter_matrix: the overlap matrix of the diameter classes, (source, destination)
+    :param velocity_matrix: the overlap matrix of the velocity classes, (source, destination)
+    :return: the rebinned counts, (time, destination diameter, destination velocity)
+    """
+    return numpy.matmul(numpy.matmul(diameter_matrix.T, cube), velocity_matrix)
+
+
+def minute_values(timestamps: numpy.ndarray, values: Dict[str, numpy.ndarray],
+                  rules: Dict[str, str]) -> Tuple[numpy.ndarray, Dict[str, numpy.ndarray]]:
+    """
+    This function reduces the values of the time steps to one value per minute, by the reduction rule of each
+    variable (default mean). The values of a 1-minute interval are kept as they are.
+    :param timestamps: the POSIX timestamps of the time steps, in time order
+    :param values: dictionary of the variable names to their values along the time steps
+    :param rules: dictionary of the variable names to their reduction rule
+    :return: the minutes (minutes since the epoch) and the values per minute
+    """
+    starts, minute_starts = interval_starts(timestamps, 60)
+    minutes = minute_starts // 60
+    if len(starts) == len(timestamps):
+        return minutes, values
+    return minutes, {name: reduce_intervals(value.astype(float), starts, rules.get(name, 'mean'))
+                     for name, value in values.items()}
+
+
+def join_minutes(minutes_a: numpy.ndarray, minutes_b: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    This function returns the indices of the minutes that both sensors have.
+    :param minutes_a: the minutes of the first sensor, unique and in time order
+    :param minutes_b: the minutes of the second sensor, unique and in time order
+    :return: the indices of the shared minutes in minutes_a and in minutes_b
+    """
+    _, index_a, index_b = numpy.intersect1d(minutes_a, minutes_b, assume_unique=True, return_indices=True)
+    return index_a, index_b
+
+
+class PairStats:
+    """
+    Single-pass comparison statistics of the paired values of two sensors, ie. the rain intensity of a Parsivel (a)
+    and a Thies (b) per minute. Every chunk of pairs is summarized by its count, means and (co-)moments, which are
+    merged into the totals, so a long period is compared without keeping its values.
+
+    Attributes:
+    - threshold: the value from which a pair counts as an event (ie. rain) for the detection scores
+    - n: the number of pairs
+    - mean_a, mean_b: the means of the values of both sensors
+    - m2_a, m2_b, c_ab: the sums of the squared deviations of both sensors and of the product of their deviations
+    - sum_abs, sum_sq: the sums of the absolute and squared differences b - a
+    - contingency: the number of pairs with an event at both, only a, only b, and neither sensor
+
+    Functions:
+    - update: adds a chunk of pairs to the statistics
+    - result: returns the statistics as a dictionary
+    """
+
+    def __init__(self, threshold: float):
+        """
+        Constructor for PairStats.
+        :param threshold: the value from which a pair counts as an event for the detection scores
+        """
+        self.threshold = threshold
+        self.n = 0
+        self.mean_a, self.mean_b = 0., 0.
+        self.m2_a, self.m2_b, self.c_ab = 0., 0., 0.
+        self.sum_abs, self.sum_sq = 0., 0.
+        self.contingency = {'hits': 0, 'misses': 0, 'false_alarms': 0, 'correct_negatives': 0}
+
+    def update(self, values_a: numpy.ndarray, values_b: numpy.ndarray):
+        """
+        Adds a chunk of pairs to the statistics, the pairs with a missing (NaN) value are skipped.
+        :param values_a: the values of the first sensor
+        :param values_b: the values of the second sensor, paired with values_a
+        """
+        valid = ~(numpy.isnan(values_a) | numpy.isnan(values_b))
+        a, b = values_a[valid].astype(float), values_b[valid].astype(float)
+        n = len(a)
+        if n == 0:
+            return
+        mean_a, mean_b = a.mean(), b.mean()
+        # merge the moments of the chunk into the totals (Chan et al.), stable for long periods
+        total = self.n + n
+        delta_a, delta_b = mean_a - self.mean_a, mean_b - self.mean_b
+        self.m2_a += ((a - mean_a) ** 2).sum() + delta_a ** 2 * self.n * n / total
+        self.m2_b += ((b - mean_b) ** 2).sum() + delta_b ** 2 * self.n * n / total
+        self.c_ab += ((a - mean_a) * (b - mean_b)).sum() + delta_a * delta_b * self.n * n / total
+        self.mean_a += delta_a * n / total
+        self.mean_b += delta_b * n / total
+        self.n = total
+        self.sum_abs += numpy.abs(b - a).sum()
+        self.sum_sq += ((b - a) ** 2).sum()
+        event_a, event_b = a >= self.threshold, b >= self.threshold
+        self.contingency['hits'] += int(numpy.count_nonzero(event_a & event_b))
+        self.contingency['misses'] += int(numpy.count_nonzero(event_a & ~event_b))
+        self.contingency['false_alarms'] += int(numpy.count_nonzero(~event_a & event_b))
+        self.contingency['correct_negatives'] += int(numpy.count_nonzero(~event_a & ~event_b))
+
+    def result(self) -> Dict:
+        """
+        Returns the statistics: the number of pairs, means, bias (b - a), relative bias of the totals, mean absolute
+        error, root mean square error, Pearson correlation, the contingency counts and the probability of detection,
+        false alarm ratio and critical success index of the events. NaN where undefined.
+        :return: dictionary of the statistics
+        """
+        def ratio(numerator, denominator):
+            return float(numerator / denominator) if denominator > 0 else float('nan')
+
+        hits, misses, false_alarms = [self.contingency[key] for key in ('hits', 'misses', 'false_alarms')]
+        return {'n': self.n, 'mean_a': self.mean_a if self.n else float('nan'),
+                'mean_b': self.mean_b if self.n else float('nan'),
+                'bias': self.mean_b - self.mean_a if self.n else float('nan'),
+                'relative_bias': ratio(self.mean_b - self.mean_a, self.mean_a) if self.n else float('nan'),
+                'mae': ratio(self.sum_abs, self.n), 'rmse': ratio(self.sum_sq, self.n) ** 0.5,
+                'correlation': ratio(self.c_ab, (self.m2_a * self.m2_b) ** 0.5),
+                **self.contingency,
+                'pod': ratio(hits, hits + misses), 'far': ratio(false_alarms, hits + false_alarms),
+                'csi': ratio(hits, hits + misses + false_alarms)}
+
+
+def compare_sensors(config_a: Dict, config_b: Dict, start: datetime, end: datetime,  # pylint: disable=too-many-locals,too-many-positional-arguments
+                    chunk: timedelta = timedelta(days=1), spectra: bool = True, version: str = 'full') -> Dict:
+    """
+    This function compares two co-located sensors over a time range in a single pass over chunks of the range:
+    the rain intensity and number of particles per shared minute (with the events threshold of the first sensor and
+    one particle as the thresholds of the detection scores), and the spectra of the second sensor rebinned onto the
+    classes of the first, summed over the shared minutes per m2 of the sampling area of each sensor.
+    :param config_a: the combined config of the first (reference) sensor, ie. a Parsivel
+    :param config_b: the combined config of the second sensor, ie. a Thies
+    :param start: the start of the time range
+    :param end: the end of the time range (exclusive)
+    :param chunk: the length of the chunks of the time range that are read at once
+    :param spectra: whether the spectra are compared, they are only in the full netCDFs
+    :param version: 'full' or 'light' netCDFs
+    :return: dictionary with the sensor names, the number of shared minutes, a dictionary of statistics
+             (see PairStats.result) per quantity, and the summed spectra of both sensors on the classes of the first
+    """
+    # per sensor: a reader without a cache, as every day is read once, and the variable and rule of each quantity
+    sensors = []
+    for config in (config_a, config_b):
+        fields = {quantity: config['events'][key] for quantity, key in COMPARED_FIELDS.items()}
+        if spectra:
+            fields['spectrum'] = config['dsd']['spectrum_field']
+        names = {quantity: config['telegram_fields'][field]['var_attrs']['standard_name']
+                 for quantity, field in fields.items()}
+        rules = reduction_rules(config)
+        sensors.append((NetCDFReader(config, max_cache_bytes=0), names,
+                        {quantity: rules.get(name, 'mean') for quantity, name in names.items()}))
+    stats = {quantity: PairStats(config_a['events']['threshold'] if quantity == 'intensity' else 1)
+             for quantity in COMPARED_FIELDS}
+    if spectra:
+        diameter_matrix = overlap_matrix(*class_bounds(config_b, 'diameter'), *class_bounds(config_a, 'diameter'))
+        velocity_matrix = overlap_matrix(*class_bounds(config_b, 'velocity'), *class_bounds(config_a, 'velocity'))
+        summed = [numpy.zeros((len(diameter_matrix[0]), len(velocity_matrix[0]))) for _ in sensors]
+
+    n_minutes = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk, end)
+        minutes = []
+        for reader, names, rules in sensors:
+            if not reader.locate(chunk_start, chunk_end, version=version):
+                break
+            try:
+                stacked = reader.read(list(names.values()), chunk_start, chunk_end, version=version)
+            except ValueError:
+                # no time steps of this sensor in the chunk
+                break
+            minutes.append(minute_values(stacked['time'], {quantity: stacked[name]
+                                                           for quantity, name in names.items()}, rules))
+        chunk_start = chunk_end
+        if len(minutes) < 2:
+            continue
+        minutes_a, values_a = minutes[0]
+        minutes_b, values_b = minutes[1]
+        index_a, index_b = join_minutes(minutes_a, minutes_b)
+        n_minutes += len(index_a)
+        for quantity, quantity_stats in stats.items():
+            quantity_stats.update(values_a[quantity][index_a], values_b[quantity][index_b])
+        if spectra:
+            cube_a = values_a['spectrum'][index_a]
+            cube_b = rebin_spectra(values_b['spectrum'][index_b], diameter_matrix, velocity_matrix)
+            # the spectra of the minutes that both sensors have
+            both = ~(numpy.isnan(cube_a).any(axis=(1, 2)) | numpy.isnan(cube_b).any(axis=(1, 2)))
+            summed[0] += cube_a[both].sum(axis=0)
+            summed[1] += cube_b[both].sum(axis=0)
+
+    result = {'sensor_a': config_a['global_attrs']['sensor_name'], 'sensor_b': config_b['global_attrs']['sensor_name'],
+              'minutes': n_minutes, 'stats': {quantity: value.result() for quantity, value in stats.items()}}
+    if spectra:
+        # counts per m2 of the sampling area, as the beams of the sensors differ
+        result['spectrum_a'], result['spectrum_b'] = [
+            spectrum / (config['dsd']['beam_length'] * config['dsd']['beam_width'])
+            for spectrum, config in zip(summed, (config_a, config_b))]
+    return result
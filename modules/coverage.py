@@ -0,0 +1,258 @@
+"""
+This module contains the per-day coverage index of the disdrodl table, so gaps in the record of a sensor
+can be found without scanning the telegrams.
+
+For every sensor and (UTC) day the coverage table holds a bitmap of the 1440 minutes of the day,
+a bit is set when a telegram of that minute is exported to NetCDF (longer than MIN_TELEGRAM_LENGTH),
+and the counts of all, empty and short telegrams. The index is updated by insert_rows (modules/sqldb.py)
+in the same transaction as the telegrams. A telegram replaced by the keep_last duplicates policy, or removed by
+dedup_db.py, is subtracted again by remove_coverage, which recounts the bit of its minute from the telegrams left.
+rebuild_coverage recounts the index from the telegrams in the database, ie. for a database of a previous version.
+
+Functions:
+- coverage_slot: Returns the day and the minute of the day of a timestamp.
+- update_coverage: Adds telegrams to the coverage index.
+- remove_coverage: Removes replaced or deleted telegrams from the coverage index.
+- recount_coverage: Recounts the coverage of sensor days from the disdrodl table.
+- rebuild_coverage: Recomputes the coverage index from the disdrodl table.
+- query_coverage: Queries the coverage of a sensor for a range of days.
+- empty_coverage: Returns the coverage of a day without telegrams.
+- missing_minutes: Returns the minutes of the day that are not set in a coverage bitmap.
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple, Union
+
+from modules.telegram_codec import decode_telegram
+
+# the export skips telegrams of this length or shorter
+MIN_TELEGRAM_LENGTH = 1000
+MINUTES_PER_DAY = 1440
+BITMAP_BYTES = MINUTES_PER_DAY // 8
+
+COVERAGE_KEYS = ('date', 'minutes', 'n_minutes', 'n_telegrams', 'n_empty', 'n_short')
+# the length of a plain telegram, or the compressed telegram to decompress (see modules/telegram_codec.py)
+LENGTH_QUERY = ("SELECT timestamp, sensor_id, CASE WHEN typeof(telegram) = 'blob' THEN telegram"
+                " ELSE length(telegram) END FROM disdrodl")
+UPSERT_COVERAGE_QUERY = ('INSERT OR REPLACE INTO coverage(sensor_id, date, minutes, n_minutes, n_telegrams,'
+                         ' n_empty, n_short) VALUES (?, ?, ?, ?, ?, ?, ?)')
+
+
+def coverage_slot(timestamp: float) -> Tuple[str, int]:
+    """
+    Returns the day and the minute of the day of a timestamp.
+    :param timestamp: the timestamp in seconds since the epoch
+    :return: the ISO date (UTC) and the minute of the day
+    """
+    day = datetime.fromtimestamp(timestamp, tz=timezone.utc).date().isoformat()
+    return day, int(timestamp % 86400) // 60
+
+
+def update_coverage(cur, telegrams: Iterable[Tuple[float, str, int]]):
+    """
+    Adds telegrams to the coverage index, without committing.
+    :param cur: the database cursor object
+    :param telegrams: tuples of (timestamp, sensor_id, telegram length)
+    """
+    telegrams = list(telegrams)
+    days: Dict[Tuple[str, str], List] = {}
+    for timestamp, sensor_id, _ in telegrams:
+        key = (sensor_id, coverage_slot(timestamp)[0])
+        if key not in days:
+            stored = _stored_day(cur, key)
+            if stored is not None:
+                days[key] = stored
+    _add_rows(days, telegrams)
+
+    _write_days(cur, days)
+
+
+def remove_coverage(cur, telegrams: Iterable[Tuple[float, str, int]], interval: int):
+    """
+    Removes telegrams that were replaced or deleted from the coverage index, without committing. The bit of the
+    minute of a removed telegram is recounted from the telegrams of that minute that are left in the disdrodl table,
+    as at intervals below a minute another telegram can cover the minute.
+    :param cur: the database cursor object
+    :param telegrams: tuples of (timestamp, sensor_id, telegram length or compressed telegram)
+    :param interval: the interval of the unique index of the disdrodl table, to find the telegrams of a minute
+    """
+    days: Dict[Tuple[str, str], List] = {}
+    for timestamp, sensor_id, length in telegrams:
+        length = _length(length)
+        day, minute = coverage_slot(timestamp)
+        key = (sensor_id, day)
+        if key not in days:
+            days[key] = _stored_day(cur, key)
+        if days[key] is None:
+            continue
+        days[key][1] -= 1
+        if length is None or length == 0:
+            days[key][2] -= 1
+        elif length <= MIN_TELEGRAM_LENGTH:
+            days[key][3] -= 1
+        else:
+            # the telegrams of the slots of the unique index in the minute, so the lookup uses the index
+            minute_start = timestamp - timestamp % 60
+            rows = cur.execute(f'{LENGTH_QUERY} WHERE sensor_id = ? AND CAST(timestamp / {interval} AS INTEGER)'
+                               ' BETWEEN ? AND ?', (sensor_id, int(minute_start / interval),
+                                                    int((minute_start + 60) / interval) - 1)).fetchall()
+            days[key][0][minute // 8] &= ~(1 << (minute % 8))
+            if any(coverage_slot(row_timestamp)[1] == minute and _length(row_length) > MIN_TELEGRAM_LENGTH
+                   for row_timestamp, _, row_length in rows):
+                days[key][0][minute // 8] |= 1 << (minute % 8)
+
+    _write_days(cur, {key: day for key, day in days.items() if day is not None})
+
+
+def recount_coverage(cur, days: Iterable[Tuple[str, str]], interval: int):
+    """
+    Recounts the coverage of sensor days from the disdrodl table, without committing, ie. after rows were removed.
+    The telegrams of a day are found through the slots of the unique index, so only that day is read.
+    :param cur: the database cursor object
+    :param days: tuples of (sensor_id, date)
+    :param interval: the interval of the unique index of the disdrodl table
+    """
+    recounted: Dict[Tuple[str, str], List] = {}
+    for sensor_id, day in days:
+        day_start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp()
+        recounted[(sensor_id, day)] = [bytearray(BITMAP_BYTES), 0, 0, 0]
+        _add_rows(recounted, cur.execute(f'{LENGTH_QUERY} WHERE sensor_id = ?'
+                                         f' AND CAST(timestamp / {interval} AS INTEGER) BETWEEN ? AND ?',
+                                         (sensor_id, int(day_start / interval),
+                                          int((day_start + 86400) / interval) - 1)).fetchall())
+    _write_days(cur, recounted)
+
+
+def rebuild_coverage(con) -> int:
+    """
+    Recomputes the coverage index from the disdrodl table, ie. for a database of a previous version
+    or after rows were removed. The table is read without a write lock, only the telegrams inserted
+    in the meantime are read again in the short transaction that replaces the index.
+    :param con: the database connection object
+    :return: the number of sensor days in the index
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    last_id = cur.execute('SELECT MAX(id) FROM disdrodl').fetchone()[0] or 0
+    days: Dict[Tuple[str, str], List] = {}
+    _add_rows(days, cur.execute(f'{LENGTH_QUERY} WHERE id <= ?', (last_id,)))
+
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        _add_rows(days, cur.execute(f'{LENGTH_QUERY} WHERE id > ?', (last_id,)).fetchall())
+        cur.execute('DELETE FROM coverage')
+        _write_days(cur, days)
+        con.commit()
+    except sqlite3.Error:
+        con.rollback()
+        raise
+    finally:
+        cur.close()
+    return len(days)
+
+
+def query_coverage(con, sensor_id: str, start: date, end: date) -> List[Dict]:
+    """
+    Queries the coverage of a sensor for every day from start to end (inclusive).
+    A day without telegrams has a coverage of 0 minutes.
+    :param con: the database connection object
+    :param sensor_id: the sensor id in the disdrodl table
+    :param start: the first day
+    :param end: the last day
+    :return: a dictionary per day with the date, minutes (bitmap), n_minutes, n_telegrams, n_empty and n_short
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    stored = {row[0]: row for row in cur.execute(
+        'SELECT date, minutes, n_minutes, n_telegrams, n_empty, n_short FROM coverage'
+        ' WHERE sensor_id = ? AND date >= ? AND date <= ?', (sensor_id, start.isoformat(), end.isoformat()))}
+    cur.close()
+
+    days = [(start + timedelta(days=day_number)).isoformat() for day_number in range((end - start).days + 1)]
+    return [dict(zip(COVERAGE_KEYS, stored[day])) if day in stored else empty_coverage(day) for day in days]
+
+
+def empty_coverage(day: str) -> Dict:
+    """
+    Returns the coverage of a day without telegrams.
+    :param day: the ISO date
+    :return: the coverage of the day, as returned by query_coverage
+    """
+    return dict(zip(COVERAGE_KEYS, (day, bytes(BITMAP_BYTES), 0, 0, 0, 0)))
+
+
+def missing_minutes(minutes: bytes) -> List[int]:
+    """
+    Returns the minutes of the day that are not set in a coverage bitmap.
+    :param minutes: the bitmap of the minutes of a day
+    :return: the missing minutes of the day, 0 is 00:00 UTC
+    """
+    return [minute for minute in range(MINUTES_PER_DAY) if not minutes[minute // 8] & (1 << (minute % 8))]
+
+
+def _stored_day(cur, key: Tuple[str, str]) -> Union[List, None]:
+    """
+    Returns the stored coverage of a day.
+    :param cur: the database cursor object
+    :param key: tuple of (sensor_id, date)
+    :return: list of the bitmap, n_telegrams, n_empty and n_short of the day, None if the day is not in the index
+    """
+    stored = cur.execute('SELECT minutes, n_telegrams, n_empty, n_short FROM coverage'
+                         ' WHERE sensor_id = ? AND date = ?', key).fetchone()
+    if stored is None:
+        return None
+    return [bytearray(stored[0])] + list(stored[1:])
+
+
+def _length(length: Union[int, bytes, None]) -> Union[int, None]:
+    """
+    Returns the length of a telegram, decompressing a compressed telegram.
+    :param length: the telegram length or the compressed telegram
+    :return: the telegram length
+    """
+    if isinstance(length, bytes):
+        return len(decode_telegram(length))
+    return length
+
+
+def _add_telegram(day: List, minute: int, length: int):
+    """
+    Adds one telegram to the coverage of a day.
+    :param day: list of the bitmap, n_telegrams, n_empty and n_short of the day
+    :param minute: the minute of the day of the telegram
+    :param length: the length of the telegram
+    """
+    day[1] += 1
+    if length is None or length == 0:
+        day[2] += 1
+    elif length <= MIN_TELEGRAM_LENGTH:
+        day[3] += 1
+    else:
+        day[0][minute // 8] |= 1 << (minute % 8)
+
+
+def _add_rows(days: Dict[Tuple[str, str], List], rows: Iterable[Tuple[float, str, int]]):
+    """
+    Adds telegrams to the coverage of days, a day that is not in days yet starts empty.
+    :param days: dictionary of (sensor_id, date) and the coverage of the day
+    :param rows: tuples of (timestamp, sensor_id, telegram length or compressed telegram)
+    """
+    for timestamp, sensor_id, length in rows:
+        length = _length(length)
+        day, minute = coverage_slot(timestamp)
+        key = (sensor_id, day)
+        if key not in days:
+            days[key] = [bytearray(BITMAP_BYTES), 0, 0, 0]
+        _add_telegram(days[key], minute, length)
+
+
+def _write_days(cur, days: Dict[Tuple[str, str], List]):
+    """
+    Writes the coverage of days, without committing.
+    :param cur: the database cursor object
+    :param days: dictionary of (sensor_id, date) and the coverage of the day
+    """
+    cur.executemany(UPSERT_COVERAGE_QUERY, [
+        (sensor_id, day, bytes(minutes), sum(bin(byte).count('1') for byte in minutes), n_telegrams, n_empty, n_short)
+        for (sensor_id, day), (minutes, n_telegrams, n_empty, n_short) in days.items()])
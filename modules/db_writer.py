@@ -0,0 +1,244 @@
+"""
+This module contains a database writer thread that is shared by several sensors.
+
+Classes:
+- DBWriter: thread that batches telegram rows from a queue into one or more databases
+"""
+
+import queue
+import sqlite3
+import threading
+from logging import Logger
+from time import monotonic
+from typing import Dict, List, Tuple, Union
+
+from modules.sqldb import connect_db, insert_rows
+from modules.spool import Spool
+
+
+class DBWriter(threading.Thread):  # pylint: disable=too-many-instance-attributes
+    """
+    Thread that receives telegram rows from any number of sensor threads and writes them in batches,
+    with one transaction per database and sensor per batch. Each sensor can use its own database file.
+    The rows are kept per database and sensor, so sensors that share a database each keep their own duplicates
+    policy, codec and spool. Rows that fail to be written are kept and retried on the next flush. After max_retries
+    failed flushes the rows are handed to the spool of the sensor, which drains them once the database can be
+    written again. Without a spool, at most max_pending rows per database and sensor are kept, the oldest rows are
+    dropped. Rows that can still not be written when the thread stops are spooled as well.
+    Particle rows of the Parsivel field 61 are written in the same transaction as the telegram rows.
+    An unexpected error in the thread loop is logged and the loop continues, so the thread never ends
+    while the sensors keep queueing rows.
+
+    Attributes:
+    - logger: logger for logging errors
+    - batch_size: number of queued rows that triggers a flush
+    - flush_interval: maximum time in seconds a row waits before it is written
+    - max_retries: number of failed flushes of a database and sensor after which its rows are spooled
+    - max_pending: maximum number of rows kept per database and sensor without a spool
+    - rows_written: number of rows written so far
+    - rows_spooled: number of rows handed to a spool so far
+    - rows_dropped: number of rows dropped so far
+
+    Functions:
+    - put: queues a row to be written to a database
+    - run: the thread loop, writes the queued rows in batches
+    - flush: writes all pending rows
+    - stop: writes the remaining rows and stops the thread
+    - __failed: spools or limits the rows of a database and sensor that failed to be written
+    - __spool: hands the rows of a database and sensor to the spool of the sensor
+    """
+
+    def __init__(self, logger: Logger, batch_size: int = 50, flush_interval: float = 1.0, max_retries: int = 10,
+                 max_pending: int = 10000):
+        """
+        Constructor for DBWriter.
+        :param logger: logger for logging errors
+        :param batch_size: number of queued rows that triggers a flush
+        :param flush_interval: maximum time in seconds a row waits before it is written
+        :param max_retries: number of failed flushes of a database and sensor after which its rows are spooled
+        :param max_pending: maximum number of rows kept per database and sensor without a spool
+        """
+        super().__init__(name='db-writer', daemon=True)
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self.rows_written = 0
+        self.rows_spooled = 0
+        self.rows_dropped = 0
+        self._queue: queue.Queue = queue.Queue()
+        # keyed by (db_path, sensor_id)
+        self._pending: Dict[Tuple[str, str], List[Tuple]] = {}
+        self._pending_particles: Dict[Tuple[str, str], List[Tuple]] = {}
+        self._duplicates: Dict[Tuple[str, str], str] = {}
+        self._codecs: Dict[Tuple[str, str], str] = {}
+        self._spools: Dict[Tuple[str, str], Spool] = {}
+        self._failures: Dict[Tuple[str, str], int] = {}
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._stop_event = threading.Event()
+
+    def put(self, db_path: str, row: Tuple, particles_row: Union[Tuple, None] = None,  # pylint: disable=too-many-positional-arguments
+            duplicates: str = 'keep_first', codec: str = 'plain', spool: Union[Spool, None] = None):
+        """
+        Queues a row to be written to a database. Safe to call from any thread.
+        :param db_path: the path of the database to write to
+        :param row: tuple of (timestamp, datetime, sensor_id, telegram)
+        :param particles_row: tuple of (timestamp, sensor_id, n_particles, data), None if there are no particles
+        :param duplicates: the policy for a row of a sensor and interval that is already in the database
+        :param codec: the compression of the telegram column, one of TELEGRAM_CODECS
+        :param spool: the spool of the sensor for rows that can not be written, None to keep them pending
+        """
+        self._queue.put((str(db_path), row, particles_row, duplicates, codec, spool))
+
+    def run(self):
+        """
+        The thread loop, writes the queued rows in batches until stop is called.
+        """
+        last_flush = monotonic()
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                db_path, row, particles_row, duplicates, codec, spool = self._queue.get(
+                    timeout=self.flush_interval)
+                key = (db_path, row[2])
+                self._duplicates[key] = duplicates
+                self._codecs[key] = codec
+                if spool is not None:
+                    self._spools[key] = spool
+                self._pending.setdefault(key, []).append(row)
+                if particles_row is not None:
+                    self._pending_particles.setdefault(key, []).append(particles_row)
+            except queue.Empty:
+                pass
+
+            n_pending = sum(len(rows) for rows in self._pending.values())
+            if n_pending >= self.batch_size or (n_pending > 0 and monotonic() - last_flush >= self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:  # pylint: disable=broad-except
+                    # the rows stay pending and the loop continues, ending the thread would lose every later row
+                    self.logger.error(msg=f'Unexpected error in the DB writer, continuing: {e!r}')
+                last_flush = monotonic()
+
+        try:
+            self.flush()
+        except Exception as e:  # pylint: disable=broad-except
+            self.logger.error(msg=f'Unexpected error in the last flush of the DB writer: {e!r}')
+        # the rows that can still not be written are spooled, as they are lost once the thread ends
+        for key, rows in self._pending.items():
+            if rows and not self.__spool(key):
+                self.logger.error(msg=f'Lost {len(rows)} rows of {key[1]} that could not be written to {key[0]}')
+                self.rows_dropped += len(rows)
+        for con in self._connections.values():
+            con.close()
+        self._connections.clear()
+
+    def flush(self):
+        """
+        Writes all pending rows, one transaction per database and sensor.
+        Only call from the writer thread, as sqlite connections can not be shared between threads.
+        """
+        for key, rows in self._pending.items():
+            if len(rows) == 0:
+                continue
+            db_path = key[0]
+            try:
+                con = self.__connection(db_path)
+                cur = con.cursor()
+                particle_rows = self._pending_particles.get(key, [])
+                insert_rows(cur, rows, duplicates=self._duplicates.get(key, 'keep_first'),
+                            codec=self._codecs.get(key, 'plain'), particle_rows=particle_rows)
+                con.commit()
+                cur.close()
+            except Exception as e:  # pylint: disable=broad-except
+                # a locked or full database, but also an encoding error, must not end the thread
+                self.__drop_connection(db_path)
+                self._failures[key] = self._failures.get(key, 0) + 1
+                self.logger.error(msg=f'Failed to write {len(rows)} rows of {key[1]} to {db_path}'
+                                      f' ({self._failures[key]} failures), will retry: {e!r}')
+                self.__failed(key)
+            else:
+                self.logger.debug(msg=f'Wrote {len(rows)} rows of {key[1]} to {db_path}')
+                self.rows_written += len(rows)
+                self._failures.pop(key, None)
+                rows.clear()
+                particle_rows.clear()
+
+    def __failed(self, key: Tuple[str, str]):
+        """
+        Spools the rows of a database and sensor after max_retries failed flushes, so they are drained into the
+        database once it can be written again. Rows that are not spooled are limited to the last max_pending rows.
+        :param key: the path of the database that failed to be written and the sensor_id of the rows
+        """
+        rows = self._pending[key]
+        if self._failures[key] >= self.max_retries and self.__spool(key):
+            return
+        if len(rows) > self.max_pending:
+            particle_rows = self._pending_particles.get(key, [])
+            dropped = rows[:len(rows) - self.max_pending]
+            del rows[:len(dropped)]
+            kept = {row[0] for row in rows}
+            particle_rows[:] = [particles_row for particles_row in particle_rows if particles_row[0] in kept]
+            self.logger.error(msg=f'Dropped the {len(dropped)} oldest rows of {key[1]} in {key[0]},'
+                                  f' more than {self.max_pending} rows can not be written')
+            self.rows_dropped += len(dropped)
+
+    def __spool(self, key: Tuple[str, str]) -> bool:
+        """
+        Hands the pending rows of a database and sensor to the spool of the sensor.
+        :param key: the path of the database and the sensor_id of the rows
+        :return: True if the rows are spooled, False if the sensor has no spool or the spool can not be written
+        """
+        spool = self._spools.get(key)
+        if spool is None:
+            return False
+        rows = self._pending[key]
+        particle_rows = self._pending_particles.get(key, [])
+        particles = {(particles_row[0], particles_row[1]): particles_row for particles_row in particle_rows}
+        try:
+            for row in rows:
+                spool.append(row, particles.get((row[0], row[2])))
+            spool.sync()
+        except OSError as e:
+            self.logger.error(msg=f'Failed to spool the rows of {key[1]} in {key[0]} to {spool.path}: {e}')
+            return False
+        self.logger.warning(msg=f'Spooled {len(rows)} rows of {key[1]} in {key[0]} to {spool.path}')
+        self.rows_spooled += len(rows)
+        self._failures.pop(key, None)
+        rows.clear()
+        particle_rows.clear()
+        return True
+
+    def stop(self, timeout: float = None):
+        """
+        Writes the remaining rows and stops the thread.
+        :param timeout: maximum time in seconds to wait for the thread to finish
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+    def __connection(self, db_path: str) -> sqlite3.Connection:
+        """
+        Returns the open connection to a database, connecting if necessary.
+        :param db_path: the path of the database
+        :return: the connection object
+        """
+        if db_path not in self._connections:
+            con, cur = connect_db(dbpath=db_path)
+            cur.close()
+            self._connections[db_path] = con
+        return self._connections[db_path]
+
+    def __drop_connection(self, db_path: str):
+        """
+        Closes and forgets the connection to a database, so the next flush reconnects.
+        :param db_path: the path of the database
+        """
+        con = self._connections.pop(db_path, None)
+        if con is not None:
+            try:
+                con.rollback()
+                con.close()
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,119 @@
+"""
+This module contains the drop size distribution (DSD) products computed from the raw spectra at export time:
+the number concentration N(D), the rain rate R, the radar reflectivity Z and the mass-weighted diameter Dm.
+
+The spectra of all time steps of a day are one (time, diameter, velocity) array, so every product is computed
+for the whole day at once with numpy broadcasting against the class centers and the effective sampling area.
+Margin fallers and splashing drops are removed by a (diameter, velocity) mask around a fall speed relation,
+built once and applied to the whole array.
+
+Functions:
+- spectra_cube: Converts the raw spectra of the telegrams to one (time, diameter, velocity) array.
+- effective_area: Returns the effective sampling area of each diameter class.
+- fall_speed: Returns the terminal fall speed of rain drops, v = a - b exp(-c D).
+- velocity_mask: Returns the (diameter, velocity) classes within a tolerance of the fall speed.
+- filter_spectra: Applies a velocity mask to the spectra of all time steps.
+- dsd_moments: Computes N(D), R, Z and Dm of all time steps.
+"""
+
+from typing import Dict, List, Tuple, Union
+import numpy
+
+
+def spectra_cube(spectra: List[Union[List[str], None]], n_diameter: int, n_velocity: int) -> numpy.ndarray:
+    """
+    This function converts the raw spectra of the telegrams to one (time, diameter, velocity) array.
+    :param spectra: per time step the values of the raw spectrum field, diameter class major
+    :param n_diameter: the number of diameter classes
+    :param n_velocity: the number of velocity classes
+    :return: array of counts, NaN for the time steps without a complete spectrum
+    """
+    cube = numpy.full((len(spectra), n_diameter * n_velocity), numpy.nan)
+    valid = [i for i, spectrum in enumerate(spectra)
+             if isinstance(spectrum, list) and len(spectrum) == n_diameter * n_velocity]
+    if len(valid) > 0:
+        # one conversion of all values, instead of one per telegram
+        cube[valid] = numpy.array([spectra[i] for i in valid], dtype=float)
+    return cube.reshape(len(spectra), n_diameter, n_velocity)
+
+
+def effective_area(diameter_center: numpy.ndarray, beam_length: float, beam_width: float) -> numpy.ndarray:
+    """
+    This function returns the effective sampling area of each diameter class: a drop is only counted if it
+    falls completely inside the beam, which narrows the beam by half the drop diameter.
+    :param diameter_center: the center of the diameter classes [mm]
+    :param beam_length: the length of the laser beam [m]
+    :param beam_width: the width of the laser beam [m]
+    :return: the effective sampling area per diameter class [m2]
+    """
+    return beam_length * (beam_width - diameter_center / 2000)
+
+
+def fall_speed(diameter: numpy.ndarray, a: float = 9.65, b: float = 10.3, c: float = 0.6) -> numpy.ndarray:
+    """
+    This function returns the terminal fall speed of rain drops, v = a - b exp(-c D), by default the relation of
+    Atlas et al. (1973).
+    :param diameter: the drop diameter [mm]
+    :param a: the coefficient a [m s-1]
+    :param b: the coefficient b [m s-1]
+    :param c: the coefficient c [mm-1]
+    :return: the fall speed [m s-1]
+    """
+    return a - b * numpy.exp(-c * diameter)
+
+
+def velocity_mask(diameter_center: numpy.ndarray, velocity_center: numpy.ndarray, tolerance: float,
+                  coefficients: List[float]) -> numpy.ndarray:
+    """
+    This function returns the (diameter, velocity) classes whose velocity center is within a relative tolerance
+    of the fall speed of the diameter center.
+    :param diameter_center: the center of the diameter classes [mm]
+    :param velocity_center: the center of the velocity classes [m s-1]
+    :param tolerance: the relative tolerance, ie. 0.5 keeps 50 % to 150 % of the fall speed
+    :param coefficients: the coefficients a, b and c of fall_speed
+    :return: boolean array (diameter, velocity), True for the classes that are kept
+    """
+    speed = fall_speed(diameter_center, *coefficients)[:, None]
+    return numpy.abs(velocity_center[None, :] - speed) <= tolerance * speed
+
+
+def filter_spectra(cube: numpy.ndarray, mask: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    This function applies a velocity mask to the spectra of all time steps.
+    :param cube: the counts, (time, diameter, velocity)
+    :param mask: the classes that are kept, (diameter, velocity)
+    :return: the filtered counts, and the number of rejected particles per time step (NaN without a spectrum)
+    """
+    # a time step without a spectrum stays NaN
+    filtered = cube * mask
+    return filtered, cube.sum(axis=(1, 2)) - filtered.sum(axis=(1, 2))
+
+
+def dsd_moments(cube: numpy.ndarray, diameter_center: numpy.ndarray, diameter_spread: numpy.ndarray,  # pylint: disable=too-many-positional-arguments
+                velocity_center: numpy.ndarray, area: numpy.ndarray, interval: float) -> Dict[str, numpy.ndarray]:
+    """
+    This function computes the DSD products of all time steps:
+    N(D) = sum_v n(D, v) / (A(D) dt v dD)                   [m-3 mm-1]
+    R = 6 pi 10^-4 sum_D,v n(D, v) D^3 / (A(D) dt)           [mm h-1]
+    Z = sum_D N(D) D^6 dD                                    [mm6 m-3], written as 10 log10(Z) [dBZ]
+    Dm = sum_D N(D) D^4 dD / sum_D N(D) D^3 dD               [mm]
+    :param cube: the counts, (time, diameter, velocity)
+    :param diameter_center: the center of the diameter classes [mm]
+    :param diameter_spread: the width of the diameter classes [mm]
+    :param velocity_center: the center of the velocity classes [m s-1]
+    :param area: the effective sampling area per diameter class [m2]
+    :param interval: the length of the measurement interval [s]
+    :return: dictionary of number_concentration (time, diameter), rain_rate, reflectivity
+             and mass_weighted_diameter (time), NaN where they are undefined
+    """
+    sampled_volume = area[None, :, None] * interval * velocity_center[None, None, :]
+    number_concentration = (cube / sampled_volume).sum(axis=2) / diameter_spread
+    rain_rate = 6e-4 * numpy.pi * (cube.sum(axis=2) * diameter_center ** 3 / area).sum(axis=1) / interval
+    moment_3, moment_4, moment_6 = [(number_concentration * diameter_center ** order * diameter_spread).sum(axis=1)
+                                    for order in (3, 4, 6)]
+    # no drops: no reflectivity and no mean diameter
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        reflectivity = numpy.where(moment_6 > 0, 10 * numpy.log10(moment_6), numpy.nan)
+        mass_weighted_diameter = numpy.where(moment_3 > 0, moment_4 / moment_3, numpy.nan)
+    return {'number_concentration': number_concentration, 'rain_rate': rain_rate, 'reflectivity': reflectivity,
+            'mass_weighted_diameter': mass_weighted_diameter}
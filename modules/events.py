@@ -0,0 +1,235 @@
+"""
+This module contains the rain-event catalog: a small SQLite index of the rain events of all stations, so event
+queries over years do not open the netCDFs.
+
+A time step is wet if its rain intensity is at least the threshold and it has at least min_particles particles,
+an event is a run of wet time steps in which the dry gaps are at most max_gap seconds. The events are detected
+per day at export with numpy over all time steps of the day at once, and stored as the part of the event in that
+day. The parts of an event that continues over midnight share the start of the event (event_start), the events
+view combines them. Exporting a day again replaces its parts, and relinks the parts of the next day.
+
+Functions:
+- events_db_path: Returns the path of the event catalog of a sensor.
+- create_events_db: Creates the event catalog if it does not exist yet.
+- detect_events: Returns the events in the time steps of a day.
+- update_events: Replaces the events of a sensor on a day in the catalog.
+- query_events: Queries the events of a range of days from the catalog.
+- events_from_telegrams: Detects the events of a day in telegram objects.
+- events_from_netCDF: Detects the events of a day in an exported netCDF.
+"""
+
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import numpy
+from cftime import num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+from modules.qc import to_values
+from modules.sqldb import connect_db
+
+EVENT_KEYS = ('station', 'sensor_name', 'start_time', 'end_time', 'peak_intensity', 'total_amount', 'n_minutes')
+INSERT_PART_QUERY = ('INSERT INTO event_parts(station, sensor_name, day, event_start, start_time, end_time,'
+                     ' peak_intensity, total_amount, n_minutes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+def events_db_path(config_dict: Dict) -> Path:
+    """
+    This function returns the path of the event catalog of a sensor, events_db in the site config, by default
+    events.db in the data directory. Several sensors can share a catalog.
+    :param config_dict: the (combined) site specific config
+    :return: the path of the event catalog
+    """
+    return Path(config_dict.get('events_db', Path(config_dict['data_dir']) / 'events.db'))
+
+
+def create_events_db(dbpath: Union[str, Path]):
+    """
+    This function creates the event catalog at the specified path.
+    with Table: event_parts, the part of each event in a day
+    with columns station, sensor_name, day, event_start, start_time, end_time, peak_intensity, total_amount,
+    n_minutes
+    and View: events, the parts combined per event, with the columns of EVENT_KEYS
+    :param dbpath: the path of the event catalog
+    """
+    con, cur = connect_db(dbpath=str(dbpath))
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS event_parts
+                (
+                    station TEXT,
+                    sensor_name TEXT,
+                    day TEXT,
+                    event_start REAL,
+                    start_time REAL,
+                    end_time REAL,
+                    peak_intensity REAL,
+                    total_amount REAL,
+                    n_minutes INTEGER,
+                    PRIMARY KEY (sensor_name, start_time)
+                )
+                """)
+    cur.execute('CREATE INDEX IF NOT EXISTS event_parts_event ON event_parts(sensor_name, event_start)')
+    cur.execute("""
+                CREATE VIEW IF NOT EXISTS events AS
+                SELECT station, sensor_name, event_start AS start_time, MAX(end_time) AS end_time,
+                    MAX(peak_intensity) AS peak_intensity, SUM(total_amount) AS total_amount,
+                    SUM(n_minutes) AS n_minutes
+                FROM event_parts GROUP BY sensor_name, event_start
+                """)
+    con.commit()
+    cur.close()
+    con.close()
+
+
+def detect_events(timestamps: numpy.ndarray, intensity: numpy.ndarray, n_particles: numpy.ndarray,
+                  events_config: Dict, interval: int) -> List[Tuple[float, float, float, float, int]]:
+    """
+    This function returns the events in the time steps of a day.
+    :param timestamps: the POSIX timestamps of the time steps, in time order
+    :param intensity: the rain intensity of the time steps [mm/h], NaN for missing values
+    :param n_particles: the number of particles of the time steps, NaN for missing values
+    :param events_config: the events section of the config, with threshold, min_particles and max_gap
+    :param interval: the length of a time step in seconds
+    :return: per event the start and end (POSIX timestamps), the peak intensity [mm/h], the total amount [mm]
+             and the number of wet time steps
+    """
+    with numpy.errstate(invalid='ignore'):
+        wet = (intensity >= events_config['threshold']) & (n_particles >= events_config['min_particles'])
+    wet_index = numpy.flatnonzero(wet)
+    if len(wet_index) == 0:
+        return []
+    # a new event starts after a dry gap longer than max_gap
+    gaps = numpy.diff(timestamps[wet_index]) - interval
+    splits = numpy.flatnonzero(gaps > events_config['max_gap'])
+    first = wet_index[numpy.concatenate(([0], splits + 1))]
+    last = wet_index[numpy.concatenate((splits, [len(wet_index) - 1]))]
+
+    intensity = numpy.nan_to_num(intensity)
+    # the amounts of all time steps of an event, also the ones in its dry gaps
+    amount = numpy.concatenate(([0], numpy.cumsum(intensity * interval / 3600)))
+    n_wet = numpy.concatenate(([0], numpy.cumsum(wet)))
+    # the maximum of each [first, last] range, the sentinel keeps last + 1 a valid index
+    bounds = numpy.column_stack((first, last + 1)).ravel()
+    peak = numpy.maximum.reduceat(numpy.append(intensity, 0), bounds)[::2]
+    return [(float(timestamps[start]), float(timestamps[end] + interval), float(peak[i]),
+             float(amount[end + 1] - amount[start]), int(n_wet[end + 1] - n_wet[start]))
+            for i, (start, end) in enumerate(zip(first, last))]
+
+
+def update_events(con, station: str, sensor_name: str, day: date,  # pylint: disable=too-many-positional-arguments
+                  events: List[Tuple[float, float, float, float, int]], max_gap: int):
+    """
+    This function replaces the events of a sensor on a day in the catalog, in one transaction. The first event of
+    the day continues the last event before it if the dry gap between them is at most max_gap seconds, and the
+    first event after the day is relinked the same way.
+    :param con: the connection to the event catalog
+    :param station: the station code
+    :param sensor_name: the sensor name
+    :param day: the day of the events
+    :param events: the events of the day, as returned by detect_events
+    :param max_gap: the longest dry gap within an event in seconds
+    """
+    day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+    cur = con.cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        cur.execute('DELETE FROM event_parts WHERE sensor_name = ? AND day = ?', (sensor_name, day.isoformat()))
+        previous = cur.execute('SELECT event_start, end_time FROM event_parts WHERE sensor_name = ?'
+                               ' AND start_time < ? ORDER BY start_time DESC LIMIT 1',
+                               (sensor_name, day_start)).fetchone()
+        rows = []
+        for start_time, end_time, peak_intensity, total_amount, n_minutes in events:
+            event_start = start_time
+            if previous is not None and start_time - previous[1] <= max_gap:
+                event_start = previous[0]
+            rows.append((station, sensor_name, day.isoformat(), event_start, start_time, end_time, peak_intensity,
+                         total_amount, n_minutes))
+            previous = (event_start, end_time)
+        cur.executemany(INSERT_PART_QUERY, rows)
+
+        following = cur.execute('SELECT event_start, start_time FROM event_parts WHERE sensor_name = ?'
+                                ' AND start_time >= ? ORDER BY start_time LIMIT 1',
+                                (sensor_name, day_start + 86400)).fetchone()
+        if following is not None:
+            linked = previous is not None and following[1] - previous[1] <= max_gap
+            cur.execute('UPDATE event_parts SET event_start = ? WHERE sensor_name = ? AND event_start = ?'
+                        ' AND start_time >= ?',
+                        (previous[0] if linked else following[1], sensor_name, following[0], following[1]))
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def query_events(con, start: date, end: date, station: Union[str, None] = None,  # pylint: disable=too-many-positional-arguments
+                 sensor_name: Union[str, None] = None, min_peak: Union[float, None] = None,
+                 min_total: Union[float, None] = None) -> List[Dict]:
+    """
+    This function queries the events that start from start to end (inclusive) from the catalog.
+    :param con: the connection to the event catalog
+    :param start: the first day
+    :param end: the last day
+    :param station: only the events of this station, None for all stations
+    :param sensor_name: only the events of this sensor, None for all sensors
+    :param min_peak: only the events with at least this peak intensity [mm/h]
+    :param min_total: only the events with at least this total amount [mm]
+    :return: a dictionary per event with the keys of EVENT_KEYS, in time order
+    """
+    start_ts = datetime(start.year, start.month, start.day, tzinfo=timezone.utc).timestamp()
+    end_ts = start_ts + ((end - start).days + 1) * 86400
+    conditions, params = ['start_time >= ?', 'start_time < ?'], [start_ts, end_ts]
+    for condition, value in (('station = ?', station), ('sensor_name = ?', sensor_name),
+                             ('peak_intensity >= ?', min_peak), ('total_amount >= ?', min_total)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    cur = con.cursor()
+    cur.row_factory = None
+    rows = cur.execute(f"SELECT {', '.join(EVENT_KEYS)} FROM events WHERE {' AND '.join(conditions)}"
+                       ' ORDER BY start_time', params).fetchall()
+    cur.close()
+    return [dict(zip(EVENT_KEYS, row)) for row in rows]
+
+
+def events_from_telegrams(telegram_objs: List, config_dict: Dict) -> List[Tuple[float, float, float, float, int]]:
+    """
+    This function detects the events of a day in telegram objects, ie. at export.
+    :param telegram_objs: the telegram objects of the day, in time order
+    :param config_dict: the combined site specific and general config
+    :return: the events of the day, as returned by detect_events
+    """
+    events_config = config_dict['events']
+    return detect_events(
+        timestamps=numpy.array([telegram_obj.timestamp.timestamp() for telegram_obj in telegram_objs]),
+        intensity=to_values([telegram_obj.telegram_data.get(events_config['intensity_field'])
+                             for telegram_obj in telegram_objs]),
+        n_particles=to_values([telegram_obj.telegram_data.get(events_config['particles_field'])
+                               for telegram_obj in telegram_objs]),
+        events_config=events_config,
+        interval=config_dict['variables']['interval']['value'][0])
+
+
+def events_from_netCDF(path: Path, config_dict: Dict) -> Tuple[date, List[Tuple[float, float, float, float, int]]]:
+    """
+    This function detects the events of a day in an exported netCDF, ie. to fill the catalog with earlier days.
+    :param path: the netCDF of the day
+    :param config_dict: the combined site specific and general config
+    :return: the day of the netCDF, and its events as returned by detect_events
+    """
+    events_config = config_dict['events']
+    telegram_fields = config_dict['telegram_fields']
+    with Dataset(path, 'r') as nc_file:
+        time_var = nc_file.variables['time']
+        timestamps = numpy.array([
+            time.replace(tzinfo=timezone.utc).timestamp()
+            for time in num2date(time_var[:], units=time_var.units, calendar=time_var.calendar,
+                                 only_use_cftime_datetimes=False, only_use_python_datetimes=True)])
+        intensity, n_particles = [
+            numpy.ma.filled(nc_file.variables[telegram_fields[field]['var_attrs']['standard_name']][:]
+                            .astype(float), numpy.nan)
+            for field in (events_config['intensity_field'], events_config['particles_field'])]
+        interval = int(nc_file.variables['time_interval'][:])
+    day = datetime.fromtimestamp(timestamps[0], tz=timezone.utc).date()
+    return day, detect_events(timestamps, intensity, n_particles, events_config, interval)
@@ -1,39 +1,146 @@
 """
 This module is used to create a logger object that logs to a file.
 
+Log records are handed to a queue by the logger and written to the file by a
+background listener thread, so that slow disks do not delay the acquisition loop.
+
+Classes:
+- JsonFormatter: formats log records as one JSON object per line
+- LevelSampler: filter that only lets through 1 out of every N records of a level
+
 Functions:
 - log: creates a logger object
+- stop_listener: flushes and stops a queue listener and closes its file handlers
+- stop_log_listeners: flushes and stops all running queue listeners
 """
 
+import atexit
 import logging
 import json
+import queue
 import time
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+from typing import Dict, Union
 
+# running queue listeners, by logger name
+_listeners: Dict[str, QueueListener] = {}
 
-def log(log_path, log_name):
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter that writes each log record as one JSON object per line.
+    The message is encoded by json.dumps, so quotes and newlines in messages are escaped correctly.
+    """
+
+    converter = time.gmtime  # set log time to utc/gmt
+
+    def format(self, record):
+        """
+        Formats a log record as a JSON string.
+        :param record: the log record
+        :return: the JSON string
+        """
+        log_dict = {'date': self.formatTime(record),
+                    'name': record.name,
+                    'level': record.levelname,
+                    'msg': record.getMessage(),
+                    }
+        if record.exc_info:
+            log_dict['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(log_dict)
+
+
+class LevelSampler(logging.Filter):
+    """
+    Filter that only lets through 1 out of every N log records of a level,
+    used to thin out high volume (debug) messages.
+
+    Attributes:
+    - sample_rates: dictionary of level (name or number) to N
+    - counters: number of records seen so far per level
+    """
+
+    def __init__(self, sample_rates: Dict[Union[str, int], int]):
+        """
+        Constructor for LevelSampler.
+        :param sample_rates: dictionary of level (name or number) to N, ie. {'DEBUG': 10}
+        """
+        super().__init__()
+        self.sample_rates = {logging.getLevelName(level) if isinstance(level, str) else level: int(rate)
+                             for level, rate in sample_rates.items()}
+        self.counters = {level: 0 for level in self.sample_rates}
+
+    def filter(self, record):
+        """
+        Decides whether the record is passed on.
+        :param record: the log record
+        :return: True if the record should be logged
+        """
+        rate = self.sample_rates.get(record.levelno)
+        if rate is None or rate <= 1:
+            return True
+        count = self.counters[record.levelno]
+        self.counters[record.levelno] = count + 1
+        return count % rate == 0
+
+
+def log(log_path, log_name, queued=False, sample_rates=None):
     """
     This function creates a logger object that logs to a file.
     :param log_path: the path to the log file
     :param log_name: the name of the logger
+    :param queued: whether log records are written to file by a background thread
+    :param sample_rates: optional dictionary of level to N, only 1 in N records of that level is logged
     :return: logger object
     """
     logger = logging.getLogger(log_name)
-    logging.Formatter.converter = time.gmtime  # set log time to utc/gmt
-    log_format = logging.Formatter(
-        json.dumps({'date': '%(asctime)s',
-                    'name': '%(name)s',
-                    'level': '%(levelname)s',
-                    'msg': '%(message)s',
-                    })
-    )
     log_handler = TimedRotatingFileHandler(
         filename=log_path,
         when='midnight',
         backupCount=7,
         utc=True)
     log_handler.suffix = "%Y%m%d"
-    log_handler.setFormatter(log_format)
+    log_handler.setFormatter(JsonFormatter())
+
+    if queued:
+        # replace the handlers of a previous call for the same logger
+        if log_name in _listeners:
+            stop_listener(_listeners.pop(log_name))
+            for handler in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+                logger.removeHandler(handler)
+                handler.close()
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, log_handler, respect_handler_level=True)
+        listener.start()
+        _listeners[log_name] = listener
+        log_handler = QueueHandler(log_queue)
+
+    if sample_rates:
+        # filter before the record is queued, so dropped records cost as little as possible
+        log_handler.addFilter(LevelSampler(sample_rates))
+
     logger.addHandler(log_handler)
     logger.setLevel(logging.DEBUG)
     return logger
+
+
+def stop_listener(listener: QueueListener):
+    """
+    This function flushes the queued log records of a listener to file, stops its thread and closes its file handlers.
+    :param listener: the queue listener
+    """
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def stop_log_listeners():
+    """
+    This function flushes the queued log records to file, stops the listener threads and closes their file handlers.
+    """
+    while _listeners:
+        _, listener = _listeners.popitem()
+        stop_listener(listener)
+
+
+atexit.register(stop_log_listeners)
@@ -0,0 +1,203 @@
+"""
+This module contains the merge of exported netCDFs of a range of days, ie. the daily netCDFs of a month or a year,
+into one netCDF for long-term analysis and data publication.
+
+The netCDFs are appended one at a time along the unlimited time dimension (and the particle dimension), so only the
+variables of one netCDF are in memory, however long the range: a year of full files with the raw spectra is merged
+with the memory of a day. The variables along the time dimension are chunked for reading time series, ie. the
+rain intensity of a year or the spectra of a month, instead of the chunks of a day. The time is stored in double
+precision, as the hours of a year in single precision are only precise to a few seconds. The variable attributes
+and global attributes are taken from the config, the attributes that are not in the config from the first netCDF.
+
+Functions:
+- config_var_attrs: Returns the attributes in the config of each netCDF variable.
+- time_chunk_size: Returns the number of time steps of the chunks of a variable along the time dimension.
+- variable_definitions: Returns the union of the variables of the netCDFs, read from their headers.
+- create_merged_variables: Creates the dimensions and variables of the merged netCDF.
+- append_netCDF: Appends the variables along the time and particle dimensions of a netCDF to the merged netCDF.
+- merge_netCDF: Writes one netCDF with the variables of netCDFs of a range of days appended along time.
+"""
+
+from datetime import datetime, timezone
+from logging import Logger
+from pathlib import Path
+from typing import Dict, List
+import numpy
+from cftime import num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+from modules.reader import decode_variable
+
+# the config sections with netCDF variable definitions
+VARIABLE_SECTIONS = ('variables', 'telegram_fields', 'particle_variables', 'dsd_variables', 'filter_variables',
+                     'qc_variables')
+# the size of the chunks of the variables along the time dimension, in bytes before compression
+CHUNK_BYTES = 1 << 20
+# the maximum number of time steps of a chunk, about half a year of 1-minute values
+MAX_CHUNK_STEPS = 1 << 18
+# the dimensions that grow with every appended netCDF
+APPENDED_DIMENSIONS = ('time', 'particle')
+
+
+def config_var_attrs(config_dict: Dict) -> Dict[str, Dict]:
+    """
+    This function returns the attributes in the config of each netCDF variable.
+    :param config_dict: the combined site specific and general config
+    :return: dictionary of the netCDF variable name (standard_name) to its attributes
+    """
+    return {var_dict['var_attrs']['standard_name']: var_dict['var_attrs']
+            for section in VARIABLE_SECTIONS for var_dict in config_dict.get(section, {}).values()}
+
+
+def time_chunk_size(step_shape: tuple, itemsize: int, chunk_bytes: int = CHUNK_BYTES) -> int:
+    """
+    This function returns the number of time steps of the chunks of a variable along the time dimension, so a chunk
+    holds about chunk_bytes: a long run of time steps for a single value per time step, fewer for a spectrum.
+    :param step_shape: the shape of the variable at one time step, ie. () or (32, 32)
+    :param itemsize: the size of a value in bytes
+    :param chunk_bytes: the size of the chunks in bytes
+    :return: the number of time steps of a chunk
+    """
+    step_bytes = itemsize * int(numpy.prod(step_shape, dtype=numpy.int64))
+    return int(min(MAX_CHUNK_STEPS, max(1, chunk_bytes // step_bytes)))
+
+
+def variable_definitions(paths: List[Path]) -> Dict[str, Dict]:
+    """
+    This function returns the structure of the merged netCDF: the union of the variables of the netCDFs, read from
+    their headers only.
+    :param paths: the netCDFs, in time order
+    :return: dictionary of the variable name to its datatype, dimensions, shape of a time step and attributes
+    :raises ValueError: if the netCDFs are of different sensors or intervals
+    """
+    definitions, sensors, intervals = {}, set(), set()
+    for path in paths:
+        with Dataset(path, 'r') as nc_file:
+            sensors.add(nc_file.getncattr('sensor_name') if 'sensor_name' in nc_file.ncattrs() else None)
+            intervals.add(int(nc_file.variables['time_interval'][:]))
+            for name, var in nc_file.variables.items():
+                if name not in definitions:
+                    definitions[name] = {
+                        'datatype': var.datatype, 'dimensions': var.dimensions, 'is_str': var.dtype == str,
+                        'step_shape': var.shape[1:], 'attrs': {key: var.getncattr(key) for key in var.ncattrs()}}
+    if len(sensors) > 1 or len(intervals) > 1:
+        raise ValueError(f'Cannot merge netCDFs of sensors {sorted(map(str, sensors))}'
+                         f' and intervals {sorted(intervals)}')
+    return definitions
+
+
+def create_merged_variables(nc_out: Dataset, first: Dataset, definitions: Dict[str, Dict], config_dict: Dict,
+                            chunk_bytes: int) -> float:
+    """
+    This function creates the dimensions and variables of the merged netCDF, with the global attributes, and writes
+    the variables without the appended dimensions from the first netCDF.
+    :param nc_out: the merged netCDF
+    :param first: the first netCDF
+    :param definitions: the variable definitions, see variable_definitions
+    :param config_dict: the combined site specific and general config, for the attributes
+    :param chunk_bytes: the size of the chunks of the variables along the time dimension in bytes
+    :return: the POSIX timestamp of the start of the day of the first netCDF, the origin of the merged time
+    """
+    attrs = config_var_attrs(config_dict)
+    nc_out.setncatts({**{key: first.getncattr(key) for key in first.ncattrs() if key != 'qc_summary'},
+                      **config_dict['global_attrs']})
+    for name, dimension in first.dimensions.items():
+        nc_out.createDimension(name, None if name in APPENDED_DIMENSIONS else len(dimension))
+    if 'particle' not in nc_out.dimensions and any('particle' in definition['dimensions']
+                                                   for definition in definitions.values()):
+        nc_out.createDimension('particle', None)
+
+    # the time of the merged netCDF is in hours since the day of the first netCDF
+    first_day = num2date(0, units=first.variables['time'].units, calendar=first.variables['time'].calendar,
+                         only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+    for name, definition in definitions.items():
+        datatype = 'f8' if name == 'time' else definition['datatype']
+        dimensions, step_shape = definition['dimensions'], definition['step_shape']
+        chunksizes = None
+        if dimensions and dimensions[0] in APPENDED_DIMENSIONS and not definition['is_str']:
+            chunksizes = (time_chunk_size(step_shape, numpy.dtype(datatype).itemsize, chunk_bytes),) + step_shape
+        out_var = nc_out.createVariable(name, datatype, dimensions,
+                                        fill_value=definition['attrs'].get('_FillValue'),
+                                        compression=None if definition['is_str'] else 'zlib', shuffle=True,
+                                        chunksizes=chunksizes)
+        out_var.setncatts({**{key: value for key, value in definition['attrs'].items() if key != '_FillValue'},
+                           **attrs.get(name, {})})
+        if name == 'time':
+            out_var.setncattr('units', f"hours since {first_day:%Y-%m-%d} 00:00:00 +00:00")
+        if not set(dimensions) & set(APPENDED_DIMENSIONS) and name in first.variables:
+            out_var[...] = first.variables[name][...]
+    return datetime(first_day.year, first_day.month, first_day.day, tzinfo=timezone.utc).timestamp()
+
+
+def append_netCDF(nc_out: Dataset, nc_file: Dataset, timestamps: numpy.ndarray, positions: Dict[str, int],
+                  origin: float):
+    """
+    This function appends the variables along the time and particle dimensions of a netCDF to the merged netCDF.
+    :param nc_out: the merged netCDF
+    :param nc_file: the netCDF to append
+    :param timestamps: the POSIX timestamps of the time steps of the netCDF
+    :param positions: the size of each appended dimension of the merged netCDF so far, updated in place
+    :param origin: the POSIX timestamp of the origin of the merged time
+    """
+    sizes = {name: len(nc_file.dimensions[name]) if name in nc_file.dimensions else 0
+             for name in APPENDED_DIMENSIONS}
+    for name, var in nc_file.variables.items():
+        if not var.dimensions or var.dimensions[0] not in APPENDED_DIMENSIONS:
+            continue
+        dimension = var.dimensions[0]
+        index = slice(positions[dimension], positions[dimension] + sizes[dimension])
+        if name == 'time':
+            nc_out.variables['time'][index] = (timestamps - origin) / 3600
+        else:
+            nc_out.variables[name][index] = var[:]
+    for name, size in sizes.items():
+        positions[name] += size
+
+
+def merge_netCDF(paths: List[Path], path_out: Path, config_dict: Dict, logger: Logger,
+                 chunk_bytes: int = CHUNK_BYTES) -> int:
+    """
+    This function writes one netCDF with the variables of netCDFs of the same sensor, version and interval appended
+    along the time dimension. The variables along the particle dimension are appended as well, as the particle_count
+    per time step keeps them a contiguous ragged array. The variables without these dimensions are taken from the
+    first netCDF. A variable that is not in every netCDF is missing for the time steps of the netCDFs without it.
+    The netCDF is written to a temporary file that is renamed to path_out once complete, so a failed merge does not
+    leave a partial netCDF behind.
+    :param paths: the netCDFs, in time order
+    :param path_out: the path of the merged netCDF
+    :param config_dict: the combined site specific and general config, for the attributes
+    :param logger: the logger object
+    :param chunk_bytes: the size of the chunks of the variables along the time dimension in bytes
+    :return: the number of time steps written
+    :raises ValueError: if the netCDFs are of different sensors or intervals, or their time steps overlap
+    """
+    definitions = variable_definitions(paths)
+    path_tmp = path_out.with_name(f'tmp_{path_out.name}')
+    positions = dict.fromkeys(APPENDED_DIMENSIONS, 0)
+    start_time, last_time = None, None
+    try:
+        with Dataset(paths[0], 'r') as first, Dataset(path_tmp, 'w', format='NETCDF4') as nc_out:
+            origin = create_merged_variables(nc_out, first, definitions, config_dict, chunk_bytes)
+
+            # the netCDFs are appended one at a time, so only the variables of one netCDF are in memory
+            for path in paths:
+                with Dataset(path, 'r') as nc_file:
+                    timestamps = decode_variable(nc_file, 'time')
+                    if len(timestamps) == 0:
+                        continue
+                    if last_time is not None and timestamps[0] <= last_time:
+                        raise ValueError(f'Time steps of {path} overlap the netCDFs before it')
+                    start_time = timestamps[0] if start_time is None else start_time
+                    last_time = timestamps[-1]
+                    append_netCDF(nc_out, nc_file, timestamps, positions, origin)
+
+            if start_time is not None:
+                nc_out.setncattr('time_coverage_start',
+                                 datetime.fromtimestamp(start_time, tz=timezone.utc).isoformat())
+                nc_out.setncattr('time_coverage_end', datetime.fromtimestamp(last_time, tz=timezone.utc).isoformat())
+        path_tmp.replace(path_out)
+    finally:
+        path_tmp.unlink(missing_ok=True)
+
+    logger.info(msg=f"Merged {positions['time']} time steps of {len(paths)} netCDF: {path_out}")
+    return positions['time']
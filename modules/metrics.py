@@ -0,0 +1,187 @@
+"""
+This module contains classes for timing the stages of the acquisition cycle
+and exporting the timings as Prometheus metrics.
+
+Classes:
+- Histogram: cumulative histogram of observed durations
+- CycleMetrics: per stage histograms of one sensor, written to a Prometheus text file
+
+Functions:
+- write_prometheus_file: atomically writes Prometheus metrics to a text file
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic
+from typing import Dict, List, Sequence, Union
+
+# bucket upper bounds in seconds, from fast DB commits up to a full minute cycle
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# stages of one acquisition cycle in main.main
+CYCLE_STAGES = ('wakeup_lateness', 'db_connect', 'read', 'parse', 'insert', 'commit', 'write')
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed durations, following the Prometheus histogram type.
+
+    Attributes:
+    - buckets: sorted bucket upper bounds in seconds
+    - counts: number of observations per bucket (not cumulative)
+    - count: total number of observations
+    - total: sum of all observations
+    - last: the last observed value
+    - max: the largest observed value
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Constructor for Histogram.
+        :param buckets: bucket upper bounds in seconds
+        """
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """
+        Adds an observation to the histogram.
+        :param value: the observed duration in seconds
+        """
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self) -> List[int]:
+        """
+        Returns the cumulative number of observations per bucket.
+        :return: list of cumulative counts, one per bucket
+        """
+        cumulative = []
+        running = 0
+        for count in self.counts:
+            running += count
+            cumulative.append(running)
+        return cumulative
+
+
+class CycleMetrics:
+    """
+    Keeps per stage timing histograms of the acquisition cycle of one sensor.
+
+    Attributes:
+    - sensor_name: name of the sensor, used as metric label
+    - histograms: dictionary of stage name to Histogram
+    - cycles: number of completed cycles
+    - last_cycle: the stage durations of the last completed cycle
+
+    Functions:
+    - stage: context manager that times a stage with a monotonic clock
+    - observe: adds a duration for a stage
+    - end_cycle: marks the end of a cycle
+    - to_prometheus: returns the metrics in the Prometheus text format
+    - write: writes the metrics to a Prometheus text file
+    """
+
+    def __init__(self, sensor_name: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Constructor for CycleMetrics.
+        :param sensor_name: name of the sensor, used as metric label
+        :param buckets: bucket upper bounds in seconds
+        """
+        self.sensor_name = sensor_name
+        self.buckets = buckets
+        self.histograms: Dict[str, Histogram] = {stage: Histogram(buckets) for stage in CYCLE_STAGES}
+        self.cycles = 0
+        self.last_cycle: Dict[str, float] = {}
+        self._current_cycle: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager that times the enclosed block as stage `name` with a monotonic clock.
+        :param name: name of the stage
+        """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - start)
+
+    def observe(self, name: str, seconds: float):
+        """
+        Adds a duration for a stage of the current cycle.
+        :param name: name of the stage
+        :param seconds: the duration in seconds
+        """
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(self.buckets)
+        self.histograms[name].observe(seconds)
+        self._current_cycle[name] = self._current_cycle.get(name, 0.0) + seconds
+
+    def end_cycle(self) -> Dict[str, float]:
+        """
+        Marks the end of a cycle.
+        :return: the stage durations of the cycle that ended
+        """
+        self.cycles += 1
+        self.last_cycle = self._current_cycle
+        self._current_cycle = {}
+        return self.last_cycle
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        :return: the metrics as string
+        """
+        name = 'disdrodl_cycle_stage_seconds'
+        lines = [f'# HELP {name} Duration of the stages of the acquisition cycle.',
+                 f'# TYPE {name} histogram']
+        for stage, histogram in self.histograms.items():
+            labels = f'sensor="{self.sensor_name}",stage="{stage}"'
+            for upper_bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                lines.append(f'{name}_bucket{{{labels},le="{upper_bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+        labels = f'sensor="{self.sensor_name}"'
+        lines.append('# HELP disdrodl_cycle_stage_last_seconds Duration of the stages of the last cycle.')
+        lines.append('# TYPE disdrodl_cycle_stage_last_seconds gauge')
+        for stage, seconds in self.last_cycle.items():
+            lines.append(f'disdrodl_cycle_stage_last_seconds{{{labels},stage="{stage}"}} {seconds}')
+        lines.append('# HELP disdrodl_cycles_total Number of completed acquisition cycles.')
+        lines.append('# TYPE disdrodl_cycles_total counter')
+        lines.append(f'disdrodl_cycles_total{{{labels}}} {self.cycles}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Union[str, Path]):
+        """
+        Writes the metrics to a Prometheus text file.
+        :param path: the path of the text file, ie. in the node_exporter textfile collector directory
+        """
+        write_prometheus_file(path, self.to_prometheus())
+
+
+def write_prometheus_file(path: Union[str, Path], text: str):
+    """
+    This function atomically writes Prometheus metrics to a text file,
+    so that a collector never reads a half written file.
+    :param path: the path of the text file
+    :param text: the metrics in the Prometheus text format
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as tmp_file:
+        tmp_file.write(text)
+    os.replace(tmp_path, path)
@@ -18,6 +18,10 @@ import numpy
 from cftime import date2num
 from netCDF4 import Dataset  # pylint: disable=no-name-in-module
 
+from modules.dsd import spectra_cube, effective_area, velocity_mask, filter_spectra, dsd_moments
+from modules.qc import to_values, qc_rules, qc_flags, qc_summary, flag_attrs
+from modules.profiler import StageProfiler
+
 
 class NetCDF:
     """
@@ -31,6 +35,7 @@ class NetCDF:
     - full_version: bool to indicate whether this netCDF is a full or light version
     - telegram_objs: list with all telegram objects
     - date_dt: the date from when the data is
+    - profiler: StageProfiler measuring the write time of the telegram fields and the derived products
     - path_netCDF: full path for the netCDF file
     - path_netCDF_temp: additional temporary path for the netCDF file
 
@@ -39,6 +44,15 @@ class NetCDF:
     - write_data_to_netCDF: chooses the right function to write data to the netCDF file
     - write_data_to_netCDF_thies: writes data from ThiesTelegram objects to the netCDF file
     - write_data_to_netCDF_parsivel: writes data from ParsivelTelegram objects to the netCDF file
+    - __write_telegram_fields_thies: writes the telegram fields of ThiesTelegram objects to the netCDF file
+    - __write_telegram_fields_parsivel: writes the telegram fields of ParsivelTelegram objects to the netCDF file
+    - __include_particles: checks if the particles of field 61 are written to this netCDF
+    - __write_particles: writes the particles of field 61 as a contiguous ragged array
+    - __include_dsd: checks if the DSD products are written to this netCDF
+    - __include_filter: checks if the velocity filtered spectrum is written to this netCDF
+    - __write_spectrum_products: writes the velocity filtered spectrum and the DSD products of the raw spectra
+    - __include_qc: checks if the QC flags are written to this netCDF
+    - __write_qc: writes the QC flags of all time steps and the QC summary of the day
     - compress: compresses the netCDF file
     - __set_netCDF_path: sets the path of the netCDF based on fn_start
     - __netcdf_populate_s4_var: populates netCDF S4 vars
@@ -51,7 +65,7 @@ class NetCDF:
     def __init__(self, logger: Logger, config_dict: Dict, data_dir: Path, fn_start: str, full_version,
                  # pylint: disable=redefined-outer-name
                  telegram_objs: List[Dict],
-                 date: datetime) -> None:
+                 date: datetime, profiler: Union[StageProfiler, None] = None) -> None:
         """
         Constructor for NetCDF.
         """
@@ -62,6 +76,7 @@ class NetCDF:
         self.date_dt = date
         self.telegram_objs = telegram_objs
         self.full_version = full_version
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
         logger.debug(msg="NetCDF class is initialized")
 
     def create_netCDF(self):
@@ -109,73 +124,16 @@ class NetCDF:
         self.__netcdf_populate_s4_var(netCDF_var_=netCDF_var_datetime, var_key_='timestamp')
 
         # --- NetCDF variables in telegram_data ---
-        for key in self.telegram_objs[0].telegram_data.keys():  # pylint: disable=too-many-nested-blocks
-
-            # checks if key is not in the telegram fields or if the value from the telegram should not be added
-            # to the netcdf (either should never be added or a light netcdf has been requested), if that is the
-            # case go onto next key
-            if key not in self.config_dict['telegram_fields'].keys() or \
-                    ((self.full_version is True and
-                      self.config_dict['telegram_fields'][key].get('include_in_nc') == 'never') or
-                     (self.full_version is False and
-                      self.config_dict['telegram_fields'][key].get('include_in_nc') != 'always')):
-                continue
+        with self.profiler.stage('write telegram fields'):
+            self.__write_telegram_fields_thies(nc_rootgrp=netCDF_rootgrp)
 
-            field_dict = self.config_dict['telegram_fields'][key]
-            standard_name = field_dict['var_attrs']['standard_name']
-            netCDF_var = netCDF_rootgrp.variables[standard_name]
+        if self.__include_filter() or self.__include_dsd():
+            with self.profiler.stage('write spectrum products'):
+                self.__write_spectrum_products(nc_rootgrp=netCDF_rootgrp)
 
-            # import pdb; pdb.set_trace()
-            # message for the debugger
-            nc_details = (f'Handling values from NetCDF var: {key}, {netCDF_var.standard_name},'
-                          f' {netCDF_var.dtype}, {netCDF_var._vltype}, {netCDF_var._isvlen},'  # pylint: disable=protected-access
-                          f' dims: {netCDF_var._getdims()}')  # pylint: disable=W0212
-            logger.debug(msg=nc_details)
-
-            # check that the value in the key value pair is supposed to be of type string,
-            # if so use function for populating strings
-            if netCDF_var.dtype == str:  # S4
-                # assuming S4 vars are only 1D
-                self.__netcdf_populate_s4_var(netCDF_var_=netCDF_var,
-                                              var_key_=key)
-            else:
-
-                # check that the variable has 2 or fewer dimensions and if so add to netCDF
-                if len(netCDF_var._getdims()) <= 2:  # pylint: disable=protected-access
-                    # if(key == '63'):
-                    #     for telegram_obj in self.telegram_objs:
-                    #         print(telegram_obj.telegram_data[key])
-                    all_items_val = [telegram_obj.telegram_data[key] for telegram_obj in self.telegram_objs]
-                    netCDF_var[:] = all_items_val
-
-                # check if variable has more than 2 dimensions and the key
-                # associated with the key:value pair is 81 (only 3D variable in Thies telegram)
-                elif len(netCDF_var._getdims()) > 2 and key == '81':  # pylint: disable=protected-access
-                    all_f81_items_val = []
-
-                    for telegram_obj in self.telegram_objs:
-                        try:
-                            # value associated with key 81 is supposed to be a list of 440
-                            # values representing particle diameter and velocity classes
-                            # this is later converted to a 22x20 matrix
-                            # checks if the value is a list of length 440
-                            assert len(telegram_obj.telegram_data[key]) == 440, \
-                                'telegram_obj.telegram_data["81"] len == 440'
-                        except AssertionError as error:
-                            self.logger.error(msg=f'DB item {telegram_obj.db_row_id}'
-                                                  f' from {telegram_obj.timestamp} {error}'
-                                                  f'. 22x20 ndarray with (error value)'
-                                                  f' -99 will be added instead')
-                            # fills fields with default -99 error value if error has occurred
-                            error_f81 = numpy.full(shape=(22, 20), fill_value='-99', dtype='<U3')
-                            all_f81_items_val.append(error_f81)
-                        else:
-                            # if list was of appropriate size reshapes it into a 22x20 matrix
-                            reshaped_f81 = numpy.array(telegram_obj.telegram_data[key]).reshape(22, 20)
-                            all_f81_items_val.append(reshaped_f81)
-                            self.logger.debug(msg=f'F81 to F520 values from DB item {telegram_obj.db_row_id}'
-                                                  f' from {telegram_obj.timestamp} successfully reshaped')
-                    netCDF_var[:] = all_f81_items_val
+        if self.__include_qc():
+            with self.profiler.stage('write qc'):
+                self.__write_qc(nc_rootgrp=netCDF_rootgrp)
 
         netCDF_rootgrp.close()
         self.logger.info(msg='class NetCDF executed write_data_to_netCDF()')
@@ -200,6 +158,99 @@ class NetCDF:
         self.__netcdf_populate_s4_var(netCDF_var_=netCDF_var_datetime, var_key_='timestamp')
 
         # --- NetCDF variables in telegram_data ---
+        with self.profiler.stage('write telegram fields'):
+            self.__write_telegram_fields_parsivel(nc_rootgrp=netCDF_rootgrp)
+
+        if self.__include_particles():
+            with self.profiler.stage('write particles'):
+                self.__write_particles(nc_rootgrp=netCDF_rootgrp)
+
+        if self.__include_filter() or self.__include_dsd():
+            with self.profiler.stage('write spectrum products'):
+                self.__write_spectrum_products(nc_rootgrp=netCDF_rootgrp)
+
+        if self.__include_qc():
+            with self.profiler.stage('write qc'):
+                self.__write_qc(nc_rootgrp=netCDF_rootgrp)
+
+        netCDF_rootgrp.close()
+        self.logger.info(msg='class NetCDF executed write_data_to_netCDF()')
+
+    def __write_telegram_fields_thies(self, nc_rootgrp):
+        """
+        This function writes the values of the telegram fields of the ThiesTelegram objects to the netCDF file.
+        :param nc_rootgrp: the root group of the netCDF file
+        """
+        for key in self.telegram_objs[0].telegram_data.keys():  # pylint: disable=too-many-nested-blocks
+
+            # checks if key is not in the telegram fields or if the value from the telegram should not be added
+            # to the netcdf (either should never be added or a light netcdf has been requested), if that is the
+            # case go onto next key
+            if key not in self.config_dict['telegram_fields'].keys() or \
+                    ((self.full_version is True and
+                      self.config_dict['telegram_fields'][key].get('include_in_nc') == 'never') or
+                     (self.full_version is False and
+                      self.config_dict['telegram_fields'][key].get('include_in_nc') != 'always')):
+                continue
+
+            field_dict = self.config_dict['telegram_fields'][key]
+            standard_name = field_dict['var_attrs']['standard_name']
+            netCDF_var = nc_rootgrp.variables[standard_name]
+
+            # message for the debugger
+            nc_details = (f'Handling values from NetCDF var: {key}, {netCDF_var.standard_name},'
+                          f' {netCDF_var.dtype}, {netCDF_var._vltype}, {netCDF_var._isvlen},'  # pylint: disable=protected-access
+                          f' dims: {netCDF_var._getdims()}')  # pylint: disable=W0212
+            logger.debug(msg=nc_details)
+
+            with self.profiler.stage(f'write {standard_name}'):
+                # check that the value in the key value pair is supposed to be of type string,
+                # if so use function for populating strings
+                if netCDF_var.dtype == str:  # S4
+                    # assuming S4 vars are only 1D
+                    self.__netcdf_populate_s4_var(netCDF_var_=netCDF_var,
+                                                  var_key_=key)
+                else:
+
+                    # check that the variable has 2 or fewer dimensions and if so add to netCDF
+                    if len(netCDF_var._getdims()) <= 2:  # pylint: disable=protected-access
+                        all_items_val = [telegram_obj.telegram_data[key] for telegram_obj in self.telegram_objs]
+                        netCDF_var[:] = all_items_val
+
+                    # check if variable has more than 2 dimensions and the key
+                    # associated with the key:value pair is 81 (only 3D variable in Thies telegram)
+                    elif len(netCDF_var._getdims()) > 2 and key == '81':  # pylint: disable=protected-access
+                        all_f81_items_val = []
+
+                        for telegram_obj in self.telegram_objs:
+                            try:
+                                # value associated with key 81 is supposed to be a list of 440
+                                # values representing particle diameter and velocity classes
+                                # this is later converted to a 22x20 matrix
+                                # checks if the value is a list of length 440
+                                assert len(telegram_obj.telegram_data[key]) == 440, \
+                                    'telegram_obj.telegram_data["81"] len == 440'
+                            except AssertionError as error:
+                                self.logger.error(msg=f'DB item {telegram_obj.db_row_id}'
+                                                      f' from {telegram_obj.timestamp} {error}'
+                                                      f'. 22x20 ndarray with (error value)'
+                                                      f' -99 will be added instead')
+                                # fills fields with default -99 error value if error has occurred
+                                error_f81 = numpy.full(shape=(22, 20), fill_value='-99', dtype='<U3')
+                                all_f81_items_val.append(error_f81)
+                            else:
+                                # if list was of appropriate size reshapes it into a 22x20 matrix
+                                reshaped_f81 = numpy.array(telegram_obj.telegram_data[key]).reshape(22, 20)
+                                all_f81_items_val.append(reshaped_f81)
+                                self.logger.debug(msg=f'F81 to F520 values from DB item {telegram_obj.db_row_id}'
+                                                      f' from {telegram_obj.timestamp} successfully reshaped')
+                        netCDF_var[:] = all_f81_items_val
+
+    def __write_telegram_fields_parsivel(self, nc_rootgrp):
+        """
+        This function writes the values of the telegram fields of the ParsivelTelegram objects to the netCDF file.
+        :param nc_rootgrp: the root group of the netCDF file
+        """
         for key in self.telegram_objs[0].telegram_data.keys():  # pylint: disable=too-many-nested-blocks
 
             # checks if key is not in the telegram fields or if the value from the telegram should not be added
@@ -214,58 +265,159 @@ class NetCDF:
 
             field_dict = self.config_dict['telegram_fields'][key]
             standard_name = field_dict['var_attrs']['standard_name']
-            netCDF_var = netCDF_rootgrp.variables[standard_name]
+            netCDF_var = nc_rootgrp.variables[standard_name]
 
-            # import pdb; pdb.set_trace()
             # message for the debugger
             nc_details = (f'Handling values from NetCDF var: {key}, {netCDF_var.standard_name},'
                           f' {netCDF_var.dtype}, {netCDF_var._vltype}, {netCDF_var._isvlen},'  # pylint: disable=protected-access
                           f' dims: {netCDF_var._getdims()}')  # pylint: disable=W0212
             logger.debug(msg=nc_details)
 
-            # check that the value in the key value pair is supposed to be of type string,
-            # if so use function for populating strings
-            if netCDF_var.dtype == str:  # S4
-                # assuming S4 vars are only 1D - that's the case for the parsivel
-                self.__netcdf_populate_s4_var(netCDF_var_=netCDF_var,
-                                              var_key_=key)
-            else:
+            with self.profiler.stage(f'write {standard_name}'):
+                # check that the value in the key value pair is supposed to be of type string,
+                # if so use function for populating strings
+                if netCDF_var.dtype == str:  # S4
+                    # assuming S4 vars are only 1D - that's the case for the parsivel
+                    self.__netcdf_populate_s4_var(netCDF_var_=netCDF_var,
+                                                  var_key_=key)
+                else:
+
+                    # check that the variable has 2 or fewer dimensions and if so add to netCDF
+                    if len(netCDF_var._getdims()) <= 2:  # pylint: disable=protected-access
+                        all_items_val = [telegram_obj.telegram_data[key] for telegram_obj in self.telegram_objs]
+                        netCDF_var[:] = all_items_val
+
+
+                    elif len(netCDF_var._getdims()) > 2 and key == '93':  # pylint: disable=protected-access
+                        all_f93_items_val = []
+
+                        for telegram_obj in self.telegram_objs:
+                            try:
+                                # value associated with key 93 is supposed to be a list of 1024
+                                # values, this is later converted to a 32x32 matrix
+                                # checks if the value is a list of length 1024
+                                assert len(telegram_obj.telegram_data[key]) == 1024, \
+                                    'telegram_obj.telegram_data["93"] len != 1024'
+                            except AssertionError as error:
+                                self.logger.error(msg=f'DB item {telegram_obj.db_row_id}'
+                                                      f' from {telegram_obj.timestamp} {error}'
+                                                      f'. 32x32 ndarray with (error value)'
+                                                      f' -99 will be added instead')
+                                # fills fields with default -99 error value if error has occurred
+                                error_f93 = numpy.full(shape=(32, 32), fill_value='-99', dtype='<U3')
+                                all_f93_items_val.append(error_f93)
+                            else:
+                                # if list was of appropriate size reshapes it into a 32x32 matrix
+                                reshaped_f93 = numpy.array(telegram_obj.telegram_data[key]).reshape(32, 32)
+                                all_f93_items_val.append(reshaped_f93)
+                                self.logger.debug(msg=f'F93 values from DB item {telegram_obj.db_row_id}'
+                                                      f' from {telegram_obj.timestamp} successfully reshaped')
+
+                        netCDF_var[:] = all_f93_items_val
+
+    def __include_particles(self) -> bool:
+        """
+        This function checks if the particles of field 61 are captured and written to this netCDF.
+        :return: True if the particle dimension and variables are in the netCDF
+        """
+        return self.config_dict.get('capture_particles', False) is True and \
+            'particle_variables' in self.config_dict.keys() and self.full_version is True
 
-                # check that the variable has 2 or fewer dimensions and if so add to netCDF
-                if len(netCDF_var._getdims()) <= 2:  # pylint: disable=protected-access
-                    all_items_val = [telegram_obj.telegram_data[key] for telegram_obj in self.telegram_objs]
-                    netCDF_var[:] = all_items_val
-
-
-                elif len(netCDF_var._getdims()) > 2 and key == '93':  # pylint: disable=protected-access
-                    all_f93_items_val = []
-
-                    for telegram_obj in self.telegram_objs:
-                        try:
-                            # value associated with key 93 is supposed to be a list of 1024
-                            # values, this is later converted to a 32x32 matrix
-                            # checks if the value is a list of length 1024
-                            assert len(telegram_obj.telegram_data[key]) == 1024, \
-                                'telegram_obj.telegram_data["93"] len != 1024'
-                        except AssertionError as error:
-                            self.logger.error(msg=f'DB item {telegram_obj.db_row_id}'
-                                                  f' from {telegram_obj.timestamp} {error}'
-                                                  f'. 32x32 ndarray with (error value)'
-                                                  f' -99 will be added instead')
-                            # fills fields with default -99 error value if error has occurred
-                            error_f93 = numpy.full(shape=(32, 32), fill_value='-99', dtype='<U3')
-                            all_f93_items_val.append(error_f93)
-                        else:
-                            # if list was of appropriate size reshapes it into a 32x32 matrix
-                            reshaped_f93 = numpy.array(telegram_obj.telegram_data[key]).reshape(32, 32)
-                            all_f93_items_val.append(reshaped_f93)
-                            self.logger.debug(msg=f'F93 values from DB item {telegram_obj.db_row_id}'
-                                                  f' from {telegram_obj.timestamp} successfully reshaped')
-
-                    netCDF_var[:] = all_f93_items_val
+    def __write_particles(self, nc_rootgrp):
+        """
+        This function writes the particles of field 61 as a CF contiguous ragged array:
+        the particles of all telegrams follow each other along the particle dimension,
+        and particle_count holds the number of particles of each time step.
+        :param nc_rootgrp: the root group of the netCDF file
+        """
+        particles = [telegram_obj.particles for telegram_obj in self.telegram_objs
+                     if telegram_obj.particles is not None]
+        counts = [0 if telegram_obj.particles is None else len(telegram_obj.particles)
+                  for telegram_obj in self.telegram_objs]
+        variables = self.config_dict['particle_variables']
+        nc_rootgrp.variables[variables['count']['var_attrs']['standard_name']][:] = counts
+        if sum(counts) == 0:
+            return
+        all_particles = numpy.concatenate(particles)
+        nc_rootgrp.variables[variables['diameter']['var_attrs']['standard_name']][:] = all_particles['diameter']
+        nc_rootgrp.variables[variables['velocity']['var_attrs']['standard_name']][:] = all_particles['velocity']
+
+    def __include_dsd(self) -> bool:
+        """
+        This function checks if the DSD products of the raw spectra are computed and written to this netCDF.
+        :return: True if export_dsd is set and the DSD variables are defined
+        """
+        return self.config_dict.get('export_dsd', False) is True and 'dsd_variables' in self.config_dict.keys()
 
-        netCDF_rootgrp.close()
-        self.logger.info(msg='class NetCDF executed write_data_to_netCDF()')
+    def __include_filter(self) -> bool:
+        """
+        This function checks if the raw spectra are filtered by the velocity mask and written to this netCDF.
+        :return: True if filter_spectrum is set and the filter variables are defined
+        """
+        return self.config_dict.get('filter_spectrum', False) is True and \
+            'filter_variables' in self.config_dict.keys()
+
+    def __write_spectrum_products(self, nc_rootgrp):
+        """
+        This function converts the raw spectra of all telegrams to one array (see modules/dsd.py), and writes the
+        velocity filtered spectrum with the rejected particles, and the DSD products, the ones included in this
+        netCDF. The DSD products are computed from the filtered spectrum if the filter is on.
+        Time steps without a complete spectrum get the fill value.
+        :param nc_rootgrp: the root group of the netCDF file
+        """
+        dsd = self.config_dict['dsd']
+        variables = self.config_dict['variables']
+        cube = spectra_cube([telegram_obj.telegram_data.get(dsd['spectrum_field'])
+                             for telegram_obj in self.telegram_objs],
+                            n_diameter=self.config_dict['dimensions']['diameter_classes']['size'],
+                            n_velocity=self.config_dict['dimensions']['velocity_classes']['size'])
+        diameter_center = numpy.array(variables[dsd['diameter_center']]['value'], dtype=float)
+        velocity_center = numpy.array(variables[dsd['velocity_center']]['value'], dtype=float)
+        products = {}
+        if self.__include_filter():
+            mask = velocity_mask(diameter_center, velocity_center, tolerance=dsd['velocity_tolerance'],
+                                 coefficients=dsd['fall_speed'])
+            cube, rejected = filter_spectra(cube, mask)
+            products['filter_variables'] = {'filtered_spectrum': cube, 'rejected_particles': rejected}
+        if self.__include_dsd():
+            products['dsd_variables'] = dsd_moments(
+                cube, diameter_center=diameter_center,
+                diameter_spread=numpy.array(variables[dsd['diameter_spread']]['value'], dtype=float),
+                velocity_center=velocity_center,
+                area=effective_area(diameter_center, dsd['beam_length'], dsd['beam_width']),
+                interval=variables['interval']['value'][0])
+        for section, section_products in products.items():
+            for key, values in section_products.items():
+                standard_name = self.config_dict[section][key]['var_attrs']['standard_name']
+                if standard_name in nc_rootgrp.variables:
+                    nc_rootgrp.variables[standard_name][:] = numpy.ma.masked_invalid(values)
+
+    def __include_qc(self) -> bool:
+        """
+        This function checks if the QC flags of the qc rules are computed and written to this netCDF.
+        :return: True if export_qc is set and the QC variables are defined
+        """
+        return self.config_dict.get('export_qc', False) is True and 'qc_variables' in self.config_dict.keys()
+
+    def __write_qc(self, nc_rootgrp):
+        """
+        This function evaluates the qc rules over all telegrams of the day (see modules/qc.py), and writes the QC
+        flags with their CF flag_masks and flag_meanings, and the number of flagged time steps of each rule as the
+        qc_summary global attribute.
+        :param nc_rootgrp: the root group of the netCDF file
+        """
+        rules = qc_rules(self.config_dict)
+        fields = {str(rule['field']) for rule in rules.values()}
+        values = {field: to_values([telegram_obj.telegram_data.get(field) for telegram_obj in self.telegram_objs])
+                  for field in fields}
+        timestamps = numpy.array([telegram_obj.timestamp.timestamp() for telegram_obj in self.telegram_objs])
+        flags = qc_flags(values, timestamps, rules)
+        variable = nc_rootgrp.variables[self.config_dict['qc_variables']['flags']['var_attrs']['standard_name']]
+        variable[:] = flags
+        variable.setncatts(flag_attrs(rules))
+        summary = qc_summary(flags, rules)
+        nc_rootgrp.setncattr('qc_summary', ', '.join(f'{name}: {count}' for name, count in summary.items()))
+        self.logger.info(msg=f'QC of {len(flags)} time steps, flagged per rule: {summary}')
 
     def compress(self):
         """
@@ -323,6 +475,21 @@ class NetCDF:
         # variables in telegram
         for key, var_dict in self.config_dict['telegram_fields'].items():
             self.__set_netcdf_variable(key=key, one_var_dict=var_dict, nc_group=nc_rootgrp)
+        # particles of field 61 along the particle dimension
+        if self.__include_particles():
+            for key, var_dict in self.config_dict['particle_variables'].items():
+                self.__set_netcdf_variable(key=key, one_var_dict=var_dict, nc_group=nc_rootgrp)
+        # velocity filtered spectrum and DSD products of the raw spectra
+        if self.__include_filter():
+            for key, var_dict in self.config_dict['filter_variables'].items():
+                self.__set_netcdf_variable(key=key, one_var_dict=var_dict, nc_group=nc_rootgrp)
+        if self.__include_dsd():
+            for key, var_dict in self.config_dict['dsd_variables'].items():
+                self.__set_netcdf_variable(key=key, one_var_dict=var_dict, nc_group=nc_rootgrp)
+        # data-quality flags of the qc rules
+        if self.__include_qc():
+            for key, var_dict in self.config_dict['qc_variables'].items():
+                self.__set_netcdf_variable(key=key, one_var_dict=var_dict, nc_group=nc_rootgrp)
 
     def __set_netcdf_variable(self, key, one_var_dict, nc_group):
         """
@@ -394,6 +561,11 @@ class NetCDF:
         for key in self.config_dict['dimensions'].keys():
             self.logger.info(msg=f'creating netCDF dimension: {key}')
             nc_rootgrp.createDimension(key, self.config_dict['dimensions'][key]['size'])
+        if self.__include_particles():
+            n_particles = sum(len(telegram_obj.particles) for telegram_obj in self.telegram_objs
+                              if telegram_obj.particles is not None)
+            self.logger.info(msg=f'creating netCDF dimension: particle, {n_particles} particles')
+            nc_rootgrp.createDimension('particle', n_particles)
 
     def __global_attrs_to_netCDF(self, nc_rootgrp):
         """
@@ -0,0 +1,327 @@
+"""
+This module contains the export of a day of several sensors of the same type, ie. the Parsivels of all Ruisdael
+stations, to one netCDF with a station dimension, so a regional product reads the whole network in one I/O operation
+instead of opening a netCDF per sensor.
+
+The sensors are exported in parallel, one worker process per sensor: it queries the database of the sensor, parses
+the telegrams and writes them to a temporary netCDF with the NetCDF class of the daily export, so the network netCDF
+has the same variables, DSD products and QC flags as the netCDFs of the sensors. Processes are used instead of
+threads as parsing and writing are bound by the CPU, and the netCDF library is not thread safe.
+The variables along the time dimension are stacked along the station dimension on the time steps of the interval of
+the day, ie. 1440 minutes, and a time step that a sensor misses has the fill value. The exact time of the telegram
+of every time step is kept in the datetime variable. The site variables (latitude, longitude, altitude) and the
+global attributes that differ per sensor (STATION_ATTRS) become variables along the station dimension.
+The particles of field 61 are not included, as they are a ragged array per sensor.
+
+Functions:
+- check_network: Checks that the sensors can be exported to one netCDF and returns their interval.
+- network_name: Returns the file name of the network netCDF of a day.
+- station_telegrams: Queries and parses the telegrams of a sensor of a day.
+- station_steps: Returns the time step of the day of each telegram timestamp.
+- kept_steps: Returns which telegrams are written: the first telegram of each time step of the day.
+- write_station_variables: Writes the variables along the station dimension from the site configs.
+- write_network_netCDF: Writes the netCDFs of the sensors to one netCDF with a station dimension.
+- export_station: Exports a day of a sensor to a netCDF, in a worker process.
+- export_network: Exports a day of several sensors to one netCDF with a station dimension.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from itertools import repeat
+from logging import Logger
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import numpy
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+from modules.coverage import MIN_TELEGRAM_LENGTH
+from modules.merge import config_var_attrs, time_chunk_size, CHUNK_BYTES
+from modules.netCDF import NetCDF
+from modules.sqldb import DBRouter, DEFAULT_ARRAYSIZE
+from modules.telegram import create_telegram
+
+# the global attributes that differ per sensor, written as variables along the station dimension
+STATION_ATTRS = ('site_name', 'sensor_name', 'sensor_serial_number')
+# the site variables of the site configs, written as coordinates along the station dimension
+SITE_VARIABLES = ('latitude', 'longitude', 'altitude')
+# the field that a telegram of each sensor type has if it holds data, see export_disdrodlDB2NC.py
+DATA_FIELDS = {'OTT Hydromet Parsivel2': '90', 'Thies Clima': '11'}
+# the sensor type in the file name of the network netCDF
+NETWORK_NAMES = {'OTT Hydromet Parsivel2': 'parsivel', 'Thies Clima': 'thies'}
+
+
+def check_network(config_dicts: List[Dict]) -> int:
+    """
+    This function checks that the sensors can be exported to one netCDF: they are of the same sensor type and
+    interval, and the sensor names are unique.
+    :param config_dicts: the combined site specific and general configs of the sensors
+    :return: the interval of the sensors in seconds
+    :raises ValueError: if there are no sensors, or the sensors cannot be exported to one netCDF
+    """
+    if not config_dicts:
+        raise ValueError('No sensors to export')
+    sensor_types = {config_dict['global_attrs']['sensor_type'] for config_dict in config_dicts}
+    intervals = {config_dict['variables']['interval']['value'][0] for config_dict in config_dicts}
+    sensor_names = [config_dict['global_attrs']['sensor_name'] for config_dict in config_dicts]
+    if len(sensor_types) > 1 or len(intervals) > 1:
+        raise ValueError(f'Cannot export sensor types {sorted(sensor_types)} and intervals {sorted(intervals)}'
+                         f' to one netCDF')
+    if len(set(sensor_names)) < len(sensor_names):
+        raise ValueError(f'Sensor names {sensor_names} are not unique')
+    return int(intervals.pop())
+
+
+def network_name(config_dicts: List[Dict], day: datetime, full_version: bool = True) -> str:
+    """
+    This function returns the file name of the network netCDF of a day, ie. 20240101_network_parsivel.nc.
+    :param config_dicts: the combined site specific and general configs of the sensors
+    :param day: the day of the netCDF
+    :param full_version: False for the light version
+    :return: the file name
+    """
+    sensor_type = NETWORK_NAMES[config_dicts[0]['global_attrs']['sensor_type']]
+    return f"{day:%Y%m%d}_network_{sensor_type}{'' if full_version else '_light'}.nc"
+
+
+def station_telegrams(config_dict: Dict, date_dt: datetime, logger: Logger) -> List:
+    """
+    This function queries the telegrams of a sensor of a day from its database and parses them, as the daily
+    export does. The rows are queried through the DBRouter of the sensor, which opens its own database connection,
+    so the sensors can be queried in parallel, and which returns no rows if the database does not exist.
+    :param config_dict: the combined site specific and general config of the sensor
+    :param date_dt: the day
+    :param logger: the logger object
+    :return: the Telegram objects with data, in time order
+    """
+    db_router = DBRouter(db_path=Path(config_dict['data_dir']) / config_dict['db_filename'],
+                         partitioned=config_dict.get('partition_db', False))
+    day_start = date_dt.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc).timestamp()
+    data_field = DATA_FIELDS[config_dict['global_attrs']['sensor_type']]
+
+    telegram_objs = []
+    for row in db_router.query_rows_gen(day_start, day_start + 86400,
+                                        arraysize=config_dict.get('db_arraysize', DEFAULT_ARRAYSIZE)):
+        if len(row.get('telegram') or '') > MIN_TELEGRAM_LENGTH:
+            telegram_instance = create_telegram(config_dict=config_dict,
+                                                telegram_lines=row.get('telegram'),
+                                                db_row_id=row.get('id'),
+                                                timestamp=datetime.fromtimestamp(row.get('timestamp'),
+                                                                                 tz=timezone.utc),
+                                                db_cursor=None,
+                                                telegram_data={},
+                                                logger=logger)
+            telegram_instance.parse_telegram_row()
+            if data_field in telegram_instance.telegram_data.keys():
+                telegram_objs.append(telegram_instance)
+    logger.info(msg=f"{len(telegram_objs)} telegrams of {config_dict['global_attrs']['sensor_name']}"
+                    f" on {date_dt:%Y-%m-%d}")
+    return telegram_objs
+
+
+def station_steps(timestamps: numpy.ndarray, day_start: float, interval: int) -> numpy.ndarray:
+    """
+    This function returns the time step of the day of each telegram timestamp: the interval it falls in.
+    :param timestamps: the POSIX timestamps of the telegrams
+    :param day_start: the POSIX timestamp of the start of the day
+    :param interval: the interval of the sensors in seconds
+    :return: the index of the time step of each timestamp
+    """
+    return numpy.floor((numpy.asarray(timestamps, dtype=float) - day_start) / interval).astype(numpy.int64)
+
+
+def kept_steps(steps: numpy.ndarray, n_steps: int, sensor_name: str, logger: Logger) -> numpy.ndarray:
+    """
+    This function returns which telegrams of a sensor are written to the time steps of the day: the telegrams in
+    the day, and of the telegrams that fall in the same time step the first one, with a warning for the others.
+    :param steps: the time step of each telegram, in time order
+    :param n_steps: the number of time steps of the day
+    :param sensor_name: the name of the sensor, for the warning
+    :param logger: the logger object
+    :return: the boolean mask of the telegrams that are written
+    """
+    in_day = (steps >= 0) & (steps < n_steps)
+    first = numpy.zeros(len(steps), dtype=bool)
+    first[numpy.unique(steps, return_index=True)[1]] = True
+    n_duplicates = int(numpy.sum(in_day & ~first))
+    if n_duplicates:
+        logger.warning(msg=f'{n_duplicates} telegrams of {sensor_name} fall in the time step of an earlier telegram,'
+                           f' only the first telegram of a time step is written')
+    return in_day & first
+
+
+def write_station_variables(nc_out: Dataset, config_dicts: List[Dict]):
+    """
+    This function writes the variables along the station dimension: the station code, the global attributes that
+    differ per sensor and the site variables, from the site configs.
+    :param nc_out: the network netCDF, with the station dimension
+    :param config_dicts: the combined site specific and general configs of the sensors, in station order
+    """
+    station_var = nc_out.createVariable('station_code', str, ('station',))
+    station_var.setncatts({'long_name': 'Station code', 'cf_role': 'timeseries_id'})
+    for i, config_dict in enumerate(config_dicts):
+        station_var[i] = config_dict['station_code']
+    for key in STATION_ATTRS:
+        key_var = nc_out.createVariable(key, str, ('station',))
+        key_var.setncattr('long_name', key.replace('_', ' ').capitalize())
+        for i, config_dict in enumerate(config_dicts):
+            key_var[i] = str(config_dict['global_attrs'].get(key, ''))
+    for key in SITE_VARIABLES:
+        var_dict = config_dicts[0]['variables'][key]
+        site_var = nc_out.createVariable(key, var_dict['dtype'], ('station',))
+        site_var.setncatts(var_dict['var_attrs'])
+        site_var[:] = [config_dict['variables'][key]['value'][0] for config_dict in config_dicts]
+
+
+def write_network_netCDF(path_out: Path, config_dicts: List[Dict],  # pylint: disable=too-many-locals,too-many-positional-arguments
+                         paths: List[Union[Path, None]], timestamps: List[numpy.ndarray], date_dt: datetime,
+                         logger: Logger, chunk_bytes: int = CHUNK_BYTES) -> int:
+    """
+    This function writes the netCDFs of the sensors of a day to one netCDF with a station dimension. The variables
+    along the time dimension are written along (station, time) on the time steps of the interval of the day, the
+    other variables are taken from the first netCDF, except for the site variables, which are taken from the site
+    configs. A sensor without a netCDF has the fill value at every time step, and of the telegrams of a sensor that
+    fall in the same time step only the first one is written.
+    The chunks span all stations, so the variables of the whole network are read at once.
+    :param path_out: the path of the network netCDF
+    :param config_dicts: the combined site specific and general configs of the sensors, in station order
+    :param paths: the netCDF of each sensor, None for a sensor without telegrams
+    :param timestamps: the POSIX timestamps of the time steps of the netCDF of each sensor
+    :param date_dt: the day
+    :param logger: the logger object
+    :param chunk_bytes: the size of the chunks of the variables along the time dimension in bytes
+    :return: the number of time steps that the sensors have together
+    :raises ValueError: if none of the sensors has a netCDF
+    """
+    interval = check_network(config_dicts)
+    if all(path is None for path in paths):
+        raise ValueError(f'None of the sensors has telegrams on {date_dt:%Y-%m-%d}')
+    attrs = config_var_attrs(config_dicts[0])
+    day_start = date_dt.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc).timestamp()
+    n_steps = 86400 // interval
+    n_stations = len(config_dicts)
+    steps = [station_steps(station_timestamps, day_start, interval) for station_timestamps in timestamps]
+    kept = [kept_steps(station_step, n_steps, config_dict['global_attrs']['sensor_name'], logger)
+            for station_step, config_dict in zip(steps, config_dicts)]
+
+    with ExitStack() as stack, Dataset(path_out, 'w', format='NETCDF4') as nc_out:
+        nc_files = [None if path is None else stack.enter_context(Dataset(path, 'r')) for path in paths]
+        first = next(nc_file for nc_file in nc_files if nc_file is not None)
+
+        nc_out.setncatts({key: value for key, value in config_dicts[0]['global_attrs'].items()
+                          if key not in STATION_ATTRS})
+        nc_out.setncattr('featureType', 'timeSeries')
+        nc_out.createDimension('station', n_stations)
+        for name, dimension in first.dimensions.items():
+            if name != 'particle':
+                nc_out.createDimension(name, n_steps if name == 'time' else len(dimension))
+
+        write_station_variables(nc_out, config_dicts)
+
+        time_var = nc_out.createVariable('time', first.variables['time'].datatype, ('time',))
+        time_var.setncatts({key: first.variables['time'].getncattr(key) for key in first.variables['time'].ncattrs()})
+        time_var[:] = numpy.arange(n_steps) * interval / 3600
+
+        for name, var in first.variables.items():
+            if name == 'time' or name in SITE_VARIABLES or 'particle' in var.dimensions:
+                continue
+            var_attrs = {**{key: var.getncattr(key) for key in var.ncattrs() if key != '_FillValue'},
+                         **attrs.get(name, {})}
+            is_str = var.dtype == str
+            if not var.dimensions or var.dimensions[0] != 'time':
+                out_var = nc_out.createVariable(name, var.datatype, var.dimensions,
+                                                fill_value=var.getncattr('_FillValue')
+                                                if '_FillValue' in var.ncattrs() else None)
+                out_var.setncatts(var_attrs)
+                out_var[...] = var[...]
+                continue
+
+            step_shape = var.shape[1:]
+            chunksizes = None
+            if not is_str:
+                chunk_steps = time_chunk_size((n_stations,) + step_shape, numpy.dtype(var.datatype).itemsize,
+                                              chunk_bytes)
+                chunksizes = (n_stations, min(chunk_steps, n_steps)) + step_shape
+            out_var = nc_out.createVariable(name, var.datatype, ('station',) + var.dimensions,
+                                            fill_value=var.getncattr('_FillValue')
+                                            if '_FillValue' in var.ncattrs() else None,
+                                            compression=None if is_str else 'zlib', shuffle=True,
+                                            chunksizes=chunksizes)
+            out_var.setncatts(var_attrs)
+            # the values of all stations are stacked in memory and written at once, so every chunk is written once
+            if is_str:
+                values = numpy.full((n_stations, n_steps) + step_shape, '', dtype=object)
+            else:
+                values = numpy.ma.masked_all((n_stations, n_steps) + step_shape, dtype=var.dtype)
+            for i, nc_file in enumerate(nc_files):
+                if nc_file is None or name not in nc_file.variables:
+                    continue
+                values[i, steps[i][kept[i]]] = nc_file.variables[name][:][kept[i]]
+            out_var[...] = values
+
+        n_written = int(sum(numpy.sum(station_kept) for station_kept in kept))
+        nc_out.setncattr('time_coverage_start', datetime.fromtimestamp(day_start, tz=timezone.utc).isoformat())
+        nc_out.setncattr('time_coverage_end', datetime.fromtimestamp(day_start + n_steps * interval,
+                                                                     tz=timezone.utc).isoformat())
+
+    logger.info(msg=f'Wrote {n_written} time steps of {n_stations} sensors: {path_out}')
+    return n_written
+
+
+def export_station(config_dict: Dict, date_dt: datetime, data_dir: Path, full_version: bool,
+                   logger: Logger) -> Tuple[Union[Path, None], numpy.ndarray]:
+    """
+    This function exports a day of a sensor to a netCDF with the NetCDF class of the daily export, without
+    compression. It runs in a worker process, so only the path and the timestamps are returned.
+    :param config_dict: the combined site specific and general config of the sensor
+    :param date_dt: the day
+    :param data_dir: the directory of the netCDF
+    :param full_version: True for the full version, False for the light version
+    :param logger: the logger object
+    :return: the path of the netCDF, None if the sensor has no telegrams, and the POSIX timestamps of its time steps
+    """
+    telegram_objs = station_telegrams(config_dict, date_dt, logger)
+    if len(telegram_objs) == 0:
+        return None, numpy.array([])
+    nc = NetCDF(logger=logger,
+                config_dict=config_dict,
+                data_dir=data_dir,
+                fn_start=config_dict['global_attrs']['sensor_name'],
+                full_version=full_version,
+                telegram_objs=telegram_objs,
+                date=date_dt)
+    nc.create_netCDF()
+    nc.write_data_to_netCDF()
+    return nc.path_netCDF, numpy.array([telegram_obj.timestamp.timestamp() for telegram_obj in telegram_objs])
+
+
+def export_network(config_dicts: List[Dict], date_dt: datetime, path_out: Path, full_version: bool,  # pylint: disable=too-many-positional-arguments
+                   logger: Logger, workers: Union[int, None] = None) -> int:
+    """
+    This function exports a day of several sensors of the same type to one netCDF with a station dimension.
+    The sensors are exported in parallel worker processes, each querying its database, parsing the telegrams and
+    writing a temporary netCDF, as parsing and writing are bound by the CPU. The temporary netCDFs are then written
+    to the network netCDF.
+    :param config_dicts: the combined site specific and general configs of the sensors, in station order
+    :param date_dt: the day
+    :param path_out: the path of the network netCDF
+    :param full_version: True for the full version, False for the light version
+    :param logger: the logger object
+    :param workers: the number of worker processes, by default one per sensor up to the number of CPUs
+    :return: the number of time steps that the sensors have together
+    :raises ValueError: if the sensors cannot be exported to one netCDF, or none of them has telegrams
+    """
+    check_network(config_dicts)
+    workers = workers or min(len(config_dicts), os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory(dir=path_out.parent) as temp_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(export_station, config_dicts, repeat(date_dt), repeat(Path(temp_dir)),
+                                        repeat(full_version), repeat(logger)))
+        for config_dict, (path, _) in zip(config_dicts, results):
+            if path is None:
+                logger.warning(msg=f"No telegrams of {config_dict['global_attrs']['sensor_name']}"
+                                   f" on {date_dt:%Y-%m-%d}, its time steps are missing")
+        return write_network_netCDF(path_out, config_dicts, [path for path, _ in results],
+                                    [timestamps for _, timestamps in results], date_dt, logger)
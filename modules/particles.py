@@ -0,0 +1,51 @@
+"""
+This module contains the handling of the Parsivel field 61, the list of all particles detected in an interval.
+
+Every particle is a (diameter, velocity) pair on its own telegram line, so a heavy rain interval has thousands
+of lines. They are parsed in one go into a numpy record array, and stored as a BLOB of little endian float32 pairs
+in the particles table, next to the disdrodl table.
+
+Functions:
+- parse_particle_lines: Parses the lines of field 61 into a particle record array.
+- particles_to_blob: Converts a particle record array to a BLOB.
+- blob_to_particles: Converts a BLOB back to a particle record array.
+"""
+
+from typing import List, Union
+import numpy
+
+PARTICLE_DTYPE = numpy.dtype([('diameter', '<f4'), ('velocity', '<f4')])
+
+
+def parse_particle_lines(lines: List[bytes]) -> numpy.ndarray:
+    """
+    This function parses the lines of field 61 into a particle record array.
+    :param lines: the lines with 'diameter;velocity' pairs, without the field prefix
+    :return: record array with the fields diameter [mm] and velocity [m/s]
+    """
+    # all lines are parsed at once, every non numeric byte (; \r \n ETX) separates values
+    text = b' '.join(lines).translate(None, b'\x02\x03').replace(b';', b' ')
+    values = numpy.array(text.split(), dtype='<f4')
+    # an incomplete last pair is dropped
+    values = values[:len(values) - len(values) % 2]
+    return values.view(PARTICLE_DTYPE)
+
+
+def particles_to_blob(particles: numpy.ndarray) -> bytes:
+    """
+    This function converts a particle record array to a BLOB.
+    :param particles: record array with the fields diameter and velocity
+    :return: the BLOB, little endian float32 pairs
+    """
+    return particles.astype(PARTICLE_DTYPE, copy=False).tobytes()
+
+
+def blob_to_particles(blob: Union[bytes, None]) -> numpy.ndarray:
+    """
+    This function converts a BLOB back to a particle record array.
+    :param blob: the BLOB, little endian float32 pairs
+    :return: record array with the fields diameter and velocity
+    """
+    if blob is None:
+        return numpy.empty(0, dtype=PARTICLE_DTYPE)
+    return numpy.frombuffer(blob, dtype=PARTICLE_DTYPE)
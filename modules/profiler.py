@@ -0,0 +1,175 @@
+"""
+This module contains a profiler for the stages of the export scripts.
+
+Classes:
+- StageProfiler: measures wall time and memory of named stages, and optionally runs cProfile
+"""
+
+import cProfile
+import json
+import tracemalloc
+from contextlib import contextmanager
+from logging import Logger
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Union
+
+
+class StageProfiler:
+    """
+    Measures the wall time and peak memory of named stages.
+    A stage that is entered more than once (ie. one per variable or per row) is accumulated.
+    A disabled profiler measures nothing, so it can be passed around unconditionally.
+
+    Attributes:
+    - enabled: whether stages are measured
+    - stages: dictionary of stage name to its accumulated measurements
+    - profile: the cProfile.Profile object, if cProfile is running
+
+    Functions:
+    - start: starts the memory tracing and optionally cProfile
+    - stop: stops the memory tracing and cProfile
+    - stage: context manager that measures the enclosed block as a stage
+    - iterate: measures the time spent fetching items from an iterable as a stage
+    - report: returns the measurements as a dictionary
+    - log_report: writes the report to the logger
+    - print_report: prints the report as a table to stdout
+    - dump_stats: writes the cProfile statistics to a pstats file
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Constructor for StageProfiler.
+        :param enabled: whether stages are measured
+        """
+        self.enabled = enabled
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.profile: Union[cProfile.Profile, None] = None
+        self._stack: List[Dict[str, float]] = []
+        self._start = None
+
+    def start(self, use_cprofile: bool = False):
+        """
+        Starts the memory tracing and optionally cProfile.
+        :param use_cprofile: whether cProfile should run while profiling
+        """
+        if not self.enabled:
+            return
+        tracemalloc.start()
+        self._start = perf_counter()
+        if use_cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        """
+        Stops the memory tracing and cProfile.
+        """
+        if not self.enabled:
+            return
+        if self.profile is not None:
+            self.profile.disable()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager that measures the wall time and peak memory of the enclosed block.
+        :param name: name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+        self.__enter_stage()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.__exit_stage(name, perf_counter() - start)
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        Measures the time spent fetching items from an iterable, ie. rows from a DB cursor, as a stage.
+        The time the caller spends on each item is not included.
+        :param name: name of the stage
+        :param iterable: the iterable to fetch items from
+        :return: iterator over the items of iterable
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self) -> Dict:
+        """
+        Returns the measurements as a dictionary.
+        :return: dictionary with the total wall time and the measurements per stage
+        """
+        total = perf_counter() - self._start if self._start is not None else None
+        return {'total_wall_s': total,
+                'stages': [{'stage': name, **values} for name, values in self.stages.items()]}
+
+    def log_report(self, logger: Logger):
+        """
+        Writes the report to the logger as a JSON string.
+        :param logger: the logger object
+        """
+        if self.enabled:
+            logger.info(msg=f'profile report: {json.dumps(self.report())}')
+
+    def print_report(self):
+        """
+        Prints the report as a table to stdout.
+        """
+        if not self.enabled:
+            return
+        report = self.report()
+        print(f"{'stage':<40} {'calls':>7} {'wall [s]':>10} {'peak mem [MB]':>14}")
+        for stage in report['stages']:
+            print(f"{stage['stage']:<40} {stage['calls']:>7} {stage['wall_s']:>10.3f} {stage['peak_mem_mb']:>14.2f}")
+        if report['total_wall_s'] is not None:
+            print(f"{'total':<40} {'':>7} {report['total_wall_s']:>10.3f}")
+
+    def dump_stats(self, path: Union[str, Path]):
+        """
+        Writes the cProfile statistics to a pstats file, readable with pstats or snakeviz.
+        :param path: the path of the pstats file
+        """
+        if self.profile is not None:
+            self.profile.dump_stats(str(path))
+
+    def __enter_stage(self):
+        """
+        Pushes a new stage on the stack and resets the memory peak,
+        keeping the peak reached so far in the enclosing stage.
+        """
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        self._stack.append({'peak': 0})
+
+    def __exit_stage(self, name: str, wall: float):
+        """
+        Pops the stage from the stack and accumulates its measurements.
+        :param name: name of the stage
+        :param wall: wall time spent in the stage in seconds
+        """
+        frame = self._stack.pop()
+        peak = frame['peak']
+        if tracemalloc.is_tracing():
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+        values = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'peak_mem_mb': 0.0})
+        values['calls'] += 1
+        values['wall_s'] += wall
+        values['peak_mem_mb'] = max(values['peak_mem_mb'], peak / 1e6)
@@ -0,0 +1,205 @@
+"""
+This module contains the data-quality control (QC) of the exported time steps: configurable rules on telegram
+fields, evaluated as numpy array operations over all time steps of a day or a range of days at once.
+
+Every rule of the qc section of the config sets one bit of the per time step QC flags:
+- range: the value is below min or above max, ie. a non-zero error code or a low laser amplitude
+- run_length: the value did not change for more than max_run time steps, ie. a stuck particle count,
+  values listed in ignore (ie. 0 particles in dry weather) do not count as stuck
+- rate: the value changed more than max_change per minute since the previous time step, ie. an amplitude jump
+Missing values are never flagged, and break a run of unchanged values.
+
+Functions:
+- to_values: Converts the values of a field to a float array, NaN for missing or invalid values.
+- qc_rules: Returns the QC rules of the config, checked and ordered by bit.
+- range_test: Flags the values outside a range.
+- run_length_test: Flags the runs of unchanged values longer than a maximum.
+- rate_test: Flags the values that changed more than a maximum per minute.
+- qc_flags: Evaluates the QC rules and combines them into one bitmask per time step.
+- qc_summary: Returns the number of flagged time steps of each rule.
+- flag_attrs: Returns the CF flag attributes of the QC flags variable.
+- qc_netCDF: Evaluates the QC rules on the variables of one or more netCDFs.
+"""
+
+from datetime import timezone
+from logging import Logger
+from pathlib import Path
+from typing import Dict, List, Union
+import numpy
+from cftime import num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+QC_TESTS = ('range', 'run_length', 'rate')
+# the QC flags are written as a 32-bit integer
+MAX_BITS = 31
+
+
+def to_values(values: List[Union[str, float, None]]) -> numpy.ndarray:
+    """
+    This function converts the values of a field to a float array.
+    :param values: per time step the value of the field, ie. a telegram string
+    :return: float array, NaN for missing or invalid values
+    """
+    try:
+        return numpy.array(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    converted = numpy.full(len(values), numpy.nan)
+    for i, value in enumerate(values):
+        try:
+            converted[i] = float(value)
+        except (TypeError, ValueError):
+            continue
+    return converted
+
+
+def qc_rules(config_dict: Dict) -> Dict[str, Dict]:
+    """
+    This function returns the QC rules of the config, checked and ordered by bit.
+    :param config_dict: the combined site specific and general config
+    :return: dictionary of the rule name to its definition (field, test, bit and the test parameters)
+    :raises ValueError: if a rule has an unknown test or field, or a bit is used twice or out of range
+    """
+    rules = config_dict.get('qc', {}) or {}
+    bits = {}
+    for name, rule in rules.items():
+        if rule['test'] not in QC_TESTS:
+            raise ValueError(f"QC rule {name}: test {rule['test']} not supported, use {', '.join(QC_TESTS)}")
+        if str(rule['field']) not in config_dict['telegram_fields'].keys():
+            raise ValueError(f"QC rule {name}: field {rule['field']} is not a telegram field")
+        if not 0 <= rule['bit'] < MAX_BITS or rule['bit'] in bits:
+            raise ValueError(f"QC rule {name}: bit {rule['bit']} is out of range or already used")
+        bits[rule['bit']] = name
+    return {name: rules[name] for _, name in sorted(bits.items())}
+
+
+def range_test(values: numpy.ndarray, minimum: Union[float, None] = None,
+               maximum: Union[float, None] = None) -> numpy.ndarray:
+    """
+    This function flags the values outside a range.
+    :param values: the values of all time steps, NaN for missing values
+    :param minimum: the lowest valid value, None for no lower limit
+    :param maximum: the highest valid value, None for no upper limit
+    :return: boolean array, True for the flagged time steps
+    """
+    flagged = numpy.zeros(len(values), dtype=bool)
+    # comparisons with NaN are False, so missing values are not flagged
+    if minimum is not None:
+        flagged |= values < minimum
+    if maximum is not None:
+        flagged |= values > maximum
+    return flagged
+
+
+def run_length_test(values: numpy.ndarray, max_run: int, ignore: Union[List[float], None] = None) -> numpy.ndarray:
+    """
+    This function flags all time steps of the runs of unchanged values longer than max_run time steps.
+    :param values: the values of all time steps, NaN for missing values
+    :param max_run: the longest valid run of unchanged values
+    :param ignore: values that are never flagged, ie. 0 particles
+    :return: boolean array, True for the flagged time steps
+    """
+    if len(values) == 0:
+        return numpy.zeros(0, dtype=bool)
+    # NaN != NaN, so a missing value starts a new run
+    run_ids = numpy.cumsum(numpy.concatenate(([True], values[1:] != values[:-1])))
+    run_lengths = numpy.bincount(run_ids)[run_ids]
+    flagged = (run_lengths > max_run) & ~numpy.isnan(values)
+    if ignore:
+        flagged &= ~numpy.isin(values, ignore)
+    return flagged
+
+
+def rate_test(values: numpy.ndarray, timestamps: numpy.ndarray, max_change: float) -> numpy.ndarray:
+    """
+    This function flags the values that changed more than max_change per minute since the previous time step.
+    :param values: the values of all time steps, NaN for missing values
+    :param timestamps: the POSIX timestamps of the time steps
+    :param max_change: the largest valid change per minute
+    :return: boolean array, True for the flagged time steps, the first time step is never flagged
+    """
+    flagged = numpy.zeros(len(values), dtype=bool)
+    minutes = numpy.maximum(numpy.diff(timestamps) / 60, 1)
+    with numpy.errstate(invalid='ignore'):
+        flagged[1:] = numpy.abs(numpy.diff(values)) / minutes > max_change
+    return flagged
+
+
+def qc_flags(values: Dict[str, numpy.ndarray], timestamps: numpy.ndarray, rules: Dict[str, Dict]) -> numpy.ndarray:
+    """
+    This function evaluates the QC rules and combines them into one bitmask per time step.
+    :param values: dictionary of the telegram field to its values of all time steps (see to_values)
+    :param timestamps: the POSIX timestamps of the time steps
+    :param rules: the QC rules (see qc_rules)
+    :return: int32 array, the bits of the rules that flagged each time step
+    """
+    flags = numpy.zeros(len(timestamps), dtype=numpy.int32)
+    for rule in rules.values():
+        field_values = values[str(rule['field'])]
+        if rule['test'] == 'range':
+            flagged = range_test(field_values, minimum=rule.get('min'), maximum=rule.get('max'))
+        elif rule['test'] == 'run_length':
+            flagged = run_length_test(field_values, max_run=rule['max_run'], ignore=rule.get('ignore'))
+        else:
+            flagged = rate_test(field_values, timestamps, max_change=rule['max_change'])
+        flags |= flagged.astype(numpy.int32) << rule['bit']
+    return flags
+
+
+def qc_summary(flags: numpy.ndarray, rules: Dict[str, Dict]) -> Dict[str, int]:
+    """
+    This function returns the number of flagged time steps of each rule, and of any rule.
+    :param flags: the QC flags of all time steps (see qc_flags)
+    :param rules: the QC rules (see qc_rules)
+    :return: dictionary of the rule name to its number of flagged time steps, 'any' for all rules together
+    """
+    summary = {name: int(numpy.count_nonzero(flags & (1 << rule['bit']))) for name, rule in rules.items()}
+    summary['any'] = int(numpy.count_nonzero(flags))
+    return summary
+
+
+def flag_attrs(rules: Dict[str, Dict]) -> Dict[str, Union[numpy.ndarray, str]]:
+    """
+    This function returns the CF flag attributes of the QC flags variable.
+    :param rules: the QC rules (see qc_rules)
+    :return: dictionary with flag_masks and flag_meanings
+    """
+    return {'flag_masks': numpy.array([1 << rule['bit'] for rule in rules.values()], dtype=numpy.int32),
+            'flag_meanings': ' '.join(rules.keys())}
+
+
+def qc_netCDF(paths: List[Path], config_dict: Dict, logger: Logger) -> Dict[str, int]:
+    """
+    This function evaluates the QC rules on the variables of one or more netCDFs of the same sensor, as one range,
+    so a run of unchanged values continues across midnight. Rules on fields that are not in the netCDFs are skipped.
+    :param paths: the netCDFs, in time order
+    :param config_dict: the combined site specific and general config
+    :param logger: the logger object
+    :return: the number of flagged time steps of each rule, and 'time_steps' for the number of time steps
+    """
+    rules = qc_rules(config_dict)
+    fields = sorted({str(rule['field']) for rule in rules.values()})
+    timestamps, values = [], {field: [] for field in fields}
+    for path in paths:
+        with Dataset(path, 'r') as nc_file:
+            time_var = nc_file.variables['time']
+            timestamps.append(numpy.array([
+                time.replace(tzinfo=timezone.utc).timestamp()
+                for time in num2date(time_var[:], units=time_var.units, calendar=time_var.calendar,
+                                     only_use_cftime_datetimes=False, only_use_python_datetimes=True)]))
+            for field in fields:
+                standard_name = config_dict['telegram_fields'][field]['var_attrs']['standard_name']
+                if standard_name in nc_file.variables:
+                    values[field].append(numpy.ma.filled(nc_file.variables[standard_name][:].astype(float),
+                                                         numpy.nan))
+                else:
+                    values[field].append(numpy.full(len(time_var), numpy.nan))
+    for name, rule in rules.items():
+        if numpy.isnan(numpy.concatenate(values[str(rule['field'])])).all():
+            logger.info(msg=f"QC rule {name} skipped, field {rule['field']} has no values in the netCDFs")
+    flags = qc_flags({field: numpy.concatenate(field_values) for field, field_values in values.items()},
+                     numpy.concatenate(timestamps), rules)
+    summary = qc_summary(flags, rules)
+    summary['time_steps'] = len(flags)
+    logger.info(msg=f'QC of {len(paths)} netCDF: {summary}')
+    return summary
@@ -0,0 +1,143 @@
+"""
+This module contains the raw telegram log, an append-only file per sensor and day with the telegrams
+exactly as they were received, so they can be parsed again when the parsing logic changes.
+
+Every frame is a header of the receive timestamp (float64, seconds since the epoch) and the payload length
+(uint32), both little endian, followed by the payload. For a Parsivel the payload is the concatenated
+telegram lines, for a Thies the telegram string encoded as UTF-8.
+
+Classes:
+- RawLog: append-only raw telegram log with daily rotation
+
+Functions:
+- raw_log_path: Returns the path of the raw log file of a sensor for a date.
+- read_frames: Generates the frames of a raw log file.
+- telegram_to_payload: Converts telegram lines as read from a sensor to a frame payload.
+- payload_to_telegram: Converts a frame payload back to telegram lines as read from a sensor.
+"""
+
+import io
+import struct
+from datetime import datetime, timezone, date
+from logging import Logger
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+FRAME_HEADER = struct.Struct('<dI')
+
+
+def raw_log_path(log_dir: Path, sensor_name: str, day: date) -> Path:
+    """
+    Returns the path of the raw log file of a sensor for a date.
+    :param log_dir: the directory of the raw log files
+    :param sensor_name: the name of the sensor
+    :param day: the (UTC) date of the telegrams in the file
+    :return: the path of the raw log file
+    """
+    return Path(log_dir) / f"raw_{sensor_name}_{day.strftime('%Y%m%d')}.bin"
+
+
+def telegram_to_payload(telegram_lines: Union[List[bytes], str]) -> bytes:
+    """
+    Converts telegram lines as read from a sensor to a frame payload.
+    :param telegram_lines: the list of lines read from a Parsivel, or the line read from a Thies
+    :return: the payload
+    """
+    if isinstance(telegram_lines, str):
+        return telegram_lines.encode('utf-8')
+    return b''.join(telegram_lines)
+
+
+def payload_to_telegram(payload: bytes, sensor_type: str) -> Union[List[bytes], str]:
+    """
+    Converts a frame payload back to telegram lines as read from a sensor.
+    :param payload: the payload
+    :param sensor_type: the sensor type in the config file
+    :return: the list of lines for a Parsivel, the line for a Thies
+    """
+    if sensor_type == 'Thies Clima':
+        return payload.decode('utf-8')
+    # split the same way as the serial readlines of the Parsivel
+    return io.BytesIO(payload).readlines()
+
+
+def read_frames(path: Path) -> Iterator[Tuple[float, bytes]]:
+    """
+    Generates the frames of a raw log file. A truncated last frame, from a crash while appending, is skipped.
+    :param path: the path of the raw log file
+    :return: generator of (receive timestamp, payload)
+    """
+    with open(path, 'rb') as raw_file:
+        while True:
+            header = raw_file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            timestamp, length = FRAME_HEADER.unpack(header)
+            payload = raw_file.read(length)
+            if len(payload) < length:
+                return
+            yield timestamp, payload
+
+
+class RawLog:
+    """
+    Append-only raw telegram log of one sensor, rotated daily (UTC).
+
+    Attributes:
+    - log_dir: the directory of the raw log files
+    - sensor_name: the name of the sensor
+    - logger: logger for logging errors
+    - path: the path of the current raw log file
+
+    Functions:
+    - append: appends a frame with the telegram as read from the sensor
+    - close: closes the current raw log file
+    """
+
+    def __init__(self, log_dir: Path, sensor_name: str, logger: Logger):
+        """
+        Constructor for RawLog.
+        :param log_dir: the directory of the raw log files
+        :param sensor_name: the name of the sensor
+        :param logger: logger for logging errors
+        """
+        self.log_dir = Path(log_dir)
+        self.sensor_name = sensor_name
+        self.logger = logger
+        self.path = None
+        self._file = None
+
+    def append(self, timestamp: datetime, telegram_lines: Union[List[bytes], str, None]):
+        """
+        Appends a frame with the telegram as read from the sensor. Errors are logged, not raised,
+        so the raw log never stops the acquisition.
+        :param timestamp: the time the telegram was received
+        :param telegram_lines: the list of lines read from a Parsivel, or the line read from a Thies
+        """
+        if telegram_lines is None:
+            return
+        payload = telegram_to_payload(telegram_lines)
+        path = raw_log_path(self.log_dir, self.sensor_name, timestamp.astimezone(timezone.utc).date())
+        try:
+            if path != self.path:
+                self.close()
+                self.log_dir.mkdir(parents=True, exist_ok=True)
+                self._file = open(path, 'ab')  # pylint: disable=consider-using-with
+                self.path = path
+            self._file.write(FRAME_HEADER.pack(timestamp.timestamp(), len(payload)) + payload)
+            self._file.flush()
+        except OSError as e:
+            self.logger.error(msg=f'Failed to append to raw log {path}: {e}')
+            self.close()
+
+    def close(self):
+        """
+        Closes the current raw log file.
+        """
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+        self.path = None
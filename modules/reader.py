@@ -0,0 +1,274 @@
+"""
+This module contains the reader of the exported netCDFs of a sensor over a time range, ie. a month of daily files,
+as stacked numpy arrays, instead of opening the files and concatenating the variables by hand.
+
+The files are located by the naming convention of the export (<data_dir>/<YYYYMM>/<YYYYMMDD>_<site>-<station>_
+<sensor>[_light][_<interval>s].nc) or by the archive catalog (see modules/archive.py). Only the requested variables
+are read, every variable of a file is decoded once (masked values to NaN, the time to POSIX timestamps) and kept in
+a least recently used cache, so repeated queries over the same days, ie. in a notebook, do not read the files again.
+The time steps of the range are copied from the cached variables into arrays that are allocated once per query.
+
+Functions:
+- netCDF_name: Returns the file name of the netCDF of a sensor on a day.
+- locate_files: Returns the paths of the existing netCDFs of a sensor over a time range, by the naming convention.
+- decode_variable: Decodes a netCDF variable to a numpy array.
+- entry_bytes: Returns the size counted in the cache of the NetCDFReader for an entry.
+
+Classes:
+- NetCDFReader: reads the netCDFs of a sensor over a time range as stacked arrays, with a cache of decoded variables
+"""
+
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import numpy
+from cftime import num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+from modules.archive import query_archive
+
+# the default size of the cache of decoded variables, about a month of full Parsivel spectra
+DEFAULT_CACHE_BYTES = 512 << 20
+# the size counted for the cache entry of a variable that is missing from a netCDF, about the size of its key
+MISSING_ENTRY_BYTES = 256
+
+
+def netCDF_name(config_dict: Dict, day: date, version: str = 'full', interval: Union[int, None] = None,
+                date_format: str = '%Y%m%d') -> str:
+    """
+    This function returns the file name of the netCDF of a sensor on a day, as written by the export.
+    :param config_dict: the combined site specific and general config
+    :param day: the day of the netCDF
+    :param version: 'full' or 'light'
+    :param interval: the time interval of the netCDF in seconds, None or the acquisition interval for the exported
+                     netCDF, a longer interval for a resampled product
+    :param date_format: the format of the date at the start of the name, ie. '%Y%m' for a merged month
+    :return: the file name
+    """
+    name = (f"{day.strftime(date_format)}_{config_dict['global_attrs']['site_name']}-{config_dict['station_code']}"
+            f"_{config_dict['global_attrs']['sensor_name']}")
+    if version == 'light':
+        name = f'{name}_light'
+    if interval is not None and interval != config_dict.get('interval', 60):
+        name = f'{name}_{interval}s'
+    return f'{name}.nc'
+
+
+def locate_files(config_dict: Dict, start: datetime, end: datetime, version: str = 'full',
+                 interval: Union[int, None] = None) -> List[Path]:
+    """
+    This function returns the paths of the existing netCDFs of a sensor over a time range, by the naming convention
+    of the export: one netCDF per UTC day in a monthly directory of data_dir.
+    :param config_dict: the combined site specific and general config
+    :param start: the start of the time range
+    :param end: the end of the time range (exclusive)
+    :param version: 'full' or 'light'
+    :param interval: the time interval of the netCDFs in seconds, None for the exported netCDFs
+    :return: the paths, in time order
+    """
+    first = start.astimezone(timezone.utc).date()
+    last = (end.astimezone(timezone.utc) - timedelta(microseconds=1)).date()
+    paths = []
+    for day in (first + timedelta(days=i) for i in range((last - first).days + 1)):
+        path = Path(config_dict['data_dir']) / f'{day:%Y%m}' / netCDF_name(config_dict, day, version, interval)
+        if path.exists():
+            paths.append(path)
+    return paths
+
+
+def decode_variable(nc_file: Dataset, name: str) -> numpy.ndarray:
+    """
+    This function decodes a netCDF variable to a numpy array: the time to POSIX timestamps, numbers to the smallest
+    float type that holds them (masked values to NaN), strings to an object array.
+    :param nc_file: the opened netCDF
+    :param name: the name of the variable
+    :return: the decoded values
+    """
+    var = nc_file.variables[name]
+    if name == 'time':
+        # the time is a linear function of the stored values, so two converted values give all timestamps
+        origin, unit = [time.replace(tzinfo=timezone.utc).timestamp()
+                        for time in num2date([0, 1], units=var.units, calendar=var.calendar,
+                                             only_use_cftime_datetimes=False, only_use_python_datetimes=True)]
+        return origin + numpy.asarray(var[:], dtype=numpy.float64) * (unit - origin)
+    if var.dtype == str:
+        return numpy.asarray(var[:], dtype=object)
+    dtype = numpy.result_type(var.dtype, numpy.float32)
+    return numpy.ma.filled(numpy.ma.asarray(var[:]).astype(dtype), numpy.nan)
+
+
+def entry_bytes(chunk: Union[Tuple[numpy.ndarray, Tuple], None]) -> int:
+    """
+    This function returns the size counted in the cache of the NetCDFReader for an entry.
+    :param chunk: the decoded values and dimensions of a variable, None if it is missing from the netCDF
+    :return: the size of the values, MISSING_ENTRY_BYTES for a missing variable
+    """
+    return MISSING_ENTRY_BYTES if chunk is None else chunk[0].nbytes
+
+
+class NetCDFReader:
+    """
+    Reads the exported netCDFs of a sensor over a time range as stacked arrays along the time axis.
+    The decoded variables of the files are kept in a least recently used cache of at most max_cache_bytes,
+    a file that changed since it was decoded is read again and its old entries are evicted.
+
+    Attributes:
+    - config_dict: the combined site specific and general config of the sensor
+    - con: the connection to the archive catalog to locate the files, None for the naming convention
+    - max_cache_bytes: the maximum size of the decoded variables in the cache
+    - cache: ordered dictionary of (path, modification time, variable) to the decoded values, least recent first
+    - cache_mtimes: dictionary of the paths in the cache to the modification time of their entries
+    - cache_bytes: the size of the decoded variables in the cache, MISSING_ENTRY_BYTES for a missing variable
+    - hits: the number of variables taken from the cache
+    - misses: the number of variables read from the files
+
+    Functions:
+    - locate: returns the paths of the netCDFs of a time range
+    - read: returns the requested variables of a time range as stacked arrays
+    - clear_cache: empties the cache
+    """
+
+    def __init__(self, config_dict: Dict, con=None, max_cache_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Constructor for NetCDFReader.
+        :param config_dict: the combined site specific and general config of the sensor
+        :param con: the connection to the archive catalog to locate the files, None for the naming convention
+        :param max_cache_bytes: the maximum size of the decoded variables in the cache
+        """
+        self.config_dict = config_dict
+        self.con = con
+        self.max_cache_bytes = max_cache_bytes
+        self.cache: OrderedDict = OrderedDict()
+        self.cache_mtimes: Dict[str, int] = {}
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def locate(self, start: datetime, end: datetime, version: str = 'full',
+               interval: Union[int, None] = None) -> List[Path]:
+        """
+        Returns the paths of the netCDFs of the sensor that overlap a time range, from the archive catalog if the
+        reader has a connection to it, else by the naming convention.
+        :param start: the start of the time range
+        :param end: the end of the time range (exclusive)
+        :param version: 'full' or 'light'
+        :param interval: the time interval of the netCDFs in seconds, None for the exported netCDFs
+        :return: the paths, in time order
+        """
+        if self.con is None:
+            return locate_files(self.config_dict, start, end, version, interval)
+        records = query_archive(self.con, start=start, end=end,
+                                sensor_name=self.config_dict['global_attrs']['sensor_name'], version=version,
+                                interval=self.config_dict.get('interval', 60) if interval is None else interval)
+        return [Path(record['path']) for record in records]
+
+    def read(self, variables: List[str], start: datetime, end: datetime,  # pylint: disable=too-many-locals
+             version: str = 'full', interval: Union[int, None] = None) -> Dict[str, numpy.ndarray]:
+        """
+        Returns the requested variables of the time steps in a time range as stacked arrays, ie. data_raw of a month
+        as an array of (time steps, diameter classes, velocity classes). A variable without the time dimension is
+        taken from the first netCDF. A variable that is missing from a netCDF is NaN (or '') for its time steps.
+        :param variables: the netCDF variable names (standard_name), ie. ['rain_intensity', 'data_raw']
+        :param start: the start of the time range
+        :param end: the end of the time range (exclusive)
+        :param version: 'full' or 'light'
+        :param interval: the time interval of the netCDFs in seconds, None for the exported netCDFs
+        :return: dictionary of the variable names and 'time' (POSIX timestamps) to their values
+        :raises ValueError: if there are no time steps in the time range, or if a variable is along the particle
+                            dimension or in none of the netCDFs
+        """
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        slices: List[Tuple[Path, slice]] = []
+        for path in self.locate(start, end, version, interval):
+            timestamps, _ = self._chunks(path, ['time'])['time']
+            first, last = numpy.searchsorted(timestamps, [start_ts, end_ts])
+            if last > first:
+                slices.append((path, slice(first, last)))
+        if not slices:
+            raise ValueError(f"No time steps of {self.config_dict['global_attrs']['sensor_name']} in {start} - {end}")
+        n_steps = sum(index.stop - index.start for _, index in slices)
+
+        names = ['time'] + [name for name in dict.fromkeys(variables) if name != 'time']
+        chunks = [self._chunks(path, names) for path, _ in slices]
+        stacked = {}
+        for name in names:
+            templates = [chunk[name] for chunk in chunks if chunk[name] is not None]
+            if not templates:
+                raise ValueError(f'Variable {name} is not in the netCDFs of {start} - {end}')
+            template, dimensions = templates[0]
+            if 'time' not in dimensions:
+                stacked[name] = template.copy()
+                continue
+            if 'particle' in dimensions:
+                raise ValueError(f'Variable {name} is along the particle dimension, not the time dimension')
+            # the stacked array is allocated once and every netCDF copies its time steps into it
+            values = numpy.empty((n_steps,) + template.shape[1:], dtype=template.dtype)
+            position = 0
+            for chunk, (_, index) in zip(chunks, slices):
+                size = index.stop - index.start
+                if chunk[name] is None:
+                    values[position:position + size] = '' if template.dtype == object else numpy.nan
+                else:
+                    values[position:position + size] = chunk[name][0][index]
+                position += size
+            stacked[name] = values
+        return stacked
+
+    def clear_cache(self):
+        """
+        Empties the cache of decoded variables.
+        """
+        self.cache.clear()
+        self.cache_mtimes.clear()
+        self.cache_bytes = 0
+
+    def _chunks(self, path: Path, names: List[str]) -> Dict[str, Union[Tuple[numpy.ndarray, Tuple], None]]:
+        """
+        Returns the decoded variables of a netCDF from the cache, the netCDF is only opened for the variables that
+        are not in the cache.
+        :param path: the path of the netCDF
+        :param names: the variable names
+        :return: dictionary of the variable names to their decoded values and dimensions, None if not in the netCDF
+                 (a missing variable is cached as well, so the netCDF is not opened again to look for it)
+        """
+        path = Path(path)
+        mtime = path.stat().st_mtime_ns
+        if self.cache_mtimes.get(str(path), mtime) != mtime:
+            # the netCDF changed, so none of its entries is read again
+            for key in [key for key in self.cache if key[0] == str(path)]:
+                self.cache_bytes -= entry_bytes(self.cache.pop(key))
+        self.cache_mtimes[str(path)] = mtime
+        chunks, missing = {}, []
+        for name in names:
+            key = (str(path), mtime, name)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                chunks[name] = self.cache[key]
+                self.hits += 1
+            else:
+                missing.append(name)
+        if not missing:
+            return chunks
+
+        with Dataset(path, 'r') as nc_file:
+            for name in missing:
+                self.misses += 1
+                if name not in nc_file.variables:
+                    chunks[name] = None
+                    self.cache[(str(path), mtime, name)] = None
+                    self.cache_bytes += MISSING_ENTRY_BYTES
+                    continue
+                values = decode_variable(nc_file, name)
+                # the cached values are shared by all queries
+                values.flags.writeable = False
+                chunks[name] = (values, nc_file.variables[name].dimensions)
+                if values.nbytes <= self.max_cache_bytes:
+                    self.cache[(str(path), mtime, name)] = chunks[name]
+                    self.cache_bytes += values.nbytes
+        while self.cache_bytes > self.max_cache_bytes:
+            key, chunk = self.cache.popitem(last=False)
+            self.cache_bytes -= entry_bytes(chunk)
+            if not any(cached[0] == key[0] for cached in self.cache):
+                del self.cache_mtimes[key[0]]
+        return chunks
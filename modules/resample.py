@@ -0,0 +1,184 @@
+"""
+This module contains the temporal resampling of exported netCDFs to longer intervals, ie. 5-minute, hourly and
+daily products, that are much smaller than the 1-minute files with the full spectra.
+
+Every variable along the time dimension is reduced per interval by the reduction rule of its field in the config
+(the reduction entry of telegram_fields, dsd_variables, filter_variables, particle_variables and qc_variables):
+counts and spectra are summed, intensities and temperatures averaged, codes and extremes reduced to their max, min or
+last value, and QC flags combined with a bitwise or. Fields without a rule are averaged, strings keep the last
+value. The variables of one or more netCDFs, ie. a range of days, are read into memory once and every interval of a
+variable is reduced in one numpy operation.
+
+Functions:
+- reduction_rules: Returns the reduction rule of each netCDF variable defined in the config.
+- interval_starts: Returns the index of the first time step of each interval.
+- reduce_intervals: Reduces an array along its first (time) axis per interval.
+- output_datatype: Returns the datatype of a resampled variable.
+- resample_netCDF: Writes a netCDF with the variables of one or more netCDFs resampled to an interval.
+"""
+
+from datetime import datetime, timezone
+from logging import Logger
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy
+from cftime import date2num, num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+
+REDUCTIONS = ('sum', 'mean', 'min', 'max', 'first', 'last', 'bitwise_or')
+# the datatype of a summed integer variable narrower than 32 bits, ie. the i2 counts of the Thies,
+# as an hour or a day of counts overflows the datatype of the source, which netCDF4 would wrap silently
+SUM_DATATYPE = 'i4'
+# the config sections with netCDF variable definitions that can have a reduction rule
+RULE_SECTIONS = ('telegram_fields', 'dsd_variables', 'filter_variables', 'particle_variables', 'qc_variables')
+
+
+def reduction_rules(config_dict: Dict) -> Dict[str, str]:
+    """
+    This function returns the reduction rule of each netCDF variable defined in the config.
+    :param config_dict: the combined site specific and general config
+    :return: dictionary of the netCDF variable name (standard_name) to its reduction rule
+    :raises ValueError: if a reduction rule is not one of REDUCTIONS
+    """
+    rules = {}
+    for section in RULE_SECTIONS:
+        for var_dict in config_dict.get(section, {}).values():
+            if 'reduction' not in var_dict.keys():
+                continue
+            if var_dict['reduction'] not in REDUCTIONS:
+                raise ValueError(f"Reduction {var_dict['reduction']} of {var_dict['var_attrs']['standard_name']}"
+                                 f" not supported, use {', '.join(REDUCTIONS)}")
+            rules[var_dict['var_attrs']['standard_name']] = var_dict['reduction']
+    return rules
+
+
+def interval_starts(timestamps: numpy.ndarray, interval: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    This function returns the index of the first time step of each interval, the time steps are in time order.
+    :param timestamps: the POSIX timestamps of the time steps
+    :param interval: the length of the intervals in seconds, aligned to midnight UTC
+    :return: the index of the first time step of each interval that has time steps, and the interval starts
+    """
+    bins = numpy.floor(timestamps / interval).astype(numpy.int64)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(bins)) + 1))
+    return starts, bins[starts] * interval
+
+
+def reduce_intervals(values: numpy.ndarray, starts: numpy.ndarray, reduction: str) -> numpy.ndarray:
+    """
+    This function reduces an array along its first (time) axis per interval, ignoring NaN.
+    :param values: the values, NaN for missing values
+    :param starts: the index of the first time step of each interval
+    :param reduction: one of REDUCTIONS
+    :return: the reduced values, NaN for an interval without values
+    """
+    valid = numpy.add.reduceat(~numpy.isnan(values), starts, axis=0)
+    if reduction == 'first':
+        return values[starts]
+    if reduction == 'last':
+        return values[numpy.append(starts[1:], len(values)) - 1]
+    if reduction == 'min':
+        return numpy.fmin.reduceat(values, starts, axis=0)
+    if reduction == 'max':
+        return numpy.fmax.reduceat(values, starts, axis=0)
+    if reduction == 'bitwise_or':
+        reduced = numpy.bitwise_or.reduceat(numpy.nan_to_num(values).astype(numpy.int64), starts, axis=0)
+        return numpy.where(valid > 0, reduced, numpy.nan)
+    total = numpy.add.reduceat(numpy.nan_to_num(values), starts, axis=0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        reduced = total if reduction == 'sum' else total / valid
+    return numpy.where(valid > 0, reduced, numpy.nan)
+
+
+def output_datatype(var, reduction: str):
+    """
+    This function returns the datatype of a resampled variable: the datatype of the source variable, or SUM_DATATYPE
+    for a summed integer variable narrower than 32 bits.
+    :param var: the netCDF variable of the source
+    :param reduction: the reduction rule of the variable
+    :return: the datatype of the resampled variable
+    """
+    if (reduction == 'sum' and var.dtype != str and numpy.issubdtype(var.dtype, numpy.integer)
+            and var.dtype.itemsize < numpy.dtype(SUM_DATATYPE).itemsize):
+        return SUM_DATATYPE
+    return var.datatype
+
+
+def resample_netCDF(paths: List[Path], path_out: Path, interval: int,  # pylint: disable=too-many-locals,too-many-branches
+                    config_dict: Dict, logger: Logger) -> int:
+    """
+    This function writes a netCDF with the variables of one or more netCDFs of the same sensor resampled to an
+    interval. The variables without the time dimension are taken from the first netCDF, the variables along the
+    particle dimension are concatenated, as the summed particle_count keeps them a contiguous ragged array.
+    Summed integer variables narrower than 32 bits are written as SUM_DATATYPE, see output_datatype.
+    :param paths: the netCDFs, in time order
+    :param path_out: the path of the resampled netCDF
+    :param interval: the length of the intervals in seconds, ie. 300, 3600 or 86400
+    :param config_dict: the combined site specific and general config, for the reduction rules
+    :param logger: the logger object
+    :return: the number of intervals written
+    """
+    rules = reduction_rules(config_dict)
+    nc_files = [Dataset(path, 'r') for path in paths]
+    try:
+        first = nc_files[0]
+        time_var = first.variables['time']
+        timestamps = numpy.concatenate([
+            [time.replace(tzinfo=timezone.utc).timestamp()
+             for time in num2date(nc_file.variables['time'][:], units=nc_file.variables['time'].units,
+                                  calendar=time_var.calendar, only_use_cftime_datetimes=False,
+                                  only_use_python_datetimes=True)]
+            for nc_file in nc_files])
+        starts, interval_ts = interval_starts(timestamps, interval)
+        interval_dt = [datetime.fromtimestamp(ts, tz=timezone.utc) for ts in interval_ts]
+
+        with Dataset(path_out, 'w', format='NETCDF4') as nc_out:
+            nc_out.setncatts({key: first.getncattr(key) for key in first.ncattrs()})
+            nc_out.setncattr('resampling_interval', f'{interval} s')
+            for name, dimension in first.dimensions.items():
+                if name == 'time':
+                    size = None if dimension.isunlimited() else len(starts)
+                elif name == 'particle':
+                    size = sum(len(nc_file.dimensions['particle']) for nc_file in nc_files)
+                else:
+                    size = len(dimension)
+                nc_out.createDimension(name, size)
+
+            for name, var in first.variables.items():
+                fill_value = var.getncattr('_FillValue') if '_FillValue' in var.ncattrs() else None
+                datatype = var.datatype if 'time' not in var.dimensions else output_datatype(var, rules.get(name))
+                out_var = nc_out.createVariable(name, datatype, var.dimensions, fill_value=fill_value,
+                                                compression=None if var.dtype == str else 'zlib')
+                out_var.setncatts({key: var.getncattr(key) for key in var.ncattrs() if key != '_FillValue'})
+
+                if name == 'time':
+                    out_var[:] = date2num([dt.replace(tzinfo=None) for dt in interval_dt], units=var.units,
+                                          calendar=var.calendar)
+                elif name == 'datetime':
+                    for i, dt in enumerate(interval_dt):
+                        out_var[i] = dt.isoformat()
+                elif name == 'time_interval':
+                    out_var.assignValue(interval)
+                elif 'particle' in var.dimensions:
+                    out_var[:] = numpy.concatenate([nc_file.variables[name][:] for nc_file in nc_files])
+                elif 'time' not in var.dimensions:
+                    out_var[:] = var[:]
+                elif var.dtype == str:
+                    values = [value for nc_file in nc_files for value in nc_file.variables[name][:]]
+                    index = starts if rules.get(name) == 'first' else numpy.append(starts[1:], len(values)) - 1
+                    for i, value_index in enumerate(index):
+                        out_var[i] = values[value_index]
+                else:
+                    values = numpy.concatenate([numpy.ma.filled(nc_file.variables[name][:].astype(float), numpy.nan)
+                                                for nc_file in nc_files])
+                    reduced = reduce_intervals(values, starts, rules.get(name, 'mean'))
+                    if numpy.issubdtype(var.dtype, numpy.integer):
+                        reduced = numpy.round(reduced)
+                    out_var[:] = numpy.ma.masked_invalid(reduced)
+    finally:
+        for nc_file in nc_files:
+            nc_file.close()
+
+    logger.info(msg=f'Resampled {len(timestamps)} time steps of {len(paths)} netCDF to {len(starts)} intervals'
+                    f' of {interval} s: {path_out}')
+    return len(starts)
@@ -32,6 +32,7 @@ class Sensor(ABC):
     - init_serial_connection: initializes the serial connection with the sensor
     - sensor_start_sequence: executes the startup sequence for a sensor
     - reset_sensor: resets a sensor
+    - reset_rain_amount: resets the accumulated rain amount of a sensor
     - close_serial_connection: closes the serial connection
     - write: sends a message to the sensor
     - read: reads lines from the sensor
@@ -75,6 +76,13 @@ class Sensor(ABC):
         :param factory_reset: Whether the factory reset should be performed
         """
 
+    def reset_rain_amount(self, logger):
+        """
+        Resets the accumulated rain amount, which the start sequence also does.
+        Sensors without a rain amount reset command send nothing.
+        :param logger: Logger for logging information
+        """
+
     @abstractmethod
     def close_serial_connection(self):
         """
@@ -162,6 +170,11 @@ class Parsivel(Sensor):
         self.write(parsivel_set_id, logger)
         sleep(2)
 
+        # Sets the measuring interval of the Parsivel in seconds, when configured
+        if 'interval' in config_dict:
+            self.write(f"CS/I/{config_dict['interval']}\r".encode('utf-8'), logger)
+            sleep(1)
+
         parsivel_restart = 'CS/Z/1\r'.encode('utf-8')
         self.write(parsivel_restart, logger)  # resets rain amount
         sleep(10)
@@ -188,6 +201,18 @@ class Parsivel(Sensor):
             self.write(parsivel_restart, logger)
         sleep(5)
 
+    def reset_rain_amount(self, logger):
+        """
+        Resets the accumulated rain amount, without the rest of the start sequence.
+        This keeps the rain amount accumulated over one minute at sub-minute intervals.
+        :param logger: Logger for logging information and errors
+        """
+        parsivel_restart = 'CS/Z/1\r'.encode('utf-8')
+        self.write(parsivel_restart, logger)  # resets rain amount
+        sleep(1)
+        # the reply to the command is not part of the next telegram
+        self.serial_connection.reset_input_buffer()
+
     def close_serial_connection(self):
         """
         Closes the serial connection.
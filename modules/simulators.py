@@ -0,0 +1,398 @@
+"""
+This module contains simulated Parsivel and Thies sensors that answer the real command set on a pseudo-terminal,
+so the acquisition scripts can be run, timed and stressed without hardware.
+
+Commands that change settings are not acknowledged: the logging scripts do not read the answers,
+and an unread acknowledgement would end up in front of the next telegram.
+
+Classes:
+- SimulatedClock: the internal clock of a simulated sensor, optionally running faster than real time
+- SensorSimulator: base class of the simulators, a thread serving the master side of a pty
+- ParsivelSimulator: simulated OTT Parsivel2
+- ThiesSimulator: simulated Thies Clima
+
+Functions:
+- default_parsivel_telegram: returns the fields of an empty Parsivel telegram
+- default_thies_telegram: returns an empty Thies telegram 5
+- create_simulator: creates a simulator based on the sensor type in the config files
+"""
+
+import os
+import random
+import select
+import termios
+import threading
+import tty
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from time import monotonic, sleep
+from typing import Dict, List, Tuple, Union
+
+
+class SimulatedClock:
+    """
+    The internal clock of a simulated sensor, optionally running faster than real time.
+
+    Attributes:
+    - speed: number of simulated seconds per real second
+
+    Functions:
+    - now: returns the simulated time
+    - set_time: sets the hour, minute and/or second of the simulated time
+    """
+
+    def __init__(self, speed: float = 1.0, start: Union[datetime, None] = None):
+        """
+        Constructor for SimulatedClock.
+        :param speed: number of simulated seconds per real second
+        :param start: simulated time at construction, default: the current UTC time
+        """
+        self.speed = speed
+        self._start = start if start is not None else datetime.now(timezone.utc)
+        self._t0 = monotonic()
+
+    def now(self) -> datetime:
+        """
+        Returns the simulated time.
+        :return: the simulated time
+        """
+        return self._start + timedelta(seconds=(monotonic() - self._t0) * self.speed)
+
+    def set_time(self, hour: Union[int, None] = None, minute: Union[int, None] = None,
+                 second: Union[int, None] = None):
+        """
+        Sets the hour, minute and/or second of the simulated time, like the Thies ZH/ZM/ZS commands.
+        :param hour: the new hour, None to keep it
+        :param minute: the new minute, None to keep it
+        :param second: the new second, None to keep it
+        """
+        now = self.now()
+        self._start = now.replace(hour=now.hour if hour is None else hour,
+                                  minute=now.minute if minute is None else minute,
+                                  second=now.second if second is None else second)
+        self._t0 = monotonic()
+
+
+class SensorSimulator(threading.Thread, ABC):  # pylint: disable=too-many-instance-attributes
+    """
+    Base class of the simulators: a thread that serves the master side of a pty.
+    Software under test opens `port` like a serial device.
+
+    Attributes:
+    - port: path of the slave side of the pty, to be opened by the software under test
+    - delay: seconds between receiving a request and starting the answer
+    - baud: the answer is paced to the transmission time of this baudrate, 0 to not pace
+    - drop_rate: probability that a byte of an answer is dropped
+    - clock: the SimulatedClock of the sensor
+    - requests: list of (monotonic time, command) of all commands received
+    - unknown_commands: list of the commands that were not recognized
+
+    Functions:
+    - run: the thread loop, receives commands terminated by a carriage return
+    - stop: stops the thread and closes the pty
+    - handle_command: answers one command
+    - tick: called regularly, for sensors that send telegrams by themselves
+    - send: sends an answer with the delay, pacing and dropped bytes
+    - stats: returns the number of requests and the jitter of the time between them
+    """
+
+    def __init__(self, delay: float = 0.0, baud: int = 19200, drop_rate: float = 0.0,
+                 clock_speed: float = 1.0, seed: Union[int, None] = None):
+        """
+        Constructor for SensorSimulator, opens the pty.
+        :param delay: seconds between receiving a request and starting the answer
+        :param baud: the answer is paced to the transmission time of this baudrate, 0 to not pace
+        :param drop_rate: probability that a byte of an answer is dropped
+        :param clock_speed: number of simulated seconds per real second
+        :param seed: seed of the random generator for dropping bytes
+        """
+        super().__init__(daemon=True)
+        self.delay = delay
+        self.baud = baud
+        self.drop_rate = drop_rate
+        self.clock = SimulatedClock(speed=clock_speed)
+        self.requests: List[Tuple[float, str]] = []
+        self.unknown_commands: List[str] = []
+        self._random = random.Random(seed)
+        self._stop_event = threading.Event()
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        speed = getattr(termios, f'B{baud}', None)
+        if speed is not None:
+            attrs = termios.tcgetattr(self._slave)
+            attrs[4] = speed
+            attrs[5] = speed
+            termios.tcsetattr(self._slave, termios.TCSANOW, attrs)
+        # the slave side is kept open, so the master does not fail when the software under test reconnects
+        self.port = os.ttyname(self._slave)
+
+    def run(self):
+        """
+        The thread loop, receives commands terminated by a carriage return until stop is called.
+        """
+        buffer = b''
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if readable:
+                try:
+                    buffer += os.read(self._master, 4096)
+                except OSError:
+                    break
+                while b'\r' in buffer:
+                    command, buffer = buffer.split(b'\r', 1)
+                    command = command.strip(b'\n').decode('ascii', errors='replace')
+                    if command:
+                        self.requests.append((monotonic(), command))
+                        self.handle_command(command)
+            self.tick()
+
+    def stop(self):
+        """
+        Stops the thread and closes the pty.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    @abstractmethod
+    def handle_command(self, command: str):
+        """
+        Abstract function for answering one command.
+        :param command: the command, without the carriage return
+        """
+
+    def tick(self):
+        """
+        Called regularly by the thread loop, for sensors that send telegrams by themselves.
+        """
+
+    def send(self, data: bytes):
+        """
+        Sends an answer after the response delay, dropping bytes with drop_rate and paced to the baudrate.
+        :param data: the answer
+        """
+        if self.delay > 0:
+            sleep(self.delay)
+        if self.drop_rate > 0:
+            data = bytes(byte for byte in data if self._random.random() >= self.drop_rate)
+        chunk_size = 64
+        for i in range(0, len(data), chunk_size):
+            chunk = data[i:i + chunk_size]
+            if self.baud > 0:
+                # a chunk arrives once it is transmitted, 8N1: 10 bits per byte
+                sleep(len(chunk) * 10 / self.baud)
+            os.write(self._master, chunk)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the number of requests and the mean and jitter (standard deviation)
+        of the time between requests that were answered with a telegram.
+        :return: dictionary with requests, mean_interval_s and jitter_s
+        """
+        times = [t for t, command in self.requests if self._is_telegram_request(command)]
+        intervals = [b - a for a, b in zip(times[:-1], times[1:])]
+        mean = sum(intervals) / len(intervals) if intervals else 0.0
+        jitter = (sum((i - mean) ** 2 for i in intervals) / len(intervals)) ** 0.5 if intervals else 0.0
+        return {'requests': len(times), 'mean_interval_s': mean, 'jitter_s': jitter}
+
+    @abstractmethod
+    def _is_telegram_request(self, command: str) -> bool:
+        """
+        Returns whether a command requests a telegram.
+        :param command: the command
+        :return: True if the command requests a telegram
+        """
+
+
+def default_parsivel_telegram() -> Dict[str, str]:
+    """
+    Returns the fields of an empty Parsivel telegram, as configured by CS/M/M/1.
+    :return: dictionary of field number to value
+    """
+    fields = {'01': '0000.000', '02': '0000.00', '03': '00', '04': '00', '05': '   NP', '06': '   C',
+              '07': '-9.999', '08': '20000', '09': '00060', '10': '13894', '11': '00000', '12': '021',
+              '13': '450994', '14': '2.11.6', '15': '2.11.1', '16': '0.50', '17': '24.3', '18': '0',
+              '19': ' ', '20': '00:00:00', '21': '01.01.2000', '22': '', '23': '', '24': '0000.00',
+              '25': '000', '26': '032', '27': '022', '28': '022', '29': '000.041', '30': '00.000',
+              '31': '0000.0', '32': '0000.00', '34': '0000.00', '35': '0000.00', '40': '20000', '41': '20000',
+              '50': '00000000', '51': '000140',
+              '90': '-9.999;' * 32, '91': '00.000;' * 32, '93': '000;' * 1024, '94': '0000;' * 22,
+              '95': '0.00;' * 7, '96': '0000000;' * 7, '97': ';', '98': ';', '99': ';'}
+    return fields
+
+
+def default_thies_telegram() -> str:
+    """
+    Returns an empty Thies telegram 5, without the STX and ETX characters.
+    :return: the telegram
+    """
+    return ('00;0854;2.11;01.01.00;00:00:00;00;00;NP   ;000.000;00;00;NP   ;000.000;000.000;000.000;0000.00;'
+            '99999;-9.9;100;0.0;' + '0;' * 16 + '+23;26;1662;4011;2886;258;062;063;+20.3;999;9999;9999;9999;'
+            + '00000;00000.000;' * 15 + '000;' * 440 + '99999;99999;9999;999;E9;')
+
+
+class ParsivelSimulator(SensorSimulator):
+    """
+    Simulated OTT Parsivel2, answering CS/PA with the user telegram and accepting the configuration commands
+    CS/M/M/1, CS/Z/1, CS/K/<name>, CS/J/<id>, CS/I/<interval> and CS/F/1.
+    Fields 20 and 21 (sensor time and date) follow the simulated clock.
+
+    Attributes:
+    - fields: dictionary of field number to value of the telegram
+    - restarts: number of CS/Z/1 restarts
+    """
+
+    def __init__(self, fields: Union[Dict[str, str], None] = None, **kwargs):
+        """
+        Constructor for ParsivelSimulator.
+        :param fields: dictionary of field number to value of the telegram, default: an empty telegram
+        :param kwargs: arguments of SensorSimulator
+        """
+        super().__init__(**kwargs)
+        self.fields = fields if fields is not None else default_parsivel_telegram()
+        self.restarts = 0
+
+    def handle_command(self, command: str):
+        """
+        Answers CS/PA with the telegram and applies the configuration commands.
+        :param command: the command, without the carriage return
+        """
+        if command == 'CS/PA':
+            self.send(self.telegram())
+        elif command == 'CS/M/M/1':
+            pass  # the user telegram is always used
+        elif command == 'CS/Z/1':
+            self.restarts += 1
+            self.fields['24'] = '0000.00'  # resets rain amount
+        elif command.startswith('CS/K/'):
+            self.fields['22'] = command[5:15]
+        elif command.startswith('CS/J/'):
+            self.fields['23'] = command[5:]
+        elif command.startswith('CS/I/'):
+            self.fields['09'] = f'{int(command[5:]):05d}'
+        elif command == 'CS/F/1':
+            default = default_parsivel_telegram()
+            self.fields.update({field: default[field] for field in ('09', '22', '23', '24')})
+        else:
+            self.unknown_commands.append(command)
+
+    def telegram(self) -> bytes:
+        """
+        Returns the telegram as sent after CS/PA, with the time and date of the simulated clock.
+        :return: the telegram
+        """
+        now = self.clock.now()
+        self.fields['20'] = now.strftime('%H:%M:%S')
+        self.fields['21'] = now.strftime('%d.%m.%Y')
+        lines = ['TYP OP4A'] + [f'{field}:{value}' for field, value in self.fields.items()]
+        return ('\r\n'.join(lines) + '\r\n\x03').encode('ascii')
+
+    def _is_telegram_request(self, command: str) -> bool:
+        """
+        Returns whether a command requests a telegram.
+        :param command: the command
+        :return: True if the command requests a telegram
+        """
+        return command == 'CS/PA'
+
+
+class ThiesSimulator(SensorSimulator):
+    """
+    Simulated Thies Clima, answering <id>TR00005 with telegram 5 and accepting the commands
+    KY (config mode), ZH/ZM/ZS (set the clock, only in config mode), TM (automatic mode),
+    RS (restart), RF (reset error counters) and RA (reset precipitation).
+    Commands for other sensor ids on the bus are ignored.
+    In automatic mode the telegram is sent at the start of every minute of the simulated clock.
+
+    Attributes:
+    - thies_id: the id of the sensor
+    - telegram_body: the telegram without STX and ETX, the date and time fields follow the simulated clock
+    - config_mode: whether the sensor is in config mode
+    - automatic_mode: whether the sensor sends telegrams by itself
+    - resets: list of the reset commands received
+    """
+
+    def __init__(self, thies_id: str = '00', telegram_body: Union[str, None] = None, **kwargs):
+        """
+        Constructor for ThiesSimulator.
+        :param thies_id: the id of the sensor
+        :param telegram_body: the telegram without STX and ETX, default: an empty telegram
+        :param kwargs: arguments of SensorSimulator
+        """
+        super().__init__(**kwargs)
+        self.thies_id = thies_id
+        self.telegram_body = telegram_body if telegram_body is not None else default_thies_telegram()
+        self.config_mode = False
+        self.automatic_mode = False
+        self.resets: List[str] = []
+        self._last_minute = None
+
+    def handle_command(self, command: str):
+        """
+        Answers TR00005 with the telegram and applies the configuration commands.
+        :param command: the command with the sensor id, without the carriage returns
+        """
+        if not command.startswith(self.thies_id):
+            return
+        code, value = command[len(self.thies_id):len(self.thies_id) + 2], command[len(self.thies_id) + 2:]
+        if code == 'TR' and value == '00005':
+            self.send(self.telegram())
+        elif code == 'KY':
+            self.config_mode = value == '00001'
+        elif code in ('ZH', 'ZM', 'ZS') and self.config_mode:
+            unit = {'ZH': 'hour', 'ZM': 'minute', 'ZS': 'second'}[code]
+            self.clock.set_time(**{unit: int(value)})
+        elif code == 'TM':
+            self.automatic_mode = value == '00001'
+        elif code in ('RS', 'RF', 'RA') and self.config_mode:
+            self.resets.append(code)
+        else:
+            self.unknown_commands.append(command)
+
+    def tick(self):
+        """
+        Sends the telegram at the start of every simulated minute in automatic mode.
+        """
+        minute = self.clock.now().replace(second=0, microsecond=0)
+        if self.automatic_mode and self._last_minute is not None and minute != self._last_minute:
+            self.send(self.telegram())
+        self._last_minute = minute
+
+    def telegram(self) -> bytes:
+        """
+        Returns telegram 5, with the sensor id and the date and time of the simulated clock.
+        :return: the telegram, framed by STX and ETX and followed by a carriage return and line feed
+        """
+        now = self.clock.now()
+        values = self.telegram_body.split(';')
+        values[0] = self.thies_id
+        if len(values) > 4:
+            values[3] = now.strftime('%d.%m.%y')
+            values[4] = now.strftime('%H:%M:%S')
+        return ('\x02' + ';'.join(values) + '\x03\r\n').encode('ascii')
+
+    def _is_telegram_request(self, command: str) -> bool:
+        """
+        Returns whether a command requests a telegram.
+        :param command: the command
+        :return: True if the command requests a telegram
+        """
+        return command == f'{self.thies_id}TR00005'
+
+
+def create_simulator(config_dict: Dict, **kwargs) -> Union[SensorSimulator, None]:
+    """
+    Creates a simulator based on the sensor type in the config files.
+    :param config_dict: the combined site specific and general config of the sensor
+    :param kwargs: arguments of SensorSimulator
+    :return: the simulator, None if the sensor type is not recognized
+    """
+    sensor_type = config_dict['global_attrs']['sensor_type']
+    if sensor_type == 'OTT Hydromet Parsivel2':
+        return ParsivelSimulator(**kwargs)
+    if sensor_type == 'Thies Clima':
+        return ThiesSimulator(thies_id=config_dict['global_attrs']['sensor_name'][-2:], **kwargs)
+    return None
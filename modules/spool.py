@@ -0,0 +1,251 @@
+"""
+This module contains a local spool file for telegram rows that could not be written to the database,
+and a thread that drains the spool into the database once it can be written again.
+
+Every record is one JSON line with the disdrodl row and the optional particles row.
+The lines are flushed to the operating system on every append, so they survive a crash of the process.
+They are fsync'ed by the SpoolDrainer thread every drain_interval, so a slow disk does not delay the acquisition,
+and optionally every fsync_batch appends as well, so a power loss loses at most the last batch.
+
+Classes:
+- Spool: append-only spool file for telegram rows
+- SpoolDrainer: thread that replays the spool into the database
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from logging import Logger
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from modules.sqldb import connect_db, insert_rows, DBRouter
+
+
+class Spool:  # pylint: disable=too-many-instance-attributes
+    """
+    Append-only spool file for telegram rows that could not be written to the database.
+    Appending and draining are safe to call from different threads.
+
+    Attributes:
+    - path: path of the spool file
+    - logger: logger for logging errors
+    - fsync_batch: number of appended records after which the file is fsync'ed, 0 to only fsync on sync
+    - duplicates: the policy for a record of a sensor and interval that is already in the database
+    - records_spooled: number of records appended so far
+    - records_drained: number of records written to the database so far
+
+    Functions:
+    - append: appends a telegram row to the spool
+    - sync: fsyncs the appended records
+    - pending: returns whether there are records waiting to be drained
+    - drain: writes all spooled records to the database in one transaction
+    - close: fsyncs and closes the spool file
+    """
+
+    def __init__(self, path: Path, logger: Logger, fsync_batch: int = 0, duplicates: str = 'keep_first',
+                 codec: str = 'plain'):
+        """
+        Constructor for Spool.
+        :param path: path of the spool file
+        :param logger: logger for logging errors
+        :param fsync_batch: number of appended records after which the file is fsync'ed, 0 to only fsync on sync
+        :param duplicates: the policy for a record of a sensor and interval that is already in the database
+        :param codec: the compression of the telegram column, one of TELEGRAM_CODECS
+        """
+        self.path = Path(path)
+        self.path_draining = self.path.with_name(f'{self.path.name}.draining')
+        self.logger = logger
+        self.fsync_batch = fsync_batch
+        self.duplicates = duplicates
+        self.codec = codec
+        self.records_spooled = 0
+        self.records_drained = 0
+        self._file = None
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    def append(self, row: Tuple, particles_row: Union[Tuple, None] = None):
+        """
+        Appends a telegram row to the spool.
+        :param row: tuple of (timestamp, datetime, sensor_id, telegram)
+        :param particles_row: tuple of (timestamp, sensor_id, n_particles, data), None if there are no particles
+        """
+        record = {'row': list(row), 'particles': None}
+        if particles_row is not None:
+            record['particles'] = list(particles_row[:3]) + [base64.b64encode(particles_row[3]).decode('ascii')]
+
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            self.records_spooled += 1
+            self._unsynced += 1
+            if 0 < self.fsync_batch <= self._unsynced:
+                self.__fsync()
+        self.logger.info(msg=f'spooled telegram of {row[1]} to {self.path}')
+
+    def sync(self):
+        """
+        Fsyncs the appended records that are not fsync'ed yet.
+        """
+        with self._lock:
+            if self._unsynced > 0:
+                self.__fsync()
+
+    def pending(self) -> bool:
+        """
+        Returns whether there are records waiting to be drained.
+        :return: True if the spool file or a partly drained spool file exists
+        """
+        return self.path.exists() or self.path_draining.exists()
+
+    def drain(self, db_path: Union[str, Path, DBRouter]) -> int:
+        """
+        Writes all spooled records to the database in one transaction per database (partition).
+        The spool file is first moved aside, so appends continue in a new file while draining.
+        If the database can not be written, the records are kept and the sqlite3 error is raised.
+        :param db_path: the path of the database, or the DBRouter of the database partitions
+        :return: the number of records written to the database
+        """
+        with self._lock:
+            if self._file is not None:
+                self.__fsync()
+                self._file.close()
+                self._file = None
+            # a file left by a failed drain is drained first
+            if self.path.exists() and not self.path_draining.exists():
+                os.replace(self.path, self.path_draining)
+
+        if not self.path_draining.exists():
+            return 0
+
+        rows, particle_rows = self.__read_records(self.path_draining)
+        # records of a failed partition are drained again, rows already written are duplicates
+        partitions: Dict[Path, Tuple[List[Tuple], List[Tuple]]] = {}
+        for records, index in ((rows, 0), (particle_rows, 1)):
+            for record in records:
+                path = db_path.prepare(record[0]) if isinstance(db_path, DBRouter) else Path(db_path)
+                partitions.setdefault(path, ([], []))[index].append(record)
+
+        for path, (partition_rows, partition_particle_rows) in partitions.items():
+            con, cur = connect_db(dbpath=str(path))
+            try:
+                insert_rows(cur, partition_rows, duplicates=self.duplicates, codec=self.codec,
+                            particle_rows=partition_particle_rows)
+                con.commit()
+            finally:
+                cur.close()
+                con.close()
+        self.path_draining.unlink()
+
+        self.records_drained += len(rows)
+        self.logger.info(msg=f'drained {len(rows)} spooled telegrams from {self.path} to {db_path}')
+        return len(rows)
+
+    def close(self):
+        """
+        Fsyncs and closes the spool file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self.__fsync()
+                self._file.close()
+                self._file = None
+
+    def __fsync(self):
+        """
+        Fsyncs the spool file, only call while holding the lock.
+        """
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def __read_records(self, path: Path) -> Tuple[List[Tuple], List[Tuple]]:
+        """
+        Reads the records of a spool file. A torn last line, from a crash while appending, is skipped.
+        :param path: path of the spool file
+        :return: the disdrodl rows and the particles rows
+        """
+        rows = []
+        particle_rows = []
+        with open(path, 'r', encoding='utf-8') as spool_file:
+            for line_number, line in enumerate(spool_file, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.logger.error(msg=f'skipping unreadable line {line_number} of {path}')
+                    continue
+                rows.append(tuple(record['row']))
+                if record['particles'] is not None:
+                    particles = record['particles']
+                    particle_rows.append(tuple(particles[:3]) + (base64.b64decode(particles[3]),))
+        return rows, particle_rows
+
+
+class SpoolDrainer(threading.Thread):
+    """
+    Thread that periodically fsyncs the spool and drains it into the database once it can be written again.
+
+    Attributes:
+    - spool: the spool to drain
+    - db_path: the path of the database
+    - logger: logger for logging errors
+    - drain_interval: time in seconds between attempts to drain the spool
+
+    Functions:
+    - run: the thread loop, drains the spool every drain_interval
+    - stop: drains the spool a last time and stops the thread
+    - __drain: fsyncs and drains the spool, logging a failure
+    """
+
+    def __init__(self, spool: Spool, db_path: Union[str, Path, DBRouter], logger: Logger,
+                 drain_interval: float = 30.0):
+        """
+        Constructor for SpoolDrainer.
+        :param spool: the spool to drain
+        :param db_path: the path of the database, or the DBRouter of the database partitions
+        :param logger: logger for logging errors
+        :param drain_interval: time in seconds between attempts to drain the spool
+        """
+        super().__init__(name='spool-drainer', daemon=True)
+        self.spool = spool
+        self.db_path = db_path
+        self.logger = logger
+        self.drain_interval = drain_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        The thread loop, drains the spool every drain_interval until stop is called.
+        """
+        self.__drain()
+        while not self._stop_event.wait(self.drain_interval):
+            self.__drain()
+        self.__drain()
+        self.spool.close()
+
+    def stop(self, timeout: float = None):
+        """
+        Drains the spool a last time and stops the thread.
+        :param timeout: maximum time in seconds to wait for the thread to finish
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+    def __drain(self):
+        """
+        Fsyncs the spool and drains it if there are records waiting, logging a failure instead of raising it.
+        """
+        self.spool.sync()
+        if not self.spool.pending():
+            return
+        try:
+            self.spool.drain(self.db_path)
+        except (sqlite3.Error, OSError) as e:
+            self.logger.warning(msg=f'Failed to drain {self.spool.path} to {self.db_path},'
+                                    f' will retry in {self.drain_interval} s: {e}')
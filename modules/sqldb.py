@@ -4,16 +4,46 @@ This module contains functionalities to use with the sql database.
 Functions:
 - connect_db: Connects to the database at the given path.
 - create_db: Creates disdrodl.db if it does not exist yet.
+- create_unique_index: Creates the unique index on sensor and interval-aligned timestamp.
 - dict_factory: Creates a dictionary from a database row.
+- rows_gen: Generates the rows of an executed query in batches, as dictionaries or columns.
 - sql_query_gen: Generates rows from an SQL query.
 - query_db_rows_gen: Queries the row for the given date.
+- insert_rows: Inserts telegram rows into the database.
+- unique_index_interval: Returns the interval of the unique index of the disdrodl table.
+- query_particles: Queries the particle lists for the given date.
+
+Classes:
+- DBRouter: Routes the telegrams to monthly database partitions and range queries across them.
 """
 
 import sqlite3
-from typing import Tuple
-from datetime import timezone
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+from modules.coverage import update_coverage, remove_coverage, LENGTH_QUERY
+from modules.telegram_codec import encode_telegram, decode_telegram
+
 # telegram_fields = config_dict['telegram_fields'].keys()
 
+INSERT_ROW_QUERY = 'INSERT INTO disdrodl(timestamp, datetime, sensor_id, telegram) VALUES (?, ?, ?, ?)'
+# what to do with a telegram of a sensor and interval that is already in the database
+DUPLICATE_POLICIES = ('keep_first', 'keep_last', 'keep_both')
+INSERT_ROW_QUERIES = {
+    'keep_first': 'INSERT OR IGNORE INTO disdrodl(timestamp, datetime, sensor_id, telegram) VALUES (?, ?, ?, ?)',
+    'keep_last': 'INSERT OR REPLACE INTO disdrodl(timestamp, datetime, sensor_id, telegram) VALUES (?, ?, ?, ?)',
+}
+INSERT_DUPLICATE_QUERY = ('INSERT INTO disdrodl_duplicates(timestamp, datetime, sensor_id, telegram)'
+                          ' VALUES (?, ?, ?, ?)')
+UNIQUE_INDEX_PREFIX = 'disdrodl_unique_slot_'
+# number of rows fetched at a time by the query generators
+DEFAULT_ARRAYSIZE = 1000
+INSERT_PARTICLES_QUERY = 'INSERT INTO particles(timestamp, sensor_id, n_particles, data) VALUES (?, ?, ?, ?)'
+INSERT_DUPLICATE_PARTICLES_QUERY = ('INSERT INTO particles_duplicates(timestamp, sensor_id, n_particles, data)'
+                                    ' VALUES (?, ?, ?, ?)')
+
 
 def connect_db(dbpath: str) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
     """
@@ -31,6 +61,14 @@ def create_db(dbpath):
     This function creates disdrodl.db at the specified path.
     with Table: disdrodl
     with columns id, timestamp, sensor_id, telegram
+    and Table: particles, for the Parsivel field 61 particle lists
+    with columns id, timestamp, sensor_id, n_particles, data
+    and Table: disdrodl_duplicates, for telegrams of an interval that was already logged (policy keep_both)
+    with the columns of disdrodl
+    and Table: particles_duplicates, for the particle lists of the telegrams in disdrodl_duplicates
+    with the columns of particles
+    and Table: coverage, the per-day coverage index (see modules/coverage.py)
+    with columns sensor_id, date, minutes, n_minutes, n_telegrams, n_empty, n_short
     :param dbpath: the path to create disdrodl.db at as a string
     """
     con, cur = connect_db(dbpath=str(dbpath))
@@ -44,12 +82,91 @@ def create_db(dbpath):
                     telegram TEXT
                 )
                 """)
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS particles
+                (
+                    id INTEGER PRIMARY KEY,
+                    timestamp REAL,
+                    sensor_id TEXT,
+                    n_particles INTEGER,
+                    data BLOB
+                )
+                """)
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS disdrodl_duplicates
+                (
+                    id INTEGER PRIMARY KEY,
+                    timestamp REAL,
+                    datetime TEXT,
+                    sensor_id TEXT,
+                    telegram TEXT
+                )
+                """)
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS particles_duplicates
+                (
+                    id INTEGER PRIMARY KEY,
+                    timestamp REAL,
+                    sensor_id TEXT,
+                    n_particles INTEGER,
+                    data BLOB
+                )
+                """)
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS coverage
+                (
+                    sensor_id TEXT,
+                    date TEXT,
+                    minutes BLOB,
+                    n_minutes INTEGER,
+                    n_telegrams INTEGER,
+                    n_empty INTEGER,
+                    n_short INTEGER,
+                    PRIMARY KEY (sensor_id, date)
+                )
+                """)
     con.commit()
 
 
+def create_unique_index(dbpath, interval: int, logger) -> bool:
+    """
+    This function creates the unique index on the sensor and the interval-aligned timestamp of the disdrodl table,
+    so a sensor has at most one telegram per interval. An index for another interval is replaced.
+    If the table already contains duplicates the index is not created, run dedup_db.py to remove them.
+    :param dbpath: the path to the database as a string
+    :param interval: the acquisition interval in seconds
+    :param logger: the logger object to log duplicates
+    :return: True if the index exists, False if the table contains duplicates
+    """
+    index_name = f'{UNIQUE_INDEX_PREFIX}{interval}s'
+    con, cur = connect_db(dbpath=str(dbpath))
+    try:
+        cur.execute('BEGIN')
+        other_indexes = cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'disdrodl'"
+                                    f" AND name LIKE '{UNIQUE_INDEX_PREFIX}%' AND name != '{index_name}'").fetchall()
+        for (other_index,) in other_indexes:
+            cur.execute(f'DROP INDEX {other_index}')
+        cur.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {index_name}'
+                    f' ON disdrodl(sensor_id, CAST(timestamp / {interval} AS INTEGER))')
+        con.commit()
+        return True
+    except sqlite3.IntegrityError as e:
+        con.rollback()
+        logger.error(msg=f'{dbpath} contains duplicate telegrams, run dedup_db.py to remove them: {e}')
+        return False
+    except sqlite3.OperationalError as e:
+        con.rollback()
+        logger.error(msg=f'Failed to create the unique index of {dbpath}: {e}')
+        return False
+    finally:
+        cur.close()
+        con.close()
+
+
 def dict_factory(cursor, row):
     """
     This function creates a dictionary from a database row.
+    For many rows use rows_gen, which gets the column names once per query instead of once per row.
     :param cursor: the database cursor object
     :param row: a row of the database
     :return: the dictionary of column names and row values
@@ -58,23 +175,76 @@ def dict_factory(cursor, row):
     return {key: value for key, value in zip(fields, row)} # pylint: disable=unnecessary-comprehension
 
 
-def sql_query_gen(con, query):
+def rows_gen(cur, arraysize: int = DEFAULT_ARRAYSIZE, columns: bool = False) -> Iterator[Dict]:
+    """
+    This function generates the rows of an executed query, fetched in batches of arraysize rows.
+    The column names are taken from the cursor once, each row is zipped with them.
+    :param cur: the cursor of the executed query, without row factory
+    :param arraysize: the number of rows fetched at a time
+    :param columns: yield each batch as one dictionary of column name to list of values, instead of the rows
+    :return: generator of the rows as dictionaries, or of the batches as columns
+    """
+    fields = [column[0] for column in cur.description]
+    while True:
+        batch = cur.fetchmany(arraysize)
+        if len(batch) == 0:
+            return
+        if columns:
+            yield dict(zip(fields, map(list, zip(*batch))))
+        else:
+            yield from map(dict, map(partial(zip, fields), batch))
+
+
+def _execute(con, query: str, params: Tuple = (), arraysize: int = DEFAULT_ARRAYSIZE):
+    """
+    This function executes a query on a new cursor that returns plain tuples, for rows_gen.
+    :param con: the database connection object
+    :param query: the query to be executed
+    :param params: the parameters of the query
+    :param arraysize: the number of rows fetched at a time
+    :return: the cursor of the executed query
+    """
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.arraysize = arraysize
+    return cur.execute(query, params)
+
+
+def _decode_telegrams(rows: Iterator[Dict], columns: bool) -> Iterator[Dict]:
+    """
+    This function decompresses the telegrams of the rows or batches of rows_gen, see modules/telegram_codec.py.
+    :param rows: the rows or batches
+    :param columns: whether the batches are columns
+    :return: generator of the rows or batches with the telegram strings
+    """
+    for row in rows:
+        if columns:
+            row['telegram'] = [decode_telegram(telegram) for telegram in row['telegram']]
+        else:
+            row['telegram'] = decode_telegram(row['telegram'])
+        yield row
+
+
+def sql_query_gen(con, query, arraysize: int = DEFAULT_ARRAYSIZE, columns: bool = False):
     """
     This function generates rows from an SQL query.
     :param con: the database connection object
     :param query: the query to be executed
+    :param arraysize: the number of rows fetched at a time
+    :param columns: yield batches of arraysize rows as columns, see rows_gen
     :return: the result of the query
     """
-    con.row_factory = dict_factory
-    yield from con.execute(query)
+    yield from rows_gen(_execute(con, query, arraysize=arraysize), arraysize=arraysize, columns=columns)
 
 
-def query_db_rows_gen(con, date_dt, logger):
+def query_db_rows_gen(con, date_dt, logger, arraysize: int = DEFAULT_ARRAYSIZE, columns: bool = False):
     """
     This function queries the database entries for the specified date between 00:00:00 and 23:59:59.
     :param con: the database connection object
     :param date_dt: the date to get entries from in the format year,month,day
     :param logger: the logger object to log the query string
+    :param arraysize: the number of rows fetched at a time
+    :param columns: yield batches of arraysize rows as columns, see rows_gen
     :return: the result of the query
     """
     start_dt = date_dt.replace(hour=0, minute=0, second=0, tzinfo=timezone.utc)  # redundant replace
@@ -83,6 +253,226 @@ def query_db_rows_gen(con, date_dt, logger):
     end_ts = end_dt.timestamp()
     query_str = f"SELECT * FROM disdrodl WHERE timestamp >= {start_ts} AND timestamp < {end_ts}"
     logger.debug(msg=query_str)
-    # Append each SQL response row as Telegram instance to telegram_objs var
-    con.row_factory = dict_factory
-    yield from con.execute(query_str)
+    # compressed telegrams are decompressed transparently
+    rows = rows_gen(_execute(con, query_str, arraysize=arraysize), arraysize=arraysize, columns=columns)
+    yield from _decode_telegrams(rows, columns)
+
+
+def insert_rows(cur, rows: Iterable[Tuple[float, str, str, str]], duplicates: str = 'keep_first',
+                codec: str = 'plain', particle_rows: Iterable[Tuple[float, str, int, bytes]] = ()):
+    """
+    This function inserts telegram rows into the database and adds them to the coverage index, without committing.
+    A replaced row is removed from the coverage index, so it is not counted twice.
+    A row of a sensor and interval that is already in the database (see create_unique_index) is
+    ignored (keep_first), replaces the row in the database (keep_last),
+    or is inserted into the disdrodl_duplicates table (keep_both).
+    The particle rows follow the row of their timestamp and sensor: they are inserted with an inserted row,
+    replace the particles of a replaced row, go to the particles_duplicates table with a duplicate row,
+    and are dropped with an ignored row, so the particles table never holds the particles of another telegram.
+    :param cur: the database cursor object
+    :param rows: tuples of (timestamp, datetime, sensor_id, telegram)
+    :param duplicates: the duplicate policy, one of DUPLICATE_POLICIES
+    :param codec: the compression of the telegram column, one of TELEGRAM_CODECS (modules/telegram_codec.py)
+    :param particle_rows: tuples of (timestamp, sensor_id, n_particles, data) of the rows with particles
+    """
+    particles = {(particles_row[0], particles_row[1]): particles_row for particles_row in particle_rows}
+    interval = None
+    # keyed by (timestamp, sensor_id), so a row replaced in the same call is not added to the coverage index
+    inserted: Dict[Tuple[float, str], Tuple[float, str, int]] = {}
+    replaced = []
+    for row in rows:
+        length = len(row[3]) if row[3] is not None else 0
+        if codec != 'plain':
+            row = tuple(row[:3]) + (encode_telegram(row[3], codec),)
+        particles_row = particles.get((row[0], row[2]))
+        # a row that is not inserted is a duplicate of a row in the database
+        cur.execute(INSERT_ROW_QUERIES['keep_first'], row)
+        if cur.rowcount > 0:
+            inserted[(row[0], row[2])] = (row[0], row[2], length)
+            particles_query = INSERT_PARTICLES_QUERY
+        elif duplicates == 'keep_last':
+            interval = interval or unique_index_interval(cur)
+            replaced_row = cur.execute(f'{LENGTH_QUERY} WHERE sensor_id = ?'
+                                       f' AND CAST(timestamp / {interval} AS INTEGER) = ?',
+                                       (row[2], int(row[0] / interval))).fetchone()
+            if inserted.pop((replaced_row[0], row[2]), None) is None:
+                replaced.append(replaced_row)
+            cur.execute('DELETE FROM particles WHERE sensor_id = ? AND timestamp = ?', (row[2], replaced_row[0]))
+            cur.execute(INSERT_ROW_QUERIES['keep_last'], row)
+            inserted[(row[0], row[2])] = (row[0], row[2], length)
+            particles_query = INSERT_PARTICLES_QUERY
+        elif duplicates == 'keep_both':
+            cur.execute(INSERT_DUPLICATE_QUERY, row)
+            particles_query = INSERT_DUPLICATE_PARTICLES_QUERY
+        else:
+            continue
+        if particles_row is not None:
+            cur.execute(particles_query, particles_row)
+    # the replaced rows are subtracted first, as their minute is recounted from the rows in the table
+    remove_coverage(cur, replaced, interval)
+    update_coverage(cur, inserted.values())
+
+
+def unique_index_interval(cur) -> Union[int, None]:
+    """
+    This function returns the interval of the unique index of the disdrodl table (see create_unique_index).
+    :param cur: the database cursor object
+    :return: the interval in seconds, None if the table has no unique index
+    """
+    index = cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'disdrodl'"
+                        f" AND name LIKE '{UNIQUE_INDEX_PREFIX}%'").fetchone()
+    if index is None:
+        return None
+    return int(index[0][len(UNIQUE_INDEX_PREFIX):-1])
+
+
+def query_particles(con, date_dt, logger) -> Dict[float, bytes]:
+    """
+    This function queries the particle lists for the specified date between 00:00:00 and 23:59:59.
+    :param con: the database connection object
+    :param date_dt: the date to get entries from in the format year,month,day
+    :param logger: the logger object to log the query string
+    :return: dictionary of timestamp and particle BLOB
+    """
+    start_ts = date_dt.replace(hour=0, minute=0, second=0, tzinfo=timezone.utc).timestamp()
+    end_ts = date_dt.replace(hour=23, minute=59, second=59, tzinfo=timezone.utc).timestamp()
+    query_str = f"SELECT timestamp, data FROM particles WHERE timestamp >= {start_ts} AND timestamp < {end_ts}"
+    logger.debug(msg=query_str)
+    cur = con.cursor()
+    cur.row_factory = None  # plain tuples, also when the connection uses dict_factory
+    try:
+        return dict(cur.execute(query_str).fetchall())
+    except sqlite3.OperationalError:
+        # databases created before the particles table existed
+        return {}
+
+
+class DBRouter:
+    """
+    Routes the telegrams to the database partition of their month, one SQLite file per YYYYmm next to the
+    configured database, ie. disdrodl_202401.db for disdrodl.db. Old partitions can be archived, compressed
+    or moved without touching the partition that is written to. Without partitioning every timestamp is routed
+    to the configured database, so the router can always be used.
+
+    Attributes:
+    - db_path: the path of the configured database
+    - partitioned: whether the database is partitioned by month
+    - interval: the acquisition interval in seconds, for the unique index of a new partition
+    - logger: the logger object
+
+    Functions:
+    - path_for: returns the path of the partition of a timestamp
+    - prepare: creates the partition of a timestamp if needed and returns its path
+    - paths: returns the paths of all existing partitions
+    - date_ranges: splits a range of days over the partitions
+    - query_rows_gen: generates the telegram rows of a time range across the partitions
+    """
+
+    def __init__(self, db_path: Union[str, Path], partitioned: bool = False, interval: int = 60, logger=None):
+        """
+        Constructor for DBRouter.
+        :param db_path: the path of the configured database
+        :param partitioned: whether the database is partitioned by month
+        :param interval: the acquisition interval in seconds
+        :param logger: the logger object
+        """
+        self.db_path = Path(db_path)
+        self.partitioned = partitioned
+        self.interval = interval
+        self.logger = logger
+        self._prepared: Set[Path] = set()
+
+    def __str__(self) -> str:
+        """
+        Returns the configured database path, with the partition pattern if partitioned.
+        :return: the description of the database
+        """
+        if self.partitioned:
+            return str(self.__month_path('YYYYmm'))
+        return str(self.db_path)
+
+    def path_for(self, timestamp: float) -> Path:
+        """
+        Returns the path of the partition of a timestamp.
+        :param timestamp: the timestamp in seconds since the epoch
+        :return: the path of the partition, the configured database if not partitioned
+        """
+        if not self.partitioned:
+            return self.db_path
+        return self.__month_path(datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y%m'))
+
+    def prepare(self, timestamp: float) -> Path:
+        """
+        Creates the partition of a timestamp with its tables and unique index, once per process.
+        A partition without the unique index can be written, but the duplicates policy does not apply to it.
+        :param timestamp: the timestamp in seconds since the epoch
+        :return: the path of the partition
+        """
+        path = self.path_for(timestamp)
+        if path not in self._prepared:
+            create_db(dbpath=str(path))
+            if not create_unique_index(dbpath=str(path), interval=self.interval, logger=self.logger):
+                self.logger.error(msg=f'{path} has no unique index, so the duplicates policy does not apply to it.'
+                                      f' Remove the duplicates with dedup_db.py to create it')
+            self._prepared.add(path)
+        return path
+
+    def paths(self) -> List[Path]:
+        """
+        Returns the paths of all existing partitions, sorted by month.
+        :return: the paths of the partitions, the configured database if not partitioned
+        """
+        if not self.partitioned:
+            return [self.db_path] if self.db_path.exists() else []
+        return sorted(self.db_path.parent.glob(f'{self.db_path.stem}_{"[0-9]" * 6}{self.db_path.suffix}'))
+
+    def date_ranges(self, start: date, end: date) -> List[Tuple[Path, date, date]]:
+        """
+        Splits a range of days over the partitions, ie. for a report over several months.
+        Months without a partition file are skipped.
+        :param start: the first day
+        :param end: the last day (inclusive)
+        :return: tuples of (partition path, first day, last day) in the partition
+        """
+        if not self.partitioned:
+            return [(self.db_path, start, end)] if self.db_path.exists() else []
+        ranges = []
+        month_start = start
+        while month_start <= end:
+            next_month = (month_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            path = self.__month_path(month_start.strftime('%Y%m'))
+            if path.exists():
+                ranges.append((path, month_start, min(end, next_month - timedelta(days=1))))
+            month_start = next_month
+        return ranges
+
+    def query_rows_gen(self, start_ts: float, end_ts: float, arraysize: int = DEFAULT_ARRAYSIZE,
+                       columns: bool = False) -> Iterator[Dict]:
+        """
+        Generates the telegram rows from start_ts up to end_ts across the partitions, in time order.
+        :param start_ts: the start timestamp (inclusive)
+        :param end_ts: the end timestamp (exclusive)
+        :param arraysize: the number of rows fetched at a time
+        :param columns: yield batches of at most arraysize rows as columns, a batch never spans two partitions
+        :return: generator of the rows as dictionaries, or of the batches as columns
+        """
+        start = datetime.fromtimestamp(start_ts, tz=timezone.utc).date()
+        end = datetime.fromtimestamp(end_ts, tz=timezone.utc).date()
+        for path, _, _ in self.date_ranges(start, end):
+            con, cur = connect_db(dbpath=str(path))
+            try:
+                rows = rows_gen(_execute(con, 'SELECT * FROM disdrodl WHERE timestamp >= ? AND timestamp < ?'
+                                              ' ORDER BY timestamp', (start_ts, end_ts), arraysize),
+                                arraysize=arraysize, columns=columns)
+                yield from _decode_telegrams(rows, columns)
+            finally:
+                cur.close()
+                con.close()
+
+    def __month_path(self, month: str) -> Path:
+        """
+        Returns the path of the partition of a month.
+        :param month: the month as YYYYmm
+        :return: the path of the partition
+        """
+        return self.db_path.with_name(f'{self.db_path.stem}_{month}{self.db_path.suffix}')
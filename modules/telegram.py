@@ -14,6 +14,10 @@ from logging import Logger
 from typing import Dict, Union
 import chardet
 
+from modules.particles import parse_particle_lines, particles_to_blob
+from modules.sqldb import insert_rows
+from modules.telegram_codec import decode_telegram
+
 
 class Telegram(ABC):
     """
@@ -31,6 +35,7 @@ class Telegram(ABC):
     - telegram_data: data from the telegram sent by a sensor
     - db_row_id: row id from the database
     - telegram_data_str: telegram data string
+    - particles: record array of the particles of field 61, only if capture_particles is set in the config
 
     Functions:
     - capture_prefixes_and_data: captures the telegram prefixes and data stored in self.telegram_lines
@@ -38,6 +43,8 @@ class Telegram(ABC):
     - parse_telegram_row: parses telegram string from SQL telegram field
     - prep_telegram_data4db: transforms self.telegram_data so that it can be easily inserted to SQL DB
     - insert2db: inserts telegram strings into the database
+    - db_row: returns the telegram as a row for the disdrodl table
+    - particles_row: returns the particles as a row for the particles table
     - Functions:
     - str2list: Converts telegram_data values from string to list by splitting at the specified separator.
     """
@@ -65,6 +72,7 @@ class Telegram(ABC):
         self.db_cursor = db_cursor
         self.db_row_id = db_row_id
         self.telegram_data_str = telegram_data_str
+        self.particles = None
 
     @abstractmethod
     def capture_prefixes_and_data(self):
@@ -116,21 +124,43 @@ class Telegram(ABC):
         """"
         Method for passing telegrams strings into the database
         """
-        self.capture_prefixes_and_data()
-        self.prep_telegram_data4db()
-
+        row = self.db_row()
+        duplicates = self.config_dict.get('duplicates', 'keep_first')
         self.logger.info(msg=f'inserting to DB: {self.timestamp.isoformat()}')
-        insert = 'INSERT INTO disdrodl(timestamp, datetime, sensor_id, telegram) VALUES'
+        self.logger.debug(msg=f'inserting row, duplicates: {duplicates}, {row}')
+        particles_row = self.particles_row()
+        # the particles follow the row, so they are not inserted when the row is ignored as a duplicate
+        insert_rows(self.db_cursor, [row], duplicates=duplicates,
+                    codec=self.config_dict.get('telegram_codec', 'plain'),
+                    particle_rows=[] if particles_row is None else [particles_row])
+
+    def db_row(self):
+        """
+        Method that returns the telegram as a row for the disdrodl table.
+        :return: tuple of (timestamp, datetime, sensor_id, telegram)
+        """
+        # only parse the telegram lines if that was not done already
+        if self.telegram_data_str is None:
+            self.capture_prefixes_and_data()
+            self.prep_telegram_data4db()
 
-        timestamp_str = self.timestamp.isoformat()
-        ts = self.timestamp.timestamp()
-        sensor = self.config_dict['global_attrs']['sensor_name']
-        t_str = self.telegram_data_str
+        return (self.timestamp.timestamp(),
+                self.timestamp.isoformat(),
+                self.config_dict['global_attrs']['sensor_name'],
+                self.telegram_data_str)
 
-        insert_str = f"{insert} ({ts}, '{timestamp_str}', '{sensor}', '{t_str}');"
+    def particles_row(self):
+        """
+        Method that returns the particles of field 61 as a row for the particles table.
+        :return: tuple of (timestamp, sensor_id, n_particles, data), or None if no particles were captured
+        """
+        if self.particles is None:
+            return None
 
-        self.logger.debug(msg=insert_str)
-        self.db_cursor.execute(insert_str)
+        return (self.timestamp.timestamp(),
+                self.config_dict['global_attrs']['sensor_name'],
+                len(self.particles),
+                particles_to_blob(self.particles))
 
 
     def str2list(self, field, separator):
@@ -156,8 +186,25 @@ class ParsivelTelegram(Telegram):
         """
         Captures the telegram prefixes and data stored in self.telegram_lines
         and adds the data to self.telegram_data dict.
+        If capture_particles is set in the config, the lines of field 61 are not decoded one by one,
+        but collected and parsed at once into self.particles.
         """
+        capture_particles = self.config_dict is not None and self.config_dict.get('capture_particles', False)
+        particle_lines = None
+
         for line in self.telegram_lines:
+            if particle_lines is not None:
+                # the particle list continues until the next field
+                if b':' not in line:
+                    particle_lines.append(line)
+                    continue
+                self.__parse_particles(particle_lines)
+                particle_lines = None
+
+            if capture_particles and line.split(b':', 1)[0].strip() in (b'61', b'F61'):
+                particle_lines = [line.split(b':', 1)[1]]
+                continue
+
             encoding = chardet.detect(line)['encoding']
             line_str = line.decode(encoding)
             line_list = line_str.split(":")
@@ -176,11 +223,25 @@ class ParsivelTelegram(Telegram):
                 super().__setattr__(f'field_{field}_values', value)
                 self.telegram_data[field] = value
 
+        if particle_lines is not None:
+            self.__parse_particles(particle_lines)
+
+    def __parse_particles(self, particle_lines):
+        """
+        Parses the lines of field 61 into self.particles.
+        :param particle_lines: the lines of field 61, without the field prefix
+        """
+        try:
+            self.particles = parse_particle_lines(particle_lines)
+        except ValueError as e:
+            self.logger.error(msg=f'Could not parse the particles of field 61 at {self.timestamp}: {e}')
+            self.particles = None
 
     def parse_telegram_row(self):
         """
-        Parses telegram string from SQL telegram fields.
+        Parses telegram string from SQL telegram fields, compressed telegrams are decompressed first.
         """
+        self.telegram_lines = decode_telegram(self.telegram_lines)
         telegram_lines_list = self.telegram_lines.split('; ')
 
         try:
@@ -256,9 +317,9 @@ class ThiesTelegram(Telegram):
 
     def parse_telegram_row(self):
         """
-        Parses telegram string from SQL database telegram fields.
+        Parses telegram string from SQL database telegram fields, compressed telegrams are decompressed first.
         """
-
+        self.telegram_lines = decode_telegram(self.telegram_lines)
         telegram_lines_list = self.telegram_lines.split('; ')
         try:
             telegram_lines_list[1]
@@ -0,0 +1,72 @@
+"""
+This module contains the optional compression of the telegram column of the disdrodl table.
+
+A Parsivel telegram is several KB of mostly zeros, compressed it takes a fraction of that on the SD card.
+The format is stored per row: a plain telegram is stored as TEXT, a compressed telegram as a BLOB of one
+codec byte followed by the compressed UTF-8 telegram. Rows of both formats can be mixed in one table,
+so the codec can be changed without converting the database.
+
+zstd needs the optional zstandard package, zlib is part of the standard library.
+
+Functions:
+- codec_available: Returns whether a codec can be used.
+- encode_telegram: Encodes a telegram string for the telegram column.
+- decode_telegram: Decodes a value of the telegram column to the telegram string.
+"""
+
+import zlib
+from typing import Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TELEGRAM_CODECS = ('plain', 'zlib', 'zstd')
+CODEC_IDS = {'zlib': 1, 'zstd': 2}
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def codec_available(codec: str) -> bool:
+    """
+    Returns whether a codec can be used.
+    :param codec: one of TELEGRAM_CODECS
+    :return: True if the codec is known and its package is installed
+    """
+    if codec == 'zstd':
+        return zstandard is not None
+    return codec in TELEGRAM_CODECS
+
+
+def encode_telegram(telegram: str, codec: str = 'plain') -> Union[str, bytes]:
+    """
+    Encodes a telegram string for the telegram column.
+    :param telegram: the telegram string
+    :param codec: one of TELEGRAM_CODECS
+    :return: the telegram string for plain, else the codec byte followed by the compressed telegram
+    """
+    if codec == 'plain' or telegram is None:
+        return telegram
+    data = telegram.encode('utf-8')
+    if codec == 'zlib':
+        return bytes([CODEC_IDS['zlib']]) + zlib.compress(data, ZLIB_LEVEL)
+    return bytes([CODEC_IDS['zstd']]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def decode_telegram(value: Union[str, bytes, None]) -> Union[str, None]:
+    """
+    Decodes a value of the telegram column to the telegram string, whatever the format of the row.
+    :param value: the value of the telegram column
+    :return: the telegram string
+    """
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    value = bytes(value)
+    if value[0] == CODEC_IDS['zlib']:
+        return zlib.decompress(value[1:]).decode('utf-8')
+    if value[0] == CODEC_IDS['zstd']:
+        if zstandard is None:
+            raise ValueError('telegram is compressed with zstd, install the zstandard package to read it')
+        return zstandard.ZstdDecompressor().decompress(value[1:]).decode('utf-8')
+    raise ValueError(f'unknown telegram codec {value[0]}')
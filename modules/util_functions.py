@@ -9,6 +9,10 @@ Functions:
 - interruptHandler: This function interrupts the execution of the serial connection.
 - create_logger: This function creates a logger object that logs to a file.
 - create_sensor: This function creates a sensor object based on the provided sensor type.
+- get_option: This function returns an optional argument from parsed command line arguments.
+- set_interval: This function validates the acquisition interval and sets the interval variable to it.
+- get_duplicates_policy: This function validates the policy for duplicate telegrams of an interval.
+- get_telegram_codec: This function validates the compression of the telegram column.
 """
 
 import os
@@ -21,6 +25,8 @@ from logging import Logger
 import yaml
 
 from modules.sensors import Parsivel, Thies, Sensor
+from modules.sqldb import DUPLICATE_POLICIES
+from modules.telegram_codec import TELEGRAM_CODECS, codec_available
 
 if __name__ == '__main__':
     from log import log  # pylint: disable=import-error
@@ -98,18 +104,22 @@ def interruptHandler(serial_connection, logger):
     serial_connection.close()
 
 
-def create_logger(log_dir, script_name, sensor_name):
+def create_logger(log_dir, script_name, sensor_name, queued=False, sample_rates=None):
     """
     This function creates a logger object that logs to a file.
     :param log_dir: directory of the log file
     :param script_name: name of the script
     :param sensor_name: name of the disdrometer
+    :param queued: whether log records are written to file by a background thread
+    :param sample_rates: optional dictionary of level to N, only 1 in N records of that level is logged
     :return: the logger object
     """
     create_dir(log_dir)
     log_file = log_dir / f'log_{script_name}.json'
     logger = log(log_path=log_file,
-                 log_name=f"{script_name}: {sensor_name}")
+                 log_name=f"{script_name}: {sensor_name}",
+                 queued=queued,
+                 sample_rates=sample_rates)
     logger.info(msg=f"Starting {script_name} for {sensor_name}")
     return logger
 
@@ -129,3 +139,69 @@ def create_sensor(sensor_type: str, logger: Logger, sensor_id: str = '00',) -> S
     except KeyError:
         logger.error(msg=f"Sensor type {sensor_type} not recognized")
         sys.exit(1)
+
+
+def get_option(args, name: str, default=None):
+    """
+    This function returns an optional argument from parsed command line arguments,
+    or the default when args does not define it (ie. when a script's main is called with other args objects).
+    :param args: the parsed arguments
+    :param name: name of the optional argument
+    :param default: value returned when the argument is not defined
+    :return: the value of the argument
+    """
+    return vars(args).get(name, default)
+
+
+def set_interval(config_dict: Dict, logger: Logger) -> Union[int, None]:
+    """
+    This function validates the acquisition interval of the config (default 60 s)
+    and sets the value of the interval variable written to the netCDF to it.
+    The interval must divide a minute, so every minute starts with a cycle.
+    The Thies telegram 5 is averaged over one minute, so sub-minute intervals fall back to 60 s for the Thies.
+    :param config_dict: the combined site specific and general config
+    :param logger: logger for logging an invalid interval
+    :return: the interval in seconds, or None if it is invalid
+    """
+    interval = config_dict.get('interval', 60)
+    if not isinstance(interval, int) or interval < 10 or 60 % interval != 0:
+        logger.error(msg=f"Interval {interval} not supported, use 10, 12, 15, 20, 30 or 60 seconds")
+        return None
+    if interval < 60 and config_dict['global_attrs']['sensor_type'] == 'Thies Clima':
+        logger.warning(msg=f"Interval {interval} not supported by the Thies, using 60 seconds")
+        interval = 60
+    config_dict['variables']['interval']['value'] = [interval]
+    return interval
+
+
+def get_duplicates_policy(config_dict: Dict, logger: Logger) -> Union[str, None]:
+    """
+    This function validates the policy for a telegram of a sensor and interval that is already in the database
+    (default keep_first): keep the first telegram, keep the last telegram, or keep both with the later ones
+    in the disdrodl_duplicates table.
+    :param config_dict: the combined site specific and general config
+    :param logger: logger for logging an invalid policy
+    :return: the policy, or None if it is invalid
+    """
+    duplicates = config_dict.get('duplicates', 'keep_first')
+    if duplicates not in DUPLICATE_POLICIES:
+        logger.error(msg=f"Duplicates policy {duplicates} not supported, use {', '.join(DUPLICATE_POLICIES)}")
+        return None
+    return duplicates
+
+
+def get_telegram_codec(config_dict: Dict, logger: Logger) -> Union[str, None]:
+    """
+    This function validates the compression of the telegram column (default plain), see modules/telegram_codec.py.
+    :param config_dict: the combined site specific and general config
+    :param logger: logger for logging an invalid or unavailable codec
+    :return: the codec, or None if it is invalid or its package is not installed
+    """
+    codec = config_dict.get('telegram_codec', 'plain')
+    if codec not in TELEGRAM_CODECS:
+        logger.error(msg=f"Telegram codec {codec} not supported, use {', '.join(TELEGRAM_CODECS)}")
+        return None
+    if not codec_available(codec):
+        logger.error(msg=f"Telegram codec {codec} needs the zstandard package, run: pip install zstandard")
+        return None
+    return codec
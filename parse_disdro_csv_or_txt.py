@@ -13,8 +13,9 @@ from argparse import ArgumentParser
 from pydantic.v1.utils import deep_update
 from modules.telegram import ParsivelTelegram, ThiesTelegram, create_telegram
 #from pprint import pprint
-from modules.util_functions import yaml2dict, create_logger
+from modules.util_functions import yaml2dict, create_logger, get_option
 from modules.netCDF import NetCDF
+from modules.profiler import StageProfiler
 
 #Different dictionaries to select the necessary method/file needed, corresponding to the respective sensor
 telegrams = {'THIES': ThiesTelegram, 'PAR': ParsivelTelegram}
@@ -298,12 +299,24 @@ def parse_arguments():
         required=False,
         default='csv',
         help='File type of the input file(s). ie. -f csv or -f txt')	
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report wall time and memory of each stage to the log and stdout')
+    parser.add_argument(
+        '--profile_output',
+        default=None,
+        help='Path to write cProfile statistics to (pstats format), implies --profile')
     return parser.parse_args() 
 
 def main(args):
     '''
     Main script for parsing a csv of telegram
     '''
+    profile_output = get_option(args, 'profile_output')
+    profiler = StageProfiler(enabled=get_option(args, 'profile', False) or profile_output is not None)
+    profiler.start(use_cprofile=profile_output is not None)
+
     input_path = Path(args.input)
     
     #get date from input file
@@ -314,7 +327,8 @@ def main(args):
     date_str = get_date[:8]
     ## Config
     wd = Path(__file__).parent
-    config_dict_site = yaml2dict(path=wd / args.config)
+    with profiler.stage('config_load'):
+        config_dict_site = yaml2dict(path=wd / args.config)
 
     ## Logger
     logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
@@ -330,7 +344,8 @@ def main(args):
         logger.error(msg=f"Sensor {sensor_name} not found")
         sys.exit(1)
 
-    config_dict = yaml2dict(path=wd / 'configs_netcdf' / config_files[sensor])
+    with profiler.stage('config_load'):
+        config_dict = yaml2dict(path=wd / 'configs_netcdf' / config_files[sensor])
     config_dict = deep_update(config_dict, config_dict_site)
     conf_telegram_fields = config_dict['telegram_fields']  # multivalue fields have > 1 dimension
     
@@ -340,9 +355,11 @@ def main(args):
 
     #iterate over all telegrams
     if args.file_type == 'txt':
-        telegram_objs = txt_loop(input_path, sensor, config_dict, conf_telegram_fields, logger)
+        with profiler.stage('telegram_parse'):
+            telegram_objs = txt_loop(input_path, sensor, config_dict, conf_telegram_fields, logger)
     elif args.file_type == 'csv':
-        telegram_objs = csv_loop(input_path, sensor, config_dict, conf_telegram_fields, logger)
+        with profiler.stage('telegram_parse'):
+            telegram_objs = csv_loop(input_path, sensor, config_dict, conf_telegram_fields, logger)
     else:
         logger.error(msg=f"File type {args.file_type} not recognized")
         sys.exit(1)
@@ -355,11 +372,22 @@ def main(args):
                 fn_start=output_fn,
                 full_version=True,
                 telegram_objs=telegram_objs,
-                date=date)
+                date=date,
+                profiler=profiler)
     
-    nc.create_netCDF()
-    nc.write_data_to_netCDF_parsivel() if sensor == 'PAR' else nc.write_data_to_netCDF_thies() 
-    nc.compress()   
+    with profiler.stage('netcdf_create'):
+        nc.create_netCDF()
+    with profiler.stage('netcdf_write'):
+        nc.write_data_to_netCDF_parsivel() if sensor == 'PAR' else nc.write_data_to_netCDF_thies() 
+    with profiler.stage('compression'):
+        nc.compress()   
+
+    profiler.stop()
+    profiler.log_report(logger)
+    profiler.print_report()
+    if profile_output is not None:
+        profiler.dump_stats(profile_output)
+        logger.info(msg=f'cProfile statistics written to {profile_output}')
 
 if __name__ == '__main__':
     main(parse_arguments())
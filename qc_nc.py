@@ -0,0 +1,61 @@
+"""
+Script that evaluates the data-quality rules (see modules/qc.py) over exported netCDFs of a range of days,
+ie. a month of a station, and prints the number of flagged time steps of each rule.
+
+Run: python qc_nc.py -c configs_netcdf/config_PAR_008_GV.yml -i /data/disdroDL/202401/*_PAR008.nc
+
+Functions:
+- main: Evaluates the QC rules over the netCDFs.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+from pydantic.v1.utils import deep_update
+
+from modules.qc import qc_netCDF
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger
+
+
+def main(args):
+    """
+    Evaluates the QC rules over the netCDFs of a sensor, in time order, as one range.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name='qc_nc',
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        sys.exit(1)
+    config_dict = deep_update(config_dict_general, config_dict_site)
+
+    # the file names start with the date, so sorting them puts them in time order
+    paths = sorted(Path(path) for path in args.input)
+    summary = qc_netCDF(paths=paths, config_dict=config_dict, logger=logger)
+    print(f"QC of {len(paths)} netCDF, {summary.pop('time_steps')} time steps")
+    for name, count in summary.items():
+        print(f'{name}: {count}')
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: evaluate the data-quality rules over the netCDFs of a range of days."
+                    " Run: python qc_nc.py -c configs_netcdf/config_PAR_008_GV.yml"
+                    " -i /data/disdroDL/202401/*_PAR008.nc")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('-i', '--input', nargs='+', required=True,
+                        help='The netCDFs to check, of the same sensor')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
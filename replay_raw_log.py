@@ -0,0 +1,164 @@
+"""
+Script that replays raw telegram logs (see modules/raw_log.py) through the Telegram parsers into a fresh database,
+to reprocess the telegrams after the parsing logic changed. The raw log files are parsed by several worker
+processes in parallel, the main process writes the rows of each file in one transaction.
+The NetCDF files are then exported from the fresh database with export_disdrodlDB2NC.py.
+
+Run: python replay_raw_log.py -c configs_netcdf/config_PAR_008_GV.yml -i /data/disdroDL/raw -o /tmp/replay.db
+
+Functions:
+- find_raw_logs: Finds the raw log files of a sensor in the given files and directories.
+- parse_raw_log: Parses the frames of one raw log file into database rows.
+- main: Replays the raw log files into a fresh database.
+- get_args: Gets the arguments from the command line.
+"""
+import logging
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from time import monotonic
+from typing import Dict, List, Tuple
+from pydantic.v1.utils import deep_update
+
+from modules.raw_log import read_frames, payload_to_telegram
+from modules.sqldb import create_db, connect_db, insert_rows, create_unique_index
+from modules.telegram import create_telegram
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger, set_interval, \
+    get_duplicates_policy, get_telegram_codec
+
+
+def find_raw_logs(inputs: List[str], sensor_name: str) -> List[Path]:
+    """
+    Finds the raw log files of a sensor in the given files and directories.
+    :param inputs: raw log files, or directories with raw log files
+    :param sensor_name: the name of the sensor
+    :return: the raw log files, sorted by date
+    """
+    paths = []
+    for input_path in map(Path, inputs):
+        if input_path.is_dir():
+            paths.extend(input_path.glob(f'raw_{sensor_name}_*.bin'))
+        else:
+            paths.append(input_path)
+    return sorted(paths, key=lambda path: path.name)
+
+
+def parse_raw_log(path: Path, config_dict: Dict) -> Tuple[List[Tuple], List[Tuple]]:
+    """
+    Parses the frames of one raw log file into database rows, as main.py does for the telegrams it reads.
+    :param path: the path of the raw log file
+    :param config_dict: the combined site specific and general config of the sensor
+    :return: the disdrodl rows and the particles rows
+    """
+    logger = logging.getLogger(f'replay {path.name}')
+    sensor_type = config_dict['global_attrs']['sensor_type']
+    rows = []
+    particle_rows = []
+    for timestamp, payload in read_frames(path):
+        telegram = create_telegram(config_dict=config_dict,
+                                   telegram_lines=payload_to_telegram(payload, sensor_type),
+                                   db_row_id=None,
+                                   timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc),
+                                   db_cursor=None,
+                                   telegram_data={},
+                                   logger=logger)
+        if telegram is None:
+            continue
+        telegram.capture_prefixes_and_data()
+        telegram.prep_telegram_data4db()
+        rows.append(telegram.db_row())
+        particles_row = telegram.particles_row()
+        if particles_row is not None:
+            particle_rows.append(particles_row)
+    return rows, particle_rows
+
+
+def main(args):
+    """
+    Replays the raw log files into a fresh database, parsing the files in parallel.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    sensor_name = config_dict_site['global_attrs']['sensor_name']
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name='replay_raw_log',
+                           sensor_name=sensor_name)
+
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        sys.exit(1)
+    config_dict = deep_update(config_dict_general, config_dict_site)
+    interval = set_interval(config_dict, logger)
+    duplicates = get_duplicates_policy(config_dict, logger)
+    codec = get_telegram_codec(config_dict, logger)
+    if interval is None or duplicates is None or codec is None:
+        sys.exit(1)
+
+    db_path = Path(args.output)
+    if db_path.exists():
+        logger.error(msg=f'{db_path} already exists, replay into a fresh database')
+        sys.exit(1)
+
+    raw_logs = find_raw_logs(args.input, sensor_name)
+    if len(raw_logs) == 0:
+        logger.error(msg=f'No raw log files of {sensor_name} found in {args.input}')
+        sys.exit(1)
+
+    create_db(dbpath=str(db_path))
+    create_unique_index(dbpath=str(db_path), interval=interval, logger=logger)
+    con, cur = connect_db(dbpath=str(db_path))
+    start = monotonic()
+    n_rows = 0
+    parse = partial(parse_raw_log, config_dict=config_dict)
+
+    def write(path, rows, particle_rows):
+        insert_rows(cur, rows, duplicates=duplicates, codec=codec, particle_rows=particle_rows)
+        con.commit()
+        logger.info(msg=f'replayed {len(rows)} telegrams from {path}')
+
+    if args.workers > 1:
+        with Pool(processes=args.workers) as pool:
+            for path, (rows, particle_rows) in zip(raw_logs, pool.imap(parse, raw_logs)):
+                write(path, rows, particle_rows)
+                n_rows += len(rows)
+    else:
+        for path in raw_logs:
+            rows, particle_rows = parse(path)
+            write(path, rows, particle_rows)
+            n_rows += len(rows)
+
+    cur.close()
+    con.close()
+    elapsed = monotonic() - start
+    msg = (f'Replayed {n_rows} telegrams from {len(raw_logs)} raw log files into {db_path} in {elapsed:.1f} s'
+           f' ({n_rows / max(elapsed, 1e-9):.0f} telegrams/s)')
+    logger.info(msg=msg)
+    print(msg)
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: replay raw telegram logs into a fresh database."
+                    " Run: python replay_raw_log.py -c configs_netcdf/config_PAR_008_GV.yml"
+                    " -i /data/disdroDL/raw -o /tmp/replay.db")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('-i', '--input', required=True, nargs='+',
+                        help='Raw log files, or directories with the raw log files of the sensor')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Path of the fresh database to create')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='Number of worker processes parsing raw log files in parallel')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
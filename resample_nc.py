@@ -0,0 +1,65 @@
+"""
+Script that resamples exported netCDFs of a range of days to a longer interval (see modules/resample.py),
+ie. a file of the hourly values of a month, or of the daily values of a year.
+
+Run: python resample_nc.py -c configs_netcdf/config_PAR_008_GV.yml -i /data/disdroDL/202401/*_PAR008.nc
+     -o /data/disdroDL/202401_Green_Village-GV_PAR008_3600s.nc --interval 3600
+
+Functions:
+- main: Resamples the netCDFs to one netCDF.
+- get_args: Gets the arguments from the command line.
+"""
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+from pydantic.v1.utils import deep_update
+
+from modules.resample import resample_netCDF
+from modules.util_functions import yaml2dict, get_general_config_dict, create_logger
+
+
+def main(args):
+    """
+    Resamples the netCDFs of a sensor, in time order, to one netCDF.
+    :param args: the command line arguments
+    """
+    wd = Path(__file__).parent
+    config_dict_site = yaml2dict(path=wd / args.config)
+    logger = create_logger(log_dir=Path(config_dict_site['log_dir']),
+                           script_name='resample_nc',
+                           sensor_name=config_dict_site['global_attrs']['sensor_name'])
+    config_dict_general = get_general_config_dict(wd, config_dict_site['global_attrs']['sensor_type'], logger)
+    if config_dict_general is None:
+        sys.exit(1)
+    config_dict = deep_update(config_dict_general, config_dict_site)
+
+    # the file names start with the date, so sorting them puts them in time order
+    paths = sorted(Path(path) for path in args.input)
+    n_intervals = resample_netCDF(paths=paths, path_out=Path(args.output), interval=args.interval,
+                                  config_dict=config_dict, logger=logger)
+    print(f'Resampled {len(paths)} netCDF to {n_intervals} intervals of {args.interval} s: {args.output}')
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: resample the netCDFs of a range of days to a longer interval."
+                    " Run: python resample_nc.py -c configs_netcdf/config_PAR_008_GV.yml"
+                    " -i /data/disdroDL/202401/*_PAR008.nc -o hourly.nc --interval 3600")
+    parser.add_argument('-c', '--config', required=True,
+                        help='Site config file of the sensor. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('-i', '--input', nargs='+', required=True,
+                        help='The netCDFs to resample, of the same sensor and version (full or light)')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Path of the resampled netCDF')
+    parser.add_argument('--interval', type=int, default=3600,
+                        help='Length of the intervals in seconds, aligned to midnight UTC, default 3600')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
@@ -0,0 +1,146 @@
+"""
+Script that runs simulated sensors on pseudo-terminals, one process per sensor,
+to run and benchmark main.py or main_multi.py without hardware.
+
+Run: python simulate_sensors.py -c configs_netcdf/config_PAR_008_GV.yml configs_netcdf/config_THIES_006_GV.yml
+     --link_dir /tmp/disdrodl_sim
+and set the `port` of each site config to the printed path.
+On exit the number of telegram requests and the jitter of the time between them are printed per sensor.
+
+Functions:
+- load_telegram_file: Loads the telegram of a simulator from a file.
+- run_simulator: Runs one simulator until SIGTERM or SIGINT is received.
+- main: Starts one simulator process per site config file.
+- get_args: Gets the arguments from the command line.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, Union
+
+from modules.simulators import create_simulator
+from modules.util_functions import yaml2dict
+
+
+def load_telegram_file(path: Union[str, None], sensor_type: str) -> Dict:
+    """
+    Loads the telegram of a simulator from a file.
+    For a Parsivel the file contains one 'NN:value' line per field, as printed by the serial sniffer,
+    for a Thies the file contains telegram 5 on one line.
+    :param path: the path of the file, None for the default telegram
+    :param sensor_type: the sensor type in the config file
+    :return: keyword arguments for the simulator
+    """
+    if path is None:
+        return {}
+    lines = [line.strip('\r\n\x02\x03') for line in Path(path).read_text(encoding='ascii').splitlines()]
+    if sensor_type == 'Thies Clima':
+        return {'telegram_body': lines[0]}
+    fields = {}
+    for line in lines:
+        if ':' in line and line[:2].isdigit():
+            field, value = line.split(':', 1)
+            fields[field] = value
+    return {'fields': fields}
+
+
+def run_simulator(config_file: str, sim_kwargs: Dict, link_dir: Union[str, None], ports):
+    """
+    Runs one simulator until SIGTERM or SIGINT is received, then prints its statistics.
+    :param config_file: the site config file of the simulated sensor
+    :param sim_kwargs: keyword arguments for the simulator
+    :param link_dir: directory for a symbolic link to the pty named after the sensor, None for no link
+    :param ports: multiprocessing queue to report the port to the parent process
+    """
+    config_dict = yaml2dict(path=Path(config_file))
+    sensor_name = config_dict['global_attrs']['sensor_name']
+    sim_kwargs = {'baud': config_dict['baud'], **sim_kwargs,
+                  **load_telegram_file(sim_kwargs.pop('telegram_file', None),
+                                       config_dict['global_attrs']['sensor_type'])}
+    simulator = create_simulator(config_dict, **sim_kwargs)
+    if simulator is None:
+        ports.put((sensor_name, None))
+        return
+
+    port = simulator.port
+    if link_dir is not None:
+        link = Path(link_dir) / sensor_name
+        link.parent.mkdir(parents=True, exist_ok=True)
+        if link.is_symlink():
+            link.unlink()
+        link.symlink_to(simulator.port)
+        port = str(link)
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    simulator.start()
+    ports.put((sensor_name, port))
+    stop_event.wait()
+    simulator.stop()
+    if link_dir is not None:
+        Path(port).unlink(missing_ok=True)
+    print(f"{sensor_name}: {simulator.stats()}, unknown commands: {simulator.unknown_commands}")
+
+
+def main(args):
+    """
+    Starts one simulator process per site config file and runs until SIGTERM or SIGINT is received.
+    :param args: the command line arguments
+    """
+    sim_kwargs = {'delay': args.delay, 'drop_rate': args.drop_rate, 'clock_speed': args.clock_speed,
+                  'seed': args.seed}
+    if args.baud is not None:
+        sim_kwargs['baud'] = args.baud
+    if args.telegram_file is not None:
+        sim_kwargs['telegram_file'] = args.telegram_file
+
+    ports = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_simulator, args=(config_file, dict(sim_kwargs),
+                                                                     args.link_dir, ports))
+                 for config_file in args.config]
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the children handle SIGINT themselves
+    for process in processes:
+        process.start()
+    for _ in processes:
+        sensor_name, port = ports.get()
+        print(f"{sensor_name}: {port if port is not None else 'sensor type not recognized'}")
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: [os.kill(p.pid, signal.SIGTERM) for p in processes])
+    for process in processes:
+        process.join()
+
+
+def get_args():
+    """
+    Function that gets the arguments from the command line
+    :return: the parsed arguments
+    """
+    parser = ArgumentParser(
+        description="Ruisdael: simulated disdrometers on pseudo-terminals."
+                    " Run: python simulate_sensors.py -c config_1.yml config_2.yml --link_dir /tmp/disdrodl_sim")
+    parser.add_argument('-c', '--config', required=True, nargs='+',
+                        help='Site config files of the simulated sensors. ie. -c configs_netcdf/config_PAR_008_GV.yml')
+    parser.add_argument('--link_dir', default=None,
+                        help='Directory for symbolic links to the ptys, named after the sensors')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='Seconds between receiving a request and starting the answer')
+    parser.add_argument('--baud', type=int, default=None,
+                        help='Pace the answers to this baudrate, 0 to not pace. Default: the baud in the config')
+    parser.add_argument('--drop_rate', type=float, default=0.0,
+                        help='Probability that a byte of an answer is dropped')
+    parser.add_argument('--clock_speed', type=float, default=1.0,
+                        help='Simulated seconds per real second of the sensor clocks')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for dropping bytes')
+    parser.add_argument('--telegram_file', default=None,
+                        help='File with the telegram to send, default: an empty telegram')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(get_args())
@@ -0,0 +1,133 @@
+"""
+This module contains tests for the archive catalog of exported netCDFs in modules/archive.py.
+
+Functions:
+- archive: Fixture with a catalog of a full, a light and an hourly netCDF of the sample day.
+- test_file_record: Tests the record of the sample netCDF, with the QC flags of the config.
+- test_query_archive: Tests that the netCDFs are filtered by time range, sensor, version and interval.
+- test_index_again: Tests that indexing a netCDF again replaces its record.
+- test_prune_archive: Tests that the records of removed netCDFs are removed.
+"""
+import hashlib
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+import pytest
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.archive import create_archive_db, file_record, index_files, query_archive, prune_archive
+from modules.resample import resample_netCDF
+from modules.sqldb import connect_db
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+sample_nc = wd / 'sample_data' / '20240722_Green_Village-GV_PAR008.nc'
+day = datetime(2024, 7, 22, tzinfo=timezone.utc)
+
+
+@pytest.fixture(name='archive')
+def fixture_archive(tmp_path, sample_nc_days):
+    """
+    Fixture with a catalog of a full netCDF of the sample day, a light netCDF with QC flags and an hourly netCDF.
+    :param tmp_path: pytest temporary directory
+    :param sample_nc_days: the fixture that copies the sample netCDF as the netCDFs of days
+    :return: the connection to the catalog and the paths of the netCDFs
+    """
+    _, (full,) = sample_nc_days([day])
+    light = full.with_name(f'{full.stem}_light.nc')
+    shutil.copy(sample_nc, light)
+    with Dataset(light, 'a') as nc_file:
+        flags = nc_file.createVariable('qc_flags', 'i4', ('time',))
+        flags[:] = numpy.arange(len(nc_file.dimensions['time'])) % 2
+    hourly = full.with_name(f'{full.stem}_3600s.nc')
+    resample_netCDF([full], hourly, 3600, config_dict, Mock())
+
+    create_archive_db(tmp_path / 'archive.db')
+    con, _ = connect_db(str(tmp_path / 'archive.db'))
+    index_files(con, [full, light, hourly], 'GV', config_dict)
+    yield con, (full, light, hourly)
+    con.close()
+
+
+def test_file_record(tmp_path):
+    """
+    This function tests the record of the sample netCDF: time range, rows, checksum and summary,
+    and that the QC flags are counted under the name of the config.
+    :param tmp_path: pytest temporary directory
+    """
+    record = file_record(sample_nc, 'GV', config_dict)
+    with Dataset(sample_nc) as nc_file:
+        n_rows = len(nc_file.dimensions['time'])
+        rain_amount = float(numpy.sum(nc_file.variables['rain_intensity'][:]) / 60)
+        peak_intensity = float(numpy.max(nc_file.variables['rain_intensity'][:]))
+    assert record['path'] == str(sample_nc.resolve())
+    assert (record['station'], record['sensor_name'], record['site_name']) == ('GV', 'PAR008', 'Green_Village')
+    assert (record['version'], record['interval'], record['n_rows']) == ('full', 60, n_rows)
+    assert day.timestamp() <= record['start_time'] < record['end_time'] < day.timestamp() + 86400
+    assert record['size'] == sample_nc.stat().st_size
+    assert record['checksum'] == hashlib.sha256(sample_nc.read_bytes()).hexdigest()
+    assert record['rain_amount'] == pytest.approx(rain_amount)
+    assert record['peak_intensity'] == pytest.approx(peak_intensity)
+    assert record['qc_flagged'] is None
+
+    flagged = tmp_path / sample_nc.name
+    shutil.copy(sample_nc, flagged)
+    with Dataset(flagged, 'a') as nc_file:
+        nc_file.createVariable('quality_flags', 'i4', ('time',))[:] = numpy.ones(n_rows)
+    config_flags = deep_update(config_dict,
+                               {'qc_variables': {'flags': {'var_attrs': {'standard_name': 'quality_flags'}}}})
+    assert file_record(flagged, 'GV', config_dict)['qc_flagged'] is None
+    assert file_record(flagged, 'GV', config_flags)['qc_flagged'] == n_rows
+
+
+def test_query_archive(archive):
+    """
+    This function tests that the netCDFs are filtered by time range, sensor, version and interval.
+    :param archive: the catalog fixture
+    """
+    con, (full, light, hourly) = archive
+    records = query_archive(con, start=day, end=day.replace(day=23))
+    assert sorted(record['path'] for record in records) == sorted(str(path.resolve()) for path in (full, light, hourly))
+    assert not query_archive(con, start=day.replace(day=23))
+    assert not query_archive(con, end=day)
+    assert not query_archive(con, sensor_name='PAR007')
+
+    records = query_archive(con, start=day.replace(hour=18), end=day.replace(hour=19), version='light')
+    assert [record['path'] for record in records] == [str(light.resolve())]
+    assert records[0]['qc_flagged'] == records[0]['n_rows'] // 2
+
+    records = query_archive(con, station='GV', interval=3600)
+    assert [record['path'] for record in records] == [str(hourly.resolve())]
+    assert records[0]['n_rows'] < 24
+    assert records[0]['rain_amount'] == pytest.approx(query_archive(con, interval=60, version='full')[0]['rain_amount'])
+
+
+def test_index_again(archive):
+    """
+    This function tests that indexing a netCDF again replaces its record.
+    :param archive: the catalog fixture
+    """
+    con, (full, _, _) = archive
+    with Dataset(full, 'a') as nc_file:
+        nc_file.setncattr('history', 'changed')
+    index_files(con, [full], 'GV', config_dict)
+    records = query_archive(con, version='full', interval=60)
+    assert len(records) == 1
+    assert records[0]['checksum'] == hashlib.sha256(full.read_bytes()).hexdigest()
+
+
+def test_prune_archive(archive):
+    """
+    This function tests that the records of removed netCDFs are removed.
+    :param archive: the catalog fixture
+    """
+    con, (_, light, _) = archive
+    light.unlink()
+    assert prune_archive(con) == [str(light.resolve())]
+    assert len(query_archive(con)) == 2
@@ -0,0 +1,267 @@
+"""
+This module contains tests for the asyncio sensors in modules/async_sensors.py,
+run against fake sensors on the master side of a pty.
+
+Functions:
+- test_parsivel_read: Tests that a Parsivel telegram is requested and read until the sensor is silent.
+- test_thies_read: Tests that a Thies telegram is requested and read as one line.
+- test_sensors_share_loop: Tests that a slow sensor does not delay the telegram of another sensor.
+- short_sleep: Shortened sleep of the sensor classes.
+- test_parsivel_start_sequence: Tests that the start sequence commands are sent in order.
+- test_start_sequence_drains: Tests that the last command is transmitted before the output buffer is flushed.
+- test_readline_timeout: Tests that readline returns what was received when the sensor is silent.
+- test_init_serial_connection_fail: Tests that a failing connection is logged and returns False.
+"""
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from modules.async_sensors import AsyncSerialPort, AsyncParsivel, AsyncThies, create_async_sensor
+
+
+class FakeSensor(threading.Thread):
+    """
+    Fake sensor on the master side of a pty, answering commands terminated by a carriage return.
+    """
+
+    def __init__(self, responses=None, delay=0.0):
+        """
+        Constructor for FakeSensor.
+        :param responses: dictionary of command (without line ending) to the bytes to answer
+        :param delay: seconds to wait before answering
+        """
+        super().__init__(daemon=True)
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.responses = responses or {}
+        self.delay = delay
+        self.received = []
+        self._received_condition = threading.Condition()
+
+    def run(self):
+        buffer = b''
+        while True:
+            try:
+                chunk = os.read(self.master, 1024)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while b'\r' in buffer:
+                command, buffer = buffer.split(b'\r', 1)
+                command = command.strip(b'\n').decode('ascii')
+                if not command:
+                    continue
+                with self._received_condition:
+                    self.received.append(command)
+                    self._received_condition.notify_all()
+                if command in self.responses:
+                    time.sleep(self.delay)
+                    os.write(self.master, self.responses[command])
+
+    def wait_received(self, n_commands, timeout=5.0):
+        """
+        Waits until the fake sensor received a number of commands.
+        :param n_commands: the number of commands to wait for
+        :param timeout: maximum seconds to wait
+        :return: True if the commands were received
+        """
+        with self._received_condition:
+            return self._received_condition.wait_for(lambda: len(self.received) >= n_commands, timeout=timeout)
+
+    def close(self):
+        """
+        Closes both sides of the pty.
+        """
+        os.close(self.slave)
+        os.close(self.master)
+
+
+PARSIVEL_TELEGRAM = b'01:0000.000\r\n02:0000.00\r\n03:00\r\n'
+
+
+@pytest.fixture(name='fake_parsivel')
+def fixture_fake_parsivel():
+    """
+    Fake Parsivel that answers CS/PA with a short telegram.
+    """
+    fake = FakeSensor(responses={'CS/PA': PARSIVEL_TELEGRAM})
+    fake.start()
+    yield fake
+    fake.close()
+
+
+def test_parsivel_read(fake_parsivel):
+    """
+    This function tests that a Parsivel telegram is requested and read until the sensor is silent.
+    :param fake_parsivel: the fake Parsivel fixture
+    """
+    async def run():
+        parsivel = AsyncParsivel()
+        parsivel.timeout = 0.2
+        assert parsivel.init_serial_connection(port=fake_parsivel.port, baud=19200, logger=Mock())
+        lines = await parsivel.read(logger=Mock())
+        parsivel.close_serial_connection()
+        return lines
+
+    assert asyncio.run(run()) == [b'01:0000.000\r\n', b'02:0000.00\r\n', b'03:00\r\n']
+    assert fake_parsivel.received == ['CS/PA']
+
+
+@patch('modules.async_sensors.sleep', new_callable=AsyncMock)
+def test_thies_read(mock_sleep):
+    """
+    This function tests that a Thies telegram is requested and read as one line.
+    :param mock_sleep: mock of asyncio.sleep in modules.async_sensors
+    """
+    fake = FakeSensor(responses={'06TR00005': b'\x0206;0000;1;2;3\r\n'})
+    fake.start()
+
+    async def run():
+        thies = create_async_sensor('Thies Clima', logger=Mock(), sensor_id='06')
+        thies.init_serial_connection(port=fake.port, baud=9600, logger=Mock())
+        telegram = await thies.read(logger=Mock())
+        thies.close_serial_connection()
+        return telegram
+
+    assert asyncio.run(run()) == '\x0206;0000;1;2;3'
+    mock_sleep.assert_awaited_once_with(2)
+    fake.close()
+
+
+@patch('modules.async_sensors.sleep', new_callable=AsyncMock)
+def test_sensors_share_loop(mock_sleep, fake_parsivel):  # pylint: disable=unused-argument
+    """
+    This function tests that a slow sensor does not delay the telegram of another sensor on the same loop.
+    :param mock_sleep: mock of asyncio.sleep in modules.async_sensors
+    :param fake_parsivel: the fake Parsivel fixture
+    """
+    slow_thies = FakeSensor(responses={'00TR00005': b'\x0200;slow\r\n'}, delay=1.0)
+    slow_thies.start()
+    finished = {}
+
+    async def timed_read(name, sensor):
+        lines = await sensor.read(logger=Mock())
+        finished[name] = time.monotonic()
+        return lines
+
+    async def run():
+        parsivel = AsyncParsivel()
+        parsivel.timeout = 0.1
+        parsivel.init_serial_connection(port=fake_parsivel.port, baud=19200, logger=Mock())
+        thies = AsyncThies()
+        thies.init_serial_connection(port=slow_thies.port, baud=9600, logger=Mock())
+        start = time.monotonic()
+        results = await asyncio.gather(timed_read('thies', thies), timed_read('parsivel', parsivel))
+        parsivel.close_serial_connection()
+        thies.close_serial_connection()
+        return start, results
+
+    start, results = asyncio.run(run())
+    assert results[0] == '\x0200;slow'
+    assert len(results[1]) == 3
+    assert finished['parsivel'] - start < 0.8
+    assert finished['thies'] - start >= 1.0
+    slow_thies.close()
+
+
+async def short_sleep(seconds):  # pylint: disable=unused-argument
+    """
+    Shortened sleep of the sensor classes, which only yields to the event loop.
+    :param seconds: the seconds the sensor class wants to sleep
+    """
+    await asyncio.sleep(0)
+
+
+@patch('modules.async_sensors.sleep', new_callable=AsyncMock, side_effect=short_sleep)
+def test_parsivel_start_sequence(mock_sleep, fake_parsivel):
+    """
+    This function tests that the start sequence commands are sent in order.
+    :param mock_sleep: mock of asyncio.sleep in modules.async_sensors
+    :param fake_parsivel: the fake Parsivel fixture
+    """
+    config_dict = {'station_code': 'CABAUW', 'global_attrs': {'sensor_name': 'PAR007'}}
+    mock_logger = Mock()
+
+    async def run():
+        parsivel = AsyncParsivel()
+        parsivel.init_serial_connection(port=fake_parsivel.port, baud=19200, logger=mock_logger)
+        await parsivel.sensor_start_sequence(config_dict=config_dict, logger=mock_logger, include_in_log=True)
+        await parsivel.reset_sensor(logger=mock_logger, factory_reset=True)
+        # the sensor is closed once the fake read every command, not after a guessed delay
+        assert fake_parsivel.wait_received(5)
+        parsivel.close_serial_connection()
+
+    asyncio.run(run())
+    assert fake_parsivel.received == ['CS/K/CABAUW', 'CS/J/PAR007', 'CS/Z/1', 'CS/M/M/1', 'CS/F/1']
+    assert [c.args[0] for c in mock_sleep.await_args_list] == [1, 2, 10, 5]
+    mock_logger.error.assert_not_called()
+
+
+@patch('modules.async_sensors.sleep', new_callable=AsyncMock)
+@patch('modules.async_sensors.termios')
+def test_start_sequence_drains(mock_termios, mock_sleep):  # pylint: disable=unused-argument
+    """
+    This function tests that the start sequences wait until the last command is transmitted before they flush
+    the output buffer, which would discard it otherwise.
+    :param mock_termios: mock of termios in modules.async_sensors
+    :param mock_sleep: mock of asyncio.sleep in modules.async_sensors
+    """
+    config_dict = {'station_code': 'CABAUW', 'global_attrs': {'sensor_name': 'PAR007'}}
+
+    async def run(sensor):
+        sensor.serial_connection = AsyncSerialPort(port='/dev/null', baud=19200)
+        sensor.serial_connection.write = AsyncMock()
+        await sensor.sensor_start_sequence(config_dict=config_dict, logger=Mock(), include_in_log=False)
+
+    for sensor in [AsyncParsivel(), AsyncThies()]:
+        mock_termios.reset_mock()
+        asyncio.run(run(sensor))
+        calls = [(c[0], c.args[1:]) for c in mock_termios.method_calls]
+        assert calls[-3:] == [('tcdrain', ()), ('tcflush', (mock_termios.TCIFLUSH,)),
+                              ('tcflush', (mock_termios.TCOFLUSH,))]
+
+
+def test_readline_timeout():
+    """
+    This function tests that readline returns what was received when the sensor stays silent.
+    """
+    fake = FakeSensor()
+    fake.start()
+
+    async def run():
+        thies = AsyncThies()
+        thies.init_serial_connection(port=fake.port, baud=9600, logger=Mock())
+        os.write(fake.master, b'\x0200;partial')
+        start = time.monotonic()
+        line = await thies.serial_connection.readline(timeout=0.3)
+        elapsed = time.monotonic() - start
+        thies.close_serial_connection()
+        return line, elapsed
+
+    line, elapsed = asyncio.run(run())
+    assert line == b'\x0200;partial'
+    assert 0.25 <= elapsed < 1
+    fake.close()
+
+
+def test_init_serial_connection_fail():
+    """
+    This function tests that a failing connection is logged and returns False, without exiting.
+    """
+    mock_logger = Mock()
+    parsivel = AsyncParsivel()
+    assert not parsivel.init_serial_connection(port='/dev/does-not-exist', baud=19200, logger=mock_logger)
+    assert parsivel.serial_connection is None
+    mock_logger.error.assert_called_once()
+
+    async def run():
+        return await parsivel.read(logger=mock_logger)
+
+    assert asyncio.run(run()) is None
+    assert mock_logger.error.call_count == 2
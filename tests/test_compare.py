@@ -0,0 +1,203 @@
+"""
+This module contains tests for the comparison of co-located sensors in modules/compare.py.
+
+Functions:
+- combined: Returns the combined general and site config of a sensor with a data directory.
+- write_nc: Writes a minimal netCDF of a sensor on a day with the given variables.
+- test_class_bounds: Tests the class bounds of the Parsivel and Thies, and the open Thies class.
+- test_rebin_spectra: Tests that the Thies spectra are rebinned onto the Parsivel classes by overlap.
+- test_minute_values: Tests that sub-minute time steps are reduced and the shared minutes joined.
+- test_pair_stats: Tests that the statistics of chunks equal the statistics of all pairs at once.
+- test_compare_sensors: Tests the comparison of a Parsivel and a Thies over two days.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy
+import pytest
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.compare import (class_bounds, overlap_matrix, rebin_spectra, minute_values, join_minutes, PairStats,
+                             compare_sensors)
+from modules.reader import netCDF_name
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+day = datetime(2024, 7, 1, tzinfo=timezone.utc)
+
+
+def combined(sensor_type, site, data_dir=None):
+    """
+    Returns the combined general and site config of a sensor, with a data directory.
+    :param sensor_type: 'parsivel' or 'thies'
+    :param site: the name of the site config, ie. 'PAR_007_CABAUW'
+    :param data_dir: the data directory, None to keep the one of the config
+    :return: the combined config
+    """
+    config = deep_update(yaml2dict(path=wd / 'configs_netcdf' / f'config_general_{sensor_type}.yml'),
+                         yaml2dict(path=wd / 'configs_netcdf' / f'config_{site}.yml'))
+    if data_dir is not None:
+        config['data_dir'] = str(data_dir)
+    return config
+
+
+def write_nc(config, date, timestamps, variables, interval=60):
+    """
+    Writes a minimal netCDF of a sensor on a day, at the path of the naming convention.
+    :param config: the combined config of the sensor
+    :param date: the day of the netCDF
+    :param timestamps: the POSIX timestamps of the time steps
+    :param variables: dictionary of the variable names to their values along the time steps
+    :param interval: the time interval of the netCDF in seconds
+    """
+    path = Path(config['data_dir']) / f'{date:%Y%m}' / netCDF_name(config, date.date())
+    path.parent.mkdir(exist_ok=True)
+    with Dataset(path, 'w') as nc_file:
+        nc_file.setncattr('sensor_name', config['global_attrs']['sensor_name'])
+        nc_file.createDimension('time', None)
+        time_var = nc_file.createVariable('time', 'f8', ('time',))
+        time_var.units = f'hours since {date:%Y-%m-%d} 00:00:00 +00:00'
+        time_var.calendar = 'standard'
+        time_var[:] = (numpy.asarray(timestamps) - date.timestamp()) / 3600
+        nc_file.createVariable('time_interval', 'i4').assignValue(interval)
+        for name, values in variables.items():
+            dimensions = ('time',) + tuple(f'{name}_{axis}' for axis in range(values.ndim - 1))
+            for dimension, size in zip(dimensions[1:], values.shape[1:]):
+                nc_file.createDimension(dimension, size)
+            nc_file.createVariable(name, 'f4', dimensions, fill_value=-999)[:] = values
+
+
+def test_class_bounds():
+    """
+    This function tests that the class bounds are read from the config, contiguous, and that the open Thies class
+    above 8 mm is as wide as its neighbour.
+    """
+    lower, upper = class_bounds(combined('thies', 'THIES_005_CABAUW'), 'diameter')
+    assert len(lower) == 22 and upper[-1] == 8.5
+    numpy.testing.assert_array_equal(lower[1:], upper[:-1])
+    lower, upper = class_bounds(combined('parsivel', 'PAR_007_CABAUW'), 'velocity')
+    assert len(lower) == 32 and upper[-1] == pytest.approx(22.4)
+
+
+def test_rebin_spectra():
+    """
+    This function tests that the overlap matrices split a Thies class over the Parsivel classes by overlap, and that
+    rebinning the Thies spectra onto the Parsivel classes keeps the particles within the Parsivel classes.
+    """
+    parsivel, thies = combined('parsivel', 'PAR_008_GV'), combined('thies', 'THIES_006_GV')
+    diameter_matrix = overlap_matrix(*class_bounds(thies, 'diameter'), *class_bounds(parsivel, 'diameter'))
+    velocity_matrix = overlap_matrix(*class_bounds(thies, 'velocity'), *class_bounds(parsivel, 'velocity'))
+    assert diameter_matrix.shape == (22, 32) and velocity_matrix.shape == (20, 32)
+    # the Thies classes are within the Parsivel classes
+    numpy.testing.assert_allclose(diameter_matrix.sum(axis=1), 1)
+    numpy.testing.assert_allclose(velocity_matrix.sum(axis=1), 1)
+    # 0 - 0.2 m/s of the Thies is 0 - 0.1 and 0.1 - 0.2 m/s of the Parsivel
+    assert velocity_matrix[0, :3] == pytest.approx([0.5, 0.5, 0])
+    assert overlap_matrix(numpy.array([0.]), numpy.array([2.]), numpy.array([1.]), numpy.array([3.]))[0, 0] == 0.5
+
+    cube = numpy.random.default_rng(1).integers(0, 20, (5, 22, 20)).astype(float)
+    rebinned = rebin_spectra(cube, diameter_matrix, velocity_matrix)
+    assert rebinned.shape == (5, 32, 32)
+    numpy.testing.assert_allclose(rebinned.sum(axis=(1, 2)), cube.sum(axis=(1, 2)))
+    expected = numpy.einsum('tdv,dD,vV->tDV', cube, diameter_matrix, velocity_matrix)
+    numpy.testing.assert_allclose(rebinned, expected)
+
+
+def test_minute_values():
+    """
+    This function tests that 10-second time steps are reduced to minutes by the reduction rules, that 1-minute
+    time steps are kept, and that the shared minutes of two sensors are joined.
+    """
+    timestamps = day.timestamp() + numpy.arange(18) * 10 + 3
+    values = {'rain_intensity': numpy.arange(18.), 'n_particles': numpy.ones(18)}
+    minutes, reduced = minute_values(timestamps, values, {'n_particles': 'sum'})
+    numpy.testing.assert_array_equal(minutes, day.timestamp() // 60 + numpy.arange(3))
+    numpy.testing.assert_array_equal(reduced['rain_intensity'], [2.5, 8.5, 14.5])
+    numpy.testing.assert_array_equal(reduced['n_particles'], [6, 6, 6])
+    minutes_b, kept = minute_values(timestamps[::6] + 40, values, {})
+    assert kept is values and len(minutes_b) == 3
+
+    index_a, index_b = join_minutes(numpy.array([1, 2, 4, 5, 7]), numpy.array([0, 2, 3, 5, 7, 8]))
+    numpy.testing.assert_array_equal(index_a, [1, 3, 4])
+    numpy.testing.assert_array_equal(index_b, [1, 3, 4])
+
+
+def test_pair_stats():
+    """
+    This function tests that the statistics merged over chunks equal the statistics of all pairs at once,
+    and that pairs with a missing value are skipped.
+    """
+    rng = numpy.random.default_rng(2)
+    a = rng.gamma(0.5, 2, 1000)
+    b = a * 1.1 + rng.normal(0, 0.2, 1000)
+    b[10] = numpy.nan
+    stats = PairStats(threshold=0.1)
+    for chunk in numpy.array_split(numpy.arange(1000), 7):
+        stats.update(a[chunk], b[chunk])
+    result = stats.result()
+
+    valid = ~numpy.isnan(b)
+    a, b = a[valid], b[valid]
+    assert result['n'] == 999
+    assert result['mean_a'] == pytest.approx(a.mean()) and result['mean_b'] == pytest.approx(b.mean())
+    assert result['bias'] == pytest.approx((b - a).mean())
+    assert result['relative_bias'] == pytest.approx(b.sum() / a.sum() - 1)
+    assert result['mae'] == pytest.approx(numpy.abs(b - a).mean())
+    assert result['rmse'] == pytest.approx(numpy.sqrt(((b - a) ** 2).mean()))
+    assert result['correlation'] == pytest.approx(numpy.corrcoef(a, b)[0, 1])
+    hits = numpy.count_nonzero((a >= 0.1) & (b >= 0.1))
+    misses = numpy.count_nonzero((a >= 0.1) & (b < 0.1))
+    false_alarms = numpy.count_nonzero((a < 0.1) & (b >= 0.1))
+    assert (result['hits'], result['misses'], result['false_alarms']) == (hits, misses, false_alarms)
+    assert result['csi'] == pytest.approx(hits / (hits + misses + false_alarms))
+    assert numpy.isnan(PairStats(threshold=0.1).result()['correlation'])
+
+
+def test_compare_sensors(tmp_path):
+    """
+    This function tests the comparison of a Parsivel at 1-minute and a Thies at 30-second time steps over two days,
+    of which the Thies misses the second day: the shared minutes, the statistics of the paired minutes and the
+    spectra per m2 on the Parsivel classes.
+    :param tmp_path: pytest temporary directory
+    """
+    parsivel = combined('parsivel', 'PAR_007_CABAUW', tmp_path)
+    thies = combined('thies', 'THIES_005_CABAUW', tmp_path)
+    n_minutes = 120
+    minutes = day.timestamp() + numpy.arange(n_minutes) * 60
+    intensity = numpy.where(numpy.arange(n_minutes) % 3 == 0, 2., 0.)
+    spectrum = numpy.zeros((n_minutes, 32, 32))
+    spectrum[:, 10, 20] = 4
+    write_nc(parsivel, day, minutes + 0.8, {'rain_intensity': intensity, 'n_particles': intensity * 10,
+                                            'data_raw': spectrum})
+    write_nc(parsivel, day + timedelta(days=1), minutes + 86400, {'rain_intensity': intensity,
+                                                                  'n_particles': intensity * 10, 'data_raw': spectrum})
+    # the Thies misses the first minute, has the same intensity and half the particles in two 30 s time steps
+    thies_steps = numpy.repeat(minutes[1:], 2) + numpy.tile([5., 35.], n_minutes - 1)
+    thies_spectrum = numpy.zeros((len(thies_steps), 22, 20))
+    thies_spectrum[:, 5, 10] = 1
+    write_nc(thies, day, thies_steps, {'all_precip_intensity': numpy.repeat(intensity[1:], 2),
+                                       'number_of_all_measured_particles': numpy.repeat(intensity[1:], 2) * 2.5,
+                                       'raw_data': thies_spectrum}, interval=30)
+
+    result = compare_sensors(parsivel, thies, day, day + timedelta(days=2))
+    assert (result['sensor_a'], result['sensor_b'], result['minutes']) == ('PAR007', 'THIES005', n_minutes - 1)
+    stats = result['stats']['intensity']
+    assert stats['n'] == n_minutes - 1 and stats['bias'] == pytest.approx(0)
+    assert stats['correlation'] == pytest.approx(1)
+    assert stats['pod'] == 1 and stats['far'] == 0
+    assert result['stats']['particles']['relative_bias'] == pytest.approx(-0.5)
+
+    parsivel_area = parsivel['dsd']['beam_length'] * parsivel['dsd']['beam_width']
+    thies_area = thies['dsd']['beam_length'] * thies['dsd']['beam_width']
+    assert result['spectrum_a'].shape == (32, 32)
+    assert result['spectrum_a'].sum() == pytest.approx(4 * (n_minutes - 1) / parsivel_area)
+    assert result['spectrum_b'].sum() == pytest.approx(2 * (n_minutes - 1) / thies_area)
+    # Thies class 1.0 - 1.25 mm, 3.0 - 3.4 m/s is in Parsivel classes 1.0 - 1.12, 1.12 - 1.25 mm
+    # and half in 2.8 - 3.2, half in 3.2 - 3.6 m/s
+    assert numpy.flatnonzero(result['spectrum_b'].sum(axis=1)).tolist() == [8, 9]
+    velocity = result['spectrum_b'].sum(axis=0)
+    assert numpy.flatnonzero(velocity).tolist() == [17, 18] and velocity[17] == pytest.approx(velocity[18])
+
+    light = compare_sensors(parsivel, thies, day, day + timedelta(days=2), chunk=timedelta(hours=6), spectra=False)
+    assert 'spectrum_a' not in light and light['stats']['intensity'] == stats
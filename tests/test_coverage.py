@@ -0,0 +1,162 @@
+"""
+This module contains tests for the per-day coverage index in modules/coverage.py.
+
+Functions:
+- row: Returns a disdrodl row for a minute of 2024-01-01.
+- create_test_db: Creates a database with the given rows.
+- test_coverage_on_insert: Tests that the coverage index is updated when telegrams are inserted.
+- test_coverage_duplicates: Tests that ignored duplicate telegrams are not counted.
+- test_coverage_keep_last: Tests that telegrams replaced by the keep_last policy are not counted.
+- test_rebuild_coverage: Tests that the rebuilt index equals the index maintained on insert.
+- test_query_coverage_missing_day: Tests that a day without telegrams has no coverage.
+- test_format_day: Tests the report line of the coverage script.
+"""
+from datetime import date, datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from coverage_db import format_day
+from modules.coverage import query_coverage, rebuild_coverage, missing_minutes, MINUTES_PER_DAY
+from modules.sqldb import create_db, connect_db, create_unique_index, insert_rows
+
+day_ts = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+long_telegram = '01:0000.000; ' * 100
+day = date(2024, 1, 1)
+
+
+def row(minute, telegram=long_telegram, sensor_id='PAR008'):
+    """
+    Returns a disdrodl row for a minute of 2024-01-01.
+    :param minute: the minute of the day
+    :param telegram: the telegram string
+    :param sensor_id: the sensor id
+    :return: tuple of (timestamp, datetime, sensor_id, telegram)
+    """
+    timestamp = day_ts + minute * 60
+    return (timestamp, datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat(), sensor_id, telegram)
+
+
+def create_test_db(db_path, rows):
+    """
+    Creates a database with the unique index and the given rows.
+    :param db_path: path of the database
+    :param rows: the disdrodl rows to insert
+    :return: the connection and cursor objects
+    """
+    create_db(dbpath=str(db_path))
+    create_unique_index(dbpath=str(db_path), interval=60, logger=Mock())
+    con, cur = connect_db(dbpath=str(db_path))
+    insert_rows(cur, rows)
+    con.commit()
+    return con, cur
+
+
+def test_coverage_on_insert(tmp_path):
+    """
+    This function tests that the coverage index is updated when telegrams are inserted.
+    :param tmp_path: pytest temporary directory
+    """
+    con, cur = create_test_db(tmp_path / 'disdrodl.db', [row(0), row(1), row(2, '')])
+    insert_rows(cur, [row(3, '01:0000.000'), row(1439), row(0, sensor_id='THIES006')])
+    insert_rows(cur, [row(MINUTES_PER_DAY)])
+    con.commit()
+
+    [coverage] = query_coverage(con, 'PAR008', day, day)
+    assert coverage['n_minutes'] == 3
+    assert coverage['n_telegrams'] == 5
+    assert coverage['n_empty'] == 1
+    assert coverage['n_short'] == 1
+    assert missing_minutes(coverage['minutes']) == list(range(2, 1439))
+    assert query_coverage(con, 'THIES006', day, day)[0]['n_minutes'] == 1
+    assert query_coverage(con, 'PAR008', date(2024, 1, 2), date(2024, 1, 2))[0]['n_minutes'] == 1
+    cur.close()
+    con.close()
+
+
+def test_coverage_duplicates(tmp_path):
+    """
+    This function tests that duplicate telegrams ignored by the keep_first and keep_both policies are not counted.
+    :param tmp_path: pytest temporary directory
+    """
+    con, cur = create_test_db(tmp_path / 'disdrodl.db', [row(0), row(0)])
+    insert_rows(cur, [row(0), row(1)], duplicates='keep_both')
+    con.commit()
+
+    [coverage] = query_coverage(con, 'PAR008', day, day)
+    assert coverage['n_minutes'] == 2
+    assert coverage['n_telegrams'] == 2
+    cur.close()
+    con.close()
+
+
+@pytest.mark.parametrize('interval, n_telegrams', [(60, 4), (30, 5)])
+def test_coverage_keep_last(tmp_path, interval, n_telegrams):
+    """
+    This function tests that telegrams replaced by the keep_last policy, also within one insert and below a minute,
+    are not counted, and that the minute of a long telegram replaced by an empty one is missing.
+    :param tmp_path: pytest temporary directory
+    :param interval: the acquisition interval in seconds
+    :param n_telegrams: the expected number of telegrams of the day
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    create_unique_index(dbpath=str(db_path), interval=interval, logger=Mock())
+    con, cur = connect_db(dbpath=str(db_path))
+    insert_rows(cur, [row(0), row(0.5, ''), row(1), row(2)], duplicates='keep_last')
+    insert_rows(cur, [row(0.25, ''), row(1.1), row(2.2, '01:0000.000'), row(2.3), row(3)], duplicates='keep_last')
+    con.commit()
+
+    [coverage] = query_coverage(con, 'PAR008', day, day)
+    assert coverage['n_telegrams'] == n_telegrams
+    assert missing_minutes(coverage['minutes'])[:2] == [0, 4]
+    rebuild_coverage(con)
+    assert query_coverage(con, 'PAR008', day, day) == [coverage]
+    cur.close()
+    con.close()
+
+
+def test_rebuild_coverage(tmp_path):
+    """
+    This function tests that the rebuilt index equals the index maintained on insert.
+    :param tmp_path: pytest temporary directory
+    """
+    con, cur = create_test_db(tmp_path / 'disdrodl.db', [row(minute) for minute in range(0, 1440, 7)] +
+                              [row(5, ''), row(6, '01:0000.000'), row(MINUTES_PER_DAY + 1)])
+    expected = query_coverage(con, 'PAR008', day, date(2024, 1, 2))
+    cur.execute('DELETE FROM coverage')
+    con.commit()
+
+    assert rebuild_coverage(con) == 2
+    assert query_coverage(con, 'PAR008', day, date(2024, 1, 2)) == expected
+    assert expected[0]['n_minutes'] == len(range(0, 1440, 7))
+    cur.close()
+    con.close()
+
+
+def test_query_coverage_missing_day(tmp_path):
+    """
+    This function tests that a day without telegrams has no coverage.
+    :param tmp_path: pytest temporary directory
+    """
+    con, cur = create_test_db(tmp_path / 'disdrodl.db', [row(0)])
+
+    coverage = query_coverage(con, 'PAR008', date(2023, 12, 31), day)
+    assert [day_coverage['date'] for day_coverage in coverage] == ['2023-12-31', '2024-01-01']
+    assert coverage[0]['n_minutes'] == 0
+    assert len(missing_minutes(coverage[0]['minutes'])) == MINUTES_PER_DAY
+    cur.close()
+    con.close()
+
+
+def test_format_day(tmp_path):
+    """
+    This function tests the report line of the coverage script.
+    :param tmp_path: pytest temporary directory
+    """
+    con, cur = create_test_db(tmp_path / 'disdrodl.db', [row(0), row(1), row(3, '')])
+
+    [coverage] = query_coverage(con, 'PAR008', day, day)
+    assert format_day(coverage) == '2024-01-01    2/1440 minutes, 3 telegrams, 1 empty, 0 short, first missing 00:02'
+    cur.close()
+    con.close()
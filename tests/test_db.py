@@ -16,6 +16,7 @@ Functions:
 - test_netcdf_wrong_f81_len_thies: Tests thies netcdf creation when matrix array is of wrong length.
 - test_netcdf_wrong_f93_len_parsivel: Tests parsivel netcdf creation when matrix array is of wrong length.
 - test_compress_non_existent_file: Tests compressing a non-existent NetCDF file.
+- test_query_db_rows_gen_batches: Tests that the rows are the same for any arraysize and as columns.
 """
 
 import os
@@ -30,7 +31,7 @@ from netCDF4 import Dataset # pylint: disable=no-name-in-module
 from cftime import num2date
 from pydantic.v1.utils import deep_update
 
-from modules.sqldb import connect_db, query_db_rows_gen
+from modules.sqldb import connect_db, create_db, insert_rows, query_db_rows_gen, sql_query_gen
 from modules.util_functions import yaml2dict
 from modules.now_time import NowTime
 from modules.telegram import ParsivelTelegram, ThiesTelegram
@@ -764,3 +765,30 @@ def test_compress_non_existent_file(caplog):
     nc.compress()
     assert [r.msg for r in caplog.records][0] == 'Failed to compress non_existent_file.nc. Error code:1 '
     assert 'test_compress.nc' not in os.listdir('sample_data')
+
+
+def test_query_db_rows_gen_batches(tmp_path):
+    '''
+    This function tests that the rows are the same for any arraysize, and that the batches as columns
+    hold the same values, without changing the row factory of the connection.
+    :param tmp_path: pytest temporary directory
+    '''
+    create_db(dbpath=str(tmp_path / 'disdrodl.db'))
+    con, cur = connect_db(dbpath=str(tmp_path / 'disdrodl.db'))
+    rows = [((start_dt + timedelta(minutes=i)).timestamp(), (start_dt + timedelta(minutes=i)).isoformat(),
+             'PAR008', f'telegram {i}') for i in range(25)]
+    insert_rows(cur, rows[:10])
+    insert_rows(cur, rows[10:], codec='zlib')
+    con.commit()
+
+    expected = list(query_db_rows_gen(con=con, date_dt=start_dt, logger=logger))
+    assert [row['telegram'] for row in expected] == [row[3] for row in rows]
+    assert list(query_db_rows_gen(con=con, date_dt=start_dt, logger=logger, arraysize=7)) == expected
+    batches = list(query_db_rows_gen(con=con, date_dt=start_dt, logger=logger, arraysize=10, columns=True))
+    assert [len(batch['id']) for batch in batches] == [10, 10, 5]
+    assert sum((batch['telegram'] for batch in batches), []) == [row['telegram'] for row in expected]
+    assert list(sql_query_gen(con, 'SELECT id, sensor_id FROM disdrodl WHERE id <= 2')) == [
+        {'id': 1, 'sensor_id': 'PAR008'}, {'id': 2, 'sensor_id': 'PAR008'}]
+    assert con.row_factory is None
+    cur.close()
+    con.close()
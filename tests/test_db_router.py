@@ -0,0 +1,131 @@
+"""
+This module contains tests for the monthly database partitions of DBRouter in modules/sqldb.py.
+
+Functions:
+- row: Returns a disdrodl row for a UTC datetime.
+- write_rows: Writes rows to the partitions of their month.
+- test_path_for: Tests the routing of timestamps to partition paths.
+- test_prepare_and_paths: Tests that a partition is created with its tables and found again.
+- test_date_ranges: Tests that a range of days is split over the existing partitions.
+- test_query_rows_gen: Tests that a range query fans out across the partitions in time order.
+- test_spool_drain_partitions: Tests that spooled rows are drained into the partition of their month.
+"""
+from datetime import date, datetime, timezone
+from unittest.mock import Mock
+
+from modules.spool import Spool
+from modules.sqldb import DBRouter, connect_db, insert_rows
+
+jan_31 = datetime(2024, 1, 31, 23, 59, tzinfo=timezone.utc)
+feb_1 = datetime(2024, 2, 1, 0, 0, tzinfo=timezone.utc)
+mar_1 = datetime(2024, 3, 1, 0, 0, tzinfo=timezone.utc)
+
+
+def row(dt):
+    """
+    Returns a disdrodl row for a UTC datetime.
+    :param dt: the datetime of the telegram
+    :return: tuple of (timestamp, datetime, sensor_id, telegram)
+    """
+    return (dt.timestamp(), dt.isoformat(), 'PAR008', f'telegram of {dt.isoformat()}')
+
+
+def write_rows(db_router, rows):
+    """
+    Writes rows to the partitions of their month.
+    :param db_router: the DBRouter
+    :param rows: the disdrodl rows
+    """
+    for db_row in rows:
+        con, cur = connect_db(dbpath=str(db_router.prepare(db_row[0])))
+        insert_rows(cur, [db_row])
+        con.commit()
+        cur.close()
+        con.close()
+
+
+def test_path_for(tmp_path):
+    """
+    This function tests the routing of timestamps to partition paths.
+    :param tmp_path: pytest temporary directory
+    """
+    db_router = DBRouter(db_path=tmp_path / 'disdrodl.db', partitioned=True)
+    assert db_router.path_for(jan_31.timestamp()) == tmp_path / 'disdrodl_202401.db'
+    assert db_router.path_for(feb_1.timestamp()) == tmp_path / 'disdrodl_202402.db'
+    assert str(db_router) == str(tmp_path / 'disdrodl_YYYYmm.db')
+
+    db_router = DBRouter(db_path=tmp_path / 'disdrodl.db')
+    assert db_router.path_for(jan_31.timestamp()) == tmp_path / 'disdrodl.db'
+    assert str(db_router) == str(tmp_path / 'disdrodl.db')
+
+
+def test_prepare_and_paths(tmp_path):
+    """
+    This function tests that a partition is created with its tables and unique index, and found again.
+    :param tmp_path: pytest temporary directory
+    """
+    db_router = DBRouter(db_path=tmp_path / 'disdrodl.db', partitioned=True, logger=Mock())
+    assert db_router.paths() == []
+    db_router.prepare(feb_1.timestamp())
+    db_router.prepare(jan_31.timestamp())
+    (tmp_path / 'disdrodl_archive.db').touch()
+
+    assert db_router.paths() == [tmp_path / 'disdrodl_202401.db', tmp_path / 'disdrodl_202402.db']
+    con, cur = connect_db(dbpath=str(tmp_path / 'disdrodl_202401.db'))
+    tables = {name for (name,) in cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    indexes = cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'disdrodl'").fetchall()
+    cur.close()
+    con.close()
+    assert {'disdrodl', 'particles', 'coverage'} <= tables
+    assert indexes == [('disdrodl_unique_slot_60s',)]
+
+
+def test_date_ranges(tmp_path):
+    """
+    This function tests that a range of days is split over the existing partitions, skipping missing months.
+    :param tmp_path: pytest temporary directory
+    """
+    db_router = DBRouter(db_path=tmp_path / 'disdrodl.db', partitioned=True, logger=Mock())
+    db_router.prepare(jan_31.timestamp())
+    db_router.prepare(mar_1.timestamp())
+
+    assert db_router.date_ranges(date(2024, 1, 15), date(2024, 3, 10)) == [
+        (tmp_path / 'disdrodl_202401.db', date(2024, 1, 15), date(2024, 1, 31)),
+        (tmp_path / 'disdrodl_202403.db', date(2024, 3, 1), date(2024, 3, 10)),
+    ]
+    assert not db_router.date_ranges(date(2024, 2, 1), date(2024, 2, 29))
+
+
+def test_query_rows_gen(tmp_path):
+    """
+    This function tests that a range query fans out across the partitions in time order.
+    :param tmp_path: pytest temporary directory
+    """
+    db_router = DBRouter(db_path=tmp_path / 'disdrodl.db', partitioned=True, logger=Mock())
+    write_rows(db_router, [row(mar_1), row(feb_1), row(jan_31)])
+
+    rows = list(db_router.query_rows_gen(jan_31.timestamp(), mar_1.timestamp()))
+    assert [db_row['datetime'] for db_row in rows] == [jan_31.isoformat(), feb_1.isoformat()]
+    assert len(list(db_router.query_rows_gen(jan_31.timestamp(), mar_1.timestamp() + 1))) == 3
+
+
+def test_spool_drain_partitions(tmp_path):
+    """
+    This function tests that spooled rows are drained into the partition of their month.
+    :param tmp_path: pytest temporary directory
+    """
+    db_router = DBRouter(db_path=tmp_path / 'disdrodl.db', partitioned=True, logger=Mock())
+    spool = Spool(path=tmp_path / 'disdrodl.db.spool', logger=Mock())
+    spool.append(row(jan_31))
+    spool.append(row(feb_1), (feb_1.timestamp(), 'PAR008', 1, b'\x00' * 8))
+
+    assert spool.drain(db_router) == 2
+    for path, dt in [(tmp_path / 'disdrodl_202401.db', jan_31), (tmp_path / 'disdrodl_202402.db', feb_1)]:
+        con, cur = connect_db(dbpath=str(path))
+        assert cur.execute('SELECT datetime FROM disdrodl').fetchall() == [(dt.isoformat(),)]
+        cur.close()
+        con.close()
+    con, cur = connect_db(dbpath=str(tmp_path / 'disdrodl_202402.db'))
+    assert cur.execute('SELECT COUNT(*) FROM particles').fetchone()[0] == 1
+    cur.close()
+    con.close()
@@ -0,0 +1,194 @@
+"""
+This module contains tests for the shared database writer in modules/db_writer.py.
+
+Functions:
+- count_rows: Counts the rows in the disdrodl table.
+- test_db_writer_batches: Tests that rows from several producers end up in their own databases.
+- test_db_writer_retries: Tests that rows are kept and retried when the database can not be written.
+- wait_for: Waits until a condition is met.
+- test_db_writer_spools: Tests that rows are spooled after max_retries failed flushes.
+- test_db_writer_max_pending: Tests that without a spool only the last max_pending rows are kept.
+- test_db_writer_unexpected_error: Tests that an error that is not an sqlite3.Error does not end the thread.
+- test_db_writer_shared_db_stop: Tests that sensors sharing a database spool their rows to their own spool on stop.
+"""
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from modules.db_writer import DBWriter
+from modules.spool import Spool
+from modules.sqldb import create_db, connect_db
+
+
+def count_rows(db_path):
+    """
+    Counts the rows in the disdrodl table.
+    :param db_path: path of the database
+    :return: the number of rows
+    """
+    con, cur = connect_db(dbpath=str(db_path))
+    count = cur.execute('SELECT COUNT(*) FROM disdrodl').fetchone()[0]
+    cur.close()
+    con.close()
+    return count
+
+
+def test_db_writer_batches(tmp_path):
+    """
+    This function tests that rows from several producer threads end up in their own databases.
+    :param tmp_path: pytest temporary directory
+    """
+    db_paths = [tmp_path / 'par.db', tmp_path / 'thies.db']
+    for db_path in db_paths:
+        create_db(dbpath=str(db_path))
+    writer = DBWriter(logger=Mock(), batch_size=10, flush_interval=0.05)
+    writer.start()
+
+    def produce(db_path, sensor):
+        for i in range(25):
+            writer.put(db_path, (float(i * 60), f'{i}', sensor, 'telegram'))
+
+    producers = [threading.Thread(target=produce, args=(db_path, sensor))
+                 for db_path, sensor in zip(db_paths, ['PAR007', 'THIES005'])]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    writer.stop(timeout=10)
+
+    assert not writer.is_alive()
+    assert writer.rows_written == 50
+    assert count_rows(db_paths[0]) == 25
+    assert count_rows(db_paths[1]) == 25
+
+
+def test_db_writer_retries(tmp_path):
+    """
+    This function tests that rows are kept and retried when the database can not be written.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'later.db'
+    mock_logger = Mock()
+    writer = DBWriter(logger=mock_logger, batch_size=1, flush_interval=0.01)
+    writer.start()
+    # the table does not exist yet, so the first flush fails
+    writer.put(db_path, (0.0, '0', 'PAR007', 'telegram'))
+    for _ in range(500):
+        if mock_logger.error.called:
+            break
+        time.sleep(0.01)
+    assert writer.rows_written == 0
+
+    create_db(dbpath=str(db_path))
+    writer.stop(timeout=10)
+    assert 'will retry' in mock_logger.error.call_args.kwargs['msg']
+    assert writer.rows_written == 1
+    assert count_rows(db_path) == 1
+
+
+def wait_for(condition):
+    """
+    Waits up to 5 seconds until the condition is met.
+    :param condition: function that returns True when the condition is met
+    """
+    for _ in range(500):
+        if condition():
+            break
+        time.sleep(0.01)
+
+
+def test_db_writer_spools(tmp_path):
+    """
+    This function tests that the rows and their particle rows are handed to the spool after max_retries failed
+    flushes, and are no longer retried.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'missing.db'
+    spool = Spool(path=tmp_path / 'missing.db.spool', logger=Mock())
+    writer = DBWriter(logger=Mock(), batch_size=100, flush_interval=0.01, max_retries=3)
+    writer.put(db_path, (0.0, '0', 'PAR007', 'telegram'), particles_row=(0.0, 'PAR007', 1, b'\x01'), spool=spool)
+    writer.put(db_path, (60.0, '60', 'PAR007', 'telegram'), spool=spool)
+    writer.start()
+    wait_for(lambda: writer.rows_spooled == 2)
+    writer.stop(timeout=10)
+    assert writer.rows_written == 0 and writer.rows_spooled == 2
+    assert spool.records_spooled == 2
+
+    db_path_drain = tmp_path / 'drain.db'
+    create_db(dbpath=str(db_path_drain))
+    assert spool.drain(db_path_drain) == 2
+    con, cur = connect_db(dbpath=str(db_path_drain))
+    assert cur.execute('SELECT timestamp, n_particles FROM particles').fetchall() == [(0.0, 1)]
+    cur.close()
+    con.close()
+
+
+def test_db_writer_max_pending(tmp_path):
+    """
+    This function tests that without a spool the rows are kept, but only the last max_pending rows.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'later.db'
+    writer = DBWriter(logger=Mock(), batch_size=100, flush_interval=0.01, max_pending=2)
+    for i in range(3):
+        writer.put(db_path, (float(i * 60), f'{i}', 'PAR007', 'telegram'),
+                   particles_row=(float(i * 60), 'PAR007', 1, b'\x01'))
+    writer.start()
+    wait_for(lambda: writer.rows_dropped == 1)
+
+    create_db(dbpath=str(db_path))
+    writer.stop(timeout=10)
+    assert writer.rows_dropped == 1 and writer.rows_written == 2
+    con, cur = connect_db(dbpath=str(db_path))
+    assert cur.execute('SELECT timestamp FROM particles').fetchall() == [(60.0,), (120.0,)]
+    cur.close()
+    con.close()
+
+
+def test_db_writer_unexpected_error(tmp_path):
+    """
+    This function tests that an error that is not an sqlite3.Error, in a flush or in the thread loop,
+    is logged and does not end the thread.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'test.db'
+    create_db(dbpath=str(db_path))
+    mock_logger = Mock()
+    writer = DBWriter(logger=mock_logger, batch_size=1, flush_interval=0.01)
+    with patch('modules.db_writer.insert_rows', side_effect=[TypeError('bad row'), None]):
+        writer.start()
+        writer.put(db_path, (0.0, '0', 'PAR007', 'telegram'))
+        wait_for(lambda: writer.rows_written == 1)
+    assert writer.is_alive()
+    assert 'bad row' in mock_logger.error.call_args_list[0].kwargs['msg']
+    writer.stop(timeout=10)
+    assert writer.rows_written == 1
+
+    # an error outside the write itself, ie. in spooling the failed rows
+    writer = DBWriter(logger=mock_logger, batch_size=1, flush_interval=0.01)
+    with patch.object(writer, 'flush', side_effect=[RuntimeError('spool broken')] + [None] * 1000) as mock_flush:
+        writer.start()
+        writer.put(db_path, (60.0, '60', 'PAR007', 'telegram'))
+        wait_for(lambda: mock_flush.call_count >= 2)
+        assert writer.is_alive()
+        writer.stop(timeout=10)
+    assert any('spool broken' in call.kwargs['msg'] for call in mock_logger.error.call_args_list)
+
+
+def test_db_writer_shared_db_stop(tmp_path):
+    """
+    This function tests that two sensors that share a database keep their own spool, and that the rows that can not
+    be written when the thread stops are spooled, before max_retries failed flushes.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'missing.db'
+    spools = {sensor: Spool(path=tmp_path / f'{sensor}.spool', logger=Mock()) for sensor in ['PAR007', 'PAR008']}
+    writer = DBWriter(logger=Mock(), batch_size=100, flush_interval=0.01, max_retries=100)
+    for i, sensor in enumerate(['PAR007', 'PAR008', 'PAR008']):
+        writer.put(db_path, (float(i * 60), f'{i}', sensor, 'telegram'), spool=spools[sensor])
+    writer.start()
+    writer.stop(timeout=10)
+    assert writer.rows_written == 0 and writer.rows_spooled == 3 and writer.rows_dropped == 0
+    assert spools['PAR007'].records_spooled == 1 and spools['PAR008'].records_spooled == 2
+    for spool in spools.values():
+        spool.close()
@@ -0,0 +1,206 @@
+"""
+This module contains tests for the duplicate policies of the disdrodl table in modules/sqldb.py
+and the online dedup migration dedup_db.py.
+
+Functions:
+- row: Returns a disdrodl row for a timestamp.
+- fetch_telegrams: Returns the telegrams of a table of a database.
+- test_insert_policies: Tests the keep_first, keep_last and keep_both policies of insert_rows.
+- test_insert_policies_particles: Tests that the particles of a row follow it under the policies of insert_rows.
+- test_unique_index_with_duplicates: Tests that the unique index is not created while the table contains duplicates,
+  which prepare_db and DBRouter.prepare log as an error.
+- test_unique_index_interval: Tests that the unique index follows the acquisition interval.
+- test_dedup: Tests that the dedup migration removes the duplicates in batches and creates the unique index.
+"""
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+import dedup_db
+from main import prepare_db
+from modules.sqldb import create_db, connect_db, create_unique_index, insert_rows, DBRouter
+
+wd = Path(__file__).parent.parent
+
+
+def row(timestamp, telegram, sensor_id='PAR008'):
+    """
+    Returns a disdrodl row for a timestamp.
+    :param timestamp: the timestamp in seconds
+    :param telegram: the telegram string
+    :param sensor_id: the sensor id
+    :return: tuple of (timestamp, datetime, sensor_id, telegram)
+    """
+    return (float(timestamp), f'{timestamp}', sensor_id, telegram)
+
+
+def fetch_telegrams(db_path, table='disdrodl'):
+    """
+    Returns the telegrams of a table of a database.
+    :param db_path: path of the database
+    :param table: name of the table
+    :return: list of telegrams ordered by timestamp
+    """
+    con, cur = connect_db(dbpath=str(db_path))
+    telegrams = [telegram for (telegram,) in cur.execute(f'SELECT telegram FROM {table} ORDER BY timestamp, id')]
+    cur.close()
+    con.close()
+    return telegrams
+
+
+@pytest.mark.parametrize('duplicates, expected, expected_duplicates', [
+    ('keep_first', ['first', 'other sensor', 'next'], []),
+    ('keep_last', ['other sensor', 'last', 'next'], []),
+    ('keep_both', ['first', 'other sensor', 'next'], ['last']),
+])
+def test_insert_policies(tmp_path, duplicates, expected, expected_duplicates):
+    """
+    This function tests the policies of insert_rows for a second telegram of a sensor in the same minute.
+    :param tmp_path: pytest temporary directory
+    :param duplicates: the duplicate policy
+    :param expected: the expected telegrams in the disdrodl table
+    :param expected_duplicates: the expected telegrams in the disdrodl_duplicates table
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    assert create_unique_index(dbpath=str(db_path), interval=60, logger=Mock())
+
+    con, cur = connect_db(dbpath=str(db_path))
+    insert_rows(cur, [row(60, 'first'), row(61, 'other sensor', sensor_id='THIES006')], duplicates=duplicates)
+    insert_rows(cur, [row(119.5, 'last'), row(120, 'next')], duplicates=duplicates)
+    con.commit()
+    cur.close()
+    con.close()
+
+    assert fetch_telegrams(db_path) == expected
+    assert fetch_telegrams(db_path, 'disdrodl_duplicates') == expected_duplicates
+
+
+@pytest.mark.parametrize('duplicates, expected, expected_duplicates', [
+    ('keep_first', [(60.0, 1)], []),
+    ('keep_last', [(119.5, 2)], []),
+    ('keep_both', [(60.0, 1)], [(119.5, 2)]),
+])
+def test_insert_policies_particles(tmp_path, duplicates, expected, expected_duplicates):
+    """
+    This function tests that the particles of a second telegram of a sensor in the same minute follow the row:
+    dropped with an ignored row, replacing the particles of a replaced row, or stored next to a duplicate row.
+    :param tmp_path: pytest temporary directory
+    :param duplicates: the duplicate policy
+    :param expected: the expected timestamps and n_particles in the particles table
+    :param expected_duplicates: the expected timestamps and n_particles in the particles_duplicates table
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    assert create_unique_index(dbpath=str(db_path), interval=60, logger=Mock())
+
+    con, cur = connect_db(dbpath=str(db_path))
+    insert_rows(cur, [row(60, 'first')], duplicates=duplicates, particle_rows=[(60.0, 'PAR008', 1, b'\x01')])
+    insert_rows(cur, [row(119.5, 'last'), row(120, 'next')], duplicates=duplicates,
+                particle_rows=[(119.5, 'PAR008', 2, b'\x02')])
+    con.commit()
+    assert cur.execute('SELECT timestamp, n_particles FROM particles ORDER BY id').fetchall() == expected
+    assert cur.execute('SELECT timestamp, n_particles FROM particles_duplicates').fetchall() == expected_duplicates
+    cur.close()
+    con.close()
+
+
+def test_unique_index_with_duplicates(tmp_path):
+    """
+    This function tests that the unique index is not created while the table contains duplicates,
+    which prepare_db and DBRouter.prepare log as an error while the database stays writable.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    con, cur = connect_db(dbpath=str(db_path))
+    insert_rows(cur, [row(60, 'first'), row(90, 'second')])
+    con.commit()
+    cur.close()
+    con.close()
+
+    logger = Mock()
+    assert not create_unique_index(dbpath=str(db_path), interval=60, logger=logger)
+    logger.error.assert_called_once()
+
+    # the database stays writable, but the missing index is logged as an error pointing to dedup_db.py
+    logger = Mock()
+    assert prepare_db(db_path=db_path, interval=60, logger=logger)
+    assert 'dedup_db.py' in logger.error.call_args_list[-1].kwargs['msg']
+    logger = Mock()
+    assert DBRouter(db_path=db_path, logger=logger).prepare(timestamp=60) == db_path
+    assert 'dedup_db.py' in logger.error.call_args_list[-1].kwargs['msg']
+
+    assert create_unique_index(dbpath=str(db_path), interval=30, logger=logger)
+
+
+def test_unique_index_interval(tmp_path):
+    """
+    This function tests that the unique index follows the acquisition interval, and replaces the index of another one.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    assert create_unique_index(dbpath=str(db_path), interval=60, logger=Mock())
+    assert create_unique_index(dbpath=str(db_path), interval=10, logger=Mock())
+
+    con, cur = connect_db(dbpath=str(db_path))
+    indexes = cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'disdrodl'").fetchall()
+    insert_rows(cur, [row(60, 'first'), row(70, 'second'), row(75, 'third')])
+    con.commit()
+    cur.close()
+    con.close()
+
+    assert indexes == [('disdrodl_unique_slot_10s',)]
+    assert fetch_telegrams(db_path) == ['first', 'second']
+
+
+@pytest.mark.parametrize('duplicates, expected, expected_duplicates', [
+    ('keep_first', ['minute 0 a', 'minute 1 a', 'minute 2 a'], []),
+    ('keep_last', ['minute 0 c', 'minute 1 b', 'minute 2 a'], []),
+    ('keep_both', ['minute 0 a', 'minute 1 a', 'minute 2 a'], ['minute 0 b', 'minute 0 c', 'minute 1 b']),
+])
+def test_dedup(tmp_path, duplicates, expected, expected_duplicates):
+    """
+    This function tests that the dedup migration removes the duplicates in batches and creates the unique index.
+    :param tmp_path: pytest temporary directory
+    :param duplicates: the duplicate policy
+    :param expected: the expected telegrams in the disdrodl table
+    :param expected_duplicates: the expected telegrams in the disdrodl_duplicates table
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    con, cur = connect_db(dbpath=str(db_path))
+    insert_rows(cur, [row(0, 'minute 0 a'), row(10, 'minute 0 b'), row(60, 'minute 1 a'), row(59, 'minute 0 c'),
+                      row(61, 'minute 1 b'), row(120, 'minute 2 a'), row(86400, 'next day')])
+    con.commit()
+    cur.close()
+    con.close()
+
+    config_dict_site = {
+        'log_dir': str(tmp_path),
+        'data_dir': str(tmp_path),
+        'db_filename': 'disdrodl.db',
+        'global_attrs': {'sensor_name': 'PAR008', 'sensor_type': 'OTT Hydromet Parsivel2'},
+    }
+    mock_args = Mock()
+    mock_args.config = 'config.yml'
+    mock_args.duplicates = duplicates
+    mock_args.batch_size = 2
+    mock_args.pause = 0
+    with patch('dedup_db.yaml2dict', return_value=config_dict_site), patch('dedup_db.create_logger'), \
+            patch('dedup_db.recount_coverage', wraps=dedup_db.recount_coverage) as mock_recount:
+        dedup_db.main(mock_args)
+
+    # only the day of the removed telegrams is recounted
+    assert [call.args[1] for call in mock_recount.call_args_list] == [[('PAR008', '1970-01-01')]]
+    assert fetch_telegrams(db_path) == expected + ['next day']
+    assert fetch_telegrams(db_path, 'disdrodl_duplicates') == expected_duplicates
+    con, cur = connect_db(dbpath=str(db_path))
+    indexes = cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'disdrodl'").fetchall()
+    assert cur.execute('SELECT date, n_telegrams FROM coverage ORDER BY date').fetchall() == [
+        ('1970-01-01', len(expected)), ('1970-01-02', 1)]
+    cur.close()
+    con.close()
+    assert indexes == [('disdrodl_unique_slot_60s',)]
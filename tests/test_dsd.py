@@ -0,0 +1,169 @@
+"""
+This module contains tests for the drop size distribution products in modules/dsd.py and their export to netCDF.
+
+Functions:
+- spectrum_telegram_string: Returns a Parsivel telegram string as stored in the database, with a raw spectrum.
+- test_spectra_cube: Tests that the spectra are converted to one array, with NaN for incomplete spectra.
+- test_dsd_moments: Tests the DSD products of a spectrum with drops of one class against the definitions.
+- test_export_dsd: Tests that the DSD products are written to the netCDF when export_dsd is set.
+- test_velocity_mask: Tests that the mask keeps the classes around the fall speed.
+- test_filter_spectra: Tests that the masked classes are removed and counted as rejected.
+- test_export_filter: Tests that the filtered spectrum and the rejected particles are written to the netCDF.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from conftest import db_telegram_string
+from modules.dsd import spectra_cube, effective_area, fall_speed, velocity_mask, filter_spectra, dsd_moments
+from modules.netCDF import NetCDF
+from modules.telegram import create_telegram
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+config_dict_dsd = deep_update(config_dict, {'export_dsd': True})
+config_dict_filter = deep_update(config_dict, {'export_dsd': True, 'filter_spectrum': True})
+
+timestamp = datetime(2024, 1, 1, 0, 1, tzinfo=timezone.utc)
+diameter_center = numpy.array(config_dict['variables']['diameter_classes_center']['value'])
+diameter_spread = numpy.array(config_dict['variables']['diameter_spread_classes']['value'])
+velocity_center = numpy.array(config_dict['variables']['velocity_classes_center']['value'])
+
+
+def spectrum_telegram_string(spectrum):
+    """
+    Returns a Parsivel telegram string as stored in the database, with a raw spectrum.
+    :param spectrum: the 32x32 counts of field 93
+    :return: the telegram string
+    """
+    return db_telegram_string({'93': ';'.join(f'{count:03d}' for count in numpy.ravel(spectrum)) + ';'})
+
+
+def test_spectra_cube():
+    """
+    This function tests that the spectra are converted to one array, with NaN for incomplete spectra.
+    """
+    cube = spectra_cube([['1', '002', '3', '4', '5', '6'], None, ['1', '2']], n_diameter=2, n_velocity=3)
+    assert cube.shape == (3, 2, 3)
+    assert cube[0].tolist() == [[1, 2, 3], [4, 5, 6]]
+    assert numpy.isnan(cube[1:]).all()
+
+
+def test_dsd_moments():
+    """
+    This function tests the DSD products of a spectrum with drops of one class against the definitions,
+    and that a dry interval has no reflectivity and no mean diameter.
+    """
+    cube = numpy.zeros((2, 32, 32))
+    cube[0, 10, 15] = 10
+    area = effective_area(diameter_center, beam_length=0.18, beam_width=0.03)
+    products = dsd_moments(cube, diameter_center, diameter_spread, velocity_center, area, interval=60)
+
+    diameter = diameter_center[10]
+    concentration = 10 / (area[10] * 60 * velocity_center[15] * diameter_spread[10])
+    assert products['number_concentration'].shape == (2, 32)
+    assert numpy.isclose(products['number_concentration'][0, 10], concentration)
+    assert numpy.isclose(products['rain_rate'][0], 6e-4 * numpy.pi * 10 * diameter ** 3 / (area[10] * 60))
+    assert numpy.isclose(products['reflectivity'][0],
+                         10 * numpy.log10(concentration * diameter ** 6 * diameter_spread[10]))
+    assert numpy.isclose(products['mass_weighted_diameter'][0], diameter)
+    assert products['rain_rate'][1] == 0
+    assert numpy.isnan(products['reflectivity'][1]) and numpy.isnan(products['mass_weighted_diameter'][1])
+
+
+def test_export_dsd(tmp_path):
+    """
+    This function tests that the DSD products are written to the netCDF when export_dsd is set,
+    with the fill value for a dry minute.
+    :param tmp_path: pytest temporary directory
+    """
+    spectrum = numpy.zeros((32, 32), dtype=int)
+    spectrum[10, 15] = 10
+    telegram_objs = []
+    for minute, minute_spectrum in [(1, spectrum), (2, numpy.zeros((32, 32), dtype=int))]:
+        telegram = create_telegram(config_dict=config_dict_dsd,
+                                   telegram_lines=spectrum_telegram_string(minute_spectrum),
+                                   timestamp=timestamp.replace(minute=minute), db_cursor=None, db_row_id=None,
+                                   telegram_data={}, logger=Mock())
+        telegram.parse_telegram_row()
+        telegram_objs.append(telegram)
+
+    nc = NetCDF(logger=Mock(), config_dict=config_dict_dsd, data_dir=tmp_path, fn_start='dsd',
+                full_version=False, telegram_objs=telegram_objs, date=timestamp)
+    nc.create_netCDF()
+    nc.write_data_to_netCDF()
+
+    area = effective_area(diameter_center, beam_length=0.18, beam_width=0.03)
+    expected = dsd_moments(numpy.stack([spectrum, numpy.zeros((32, 32))]).astype(float), diameter_center,
+                           diameter_spread, velocity_center, area, interval=60)
+    with Dataset(tmp_path / 'dsd.nc') as nc_file:
+        assert numpy.allclose(nc_file.variables['dsd_rain_rate'][:], expected['rain_rate'])
+        assert numpy.allclose(nc_file.variables['dsd_number_concentration'][:], expected['number_concentration'])
+        assert numpy.isclose(nc_file.variables['dsd_mass_weighted_diameter'][0], diameter_center[10])
+        assert nc_file.variables['dsd_reflectivity'][:].mask.tolist() == [False, True]
+
+
+def test_velocity_mask():
+    """
+    This function tests that the mask keeps the classes around the fall speed of the diameter classes.
+    """
+    assert numpy.isclose(fall_speed(numpy.array([2.0]))[0], 9.65 - 10.3 * numpy.exp(-1.2))
+    mask = velocity_mask(diameter_center, velocity_center, tolerance=0.5, coefficients=[9.65, 10.3, 0.6])
+    assert mask.shape == (32, 32)
+    # a 1 mm drop falls at ~4 m/s
+    diameter_class = numpy.argmin(numpy.abs(diameter_center - 1))
+    speed = fall_speed(diameter_center[diameter_class])
+    assert 3.5 < speed < 4.5
+    kept = numpy.abs(velocity_center - speed) <= 0.5 * speed
+    assert mask[diameter_class].tolist() == kept.tolist()
+    assert kept.any() and not mask[diameter_class, 0] and not mask[diameter_class, -1]
+
+
+def test_filter_spectra():
+    """
+    This function tests that the masked classes are removed and counted as rejected,
+    and that a time step without a spectrum stays undefined.
+    """
+    cube = numpy.ones((2, 2, 3))
+    cube[1] = numpy.nan
+    mask = numpy.array([[True, False, True], [False, False, True]])
+    filtered, rejected = filter_spectra(cube, mask)
+    assert filtered[0].tolist() == [[1, 0, 1], [0, 0, 1]]
+    assert rejected[0] == 3
+    assert numpy.isnan(filtered[1]).all() and numpy.isnan(rejected[1])
+
+
+def test_export_filter(tmp_path):
+    """
+    This function tests that the filtered spectrum and the rejected particles are written to the netCDF,
+    and that the DSD products are computed from the filtered spectrum.
+    :param tmp_path: pytest temporary directory
+    """
+    mask = velocity_mask(diameter_center, velocity_center, tolerance=0.5, coefficients=[9.65, 10.3, 0.6])
+    spectrum = numpy.zeros((32, 32), dtype=int)
+    kept_class = numpy.argmin(numpy.abs(velocity_center - fall_speed(diameter_center[10])))
+    spectrum[10, kept_class] = 10
+    spectrum[10, 0] = 5
+    assert mask[10, kept_class] and not mask[10, 0]
+    telegram = create_telegram(config_dict=config_dict_filter, telegram_lines=spectrum_telegram_string(spectrum),
+                               timestamp=timestamp, db_cursor=None, db_row_id=None, telegram_data={},
+                               logger=Mock())
+    telegram.parse_telegram_row()
+
+    nc = NetCDF(logger=Mock(), config_dict=config_dict_filter, data_dir=tmp_path, fn_start='filter',
+                full_version=True, telegram_objs=[telegram], date=timestamp)
+    nc.create_netCDF()
+    nc.write_data_to_netCDF()
+
+    with Dataset(tmp_path / 'filter.nc') as nc_file:
+        assert nc_file.variables['data_raw'][0, 10, 0] == 5
+        assert nc_file.variables['data_raw_filtered'][0, 10, 0] == 0
+        assert nc_file.variables['data_raw_filtered'][0, 10, kept_class] == 10
+        assert list(nc_file.variables['rejected_particles'][:]) == [5]
+        assert numpy.isclose(nc_file.variables['dsd_mass_weighted_diameter'][0], diameter_center[10])
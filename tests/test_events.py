@@ -0,0 +1,128 @@
+"""
+This module contains tests for the rain-event catalog in modules/events.py.
+
+Functions:
+- day_ts: Returns the timestamp of a minute of a day.
+- test_detect_events: Tests that runs of wet minutes with short dry gaps are one event, with their peak and total.
+- test_update_events: Tests that the events of a day are replaced, and linked over midnight in both directions.
+- test_query_events: Tests that the events are filtered by day, station, sensor, peak and total.
+- test_events_from_netCDF: Tests that the events of an exported netCDF are detected.
+"""
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import numpy
+import pytest
+from pydantic.v1.utils import deep_update
+
+from modules.events import create_events_db, detect_events, update_events, query_events, events_from_netCDF
+from modules.sqldb import connect_db
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+events_config = {'threshold': 0.1, 'min_particles': 10, 'max_gap': 600}
+
+
+def day_ts(day, minute):
+    """
+    Returns the timestamp of a minute of a day.
+    :param day: the day
+    :param minute: the minute of the day
+    :return: the POSIX timestamp
+    """
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() + minute * 60
+
+
+def test_detect_events():
+    """
+    This function tests that runs of wet minutes with dry gaps of at most max_gap are one event,
+    with their peak intensity, total amount over all their minutes and number of wet minutes.
+    """
+    timestamps = numpy.arange(60) * 60.
+    intensity = numpy.zeros(60)
+    n_particles = numpy.full(60, 100.)
+    # event 1: minutes 5-9 and 15-16 (dry gap of 5 minutes), minute 12 has too few particles
+    intensity[5:10] = [1, 2, 12, 3, 1]
+    intensity[12] = 30
+    n_particles[12] = 5
+    intensity[15:17] = 6
+    intensity[20] = numpy.nan
+    # event 2: minutes 40-41, after a dry gap of 23 minutes
+    intensity[40:42] = [60, 0.5]
+
+    events = detect_events(timestamps, intensity, n_particles, events_config, interval=60)
+    assert len(events) == 2
+    start, end, peak, total, n_minutes = events[0]
+    assert (start, end) == (5 * 60, 17 * 60)
+    assert peak == 30
+    assert total == pytest.approx((1 + 2 + 12 + 3 + 1 + 30 + 6 + 6) / 60)
+    assert n_minutes == 7
+    assert events[1] == pytest.approx((40 * 60, 42 * 60, 60, 60.5 / 60, 2))
+    assert not detect_events(timestamps, numpy.zeros(60), n_particles, events_config, interval=60)
+
+
+def test_update_events(tmp_path):
+    """
+    This function tests that the events of a day are replaced when it is exported again,
+    and that an event over midnight is linked whichever day is exported first.
+    :param tmp_path: pytest temporary directory
+    """
+    create_events_db(tmp_path / 'events.db')
+    con, _ = connect_db(str(tmp_path / 'events.db'))
+    day_1, day_2 = date(2024, 6, 1), date(2024, 6, 2)
+    evening = [(day_ts(day_1, 600), day_ts(day_1, 620), 5., 1., 20),
+               (day_ts(day_1, 1430), day_ts(day_1, 1440), 8., 2., 10)]
+    morning = [(day_ts(day_2, 5), day_ts(day_2, 30), 20., 3., 25)]
+
+    # the next day is exported first, and relinked when the day before is exported
+    update_events(con, 'GV', 'PAR008', day_2, morning, max_gap=600)
+    update_events(con, 'GV', 'PAR008', day_1, evening, max_gap=600)
+    update_events(con, 'GV', 'PAR008', day_1, evening, max_gap=600)
+    events = query_events(con, day_1, day_2)
+    assert [(event['start_time'], event['end_time']) for event in events] == [
+        (day_ts(day_1, 600), day_ts(day_1, 620)), (day_ts(day_1, 1430), day_ts(day_2, 30))]
+    assert events[1]['peak_intensity'] == 20 and events[1]['total_amount'] == 5 and events[1]['n_minutes'] == 35
+    # exporting the next day again links it to the stored evening event
+    update_events(con, 'GV', 'PAR008', day_2, morning, max_gap=600)
+    assert query_events(con, day_1, day_2) == events
+
+    # the evening event is gone after exporting its day again, so the morning is an event of its own
+    update_events(con, 'GV', 'PAR008', day_1, evening[:1], max_gap=600)
+    events = query_events(con, day_1, day_2)
+    assert [event['start_time'] for event in events] == [day_ts(day_1, 600), day_ts(day_2, 5)]
+    con.close()
+
+
+def test_query_events(tmp_path):
+    """
+    This function tests that the events are filtered by day, station, sensor, peak intensity and total amount.
+    :param tmp_path: pytest temporary directory
+    """
+    create_events_db(tmp_path / 'events.db')
+    con, _ = connect_db(str(tmp_path / 'events.db'))
+    for station, sensor_name, peak in (('CABAUW', 'PAR001', 12.), ('CABAUW', 'PAR002', 4.), ('GV', 'PAR008', 15.)):
+        for month in (1, 2):
+            day = date(2024, month, 10)
+            update_events(con, station, sensor_name, day, [(day_ts(day, 60), day_ts(day, 90), peak, peak / 4, 30)],
+                          max_gap=1800)
+
+    assert len(query_events(con, date(2024, 1, 1), date(2024, 12, 31))) == 6
+    events = query_events(con, date(2024, 1, 1), date(2024, 12, 31), station='CABAUW', min_peak=10)
+    assert [(event['sensor_name'], event['peak_intensity']) for event in events] == [('PAR001', 12)] * 2
+    assert len(query_events(con, date(2024, 1, 1), date(2024, 1, 31), min_total=3)) == 2
+    assert len(query_events(con, date(2024, 2, 10), date(2024, 2, 10), sensor_name='PAR008')) == 1
+    con.close()
+
+
+def test_events_from_netCDF():
+    """
+    This function tests that the events of the sample netCDF are detected, within its day.
+    """
+    day, events = events_from_netCDF(wd / 'sample_data' / '20240722_Green_Village-GV_PAR008.nc', config_dict)
+    assert day == date(2024, 7, 22)
+    assert len(events) > 0
+    for start, end, peak, total, n_minutes in events:
+        assert day_ts(day, 0) <= start < end <= day_ts(day, 1440)
+        assert peak >= config_dict['events']['threshold'] and total > 0 and n_minutes > 0
@@ -22,6 +22,7 @@ import export_disdrodlDB2NC
 from modules.util_functions import create_dir
 from modules.sqldb import connect_db
 from modules.netCDF import NetCDF
+from modules.profiler import StageProfiler
 
 output_file_dir = Path('sample_data/')
 db_path_thies = output_file_dir / 'test_thies.db'
@@ -52,6 +53,7 @@ class ExportParsivelTests(unittest.TestCase):
     Functions:
     - test_parsivel_full: Verifies that exporting a full version of the PAR008 sensor results in no errors.
     - test_parsivel_light: Verifies that exporting a light version of the PAR008 sensor results in no errors.
+    - test_parsivel_profile: Verifies that a profiled export times the write of each netCDF variable.
     """
 
     @patch('export_disdrodlDB2NC.create_dir')
@@ -122,6 +124,48 @@ class ExportParsivelTests(unittest.TestCase):
         if os.path.exists(output_file_path):
             os.remove(output_file_path)
 
+    @patch('export_disdrodlDB2NC.StageProfiler')
+    @patch('export_disdrodlDB2NC.create_dir')
+    @patch('export_disdrodlDB2NC.connect_db')
+    @patch('export_disdrodlDB2NC.NetCDF')
+    def test_parsivel_profile(self, mock_NetCDF, mock_connect_db, mock_create_dir, mock_StageProfiler):
+        """
+        This function verifies that a profiled export times the write of each netCDF variable.
+        :param mock_NetCDF: Mock object for NetCDF objects
+        :param mock_connect_db: Mock object for connecting to the test database with connect_db
+        :param mock_create_dir: Mock object for creating the output directory
+        :param mock_StageProfiler: Mock object returning a real StageProfiler, to inspect its stages
+        """
+        output_file_path = output_file_dir / '20240101_Green_Village-GV_PAR008.nc'
+
+        mock_args = Mock()
+        mock_args.config = 'configs_netcdf/config_PAR_008_GV.yml'
+        mock_args.date = '2024-01-01'
+        mock_args.version = 'full'
+        mock_args.profile = True
+
+        db_path = Path("sample_data/test_parsivel.db")
+        mock_connect_db.return_value = connect_db(dbpath=str(db_path))
+
+        mock_create_dir.return_value = create_dir(path=output_file_dir)
+
+        mock_NetCDF.side_effect = side_effect
+
+        profiler = StageProfiler(enabled=True)
+        mock_StageProfiler.return_value = profiler
+
+        export_disdrodlDB2NC.main(mock_args)
+
+        assert output_file_path.exists()
+        # a stage per variable, within the stage of all telegram fields
+        assert profiler.stages['write rain_intensity']['calls'] == 1
+        assert profiler.stages['write data_raw']['calls'] == 1
+        assert profiler.stages['write telegram fields']['wall_s'] >= profiler.stages['write data_raw']['wall_s']
+
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+
+
 @pytest.mark.usefixtures("db_insert_24h_thies")
 class ExportThiesTests(unittest.TestCase):
     """
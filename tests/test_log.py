@@ -0,0 +1,80 @@
+"""
+This module contains tests for the logger in modules/log.py.
+
+Functions:
+- test_json_formatter_escapes_quotes: Tests that messages with quotes are encoded as valid JSON.
+- test_level_sampler: Tests that the sampler only lets through 1 in N records of a sampled level.
+- test_queued_logger: Tests that a queued logger writes its records to file once flushed.
+- test_queued_logger_replaced: Tests that replacing a queued logger stops and closes the previous listener.
+"""
+import json
+import logging
+from logging.handlers import QueueHandler
+
+from modules.log import JsonFormatter, LevelSampler, log, stop_log_listeners, _listeners
+
+
+def test_json_formatter_escapes_quotes():
+    """
+    This function tests that messages with quotes and newlines are encoded as valid JSON.
+    """
+    msg = "INSERT INTO disdrodl VALUES (1, 'a \"b\"');\nsecond line"
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, msg, None, None)
+    log_dict = json.loads(JsonFormatter().format(record))
+    assert log_dict['msg'] == msg
+    assert log_dict['level'] == 'INFO'
+    assert log_dict['name'] == 'test'
+
+
+def test_level_sampler():
+    """
+    This function tests that the sampler only lets through 1 in N records of a sampled level.
+    """
+    sampler = LevelSampler({'DEBUG': 10})
+    debug = logging.LogRecord('test', logging.DEBUG, __file__, 1, 'debug', None, None)
+    info = logging.LogRecord('test', logging.INFO, __file__, 1, 'info', None, None)
+    assert sum(sampler.filter(debug) for _ in range(100)) == 10
+    assert all(sampler.filter(info) for _ in range(100))
+
+
+def test_queued_logger(tmp_path):
+    """
+    This function tests that a queued logger writes its records to file once the listeners are flushed.
+    :param tmp_path: pytest temporary directory
+    """
+    log_file = tmp_path / 'log_test_queued.json'
+    logger = log(log_path=log_file, log_name='test-queued', queued=True, sample_rates={'DEBUG': 2})
+    for i in range(4):
+        logger.debug(msg=f'debug {i}')
+    logger.info(msg='it\'s "quoted"')
+    stop_log_listeners()
+
+    with open(log_file, 'r', encoding='utf-8') as log_file_r:
+        lines = [json.loads(line) for line in log_file_r.readlines()]
+    assert [line['msg'] for line in lines] == ['debug 0', 'debug 2', 'it\'s "quoted"']
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+
+
+def test_queued_logger_replaced(tmp_path):
+    """
+    This function tests that creating a queued logger again for the same name stops the previous listener and
+    closes its file handler, and that the records of both loggers are written.
+    :param tmp_path: pytest temporary directory
+    """
+    log_file = tmp_path / 'log_test_replaced.json'
+    logger = log(log_path=log_file, log_name='test-replaced', queued=True)
+    listener = _listeners['test-replaced']
+    file_handler = listener.handlers[0]
+    logger.info(msg='first')
+    logger = log(log_path=log_file, log_name='test-replaced', queued=True)
+    assert listener._thread is None  # pylint: disable=protected-access
+    assert file_handler.stream is None
+    assert len([handler for handler in logger.handlers if isinstance(handler, QueueHandler)]) == 1
+    logger.info(msg='second')
+    stop_log_listeners()
+
+    with open(log_file, 'r', encoding='utf-8') as log_file_r:
+        assert [json.loads(line)['msg'] for line in log_file_r.readlines()] == ['first', 'second']
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
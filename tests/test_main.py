@@ -5,9 +5,10 @@ The main goal of this file is to test the main loop of the program,
 which logs data once every minute.
 """
 import os
+import sqlite3
 import sys
 import unittest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from unittest.mock import Mock, patch
 
@@ -15,6 +16,8 @@ import pytest
 
 from main import main
 from modules.sensors import Thies, Parsivel
+from modules.telegram import ParsivelTelegram
+from modules.spool import Spool
 from modules.sqldb import connect_db, create_db
 
 wd = Path(__file__).parent.parent
@@ -31,6 +34,26 @@ def connect_db_wrapper(dbpath):
     return connect_db(dbpath=str(db_path))
 
 
+def mock_now_times(mock_now_time, time_list, interval=60):
+    """
+    Makes every NowTime of the main loop one interval later, so every cycle logs a telegram of its own interval.
+    :param mock_now_time: mock NowTime object
+    :param time_list: the hours, minutes and seconds of every NowTime
+    :param interval: the time in seconds between two NowTime's
+    """
+    start = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    now_times = []
+
+    def side_effect():
+        now_time = Mock()
+        now_time.time_list = time_list
+        now_time.utc = start + timedelta(seconds=interval * len(now_times))
+        now_times.append(now_time)
+        return now_time
+
+    mock_now_time.side_effect = side_effect
+
+
 class TestIntegration(unittest.TestCase):
     """
     Class for testing main.py for the Thies sensor.
@@ -38,6 +61,9 @@ class TestIntegration(unittest.TestCase):
     Functions:
     - test_bad_sensor_type: Test for a bad sensor type, and if the logger writes the correct thing to file.
     - test_main_loop: Test for the main loop of the Thies sensor.
+    - test_main_loop_parsivel_sub_minute: Test for the main loop of the Parsivel sensor with a 10 second interval.
+    - test_main_loop_db_locked: Test that telegrams are spooled when the database can not be written.
+    - test_main_loop_create_db_fails: Test that telegrams are spooled while the database can not be created.
     """
     thies_line = ('06;0854;2.11;01.01.14;18:59:00;00;00;NP   ;000.000;00;00;NP   '
                   ';000.000;000.000;000.000;0000.00;99999;-9.9;100;0.0;0;0;0;0;0;0;0;0;0;0;0;0;0;0;0;0;+23;26;1662'
@@ -134,8 +160,7 @@ class TestIntegration(unittest.TestCase):
 
         mock_yaml2dict.return_value = test_conf_dict_site
 
-        mock_now_time.return_value.time_list = ['10', '10', '00']
-        mock_now_time.return_value.utc = datetime.now(timezone.utc)
+        mock_now_times(mock_now_time, ['10', '10', '00'])
 
         def side_effect(seconds):  # pylint: disable=unused-argument
             if mock_sleep.call_count > 1440:
@@ -197,8 +222,7 @@ class TestIntegration(unittest.TestCase):
 
         mock_yaml2dict.return_value = test_conf_dict_site
 
-        mock_now_time.return_value.time_list = ['10', '10', '00']
-        mock_now_time.return_value.utc = datetime.now(timezone.utc)
+        mock_now_times(mock_now_time, ['10', '10', '00'])
 
         def side_effect(seconds):  # pylint: disable=unused-argument
             if mock_sleep.call_count > 1440:
@@ -221,6 +245,273 @@ class TestIntegration(unittest.TestCase):
         os.remove(f'sample_data/{db_name}')
         os.remove('sample_data/log_test_log.json')
 
+    @patch.object(Parsivel, 'reset_rain_amount')
+    @patch.object(Parsivel, 'sensor_start_sequence')
+    @patch.object(Parsivel, 'read')
+    @patch('main.NowTime')
+    @patch('main.yaml2dict')
+    @patch('main.sleep', return_value=None)
+    @patch('modules.sensors.serial')
+    @patch('main.create_db', new=create_db_wrapper)
+    @patch('main.connect_db', new=connect_db_wrapper)
+    def test_main_loop_parsivel_sub_minute(self, mock_serial, mock_sleep, mock_yaml2dict,  # pylint: disable=unused-argument
+                                           mock_now_time, mock_read, mock_start_sequence, mock_reset_rain_amount):
+        """
+        Test for the main loop of the Parsivel sensor with an interval of 10 seconds, it checks whether
+        a cycle runs when the seconds are a multiple of the interval, the start sequence only runs at startup
+        and the rain amount is reset after the telegram at the start of each minute.
+        :param mock_serial: mock serial object
+        :param mock_sleep: mock sleep object to skip the sleep time
+        :param mock_yaml2dict: mock yaml2dict object
+        :param mock_now_time: mock NowTime object to always be on a multiple of 10 seconds
+        :param mock_read: mock read object to return a Parsivel telegram
+        :param mock_start_sequence: mock of the start sequence
+        :param mock_reset_rain_amount: mock of the rain amount reset
+        """
+        mock_read.return_value = self.parsivel_lines
+
+        test_conf_dict_site = {
+            'log_dir': 'sample_data',
+            'data_dir': 'sample_data',
+            'db_filename': db_name,
+            'script_name': 'test_log',
+            'port': '/dev/ttyUSB0',
+            'baud': 19200,
+            'station_code': 'GV',
+            'interval': 10,
+            'global_attrs': {
+                'sensor_name': 'PAR008',
+                'sensor_type': 'OTT Hydromet Parsivel2',
+            }
+        }
+        mock_yaml2dict.return_value = test_conf_dict_site
+
+        mock_now_times(mock_now_time, ['10', '10', '20'], interval=10)
+
+        def side_effect(seconds):  # pylint: disable=unused-argument
+            if mock_sleep.call_count > 10:
+                raise KeyboardInterrupt
+
+        mock_sleep.side_effect = side_effect
+
+        if os.path.exists(f'sample_data/{db_name}'):
+            os.remove(f'sample_data/{db_name}')
+
+        with self.assertRaises(KeyboardInterrupt):
+            main('configs_netcdf/config_PAR_008_GV.yml')
+
+        con, cur = connect_db(dbpath=f'sample_data/{db_name}')
+        number_of_rows = len(con.execute('SELECT * FROM disdrodl').fetchall())
+        assert number_of_rows == 10
+        mock_start_sequence.assert_called_once()
+        # the 10 cycles start at 0 seconds, so they include 2 minutes
+        assert mock_reset_rain_amount.call_count == 2
+        cur.close()
+        con.close()
+        os.remove(f'sample_data/{db_name}')
+        os.remove('sample_data/log_test_log.json')
+
+    @patch('main.SpoolDrainer')
+    @patch.object(ParsivelTelegram, 'insert2db', side_effect=sqlite3.OperationalError('database is locked'))
+    @patch.object(Parsivel, 'sensor_start_sequence')
+    @patch.object(Parsivel, 'read')
+    @patch('main.NowTime')
+    @patch('main.yaml2dict')
+    @patch('main.sleep', return_value=None)
+    @patch('modules.sensors.serial')
+    @patch('main.create_db', new=create_db_wrapper)
+    @patch('main.connect_db', new=connect_db_wrapper)
+    def test_main_loop_db_locked(self, mock_serial, mock_sleep, mock_yaml2dict,  # pylint: disable=unused-argument
+                                 mock_now_time, mock_read, mock_start_sequence, mock_insert2db,  # pylint: disable=unused-argument
+                                 mock_spool_drainer):
+        """
+        Test that the main loop keeps running and spools the telegrams when the database can not be written,
+        and that the spool is drained into the database afterwards.
+        :param mock_serial: mock serial object
+        :param mock_sleep: mock sleep object to skip the sleep time
+        :param mock_yaml2dict: mock yaml2dict object
+        :param mock_now_time: mock NowTime object to always be on a whole minute
+        :param mock_read: mock read object to return a Parsivel telegram
+        :param mock_start_sequence: mock of the start sequence
+        :param mock_insert2db: mock insert2db raising a locked database error
+        :param mock_spool_drainer: mock of the drainer thread, so the spool is not drained while the loop runs
+        """
+        mock_read.return_value = self.parsivel_lines
+        spool_file = 'sample_data/integration-test.spool'
+
+        test_conf_dict_site = {
+            'log_dir': 'sample_data',
+            'data_dir': 'sample_data',
+            'db_filename': db_name,
+            'spool_file': spool_file,
+            'script_name': 'test_log',
+            'port': '/dev/ttyUSB0',
+            'baud': 19200,
+            'station_code': 'GV',
+            'global_attrs': {
+                'sensor_name': 'PAR008',
+                'sensor_type': 'OTT Hydromet Parsivel2',
+            }
+        }
+        mock_yaml2dict.return_value = test_conf_dict_site
+
+        mock_now_times(mock_now_time, ['10', '10', '00'])
+
+        def side_effect(seconds):  # pylint: disable=unused-argument
+            if mock_sleep.call_count > 5:
+                raise KeyboardInterrupt
+
+        mock_sleep.side_effect = side_effect
+
+        for path in [f'sample_data/{db_name}', spool_file]:
+            if os.path.exists(path):
+                os.remove(path)
+
+        with self.assertRaises(KeyboardInterrupt):
+            main('configs_netcdf/config_PAR_008_GV.yml')
+
+        with open(spool_file, 'r', encoding='utf-8') as spool_r:
+            assert len(spool_r.readlines()) == 5
+
+        mock_spool_drainer.return_value.start.assert_called_once()
+        spool = Spool(path=Path(spool_file), logger=Mock())
+        assert spool.drain(db_path) == 5
+        con, cur = connect_db(dbpath=f'sample_data/{db_name}')
+        number_of_rows = len(con.execute('SELECT * FROM disdrodl').fetchall())
+        assert number_of_rows == 5
+        cur.close()
+        con.close()
+        os.remove(f'sample_data/{db_name}')
+        os.remove('sample_data/log_test_log.json')
+
+    @patch('main.SpoolDrainer')
+    @patch.object(Spool, 'append', side_effect=OSError(28, 'No space left on device'))
+    @patch.object(ParsivelTelegram, 'insert2db', side_effect=sqlite3.OperationalError('database or disk is full'))
+    @patch.object(Parsivel, 'sensor_start_sequence')
+    @patch.object(Parsivel, 'read')
+    @patch('main.NowTime')
+    @patch('main.yaml2dict')
+    @patch('main.sleep', return_value=None)
+    @patch('modules.sensors.serial')
+    @patch('main.create_db', new=create_db_wrapper)
+    @patch('main.connect_db', new=connect_db_wrapper)
+    def test_main_loop_spool_fails(self, mock_serial, mock_sleep, mock_yaml2dict,  # pylint: disable=unused-argument
+                                   mock_now_time, mock_read, mock_start_sequence,  # pylint: disable=unused-argument
+                                   mock_insert2db, mock_append, mock_spool_drainer):  # pylint: disable=unused-argument
+        """
+        Test that the main loop keeps running when neither the database nor the spool can be written, ie. on a full
+        disk, losing only the telegrams of those cycles.
+        :param mock_serial: mock serial object
+        :param mock_sleep: mock sleep object to skip the sleep time
+        :param mock_yaml2dict: mock yaml2dict object
+        :param mock_now_time: mock NowTime object to always be on a whole minute
+        :param mock_read: mock read object to return a Parsivel telegram
+        :param mock_start_sequence: mock of the start sequence
+        :param mock_insert2db: mock insert2db raising a full database error
+        :param mock_append: mock Spool.append raising a full disk error
+        :param mock_spool_drainer: mock of the drainer thread
+        """
+        mock_read.return_value = self.parsivel_lines
+        mock_yaml2dict.return_value = {
+            'log_dir': 'sample_data',
+            'data_dir': 'sample_data',
+            'db_filename': db_name,
+            'script_name': 'test_log',
+            'port': '/dev/ttyUSB0',
+            'baud': 19200,
+            'station_code': 'GV',
+            'global_attrs': {
+                'sensor_name': 'PAR008',
+                'sensor_type': 'OTT Hydromet Parsivel2',
+            }
+        }
+        mock_now_times(mock_now_time, ['10', '10', '00'])
+
+        def side_effect(seconds):  # pylint: disable=unused-argument
+            if mock_sleep.call_count > 5:
+                raise KeyboardInterrupt
+
+        mock_sleep.side_effect = side_effect
+
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+        with self.assertRaises(KeyboardInterrupt):
+            main('configs_netcdf/config_PAR_008_GV.yml')
+
+        assert mock_append.call_count == 5
+        os.remove(f'sample_data/{db_name}')
+        os.remove('sample_data/log_test_log.json')
+
+    @patch('main.SpoolDrainer')
+    @patch.object(Parsivel, 'sensor_start_sequence')
+    @patch.object(Parsivel, 'read')
+    @patch('main.NowTime')
+    @patch('main.yaml2dict')
+    @patch('main.sleep', return_value=None)
+    @patch('modules.sensors.serial')
+    @patch('main.create_db', side_effect=[sqlite3.OperationalError('disk I/O error'), OSError('read-only'),
+                                          None, None])
+    @patch('main.connect_db', new=connect_db_wrapper)
+    def test_main_loop_create_db_fails(self, mock_create_db, mock_serial, mock_sleep,  # pylint: disable=unused-argument
+                                       mock_yaml2dict, mock_now_time, mock_read,
+                                       mock_start_sequence, mock_spool_drainer):  # pylint: disable=unused-argument
+        """
+        Test that the main loop keeps running and spools the telegrams while the database can not be created,
+        and writes them to the database once the creation, retried every cycle, succeeds.
+        :param mock_create_db: mock create_db failing at startup and in the first cycle
+        :param mock_serial: mock serial object
+        :param mock_sleep: mock sleep object to skip the sleep time
+        :param mock_yaml2dict: mock yaml2dict object
+        :param mock_now_time: mock NowTime object to always be on a whole minute
+        :param mock_read: mock read object to return a Parsivel telegram
+        :param mock_start_sequence: mock of the start sequence
+        :param mock_spool_drainer: mock of the drainer thread, so the spool is not drained while the loop runs
+        """
+        mock_read.return_value = self.parsivel_lines
+        spool_file = 'sample_data/integration-test.spool'
+        test_conf_dict_site = {
+            'log_dir': 'sample_data',
+            'data_dir': 'sample_data',
+            'db_filename': db_name,
+            'spool_file': spool_file,
+            'script_name': 'test_log',
+            'port': '/dev/ttyUSB0',
+            'baud': 19200,
+            'station_code': 'GV',
+            'global_attrs': {
+                'sensor_name': 'PAR008',
+                'sensor_type': 'OTT Hydromet Parsivel2',
+            }
+        }
+        mock_yaml2dict.return_value = test_conf_dict_site
+        mock_now_times(mock_now_time, ['10', '10', '00'])
+
+        def side_effect(seconds):  # pylint: disable=unused-argument
+            if mock_sleep.call_count > 3:
+                raise KeyboardInterrupt
+
+        mock_sleep.side_effect = side_effect
+
+        for path in [f'sample_data/{db_name}', spool_file]:
+            if os.path.exists(path):
+                os.remove(path)
+        create_db(dbpath=str(db_path))
+
+        with self.assertRaises(KeyboardInterrupt):
+            main('configs_netcdf/config_PAR_008_GV.yml')
+
+        # startup and the first cycle fail to create the database, the second cycle succeeds
+        assert mock_create_db.call_count == 3
+        with open(spool_file, 'r', encoding='utf-8') as spool_r:
+            assert len(spool_r.readlines()) == 1
+        con, cur = connect_db(dbpath=f'sample_data/{db_name}')
+        assert len(con.execute('SELECT * FROM disdrodl').fetchall()) == 2
+        cur.close()
+        con.close()
+        for path in [f'sample_data/{db_name}', spool_file, 'sample_data/log_test_log.json']:
+            os.remove(path)
+
     @patch('modules.sensors.sleep', return_value=None)
     @patch.object(Thies, 'read')
     @patch('main.NowTime')
@@ -228,10 +519,12 @@ class TestIntegration(unittest.TestCase):
     @patch('main.sleep', return_value=None)
     @patch('modules.sensors.serial')
     @patch('main.create_db')
+    @patch('main.create_unique_index')
     @patch('main.connect_db')
     @patch('main.create_telegram', return_value=None)
     @patch('main.create_logger')
-    def test_telegram_is_none(self, mock_create_logger, mock_create_telegram, mock_connect_db, mock_create_db, mock_serial, mock_sleep, mock_yaml2dict,  # pylint: disable=unused-argument
+    def test_telegram_is_none(self, mock_create_logger, mock_create_telegram, mock_connect_db, mock_create_unique_index,  # pylint: disable=unused-argument,too-many-arguments
+                             mock_create_db, mock_serial, mock_sleep, mock_yaml2dict,  # pylint: disable=unused-argument
                              mock_now_time, mock_read, mock_sensor_sleep):  # pylint: disable=unused-argument
         """
         Test for the main loop of the Thies sensor, it checks whether there are 1440 rows in the database.
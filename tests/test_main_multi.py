@@ -0,0 +1,119 @@
+"""
+This module contains tests for the multi-sensor daemon in main_multi.py.
+
+Functions:
+- test_cycle_queues_telegram: Tests that a cycle reads, parses and queues one telegram.
+- test_cycle_create_db_fails: Tests that a telegram is spooled while the database can not be created.
+- test_worker_fault_isolation: Tests that a failing sensor reconnects without stopping its thread.
+- test_wait_for_interval: Tests that a wait that ends before the start of the interval is repeated.
+"""
+import itertools
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from pydantic.v1.utils import deep_update
+
+from main_multi import SensorWorker
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_thies.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_THIES_006_GV.yml'))
+
+
+def test_cycle_queues_telegram():
+    """
+    This function tests that a cycle reads, parses and queues one telegram, and runs the start sequence.
+    """
+    mock_writer = Mock()
+    worker = SensorWorker(config_dict=config_dict, logger=Mock(), db_writer=mock_writer,
+                          stop_event=threading.Event())
+    worker.db_ready = True
+    worker.sensor = Mock()
+    worker.sensor.read.return_value = '06;0854;2.11;01.01.14;18:59:00;00'
+    now_utc = Mock()
+    now_utc.utc = datetime(2024, 1, 1, 10, 10, tzinfo=timezone.utc)
+
+    worker.cycle(now_utc)
+
+    mock_writer.put.assert_called_once()
+    db_path, row = mock_writer.put.call_args.args
+    assert db_path == Path(config_dict['data_dir']) / config_dict['db_filename']
+    assert row[0] == now_utc.utc.timestamp()
+    assert row[2] == 'THIES006'
+    worker.sensor.sensor_start_sequence.assert_called_once()
+    assert worker.metrics.cycles == 1
+
+
+def test_cycle_create_db_fails(tmp_path):
+    """
+    This function tests that a telegram is spooled instead of queued while the database can not be created, without
+    failing the cycle, and that the creation is retried in the next cycle.
+    :param tmp_path: pytest temporary directory
+    """
+    mock_writer = Mock()
+    worker = SensorWorker(config_dict=deep_update(config_dict, {'data_dir': str(tmp_path)}), logger=Mock(),
+                          db_writer=mock_writer, stop_event=threading.Event())
+    worker.sensor = Mock()
+    worker.sensor.read.return_value = '06;0854;2.11;01.01.14;18:59:00;00'
+    now_utc = Mock()
+    now_utc.utc = datetime(2024, 1, 1, 10, 10, tzinfo=timezone.utc)
+
+    with patch('modules.sqldb.create_db', side_effect=sqlite3.OperationalError('unable to open database file')):
+        worker.cycle(now_utc)
+    mock_writer.put.assert_not_called()
+    assert worker.spool.records_spooled == 1 and not worker.db_ready
+    assert 'unable to open database file' in worker.logger.error.call_args.kwargs['msg']
+
+    worker.cycle(now_utc)
+    mock_writer.put.assert_called_once()
+    assert worker.db_ready and worker.db_path == tmp_path / config_dict['db_filename']
+    worker.spool.close()
+
+
+@patch('main_multi.time', side_effect=lambda clock=itertools.count(59.5, 0.1): next(clock))
+def test_worker_fault_isolation(mock_time):  # pylint: disable=unused-argument
+    """
+    This function tests that a sensor whose read fails is reconnected without stopping its thread.
+    :param mock_time: mock clock that advances 0.1 s on every call, so the next minute starts right away
+    """
+    stop_event = threading.Event()
+    mock_logger = Mock()
+    worker = SensorWorker(config_dict=config_dict, logger=mock_logger, db_writer=Mock(),
+                          stop_event=stop_event, retry_delay=0)
+    sensors = [Mock(), Mock()]
+    sensors[0].read.side_effect = OSError('device disconnected')
+
+    def connect():
+        worker.sensor = sensors.pop(0)
+        if not sensors:
+            stop_event.set()
+
+    with patch.object(worker, 'connect', side_effect=connect):
+        worker.run()
+
+    assert worker.failures == 1
+    mock_logger.error.assert_called_once()
+    assert 'device disconnected' in mock_logger.error.call_args.kwargs['msg']
+
+
+def test_wait_for_interval():
+    """
+    This function tests that a wait that ends before the start of the interval, ie. on a clock adjustment,
+    is repeated for the rest of the interval.
+    """
+    stop_event = Mock()
+    stop_event.wait.return_value = False
+    worker = SensorWorker(config_dict=config_dict, logger=Mock(), db_writer=Mock(), stop_event=stop_event)
+
+    # the first wait ends half a second before the start of the minute
+    with patch('main_multi.time', side_effect=[30.0, 30.0, 30.0, 59.5, 59.5, 60.0]):
+        assert worker.wait_for_interval()
+    assert [call.args[0] for call in stop_event.wait.call_args_list] == [30.0, 0.5]
+
+    stop_event.wait.return_value = True
+    with patch('main_multi.time', side_effect=[0.0, 0.0, 0.0]):
+        assert not worker.wait_for_interval()
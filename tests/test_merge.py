@@ -0,0 +1,128 @@
+"""
+This module contains tests for the merge of daily netCDFs in modules/merge.py and merge_nc.py.
+
+Functions:
+- days_dir: Fixture with the sample netCDF as the netCDFs of three days, with particles and QC flags on some days.
+- test_time_chunk_size: Tests that the chunks hold long time series of single values and fewer spectra.
+- test_merge_netCDF: Tests that the days are appended along time, with the attributes of the config.
+- test_merge_errors: Tests that overlapping days and different intervals are not merged, leaving no netCDF behind.
+- test_period_range: Tests the time range and file name format of a month and a year.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+import pytest
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from merge_nc import period_range
+from modules.merge import merge_netCDF, time_chunk_size, MAX_CHUNK_STEPS
+from modules.reader import NetCDFReader, netCDF_name
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+days = [datetime(2024, 7, 31, tzinfo=timezone.utc) + timedelta(days=i) for i in range(3)]
+
+
+@pytest.fixture(name='days_dir')
+def fixture_days_dir(sample_nc_days):
+    """
+    Fixture with the sample netCDF as the netCDFs of 2024-07-31 to 2024-08-02 in the monthly directories of a data
+    directory. The second day has QC flags, the first and last day have 3 and 2 particles.
+    :param sample_nc_days: the fixture that copies the sample netCDF as the netCDFs of days
+    :return: the config with the data directory, and the paths of the netCDFs
+    """
+    config, paths = sample_nc_days(days)
+    for i, path in enumerate(paths):
+        with Dataset(path, 'a') as nc_file:
+            nc_file.setncattr('qc_summary', 'error_code: 0')
+            if i == 1:
+                flags = nc_file.createVariable('qc_flags', 'i4', ('time',))
+                flags[:] = 1
+            else:
+                nc_file.createDimension('particle', 3 - i // 2)
+                particles = nc_file.createVariable('particle_diameter', 'f4', ('particle',))
+                particles[:] = numpy.arange(3 - i // 2) + i
+    return config, paths
+
+
+def test_time_chunk_size():
+    """
+    This function tests that the chunks hold a long time series of single values, and fewer time steps of spectra.
+    """
+    assert time_chunk_size((), 4) == MAX_CHUNK_STEPS
+    assert time_chunk_size((32, 32), 4) == 256
+    assert time_chunk_size((32, 32), 4, chunk_bytes=1024) == 1
+
+
+def test_merge_netCDF(days_dir, tmp_path):
+    """
+    This function tests that the days are appended along the unlimited time dimension with the same values,
+    the time in double precision since the first day, the particles appended, the variables that are not in every
+    netCDF missing for the other days, and the attributes of the config.
+    :param days_dir: the fixture of the daily netCDFs
+    :param tmp_path: pytest temporary directory
+    """
+    config, paths = days_dir
+    config = deep_update(config, {'telegram_fields': {'01': {'var_attrs': {'long_name': 'Rain intensity'}}},
+                                  'global_attrs': {'title': 'Merged Parsivel data'}})
+    n_steps = merge_netCDF(paths, tmp_path / 'merged.nc', config, Mock(), chunk_bytes=1 << 16)
+    stacked = NetCDFReader(config).read(['data_raw', 'rain_intensity', 'datetime'], days[0],
+                                        days[-1] + timedelta(days=1))
+    assert n_steps == len(stacked['time'])
+
+    with Dataset(tmp_path / 'merged.nc') as nc_file:
+        assert nc_file.dimensions['time'].isunlimited() and len(nc_file.dimensions['time']) == n_steps
+        time_var = nc_file.variables['time']
+        assert time_var.dtype == numpy.float64 and time_var.units == 'hours since 2024-07-31 00:00:00 +00:00'
+        numpy.testing.assert_allclose(time_var[:] * 3600 + days[0].timestamp(), stacked['time'])
+        numpy.testing.assert_array_equal(nc_file.variables['data_raw'][:], stacked['data_raw'])
+        numpy.testing.assert_allclose(nc_file.variables['rain_intensity'][:], stacked['rain_intensity'])
+        assert list(nc_file.variables['datetime'][:]) == list(stacked['datetime'])
+        assert nc_file.variables['data_raw'].chunking() == [16, 32, 32]
+        assert nc_file.variables['diameter_center_classes'].shape == (32,)
+
+        n_day = n_steps // 3
+        flags = nc_file.variables['qc_flags'][:]
+        assert flags.mask[:n_day].all() and flags.mask[2 * n_day:].all() and numpy.all(flags[n_day:2 * n_day] == 1)
+        assert list(nc_file.variables['particle_diameter'][:]) == [0, 1, 2, 2, 3]
+
+        assert nc_file.variables['rain_intensity'].long_name == 'Rain intensity'
+        assert nc_file.title == 'Merged Parsivel data' and nc_file.sensor_name == 'PAR008'
+        assert 'qc_summary' not in nc_file.ncattrs()
+        assert nc_file.time_coverage_start.startswith('2024-07-31T14:52')
+        assert nc_file.time_coverage_end.startswith('2024-08-02T23:59')
+
+
+def test_merge_errors(days_dir, tmp_path):
+    """
+    This function tests that netCDFs with overlapping time steps, or of different intervals, are not merged, and that
+    a failed merge leaves no netCDF behind.
+    :param days_dir: the fixture of the daily netCDFs
+    :param tmp_path: pytest temporary directory
+    """
+    config, paths = days_dir
+    with pytest.raises(ValueError):
+        merge_netCDF([paths[0], paths[0]], tmp_path / 'merged.nc', config, Mock())
+    assert not (tmp_path / 'merged.nc').exists() and not (tmp_path / 'tmp_merged.nc').exists()
+    with Dataset(paths[1], 'a') as nc_file:
+        nc_file.variables['time_interval'].assignValue(30)
+    with pytest.raises(ValueError):
+        merge_netCDF(paths, tmp_path / 'merged.nc', config, Mock())
+
+
+def test_period_range():
+    """
+    This function tests the time range and the file name format of a month, December and a year.
+    """
+    assert period_range('2024-07') == (datetime(2024, 7, 1, tzinfo=timezone.utc),
+                                       datetime(2024, 8, 1, tzinfo=timezone.utc), '%Y%m')
+    assert period_range('2024-12')[1] == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert period_range('2024') == (datetime(2024, 1, 1, tzinfo=timezone.utc),
+                                    datetime(2025, 1, 1, tzinfo=timezone.utc), '%Y')
+    assert netCDF_name(config_dict, period_range('2024')[0].date(), date_format='%Y') == \
+        '2024_Green_Village-GV_PAR008.nc'
@@ -0,0 +1,67 @@
+"""
+This module contains tests for the acquisition cycle metrics in modules/metrics.py.
+
+Functions:
+- test_histogram_observe: Tests that observations end up in the right buckets.
+- test_cycle_metrics_stages: Tests that stages are timed and summed per cycle.
+- test_write_prometheus: Tests that the metrics are written in the Prometheus text format.
+"""
+from unittest.mock import patch
+
+from modules.metrics import Histogram, CycleMetrics
+
+
+def test_histogram_observe():
+    """
+    This function tests that observations end up in the right buckets.
+    """
+    histogram = Histogram(buckets=(1, 5, 10))
+    for value in (0.5, 1, 3, 20):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 0]
+    assert histogram.cumulative_counts() == [2, 3, 3]
+    assert histogram.count == 4
+    assert histogram.total == 24.5
+    assert histogram.max == 20
+    assert histogram.last == 20
+
+
+@patch('modules.metrics.monotonic')
+def test_cycle_metrics_stages(mock_monotonic):
+    """
+    This function tests that stages are timed with the monotonic clock and summed per cycle.
+    :param mock_monotonic: mock monotonic clock
+    """
+    mock_monotonic.side_effect = [10.0, 11.5, 20.0, 20.25]
+    metrics = CycleMetrics(sensor_name='PAR008')
+    with metrics.stage('read'):
+        pass
+    with metrics.stage('parse'):
+        pass
+    metrics.observe('wakeup_lateness', 0.2)
+    cycle = metrics.end_cycle()
+    assert cycle == {'read': 1.5, 'parse': 0.25, 'wakeup_lateness': 0.2}
+    assert metrics.cycles == 1
+    assert metrics.histograms['read'].count == 1
+    assert metrics.histograms['commit'].count == 0
+
+
+def test_write_prometheus(tmp_path):
+    """
+    This function tests that the metrics are written in the Prometheus text format.
+    :param tmp_path: pytest temporary directory
+    """
+    metrics = CycleMetrics(sensor_name='THIES006', buckets=(1, 10))
+    metrics.observe('read', 2)
+    metrics.end_cycle()
+    prom_file = tmp_path / 'disdrodl.prom'
+    metrics.write(prom_file)
+
+    lines = prom_file.read_text(encoding='utf-8').splitlines()
+    labels = 'sensor="THIES006",stage="read"'
+    assert f'disdrodl_cycle_stage_seconds_bucket{{{labels},le="1"}} 0' in lines
+    assert f'disdrodl_cycle_stage_seconds_bucket{{{labels},le="10"}} 1' in lines
+    assert f'disdrodl_cycle_stage_seconds_bucket{{{labels},le="+Inf"}} 1' in lines
+    assert f'disdrodl_cycle_stage_seconds_count{{{labels}}} 1' in lines
+    assert 'disdrodl_cycles_total{sensor="THIES006"} 1' in lines
+    assert not (tmp_path / '.disdrodl.prom.tmp').exists()
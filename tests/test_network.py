@@ -0,0 +1,164 @@
+"""
+This module contains tests for the export of several sensors to one netCDF with a station dimension
+in modules/network.py.
+
+Functions:
+- combined: Returns the combined general and site config of a Parsivel with a database.
+- db_parsivel: Fixture with the 24 hours of Parsivel telegrams of the test database, moved into tmp_path.
+- test_check_network: Tests that sensors of different types or intervals, or with the same name, are refused.
+- test_station_steps: Tests that every timestamp is in the time step of its interval, and only the first is kept.
+- test_station_telegrams_partitioned: Tests that the telegrams of a day are queried from its monthly partition.
+- test_export_network: Tests the export of three Parsivels, of which one misses an hour and one has no telegrams.
+"""
+import logging
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+import pytest
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.network import check_network, network_name, station_telegrams, station_steps, kept_steps, export_network
+from modules.sqldb import connect_db, create_db
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+db_path_parsivel = wd / 'sample_data' / 'test_parsivel.db'
+day = datetime(2024, 1, 1)
+day_start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def combined(site, db_path, sensor_type='parsivel'):
+    """
+    Returns the combined general and site config of a sensor, with a database.
+    :param site: the name of the site config, ie. 'PAR_007_CABAUW'
+    :param db_path: the path of the database of the sensor
+    :param sensor_type: 'parsivel' or 'thies'
+    :return: the combined config
+    """
+    return deep_update(yaml2dict(path=wd / 'configs_netcdf' / f'config_general_{sensor_type}.yml'),
+                       yaml2dict(path=wd / 'configs_netcdf' / f'config_{site}.yml'),
+                       {'data_dir': str(db_path.parent), 'db_filename': db_path.name})
+
+
+@pytest.fixture(name='db_parsivel')
+def fixture_db_parsivel(db_insert_24h_parsivel, tmp_path):  # pylint: disable=unused-argument
+    """
+    This fixture moves the test database with 24 hours of Parsivel telegrams into tmp_path, so no database is left
+    behind in sample_data.
+    :param db_insert_24h_parsivel: the fixture that inserts the telegrams into the test database
+    :param tmp_path: pytest temporary directory
+    :return: the path of the database
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    shutil.move(db_path_parsivel, db_path)
+    return db_path
+
+
+def test_check_network():
+    """
+    This function tests that sensors of the same type and interval are accepted, and that sensors of different
+    types or intervals, or with the same sensor name, are refused.
+    """
+    parsivel_a = combined('PAR_007_CABAUW', db_path_parsivel)
+    parsivel_b = combined('PAR_008_GV', db_path_parsivel)
+    assert check_network([parsivel_a, parsivel_b]) == 60
+    assert network_name([parsivel_a, parsivel_b], day) == '20240101_network_parsivel.nc'
+    assert network_name([parsivel_a], day, full_version=False) == '20240101_network_parsivel_light.nc'
+    with pytest.raises(ValueError):
+        check_network([parsivel_a, combined('THIES_005_CABAUW', db_path_parsivel, 'thies')])
+    with pytest.raises(ValueError):
+        check_network([parsivel_a, deep_update(parsivel_b, {'variables': {'interval': {'value': [30]}}})])
+    with pytest.raises(ValueError):
+        check_network([parsivel_a, parsivel_a])
+    with pytest.raises(ValueError):
+        check_network([])
+
+
+def test_station_steps():
+    """
+    This function tests that every timestamp is in the time step of the interval it falls in, and that of the
+    timestamps in the day only the first one of each time step is kept, with a warning.
+    """
+    steps = station_steps(day_start + numpy.array([0.58, 59.99, 60, 125, -1]), day_start, 60)
+    numpy.testing.assert_array_equal(steps, [0, 0, 1, 2, -1])
+    logger = Mock()
+    numpy.testing.assert_array_equal(kept_steps(steps, 2, 'PAR008', logger), [True, False, True, False, False])
+    logger.warning.assert_called_once()
+
+
+def test_station_telegrams_partitioned(db_parsivel, tmp_path):
+    """
+    This function tests that the telegrams of a day are queried from the monthly partition of a sensor with
+    partition_db, and that a day without a partition has no telegrams.
+    :param db_parsivel: the fixture of the test database
+    :param tmp_path: pytest temporary directory
+    """
+    db_parsivel.rename(tmp_path / 'disdrodl_202401.db')
+    config_dict = deep_update(combined('PAR_008_GV', tmp_path / 'disdrodl.db'), {'partition_db': True})
+    telegram_objs = station_telegrams(config_dict, day, logging.getLogger('test-network'))
+    assert len(telegram_objs) == 1440
+    assert telegram_objs[0].timestamp == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert not station_telegrams(config_dict, datetime(2024, 2, 1), logging.getLogger('test-network'))
+    assert not (tmp_path / 'disdrodl_202402.db').exists()
+
+
+def test_export_network(db_parsivel, tmp_path, caplog):
+    """
+    This function tests the export of three Parsivels to one netCDF: PAR008 with 1440 minutes, PAR007 without the
+    first hour and with timestamps in the middle of the minutes, and PAR001 without telegrams. The variables along
+    the time dimension are stacked along the stations on the minutes of the day, with the fill value for the missing
+    minutes, and the site coordinates are taken from the site configs.
+    :param db_parsivel: the fixture of the test database
+    :param tmp_path: pytest temporary directory
+    :param caplog: pytest fixture of the log records
+    """
+    db_path_b = tmp_path / 'PAR007' / 'disdrodl.db'
+    db_path_b.parent.mkdir()
+    shutil.copy(db_parsivel, db_path_b)
+    con, cur = connect_db(dbpath=str(db_path_b))
+    cur.execute(f'DELETE FROM disdrodl WHERE timestamp < {day_start + 3600}')
+    cur.execute('UPDATE disdrodl SET timestamp = timestamp + 30.5')
+    con.commit()
+    cur.close()
+    con.close()
+    db_path_c = tmp_path / 'PAR001' / 'disdrodl.db'
+    db_path_c.parent.mkdir()
+    create_db(dbpath=db_path_c)
+
+    config_dicts = [combined('PAR_008_GV', db_parsivel), combined('PAR_007_CABAUW', db_path_b),
+                    combined('PAR_001_CABAUW', db_path_c)]
+    path_out = tmp_path / network_name(config_dicts, day)
+    with caplog.at_level(logging.WARNING, logger='test-network'):
+        n_steps = export_network(config_dicts, day, path_out, full_version=True,
+                                 logger=logging.getLogger('test-network'), workers=2)
+    assert n_steps == 1440 + 1380
+    assert [record.message for record in caplog.records] == [
+        'No telegrams of PAR001 on 2024-01-01, its time steps are missing']
+    assert not list(tmp_path.glob('tmp*'))
+
+    with Dataset(path_out) as nc_file:
+        assert len(nc_file.dimensions['station']) == 3 and len(nc_file.dimensions['time']) == 1440
+        assert list(nc_file.variables['station_code'][:]) == ['GV', 'CABAUW', 'CABAUW']
+        assert list(nc_file.variables['sensor_name'][:]) == ['PAR008', 'PAR007', 'PAR001']
+        numpy.testing.assert_allclose(nc_file.variables['latitude'][:],
+                                      [config_dict['variables']['latitude']['value'][0]
+                                       for config_dict in config_dicts])
+        assert nc_file.variables['altitude'].units == 'm'
+        assert nc_file.featureType == 'timeSeries' and 'sensor_name' not in nc_file.ncattrs()
+        assert nc_file.variables['time'][-1] == pytest.approx(1439 / 60)
+
+        data_raw = nc_file.variables['data_raw']
+        assert data_raw.dimensions == ('station', 'time', 'diameter_classes', 'velocity_classes')
+        assert data_raw.chunking()[0] == 3
+        values = data_raw[:]
+        assert not values.mask[0].any() and values.mask[1, :60].all() and not values.mask[1, 60:].any()
+        assert values.mask[2].all()
+        numpy.testing.assert_array_equal(values[1, 60:], values[0, 60:])
+        datetimes = nc_file.variables['datetime'][:]
+        assert datetimes[0, 0] == '2024-01-01T00:00:00+00:00' and datetimes[1, 0] == ''
+        assert datetimes[1, 60] == '2024-01-01T01:00:30.500000+00:00'
+        assert nc_file.variables['diameter_center_classes'].shape == (32,)
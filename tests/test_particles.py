@@ -0,0 +1,191 @@
+"""
+This module contains tests for the capture of the Parsivel field 61 particle lists in modules/particles.py,
+and their storage in the particles table and export to netCDF.
+
+Functions:
+- particle_telegram_lines: Returns the lines of a Parsivel telegram with a field 61 particle list.
+- test_parse_particle_lines: Tests that the particle lines are parsed into diameter and velocity records.
+- test_blob_round_trip: Tests that a particle record array survives the conversion to and from a BLOB.
+- test_capture_particles: Tests that field 61 is captured into the particles when capture_particles is set.
+- test_capture_particles_off: Tests that field 61 is handled as before when capture_particles is not set.
+- test_insert_particles: Tests that the particles are inserted next to the telegram and queried back.
+- test_insert_particles_duplicate: Tests that the particles of an ignored duplicate telegram are not inserted.
+- test_export_particles: Tests that the particles are exported as a contiguous ragged array.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.netCDF import NetCDF
+from modules.particles import parse_particle_lines, particles_to_blob, blob_to_particles
+from modules.simulators import default_parsivel_telegram
+from modules.sqldb import create_db, connect_db, create_unique_index, query_particles
+from modules.telegram import create_telegram
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+config_dict_particles = deep_update(config_dict, {'capture_particles': True})
+
+timestamp = datetime(2024, 1, 1, 0, 1, tzinfo=timezone.utc)
+
+
+def particle_telegram_lines(particle_lines):
+    """
+    Returns the lines of a Parsivel telegram, as read from the sensor, with a field 61 particle list.
+    :param particle_lines: the lines of field 61 after the '61:' prefix
+    :return: list of telegram lines
+    """
+    lines = [b'TYP OP4A\r\n'] + [f'{field}:{value}\r\n'.encode('ascii')
+                                 for field, value in default_parsivel_telegram().items()]
+    return lines[:-3] + [b'61:' + particle_lines[0]] + particle_lines[1:] + lines[-3:] + [b'\x03']
+
+
+def test_parse_particle_lines():
+    """
+    This function tests that the particle lines are parsed into diameter and velocity records.
+    """
+    particles = parse_particle_lines([b'00.502;00.853\r\n', b'00.606;02.026\r\n', b';'])
+    assert len(particles) == 2
+    assert numpy.allclose(particles['diameter'], [0.502, 0.606])
+    assert numpy.allclose(particles['velocity'], [0.853, 2.026])
+    assert len(parse_particle_lines([b';\r\n'])) == 0
+
+
+def test_blob_round_trip():
+    """
+    This function tests that a particle record array survives the conversion to and from a BLOB.
+    """
+    particles = parse_particle_lines([b'00.502;00.853\r\n', b'01.250;04.100\r\n'])
+    blob = particles_to_blob(particles)
+    assert len(blob) == 16
+    assert numpy.array_equal(blob_to_particles(blob), particles)
+    assert len(blob_to_particles(None)) == 0
+
+
+def test_capture_particles():
+    """
+    This function tests that field 61 is captured into the particles when capture_particles is set,
+    and that the other fields are still captured.
+    """
+    telegram = create_telegram(config_dict=config_dict_particles,
+                               telegram_lines=particle_telegram_lines([b'00.502;00.853\r\n', b'00.606;02.026\r\n',
+                                                                       b'00.550;01.595\r\n', b';\r\n']),
+                               timestamp=timestamp, db_cursor=None, db_row_id=None, telegram_data={},
+                               logger=Mock())
+    telegram.capture_prefixes_and_data()
+
+    assert len(telegram.particles) == 3
+    assert numpy.allclose(telegram.particles['velocity'], [0.853, 2.026, 1.595])
+    assert '61' not in telegram.telegram_data
+    assert len(telegram.telegram_data['93']) == 1024
+    assert len(telegram.telegram_data['96']) == 7
+    assert telegram.particles_row()[1:3] == ('PAR008', 3)
+
+
+def test_capture_particles_off():
+    """
+    This function tests that field 61 is handled as before when capture_particles is not set.
+    """
+    telegram = create_telegram(config_dict=config_dict,
+                               telegram_lines=particle_telegram_lines([b'00.502;00.853\r\n', b'00.606;02.026\r\n',
+                                                                       b';\r\n']),
+                               timestamp=timestamp, db_cursor=None, db_row_id=None, telegram_data={},
+                               logger=Mock())
+    telegram.capture_prefixes_and_data()
+
+    assert telegram.particles is None
+    assert telegram.particles_row() is None
+    assert telegram.telegram_data['61'] == ['00.502', '00.853']
+
+
+def test_insert_particles(tmp_path):
+    """
+    This function tests that the particles are inserted next to the telegram and queried back by timestamp.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'particles.db'
+    create_db(dbpath=str(db_path))
+    con, cur = connect_db(dbpath=str(db_path))
+    telegram = create_telegram(config_dict=config_dict_particles,
+                               telegram_lines=particle_telegram_lines([b'00.502;00.853\r\n', b';\r\n']),
+                               timestamp=timestamp, db_cursor=cur, db_row_id=None, telegram_data={},
+                               logger=Mock())
+    telegram.insert2db()
+    con.commit()
+
+    assert cur.execute('SELECT COUNT(*) FROM disdrodl').fetchone()[0] == 1
+    particles = query_particles(con, date_dt=timestamp, logger=Mock())
+    cur.close()
+    con.close()
+
+    assert list(particles.keys()) == [timestamp.timestamp()]
+    assert numpy.array_equal(blob_to_particles(particles[timestamp.timestamp()]), telegram.particles)
+
+
+def test_insert_particles_duplicate(tmp_path):
+    """
+    This function tests that the particles of a second telegram in the same minute are not inserted when the
+    telegram is ignored (keep_first), so the particles of the kept telegram are queried back.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'particles.db'
+    create_db(dbpath=str(db_path))
+    assert create_unique_index(dbpath=str(db_path), interval=60, logger=Mock())
+    con, cur = connect_db(dbpath=str(db_path))
+    telegrams = [create_telegram(config_dict=config_dict_particles,
+                                 telegram_lines=particle_telegram_lines(particle_lines),
+                                 timestamp=timestamp.replace(second=second), db_cursor=cur, db_row_id=None,
+                                 telegram_data={}, logger=Mock())
+                 for second, particle_lines in [(0, [b'00.502;00.853\r\n', b';\r\n']),
+                                                (30, [b'00.606;02.026\r\n', b'01.250;04.100\r\n', b';\r\n'])]]
+    for telegram in telegrams:
+        telegram.insert2db()
+    con.commit()
+
+    assert cur.execute('SELECT COUNT(*) FROM particles').fetchone()[0] == 1
+    particles = query_particles(con, date_dt=timestamp, logger=Mock())
+    cur.close()
+    con.close()
+    assert numpy.array_equal(blob_to_particles(particles[timestamp.timestamp()]), telegrams[0].particles)
+
+
+def test_export_particles(tmp_path):
+    """
+    This function tests that the particles are exported as a contiguous ragged array along the particle dimension.
+    :param tmp_path: pytest temporary directory
+    """
+    telegram_objs = []
+    for minute, particle_lines in [(1, [b'00.502;00.853\r\n', b'00.606;02.026\r\n', b';\r\n']),
+                                   (2, [b';\r\n']),
+                                   (3, [b'01.250;04.100\r\n', b';\r\n'])]:
+        timestamp_minute = timestamp.replace(minute=minute)
+        telegram = create_telegram(config_dict=config_dict_particles,
+                                   telegram_lines=particle_telegram_lines(particle_lines),
+                                   timestamp=timestamp_minute, db_cursor=None, db_row_id=None, telegram_data={},
+                                   logger=Mock())
+        row = telegram.db_row()
+        # parse the telegram as the export does, from the telegram string and the BLOB
+        telegram_db = create_telegram(config_dict=config_dict_particles, telegram_lines=row[3],
+                                      timestamp=timestamp_minute, db_cursor=None, db_row_id=None, telegram_data={},
+                                      logger=Mock())
+        telegram_db.parse_telegram_row()
+        telegram_db.particles = blob_to_particles(telegram.particles_row()[3])
+        telegram_objs.append(telegram_db)
+
+    nc = NetCDF(logger=Mock(), config_dict=config_dict_particles, data_dir=tmp_path, fn_start='particles',
+                full_version=True, telegram_objs=telegram_objs, date=timestamp)
+    nc.create_netCDF()
+    nc.write_data_to_netCDF()
+
+    with Dataset(tmp_path / 'particles.nc') as nc_file:
+        assert nc_file.dimensions['particle'].size == 3
+        assert list(nc_file.variables['particle_count'][:]) == [2, 0, 1]
+        assert nc_file.variables['particle_count'].sample_dimension == 'particle'
+        assert numpy.allclose(nc_file.variables['particle_diameter'][:], [0.502, 0.606, 1.25])
+        assert numpy.allclose(nc_file.variables['particle_velocity'][:], [0.853, 2.026, 4.1])
@@ -0,0 +1,87 @@
+"""
+This module contains tests for the export stage profiler in modules/profiler.py.
+
+Functions:
+- test_stage_accumulates: Tests that repeated stages are accumulated and memory peaks are measured.
+- test_iterate: Tests that only the time spent fetching items is measured.
+- test_disabled_profiler: Tests that a disabled profiler measures and reports nothing.
+- test_dump_stats: Tests that the cProfile statistics are written to a pstats file.
+"""
+import pstats
+from unittest.mock import Mock
+
+from modules.profiler import StageProfiler
+
+
+def test_stage_accumulates():
+    """
+    This function tests that repeated stages are accumulated and memory peaks are measured.
+    """
+    profiler = StageProfiler()
+    profiler.start()
+    for _ in range(3):
+        with profiler.stage('write'):
+            with profiler.stage('allocate'):
+                data = bytearray(2_000_000)  # pylint: disable=unused-variable
+            del data
+    profiler.stop()
+
+    report = profiler.report()
+    stages = {stage['stage']: stage for stage in report['stages']}
+    assert stages['write']['calls'] == 3
+    assert stages['allocate']['calls'] == 3
+    assert stages['allocate']['peak_mem_mb'] >= 2
+    # the peak of a nested stage is also a peak of the enclosing stage
+    assert stages['write']['peak_mem_mb'] >= stages['allocate']['peak_mem_mb']
+    assert report['total_wall_s'] >= stages['write']['wall_s']
+
+
+def test_iterate():
+    """
+    This function tests that iterate yields all items and measures one call per fetched item.
+    """
+    profiler = StageProfiler()
+    profiler.start()
+    items = list(profiler.iterate('db_query', iter([1, 2, 3])))
+    profiler.stop()
+    assert items == [1, 2, 3]
+    # 3 items and the final StopIteration
+    assert profiler.stages['db_query']['calls'] == 4
+
+
+def test_disabled_profiler(capsys):
+    """
+    This function tests that a disabled profiler measures and reports nothing.
+    :param capsys: pytest fixture capturing stdout
+    """
+    profiler = StageProfiler(enabled=False)
+    profiler.start(use_cprofile=True)
+    with profiler.stage('write'):
+        pass
+    profiler.stop()
+    mock_logger = Mock()
+    profiler.log_report(mock_logger)
+    profiler.print_report()
+    assert not profiler.stages
+    mock_logger.info.assert_not_called()
+    assert capsys.readouterr().out == ''
+
+
+def test_dump_stats(tmp_path):
+    """
+    This function tests that the cProfile statistics and the report are written.
+    :param tmp_path: pytest temporary directory
+    """
+    profiler = StageProfiler()
+    profiler.start(use_cprofile=True)
+    with profiler.stage('netcdf_create'):
+        sorted(range(1000), reverse=True)
+    profiler.stop()
+
+    stats_file = tmp_path / 'export.pstats'
+    profiler.dump_stats(stats_file)
+    assert pstats.Stats(str(stats_file)).total_calls > 0
+
+    mock_logger = Mock()
+    profiler.log_report(mock_logger)
+    assert mock_logger.info.call_args.kwargs['msg'].startswith('profile report: {')
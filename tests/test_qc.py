@@ -0,0 +1,129 @@
+"""
+This module contains tests for the data-quality flagging in modules/qc.py and its export to netCDF.
+
+Functions:
+- test_to_values: Tests that invalid and missing values become NaN.
+- test_range_test: Tests that the values outside the range are flagged, and missing values are not.
+- test_run_length_test: Tests that the runs of unchanged values longer than the maximum are flagged.
+- test_rate_test: Tests that the changes per minute above the maximum are flagged.
+- test_qc_rules: Tests that the rules are ordered by bit and that invalid rules are rejected.
+- test_export_qc: Tests that the QC flags and the QC summary are written to the netCDF when export_qc is set.
+- test_qc_netCDF: Tests that the rules are evaluated over a range of netCDFs as one range.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+import pytest
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.qc import to_values, qc_rules, range_test, run_length_test, rate_test, qc_flags, qc_summary, \
+    qc_netCDF
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+config_dict_qc = deep_update(config_dict, {'export_qc': True})
+day = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_to_values():
+    """
+    This function tests that the values are converted to floats, and that invalid and missing values become NaN.
+    """
+    assert to_values(['0001', '13894', '0.50']).tolist() == [1, 13894, 0.5]
+    values = to_values(['0001', None, 'x', '-9.999'])
+    assert values[0] == 1 and values[3] == -9.999
+    assert numpy.isnan(values[1:3]).all()
+
+
+def test_range_test():
+    """
+    This function tests that the values outside the range are flagged, and that missing values are not.
+    """
+    values = numpy.array([0, 1, numpy.nan, 5, -1])
+    assert range_test(values, maximum=0).tolist() == [False, True, False, True, False]
+    assert range_test(values, minimum=0, maximum=4).tolist() == [False, False, False, True, True]
+    assert not range_test(values).any()
+
+
+def test_run_length_test():
+    """
+    This function tests that all time steps of the runs of unchanged values longer than the maximum are flagged,
+    that ignored values are not, and that a missing value breaks a run.
+    """
+    values = numpy.array([5, 5, 5, 5, 3, 0, 0, 0, 0, 7, 7, numpy.nan, 7, 7])
+    assert run_length_test(values, max_run=3).tolist() == [True] * 4 + [False] + [True] * 4 + [False] * 5
+    assert run_length_test(values, max_run=3, ignore=[0]).tolist() == [True] * 4 + [False] * 10
+    assert run_length_test(numpy.array([]), max_run=3).tolist() == []
+
+
+def test_rate_test():
+    """
+    This function tests that the changes per minute above the maximum are flagged, over gaps per minute.
+    """
+    timestamps = numpy.array([0, 60, 120, 420, 480])
+    values = numpy.array([100, 150, 400, 700, numpy.nan])
+    # +50 in 1 min, +250 in 1 min, +300 in 5 min, missing
+    assert rate_test(values, timestamps, max_change=100).tolist() == [False, False, True, False, False]
+
+
+def test_qc_rules():
+    """
+    This function tests that the rules are ordered by bit, are combined into one bitmask and summarised,
+    and that invalid rules are rejected.
+    """
+    rules = qc_rules(deep_update(config_dict, {'qc': {'error_code': {'bit': 7}}}))
+    assert list(rules.keys())[-1] == 'error_code'
+
+    flags = qc_flags({'25': numpy.array([0, 1, 0]), '18': numpy.array([0, 0, 1]), '10': numpy.full(3, 13894),
+                      '16': numpy.full(3, 0.5), '11': numpy.array([1, 2, 3])}, numpy.array([0, 60, 120]), rules)
+    assert flags.tolist() == [0, 1 << 7, 1 << 1]
+    summary = qc_summary(flags, rules)
+    assert summary['error_code'] == 1 and summary['sensor_state'] == 1 and summary['any'] == 2
+
+    for rule in ({'test': 'median'}, {'field': '99'}, {'bit': 1}, {'bit': 31}):
+        with pytest.raises(ValueError):
+            qc_rules(deep_update(config_dict, {'qc': {'error_code': rule}}))
+
+
+def test_export_qc(tmp_path, write_parsivel_netcdf):
+    """
+    This function tests that the QC flags with their flag attributes and the QC summary are written to the
+    netCDF when export_qc is set.
+    :param tmp_path: pytest temporary directory
+    :param write_parsivel_netcdf: the fixture that writes a netCDF of telegrams
+    """
+    changed_fields = [{}, {'25': '001'}, {'10': '01000'}, {'10': '13894', '16': '0.00'}] + \
+                     [{'11': '00042'}] * 11
+    path = write_parsivel_netcdf(tmp_path, day, minutes=range(len(changed_fields)), changed_fields=changed_fields,
+                                 config_dict=config_dict_qc, full_version=False)
+
+    with Dataset(path) as nc_file:
+        flags = nc_file.variables['qc_flags']
+        # low amplitude and jump at minute 2, jump back at minute 3, stuck count from minute 4
+        assert flags[:].tolist() == [0, 1, 4 + 8, 8 + 16] + [32] * 11
+        assert flags.flag_masks.tolist() == [1, 2, 4, 8, 16, 32]
+        assert flags.flag_meanings == 'error_code sensor_state low_amplitude amplitude_jump heating_current' \
+                                      ' stuck_n_particles'
+        assert nc_file.qc_summary == 'error_code: 1, sensor_state: 0, low_amplitude: 1, amplitude_jump: 2,' \
+                                     ' heating_current: 1, stuck_n_particles: 11, any: 14'
+
+
+def test_qc_netCDF(tmp_path, write_parsivel_netcdf):
+    """
+    This function tests that the rules are evaluated over a range of netCDFs as one range,
+    so a stuck particle count continues across midnight.
+    :param tmp_path: pytest temporary directory
+    :param write_parsivel_netcdf: the fixture that writes a netCDF of telegrams
+    """
+    paths = [write_parsivel_netcdf(tmp_path, date, minutes=minutes, changed_fields=[{'11': '00042'}] * 6,
+                                   config_dict=config_dict_qc, full_version=False)
+             for date, minutes in [(day, range(1434, 1440)), (day + timedelta(days=1), range(6))]]
+    summary = qc_netCDF(paths, config_dict, Mock())
+    assert summary['stuck_n_particles'] == 12
+    assert summary['time_steps'] == 12
+    assert summary['any'] == 12
@@ -0,0 +1,143 @@
+"""
+This module contains tests for the raw telegram log in modules/raw_log.py and the replay tool replay_raw_log.py.
+
+Functions:
+- parsivel_lines: Returns the lines of a Parsivel telegram as read from the sensor.
+- test_raw_log_parsivel: Tests that Parsivel telegrams are logged per day and read back unchanged.
+- test_raw_log_thies: Tests that a Thies telegram is logged and read back unchanged.
+- test_truncated_frame: Tests that a truncated last frame is skipped.
+- test_replay: Tests that the replay with several workers gives the same rows as parsing the telegrams directly.
+- test_replay_existing_db: Tests that the replay refuses to write into an existing database.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+from pydantic.v1.utils import deep_update
+
+import replay_raw_log
+from modules.raw_log import RawLog, read_frames, payload_to_telegram, raw_log_path, FRAME_HEADER
+from modules.simulators import default_parsivel_telegram, default_thies_telegram
+from modules.sqldb import connect_db
+from modules.telegram import create_telegram
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+
+day_1 = datetime(2024, 1, 1, 23, 59, tzinfo=timezone.utc)
+day_2 = datetime(2024, 1, 2, 0, 0, tzinfo=timezone.utc)
+
+
+def parsivel_lines(rain_rate):
+    """
+    Returns the lines of a Parsivel telegram as read from the sensor.
+    :param rain_rate: the value of field 01
+    :return: list of telegram lines
+    """
+    fields = default_parsivel_telegram()
+    fields['01'] = rain_rate
+    return [b'TYP OP4A\r\n'] + [f'{field}:{value}\r\n'.encode('ascii') for field, value in fields.items()] + [b'\x03']
+
+
+def test_raw_log_parsivel(tmp_path):
+    """
+    This function tests that Parsivel telegrams are logged in one file per day and read back unchanged.
+    :param tmp_path: pytest temporary directory
+    """
+    raw_log = RawLog(log_dir=tmp_path, sensor_name='PAR008', logger=Mock())
+    raw_log.append(day_1, parsivel_lines('0000.100'))
+    raw_log.append(day_2, parsivel_lines('0000.200'))
+    raw_log.append(day_2, None)
+    raw_log.close()
+
+    frames_1 = list(read_frames(raw_log_path(tmp_path, 'PAR008', day_1.date())))
+    frames_2 = list(read_frames(tmp_path / 'raw_PAR008_20240102.bin'))
+    assert len(frames_1) == 1
+    assert len(frames_2) == 1
+    assert frames_1[0][0] == day_1.timestamp()
+    assert payload_to_telegram(frames_1[0][1], 'OTT Hydromet Parsivel2') == parsivel_lines('0000.100')
+    assert payload_to_telegram(frames_2[0][1], 'OTT Hydromet Parsivel2') == parsivel_lines('0000.200')
+
+
+def test_raw_log_thies(tmp_path):
+    """
+    This function tests that a Thies telegram is logged and read back unchanged.
+    :param tmp_path: pytest temporary directory
+    """
+    telegram_line = '\x0206;' + default_thies_telegram()[3:]
+    raw_log = RawLog(log_dir=tmp_path, sensor_name='THIES006', logger=Mock())
+    raw_log.append(day_1, telegram_line)
+    raw_log.close()
+
+    [(timestamp, payload)] = read_frames(raw_log_path(tmp_path, 'THIES006', day_1.date()))
+    assert timestamp == day_1.timestamp()
+    assert payload_to_telegram(payload, 'Thies Clima') == telegram_line
+
+
+def test_truncated_frame(tmp_path):
+    """
+    This function tests that a truncated last frame, from a crash while appending, is skipped.
+    :param tmp_path: pytest temporary directory
+    """
+    raw_log = RawLog(log_dir=tmp_path, sensor_name='PAR008', logger=Mock())
+    raw_log.append(day_1, parsivel_lines('0000.100'))
+    raw_log.close()
+    path = raw_log_path(tmp_path, 'PAR008', day_1.date())
+    with open(path, 'ab') as raw_file:
+        raw_file.write(FRAME_HEADER.pack(day_1.timestamp(), 100) + b'01:00')
+
+    assert len(list(read_frames(path))) == 1
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_replay(tmp_path, workers):
+    """
+    This function tests that the replay gives the same rows as parsing the telegrams directly.
+    :param tmp_path: pytest temporary directory
+    :param workers: number of worker processes
+    """
+    raw_dir = tmp_path / 'raw'
+    raw_log = RawLog(log_dir=raw_dir, sensor_name='PAR008', logger=Mock())
+    telegrams = [(day_1, parsivel_lines('0000.100')), (day_2, parsivel_lines('0000.200')),
+                 (day_2.replace(minute=1), parsivel_lines('0000.300'))]
+    for timestamp, lines in telegrams:
+        raw_log.append(timestamp, lines)
+    raw_log.close()
+
+    expected = []
+    for timestamp, lines in telegrams:
+        telegram = create_telegram(config_dict=config_dict, telegram_lines=lines, db_row_id=None,
+                                   timestamp=timestamp, db_cursor=None, telegram_data={}, logger=Mock())
+        expected.append(telegram.db_row())
+
+    mock_args = Mock()
+    mock_args.config = 'configs_netcdf/config_PAR_008_GV.yml'
+    mock_args.input = [str(raw_dir)]
+    mock_args.output = str(tmp_path / 'replay.db')
+    mock_args.workers = workers
+    with patch('replay_raw_log.create_logger'):
+        replay_raw_log.main(mock_args)
+
+    con, cur = connect_db(dbpath=str(tmp_path / 'replay.db'))
+    rows = cur.execute('SELECT timestamp, datetime, sensor_id, telegram FROM disdrodl ORDER BY id').fetchall()
+    cur.close()
+    con.close()
+    assert rows == expected
+
+
+def test_replay_existing_db(tmp_path):
+    """
+    This function tests that the replay refuses to write into an existing database.
+    :param tmp_path: pytest temporary directory
+    """
+    (tmp_path / 'replay.db').touch()
+    mock_args = Mock()
+    mock_args.config = 'configs_netcdf/config_PAR_008_GV.yml'
+    mock_args.input = [str(tmp_path)]
+    mock_args.output = str(tmp_path / 'replay.db')
+    mock_args.workers = 1
+    with patch('replay_raw_log.create_logger'), pytest.raises(SystemExit):
+        replay_raw_log.main(mock_args)
@@ -0,0 +1,169 @@
+"""
+This module contains tests for the multi-file reader of exported netCDFs in modules/reader.py.
+
+Functions:
+- data_dir: Fixture with the sample netCDF as the netCDFs of 2024-07-30 and 2024-08-01 in a data directory.
+- sample_values: Returns the timestamps and values of a variable of the sample netCDF.
+- test_locate_files: Tests that the netCDFs of a time range are located by the naming convention.
+- test_read: Tests that the variables of a time range are stacked over the netCDFs.
+- test_read_catalog: Tests that the netCDFs located by the archive catalog are read the same.
+- test_read_cache: Tests that the decoded variables are cached, evicted and read again after a change.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy
+import pytest
+from cftime import num2date
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.archive import create_archive_db, index_files
+from modules.reader import NetCDFReader, locate_files, netCDF_name, entry_bytes
+from modules.sqldb import connect_db
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+sample_nc = wd / 'sample_data' / '20240722_Green_Village-GV_PAR008.nc'
+sample_day = datetime(2024, 7, 22, tzinfo=timezone.utc)
+days = (datetime(2024, 7, 30, tzinfo=timezone.utc), datetime(2024, 8, 1, tzinfo=timezone.utc))
+
+
+@pytest.fixture(name='data_dir')
+def fixture_data_dir(sample_nc_days):
+    """
+    Fixture with the sample netCDF as the netCDFs of 2024-07-30 and 2024-08-01 (2024-07-31 is missing)
+    in the monthly directories of a data directory.
+    :param sample_nc_days: the fixture that copies the sample netCDF as the netCDFs of days
+    :return: the config with the data directory
+    """
+    config, _ = sample_nc_days(days)
+    return config
+
+
+def sample_values(name):
+    """
+    Returns the timestamps and values of a variable of the sample netCDF.
+    :param name: the variable name
+    :return: the timestamps relative to the start of the day and the values
+    """
+    with Dataset(sample_nc) as nc_file:
+        time_var = nc_file.variables['time']
+        timestamps = numpy.array([time.replace(tzinfo=timezone.utc).timestamp() - sample_day.timestamp()
+                                  for time in num2date(time_var[:], units=time_var.units, calendar=time_var.calendar,
+                                                       only_use_cftime_datetimes=False,
+                                                       only_use_python_datetimes=True)])
+        return timestamps, nc_file.variables[name][:]
+
+
+def test_locate_files(data_dir):
+    """
+    This function tests that the existing netCDFs of a time range are located by the naming convention,
+    over the monthly directories, for the version and interval.
+    :param data_dir: the data directory fixture
+    """
+    paths = locate_files(data_dir, days[0] - timedelta(days=1), days[1] + timedelta(days=1))
+    assert [path.name for path in paths] == ['20240730_Green_Village-GV_PAR008.nc',
+                                             '20240801_Green_Village-GV_PAR008.nc']
+    assert [path.parent.name for path in paths] == ['202407', '202408']
+    # the end of the range is exclusive
+    assert len(locate_files(data_dir, days[0], days[1])) == 1
+    assert not locate_files(data_dir, days[0], days[1], version='light')
+    assert not locate_files(data_dir, days[0], days[1], interval=3600)
+    assert netCDF_name(data_dir, days[0].date(), 'light', 3600) == '20240730_Green_Village-GV_PAR008_light_3600s.nc'
+    assert netCDF_name(data_dir, days[0].date(), interval=60) == '20240730_Green_Village-GV_PAR008.nc'
+
+
+def test_read(data_dir):
+    """
+    This function tests that the variables of the time steps of a time range are stacked over the netCDFs
+    in time order, and that the variables without the time dimension are taken as they are.
+    :param data_dir: the data directory fixture
+    """
+    start, end = days[0].replace(hour=18), days[1].replace(hour=18)
+    stacked = NetCDFReader(data_dir).read(['data_raw', 'rain_intensity', 'datetime', 'diameter_center_classes'],
+                                          start, end)
+    timestamps, data_raw = sample_values('data_raw')
+    _, intensity = sample_values('rain_intensity')
+    first = timestamps >= 18 * 3600
+    last = timestamps < 18 * 3600
+
+    n_steps = first.sum() + last.sum()
+    assert stacked['time'].shape == (n_steps,)
+    assert numpy.all(numpy.diff(stacked['time']) > 0)
+    assert start.timestamp() <= stacked['time'][0] and stacked['time'][-1] < end.timestamp()
+    assert stacked['time'] == pytest.approx(numpy.concatenate([timestamps[first] + days[0].timestamp(),
+                                                               timestamps[last] + days[1].timestamp()]), abs=1e-3)
+    assert stacked['data_raw'].shape == (n_steps, 32, 32)
+    numpy.testing.assert_array_equal(stacked['data_raw'], numpy.concatenate([data_raw[first], data_raw[last]]))
+    numpy.testing.assert_allclose(stacked['rain_intensity'], numpy.concatenate([intensity[first], intensity[last]]))
+    assert stacked['datetime'].shape == (n_steps,) and isinstance(stacked['datetime'][0], str)
+    assert stacked['diameter_center_classes'].shape == (32,)
+
+    with pytest.raises(ValueError):
+        NetCDFReader(data_dir).read(['data_raw'], days[0] + timedelta(days=1), days[1])
+    with pytest.raises(ValueError):
+        NetCDFReader(data_dir).read(['no_variable'], start, end)
+
+
+def test_read_catalog(data_dir, tmp_path):
+    """
+    This function tests that the netCDFs located by the archive catalog are read the same as by the naming convention.
+    :param data_dir: the data directory fixture
+    :param tmp_path: pytest temporary directory
+    """
+    create_archive_db(tmp_path / 'archive.db')
+    con, _ = connect_db(str(tmp_path / 'archive.db'))
+    paths = locate_files(data_dir, days[0], days[1] + timedelta(days=1))
+    index_files(con, paths, 'GV', data_dir)
+    reader = NetCDFReader(data_dir, con=con)
+    assert reader.locate(days[0], days[1] + timedelta(days=1)) == [path.resolve() for path in paths]
+    assert not reader.locate(days[0], days[1] + timedelta(days=1), interval=3600)
+    stacked = reader.read(['n_particles'], days[0], days[1] + timedelta(days=1))
+    expected = NetCDFReader(data_dir).read(['n_particles'], days[0], days[1] + timedelta(days=1))
+    numpy.testing.assert_array_equal(stacked['n_particles'], expected['n_particles'])
+    con.close()
+
+
+def test_read_cache(data_dir):
+    """
+    This function tests that repeated queries take the decoded variables from the cache, that the least recently used
+    variables are evicted, that a changed netCDF is read again with its old entries evicted, and that a variable
+    missing from a netCDF is NaN and counted in the size of the cache.
+    :param data_dir: the data directory fixture
+    """
+    start, end = days[0], days[1] + timedelta(days=1)
+    reader = NetCDFReader(data_dir)
+    first = reader.read(['data_raw', 'rain_intensity'], start, end)
+    assert (reader.hits, reader.misses) == (2, 6)
+    second = reader.read(['data_raw', 'rain_intensity'], start, end)
+    assert reader.misses == 6
+    numpy.testing.assert_array_equal(first['data_raw'], second['data_raw'])
+    # the stacked arrays are copies, not the cached values
+    second['data_raw'][:] = 0
+    assert reader.read(['data_raw'], start, end)['data_raw'].sum() == first['data_raw'].sum()
+
+    # the cache holds the data_raw of one netCDF, the least recently used variables are evicted for the last one
+    small = NetCDFReader(data_dir, max_cache_bytes=first['data_raw'].nbytes // 2 + 1)
+    small.read(['data_raw'], start, end)
+    assert small.cache_bytes <= small.max_cache_bytes
+    assert [(Path(key[0]).name, key[2]) for key in small.cache] == [('20240801_Green_Village-GV_PAR008.nc', 'data_raw')]
+
+    path = locate_files(data_dir, start, end)[1]
+    with Dataset(path, 'a') as nc_file:
+        nc_file.variables['rain_intensity'][:] = 1
+        flags = nc_file.createVariable('qc_flags', 'i4', ('time',))
+        flags[:] = 3
+    stacked = reader.read(['rain_intensity', 'qc_flags'], start, end)
+    n_first = len(sample_values('time')[0])
+    assert numpy.all(stacked['rain_intensity'][n_first:] == 1)
+    assert numpy.isnan(stacked['qc_flags'][:n_first]).all() and numpy.all(stacked['qc_flags'][n_first:] == 3)
+    assert {key[1] for key in reader.cache if key[0] == str(path)} == {path.stat().st_mtime_ns}
+    # the missing variable of the first netCDF is cached as well
+    first_path = locate_files(data_dir, start, end)[0]
+    assert (str(first_path), first_path.stat().st_mtime_ns, 'qc_flags') in reader.cache
+    assert reader.cache_bytes == sum(entry_bytes(chunk) for chunk in reader.cache.values())
+    reader.clear_cache()
+    assert not reader.cache_mtimes and reader.cache_bytes == 0
@@ -0,0 +1,154 @@
+"""
+This module contains tests for the temporal resampling of netCDFs in modules/resample.py.
+
+Functions:
+- counts_fields: Returns the changed telegram fields of telegrams with the given intensities and counts.
+- test_reduce_intervals: Tests every reduction rule on intervals with missing values.
+- test_reduction_rules: Tests that the rules are read from the config and that unknown rules are rejected.
+- test_resample_netCDF: Tests that a day is resampled following the reduction rule of each variable.
+- test_resample_range: Tests that several days are resampled to one netCDF.
+- test_resample_sum_widened: Tests that a summed 16-bit integer variable is written as 32-bit integers.
+- test_reduction_rules_counts: Tests that the counts and accumulated amounts of both sensors have a rule.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import Mock
+
+import numpy
+import pytest
+from netCDF4 import Dataset  # pylint: disable=no-name-in-module
+from pydantic.v1.utils import deep_update
+
+from modules.resample import reduction_rules, interval_starts, reduce_intervals, resample_netCDF, SUM_DATATYPE
+from modules.util_functions import yaml2dict
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+day = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def counts_fields(intensities, counts):
+    """
+    Returns the changed telegram fields of telegrams with the given rain intensities and particle counts.
+    :param intensities: the rain intensity (field 01) of each telegram
+    :param counts: the number of particles (field 11) of each telegram, also in one class of field 93
+    :return: per telegram the dictionary of the changed fields
+    """
+    return [{'01': f'{intensity:08.3f}', '11': f'{count:05d}', '93': ';'.join([f'{count:03d}'] + ['000'] * 1023) + ';'}
+            for intensity, count in zip(intensities, counts)]
+
+
+def test_reduce_intervals():
+    """
+    This function tests every reduction rule on intervals with missing values.
+    """
+    starts, interval_ts = interval_starts(numpy.array([0, 60, 240, 300, 360, 900]), 300)
+    assert starts.tolist() == [0, 3, 5]
+    assert interval_ts.tolist() == [0, 300, 900]
+
+    values = numpy.array([1, numpy.nan, 3, 4, 5, numpy.nan])
+    expected = {'sum': [4, 9, numpy.nan], 'mean': [2, 4.5, numpy.nan], 'min': [1, 4, numpy.nan],
+                'max': [3, 5, numpy.nan], 'first': [1, 4, numpy.nan], 'last': [3, 5, numpy.nan]}
+    for reduction, reduced in expected.items():
+        assert numpy.allclose(reduce_intervals(values, starts, reduction), reduced, equal_nan=True), reduction
+
+    flags = numpy.array([1, 4, numpy.nan, 2, 2, numpy.nan])
+    assert numpy.allclose(reduce_intervals(flags, starts, 'bitwise_or'), [5, 2, numpy.nan], equal_nan=True)
+
+    spectra = numpy.ones((6, 2, 2))
+    assert reduce_intervals(spectra, starts, 'sum')[:, 0, 0].tolist() == [3, 2, 1]
+
+
+def test_reduction_rules():
+    """
+    This function tests that the rules are read from the config and that unknown rules are rejected.
+    """
+    rules = reduction_rules(config_dict)
+    assert rules['data_raw'] == 'sum'
+    assert rules['n_particles'] == 'sum'
+    assert rules['error_code'] == 'max'
+    assert 'rain_intensity' not in rules
+    with pytest.raises(ValueError):
+        reduction_rules(deep_update(config_dict, {'telegram_fields': {'01': {'reduction': 'median'}}}))
+
+
+def test_resample_netCDF(tmp_path, write_parsivel_netcdf):
+    """
+    This function tests that a day is resampled following the reduction rule of each variable.
+    :param tmp_path: pytest temporary directory
+    :param write_parsivel_netcdf: the fixture that writes a netCDF of telegrams
+    """
+    changed_fields = counts_fields(intensities=[1, 2, 3, 4, 6, 5], counts=[1, 2, 3, 4, 5, 6])
+    path = write_parsivel_netcdf(tmp_path, day, minutes=[0, 1, 2, 5, 6, 12], changed_fields=changed_fields,
+                                 config_dict=config_dict)
+
+    assert resample_netCDF([path], tmp_path / 'resampled.nc', 300, config_dict, Mock()) == 3
+    with Dataset(tmp_path / 'resampled.nc') as nc_file:
+        assert nc_file.variables['time'][:].tolist() == pytest.approx([0, 5 / 60, 10 / 60])
+        assert [nc_file.variables['datetime'][i] for i in range(3)] == [
+            (day + timedelta(minutes=minute)).isoformat() for minute in (0, 5, 10)]
+        assert nc_file.variables['rain_intensity'][:].tolist() == pytest.approx([2, 5, 5])
+        assert nc_file.variables['n_particles'][:].tolist() == [6, 9, 6]
+        assert nc_file.variables['data_raw'][:, 0, 0].tolist() == [6, 9, 6]
+        assert nc_file.variables['data_raw'].shape == (3, 32, 32)
+        assert int(nc_file.variables['time_interval'][:]) == 300
+        assert nc_file.variables['latitude'][:] == pytest.approx(51.996068)
+        assert nc_file.resampling_interval == '300 s'
+
+
+def test_resample_range(tmp_path, write_parsivel_netcdf):
+    """
+    This function tests that several days are resampled to one netCDF.
+    :param tmp_path: pytest temporary directory
+    :param write_parsivel_netcdf: the fixture that writes a netCDF of telegrams
+    """
+    paths = [write_parsivel_netcdf(tmp_path, day + timedelta(days=i), minutes=[0, 720],
+                                   changed_fields=counts_fields(intensities=[i, i + 1], counts=[i, i + 2]),
+                                   config_dict=config_dict) for i in range(3)]
+
+    assert resample_netCDF(paths, tmp_path / 'daily.nc', 86400, config_dict, Mock()) == 3
+    with Dataset(tmp_path / 'daily.nc') as nc_file:
+        assert nc_file.variables['time'][:].tolist() == pytest.approx([0, 24, 48])
+        assert nc_file.variables['n_particles'][:].tolist() == [2, 4, 6]
+        assert nc_file.variables['rain_intensity'][:].tolist() == pytest.approx([0.5, 1.5, 2.5])
+
+
+def test_resample_sum_widened(tmp_path):
+    """
+    This function tests that a summed 16-bit integer variable, ie. a count of the Thies, is written as
+    SUM_DATATYPE, so an hour of counts above 32767 does not wrap, and that other reductions keep the datatype.
+    :param tmp_path: pytest temporary directory
+    """
+    path = tmp_path / 'counts.nc'
+    with Dataset(path, 'w', format='NETCDF4') as nc_file:
+        nc_file.createDimension('time', None)
+        time_var = nc_file.createVariable('time', 'f8', ('time',))
+        time_var.units = 'hours since 2024-01-01 00:00:00 +00:00'
+        time_var.calendar = 'standard'
+        time_var[:] = numpy.arange(120) / 60
+        for name in ('n_no_hydrometeor', 'max_count'):
+            nc_file.createVariable(name, 'i2', ('time',), fill_value=-9999)[:] = numpy.full(120, 1000)
+    rules_config = {'telegram_fields': {'59': {'reduction': 'sum', 'var_attrs': {'standard_name': 'n_no_hydrometeor'}},
+                                        '57': {'reduction': 'max', 'var_attrs': {'standard_name': 'max_count'}}}}
+
+    assert resample_netCDF([path], tmp_path / 'hourly.nc', 3600, rules_config, Mock()) == 2
+    with Dataset(tmp_path / 'hourly.nc') as nc_file:
+        assert nc_file.variables['n_no_hydrometeor'].dtype == numpy.dtype(SUM_DATATYPE)
+        assert nc_file.variables['n_no_hydrometeor'][:].tolist() == [60000, 60000]
+        assert nc_file.variables['max_count'].dtype == numpy.int16
+        assert nc_file.variables['max_count'][:].tolist() == [1000, 1000]
+
+
+def test_reduction_rules_counts():
+    """
+    This function tests that the particle counts of both sensors are summed and that their accumulated amounts
+    keep the last value, instead of being averaged.
+    """
+    config_dict_thies = yaml2dict(path=wd / 'configs_netcdf' / 'config_general_thies.yml')
+    rules_thies = reduction_rules(config_dict_thies)
+    assert rules_thies['number_of_particles_no_hydrometeor'] == 'sum'
+    assert rules_thies['total_volume_gross_particles_no_hydrometeor'] == 'sum'
+    assert rules_thies['accumulated_precip_amount'] == 'last'
+    rules_parsivel = reduction_rules(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'))
+    assert rules_parsivel['acc_rain_amount'] == 'last'
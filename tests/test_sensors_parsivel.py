@@ -17,8 +17,10 @@ class TestParsivel(unittest.TestCase):  # pylint: disable=too-many-public-method
     - test_init_serial_connection_exception: Bad weather test for the init_serial_connection_success function.
     - test_sensor_start_sequence: Test for the sensor_start_sequence function with logging.
     - test_sensor_start_sequence_no_log: Test for the sensor_start_sequence function without logging.
+    - test_sensor_start_sequence_interval: Test for the sensor_start_sequence function with an interval.
     - test_reset_sensor_factory_reset: Good weather test for the reset_sensor function with factory_reset=True.
     - test_reset_sensor_restart: Good weather test for the reset_sensor function with factory_reset=False.
+    - test_reset_rain_amount: Test for the reset_rain_amount function.
     - test_write_success: Good weather test for the write function.
     - test_write_fail: Bad weather test for the write function.
     - test_read_success: Good weather test for the read function.
@@ -112,6 +114,33 @@ class TestParsivel(unittest.TestCase):  # pylint: disable=too-many-public-method
 
         mock_sleep.assert_has_calls(expected_calls_sleep)
 
+    @patch('modules.sensors.sleep', return_value=None)
+    def test_sensor_start_sequence_interval(self, mock_sleep):  # pylint: disable=unused-argument
+        """
+        Test for the sensor_start_sequence function with an interval in the config, which sets the measuring interval.
+        :param mock_sleep: Mock of the time.sleep call
+        """
+        mock_logger = Mock()
+        parsivel_obj = Parsivel()
+        parsivel_obj.serial_connection = Mock()
+        parsivel_obj.write = Mock()
+
+        config_dict = {
+            'station_code': 'STATION1',
+            'interval': 10,
+            'global_attrs': {
+                'sensor_name': '1234'
+            }
+        }
+
+        parsivel_obj.sensor_start_sequence(config_dict, mock_logger, False)
+
+        parsivel_obj.write.assert_has_calls([
+            call(b'CS/J/1234\r', mock_logger),
+            call(b'CS/I/10\r', mock_logger),
+            call(b'CS/Z/1\r', mock_logger)
+        ])
+
     @patch('modules.sensors.sleep', return_value=None)
     def test_sensor_start_sequence_no_log(self, mock_sleep):
         """
@@ -171,6 +200,24 @@ class TestParsivel(unittest.TestCase):  # pylint: disable=too-many-public-method
         parsivel_obj.write.assert_called_once_with(b'CS/Z/1\r', mock_logger)
         mock_sleep.assert_called_once_with(5)
 
+    @patch('modules.sensors.sleep', return_value=None)
+    def test_reset_rain_amount(self, mock_sleep):
+        """
+        Test for the reset_rain_amount function, which only sends the rain amount reset of the start sequence.
+        :param mock_sleep: Mock of the time.sleep call
+        """
+        mock_serial_connection = Mock()
+        parsivel_obj = Parsivel()
+        parsivel_obj.serial_connection = mock_serial_connection
+        parsivel_obj.write = Mock()
+        mock_logger = Mock()
+
+        parsivel_obj.reset_rain_amount(mock_logger)
+
+        parsivel_obj.write.assert_called_once_with(b'CS/Z/1\r', mock_logger)
+        mock_sleep.assert_called_once_with(1)
+        mock_serial_connection.reset_input_buffer.assert_called_once()
+
     def test_write_success(self):
         """
         Good weather test for the write function.
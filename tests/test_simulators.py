@@ -0,0 +1,163 @@
+"""
+This module contains tests for the simulated sensors in modules/simulators.py,
+read by the sensor classes of modules/sensors.py through a real serial connection on the pty.
+
+Functions:
+- test_parsivel_simulator: Tests that a Parsivel telegram is read and parsed, and follows the configuration commands.
+- test_thies_simulator: Tests that a Thies telegram is read and parsed and the clock is set by ZH/ZM/ZS.
+- test_thies_automatic_mode: Tests that the Thies sends a telegram every simulated minute in automatic mode.
+- test_dropped_bytes: Tests that bytes of the answers are dropped.
+- test_baud_pacing: Tests that the answers are paced to the baudrate.
+- test_stats: Tests the number of requests and the jitter between them.
+"""
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from time import monotonic, sleep
+from unittest.mock import Mock, patch
+from pydantic.v1.utils import deep_update
+
+from modules.sensors import Parsivel, Thies
+from modules.simulators import ParsivelSimulator, ThiesSimulator, SimulatedClock, create_simulator
+from modules.telegram import create_telegram
+from modules.util_functions import yaml2dict
+
+# shortened sleeps of the sensor classes, the simulator must read a command before the buffers are flushed
+short_sleep = patch('modules.sensors.sleep', side_effect=lambda seconds: time.sleep(0.05))
+
+wd = Path(__file__).parent.parent
+config_dict = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_parsivel.yml'),
+                          yaml2dict(path=wd / 'configs_netcdf' / 'config_PAR_008_GV.yml'))
+config_dict_thies = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_thies.yml'),
+                                yaml2dict(path=wd / 'configs_netcdf' / 'config_THIES_006_GV.yml'))
+
+
+@short_sleep
+def test_parsivel_simulator(mock_sleep):  # pylint: disable=unused-argument
+    """
+    This function tests that a Parsivel telegram is read and parsed, and follows the configuration commands.
+    :param mock_sleep: mock of sleep in modules.sensors
+    """
+    simulator = ParsivelSimulator(baud=0)
+    simulator.start()
+    parsivel = Parsivel()
+    parsivel.init_serial_connection(port=simulator.port, baud=19200, logger=Mock())
+    parsivel.sensor_start_sequence(config_dict={'station_code': 'GV', 'global_attrs': {'sensor_name': 'PAR008'}},
+                                   logger=Mock(), include_in_log=False)
+
+    telegram_lines = parsivel.read(logger=Mock())
+    parsivel.close_serial_connection()
+    simulator.stop()
+
+    assert simulator.restarts == 1
+    assert not simulator.unknown_commands
+    telegram = create_telegram(config_dict=config_dict, telegram_lines=telegram_lines, db_row_id=None,
+                               timestamp=datetime.now(timezone.utc), db_cursor=None, telegram_data={},
+                               logger=Mock())
+    telegram.capture_prefixes_and_data()
+    assert telegram.telegram_data['22'] == 'GV'
+    assert telegram.telegram_data['23'] == 'PAR008'
+    assert telegram.telegram_data['21'] == datetime.now(timezone.utc).strftime('%d.%m.%Y')
+    assert len(telegram.telegram_data['93']) == 1024
+
+
+@short_sleep
+def test_thies_simulator(mock_sleep):  # pylint: disable=unused-argument
+    """
+    This function tests that a Thies telegram is read and parsed and the clock is set by ZH/ZM/ZS.
+    :param mock_sleep: mock of sleep in modules.sensors
+    """
+    simulator = create_simulator(config_dict_thies, baud=0)
+    simulator.clock = SimulatedClock(start=datetime(2024, 1, 1, 5, 6, 7, tzinfo=timezone.utc))
+    simulator.start()
+    thies = Thies(thies_id='06')
+    thies.init_serial_connection(port=simulator.port, baud=9600, logger=Mock())
+
+    with patch('modules.sensors.NowTime') as mock_now_time:
+        mock_now_time.return_value.time_list = ['12', '34', '56']
+        thies.sensor_start_sequence(config_dict={}, logger=Mock(), include_in_log=False)
+    sleep(0.2)
+    assert simulator.clock.now().strftime('%H:%M') == '12:34'
+
+    telegram_line = thies.read(logger=Mock())
+    thies.close_serial_connection()
+    simulator.stop()
+
+    telegram = create_telegram(config_dict=config_dict_thies, telegram_lines=telegram_line, db_row_id=None,
+                               timestamp=datetime.now(timezone.utc), db_cursor=None, telegram_data={},
+                               logger=Mock())
+    telegram.capture_prefixes_and_data()
+    assert telegram.telegram_data['2'] == '\x0206'
+    assert telegram.telegram_data['5'] == '01.01.24'
+    assert telegram.telegram_data['6'].startswith('12:34:')
+    assert len(telegram.telegram_data['81'].split(',')) == 440
+
+
+def test_thies_automatic_mode():
+    """
+    This function tests that the Thies sends a telegram every simulated minute in automatic mode.
+    """
+    simulator = ThiesSimulator(thies_id='05', telegram_body='05;0854;2.11;01.01.24;00:00:00', baud=0,
+                               clock_speed=600)
+    simulator.start()
+    thies = Thies(thies_id='05')
+    thies.init_serial_connection(port=simulator.port, baud=9600, logger=Mock())
+    thies.write(b'\r05TM00001\r', logger=Mock())
+    sleep(0.35)  # 210 simulated seconds
+    thies.write(b'\r05TM00000\r', logger=Mock())
+    sleep(0.1)
+    lines = thies.serial_connection.read_all().split(b'\r\n')
+    thies.close_serial_connection()
+    simulator.stop()
+
+    telegrams = [line for line in lines if line.startswith(b'\x0205;')]
+    assert 3 <= len(telegrams) <= 4
+
+
+def test_dropped_bytes():
+    """
+    This function tests that bytes of the answers are dropped with the drop rate.
+    """
+    simulator = ParsivelSimulator(baud=0, drop_rate=0.5, seed=1)
+    simulator.start()
+    parsivel = Parsivel()
+    parsivel.init_serial_connection(port=simulator.port, baud=19200, logger=Mock())
+    received = b''.join(parsivel.read(logger=Mock()))
+    parsivel.close_serial_connection()
+    simulator.stop()
+
+    n_sent = len(simulator.telegram())
+    assert 0.4 * n_sent < len(received) < 0.6 * n_sent
+
+
+def test_baud_pacing():
+    """
+    This function tests that the answers are paced to the baudrate.
+    """
+    simulator = ThiesSimulator(baud=300, telegram_body='00;0854;2.11')
+    simulator.start()
+    thies = Thies()
+    thies.init_serial_connection(port=simulator.port, baud=300, logger=Mock())
+    start = monotonic()
+    with patch('modules.sensors.sleep'):
+        telegram_line = thies.read(logger=Mock())
+    elapsed = monotonic() - start
+    thies.close_serial_connection()
+    simulator.stop()
+
+    assert telegram_line == '\x0200;0854;2.11\x03'
+    # 17 bytes at 300 baud take 0.57 s
+    assert 0.5 < elapsed < 2
+
+
+def test_stats():
+    """
+    This function tests the number of telegram requests and the jitter of the time between them.
+    """
+    simulator = ParsivelSimulator(baud=0)
+    simulator.requests = [(0.0, 'CS/PA'), (1.0, 'CS/PA'), (1.5, 'CS/Z/1'), (3.0, 'CS/PA')]
+    stats = simulator.stats()
+    simulator.stop()
+    assert stats['requests'] == 3
+    assert stats['mean_interval_s'] == 1.5
+    assert stats['jitter_s'] == 0.5
@@ -0,0 +1,159 @@
+"""
+This module contains tests for the telegram spool in modules/spool.py.
+
+Functions:
+- count_rows: Counts the rows in a table of a database.
+- row: Returns a disdrodl row for a minute.
+- test_spool_drain: Tests that spooled rows and particle rows are drained into the database.
+- test_spool_torn_line: Tests that a torn last line of the spool is skipped.
+- test_spool_drain_failure: Tests that the records are kept when the database can not be written.
+- test_spool_drainer: Tests that the drainer thread drains the spool once the database exists.
+- test_spool_fsync: Tests that appends only fsync with an fsync_batch, and sync fsyncs the appended records.
+"""
+import sqlite3
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from modules.spool import Spool, SpoolDrainer
+from modules.sqldb import create_db, connect_db
+
+
+def count_rows(db_path, table='disdrodl'):
+    """
+    Counts the rows in a table of a database.
+    :param db_path: path of the database
+    :param table: name of the table
+    :return: the number of rows
+    """
+    con, cur = connect_db(dbpath=str(db_path))
+    count = cur.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    cur.close()
+    con.close()
+    return count
+
+
+def row(i):
+    """
+    Returns a disdrodl row for minute i.
+    :param i: the minute
+    :return: tuple of (timestamp, datetime, sensor_id, telegram)
+    """
+    return (float(i * 60), f'minute {i}', 'PAR008', f'01:0000.000; 02:{i}')
+
+
+def test_spool_drain(tmp_path):
+    """
+    This function tests that spooled rows and particle rows are drained into the database and the spool is removed.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    spool = Spool(path=tmp_path / 'disdrodl.db.spool', logger=Mock(), fsync_batch=2)
+    spool.append(row(0))
+    spool.append(row(1), (60.0, 'PAR008', 1, b'\x00\x01\x02\x03\x04\x05\x06\x07'))
+    spool.append(row(2))
+
+    assert spool.pending()
+    assert spool.drain(db_path) == 3
+    assert not spool.pending()
+    assert count_rows(db_path) == 3
+    con, cur = connect_db(dbpath=str(db_path))
+    assert cur.execute('SELECT data FROM particles').fetchone()[0] == b'\x00\x01\x02\x03\x04\x05\x06\x07'
+    assert cur.execute('SELECT telegram FROM disdrodl WHERE timestamp = 120').fetchone()[0] == '01:0000.000; 02:2'
+    cur.close()
+    con.close()
+
+
+def test_spool_torn_line(tmp_path):
+    """
+    This function tests that a torn last line of the spool, from a crash while appending, is skipped.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    logger = Mock()
+    spool = Spool(path=tmp_path / 'disdrodl.db.spool', logger=logger)
+    spool.append(row(0))
+    spool.append(row(1))
+    spool.close()
+    with open(spool.path, 'a', encoding='utf-8') as spool_file:
+        spool_file.write('{"row": [120.0, "min')
+
+    assert spool.drain(db_path) == 2
+    assert count_rows(db_path) == 2
+    logger.error.assert_called_once()
+
+
+def test_spool_drain_failure(tmp_path):
+    """
+    This function tests that the records are kept when the database can not be written,
+    and that records appended in the meantime are drained after them.
+    :param tmp_path: pytest temporary directory
+    """
+    spool = Spool(path=tmp_path / 'disdrodl.db.spool', logger=Mock())
+    spool.append(row(0))
+    spool.append(row(1))
+    with pytest.raises(sqlite3.Error):
+        spool.drain(tmp_path / 'missing' / 'disdrodl.db')
+    assert spool.pending()
+
+    spool.append(row(2))
+    db_path = tmp_path / 'disdrodl.db'
+    create_db(dbpath=str(db_path))
+    assert spool.drain(db_path) == 2
+    assert spool.drain(db_path) == 1
+    assert not spool.pending()
+    assert count_rows(db_path) == 3
+
+
+def test_spool_drainer(tmp_path):
+    """
+    This function tests that the drainer thread drains the spool once the database exists.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = tmp_path / 'db' / 'disdrodl.db'
+    spool = Spool(path=tmp_path / 'disdrodl.db.spool', logger=Mock())
+    logger = Mock()
+    drainer = SpoolDrainer(spool=spool, db_path=db_path, logger=logger, drain_interval=0.05)
+    spool.append(row(0))
+    drainer.start()
+    time.sleep(0.2)
+    assert spool.pending()
+    assert logger.warning.call_count > 0
+
+    db_path.parent.mkdir()
+    create_db(dbpath=str(db_path))
+    spool.append(row(1))
+    time.sleep(0.2)
+    drainer.stop(timeout=5)
+
+    assert not drainer.is_alive()
+    assert not spool.pending()
+    assert spool.records_drained == 2
+    assert count_rows(db_path) == 2
+
+
+def test_spool_fsync(tmp_path):
+    """
+    This function tests that by default an append does not fsync, so a slow disk does not delay the acquisition,
+    that sync fsyncs the appended records once, and that an fsync_batch fsyncs every fsync_batch appends.
+    :param tmp_path: pytest temporary directory
+    """
+    spool = Spool(path=tmp_path / 'disdrodl.db.spool', logger=Mock())
+    with patch('modules.spool.os.fsync') as mock_fsync:
+        for i in range(3):
+            spool.append(row(i))
+        mock_fsync.assert_not_called()
+        spool.sync()
+        spool.sync()
+        mock_fsync.assert_called_once()
+    spool.close()
+
+    spool = Spool(path=tmp_path / 'batch.spool', logger=Mock(), fsync_batch=2)
+    with patch('modules.spool.os.fsync') as mock_fsync:
+        for i in range(5):
+            spool.append(row(i))
+        assert mock_fsync.call_count == 2
+    spool.close()
@@ -0,0 +1,81 @@
+"""
+This module contains tests for the compression of the telegram column in modules/telegram_codec.py.
+
+Functions:
+- test_encode_decode: Tests that a telegram survives encoding and decoding with each available codec.
+- test_decode_unknown_codec: Tests that a BLOB of an unknown codec raises an error.
+- test_mixed_codecs: Tests that plain and compressed rows of one table are read back as telegram strings.
+- test_get_telegram_codec: Tests the validation of the telegram_codec config entry.
+"""
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from modules.coverage import query_coverage, rebuild_coverage
+from modules.sqldb import create_db, connect_db, insert_rows, query_db_rows_gen
+from modules.telegram_codec import TELEGRAM_CODECS, codec_available, encode_telegram, decode_telegram
+from modules.util_functions import get_telegram_codec
+
+day = datetime(2024, 1, 1, tzinfo=timezone.utc)
+telegram = '01:0000.000; 02:0000.00; 93:' + ','.join(['000'] * 1024)
+
+
+def test_encode_decode():
+    """
+    This function tests that a telegram survives encoding and decoding with each available codec.
+    """
+    assert encode_telegram(telegram) == telegram
+    assert decode_telegram(telegram) == telegram
+    assert decode_telegram(None) is None
+    for codec in TELEGRAM_CODECS[1:]:
+        if not codec_available(codec):
+            continue
+        encoded = encode_telegram(telegram, codec)
+        assert isinstance(encoded, bytes)
+        assert len(encoded) < len(telegram) / 10
+        assert decode_telegram(encoded) == telegram
+
+
+def test_decode_unknown_codec():
+    """
+    This function tests that a BLOB of an unknown codec raises an error.
+    """
+    with pytest.raises(ValueError):
+        decode_telegram(b'\x09telegram')
+
+
+def test_mixed_codecs(tmp_path):
+    """
+    This function tests that plain and compressed rows of one table are read back as telegram strings,
+    and are counted the same by the coverage index.
+    :param tmp_path: pytest temporary directory
+    """
+    db_path = str(tmp_path / 'disdrodl.db')
+    create_db(dbpath=db_path)
+    con, cur = connect_db(dbpath=db_path)
+    rows = [(day.timestamp() + minute * 60, str(minute), 'PAR008', telegram) for minute in range(3)]
+    insert_rows(cur, rows[:1])
+    insert_rows(cur, rows[1:], codec='zlib')
+    con.commit()
+
+    assert [typeof for (typeof,) in cur.execute('SELECT typeof(telegram) FROM disdrodl')] == ['text', 'blob', 'blob']
+    assert [row['telegram'] for row in query_db_rows_gen(con, day, Mock())] == [telegram] * 3
+    expected = query_coverage(con, 'PAR008', day.date(), day.date())
+    assert expected[0]['n_minutes'] == 3
+    rebuild_coverage(con)
+    assert query_coverage(con, 'PAR008', day.date(), day.date()) == expected
+    cur.close()
+    con.close()
+
+
+def test_get_telegram_codec():
+    """
+    This function tests the validation of the telegram_codec config entry.
+    """
+    logger = Mock()
+    assert get_telegram_codec({}, logger) == 'plain'
+    assert get_telegram_codec({'telegram_codec': 'zlib'}, logger) == 'zlib'
+    assert get_telegram_codec({'telegram_codec': 'lzma'}, logger) is None
+    assert logger.error.call_count == 1
+    assert (get_telegram_codec({'telegram_codec': 'zstd'}, logger) == 'zstd') == codec_available('zstd')
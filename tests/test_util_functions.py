@@ -11,7 +11,9 @@ Functions:
 - test_config_dict: Tests the integrity of the configuration dictionary `config_dict`.
 - test_get_general_config_dict: Tests whether for exporting the correct general config file
     is chosen based on the site config file.
+- test_set_interval: Tests the validation of the acquisition interval and the interval variable.
 """
+import copy
 import json
 from pathlib import Path
 import unittest
@@ -21,7 +23,7 @@ from pydantic.v1.utils import deep_update
 
 from modules.sensors import Thies, Parsivel
 from modules.util_functions import yaml2dict, get_general_config_dict, create_logger, \
-    create_dir, resetSerialBuffers, interruptHandler, create_sensor  # pylint: disable=import-error
+    create_dir, resetSerialBuffers, interruptHandler, create_sensor, set_interval  # pylint: disable=import-error
 from modules.netCDF import unpack_telegram_from_db
 
 wd = Path(__file__).parent.parent
@@ -47,7 +49,7 @@ telegram_lines = [b'OK\r\n',
                   b';']
 
 
-class UtilFunctionsTests(unittest.TestCase):
+class UtilFunctionsTests(unittest.TestCase):  # pylint: disable=too-many-public-methods
     """
     Class for testing the functionality of the methods
     """
@@ -253,3 +255,35 @@ class UtilFunctionsTests(unittest.TestCase):
             '90': '-9.999,-9.999,-9.999,-9.999'
         }
         assert unpack_telegram_from_db(input_str) == expected_output
+
+    @staticmethod
+    def test_set_interval():
+        """
+        Test for the set_interval function with the default, a sub-minute and an invalid interval
+        """
+        mock_logger = Mock()
+        config = copy.deepcopy(config_dict)
+        assert set_interval(config, mock_logger) == 60
+        assert config['variables']['interval']['value'] == [60]
+
+        config['interval'] = 10
+        assert set_interval(config, mock_logger) == 10
+        assert config['variables']['interval']['value'] == [10]
+        mock_logger.error.assert_not_called()
+
+        config['interval'] = 25
+        assert set_interval(config, mock_logger) is None
+        mock_logger.error.assert_called_once()
+
+    @staticmethod
+    def test_set_interval_thies():
+        """
+        Test for the set_interval function with a sub-minute interval for the Thies, which falls back to 60 seconds
+        """
+        mock_logger = Mock()
+        config = deep_update(yaml2dict(path=wd / 'configs_netcdf' / 'config_general_thies.yml'),
+                             yaml2dict(path=wd / 'configs_netcdf' / 'config_THIES_006_GV.yml'))
+        config['interval'] = 30
+        assert set_interval(config, mock_logger) == 60
+        assert config['variables']['interval']['value'] == [60]
+        mock_logger.warning.assert_called_once()